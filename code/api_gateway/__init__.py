@@ -4,10 +4,15 @@
 提供统一的API访问入口
 """
 
-from .gateway import app, SERVICES, forward_request
+from .gateway import app, SERVICES, forward_request, upstream
+from .upstream import UpstreamConfig, UpstreamPool, ResponseCache
 
 __all__ = [
     'app',
     'SERVICES',
     'forward_request',
+    'upstream',
+    'UpstreamConfig',
+    'UpstreamPool',
+    'ResponseCache',
 ]
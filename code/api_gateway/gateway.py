@@ -6,11 +6,14 @@
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 from typing import Optional, Dict, Any
 import os
 
+from .upstream import CachedResponse, UpstreamConfig, UpstreamPool, forwardable_headers
+
 app = FastAPI(
     title="DSL Schema统一API网关",
     version="1.0.0",
@@ -70,6 +73,15 @@ SERVICES = {
     }
 }
 
+# 所有请求共享的上游长连接池，配置见UpstreamConfig.from_env
+upstream = UpstreamPool(SERVICES, UpstreamConfig.from_env())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """关闭上游连接"""
+    await upstream.aclose()
+
 
 async def forward_request(service_name: str, path: str, method: str = "GET",
                          data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -88,24 +100,11 @@ async def forward_request(service_name: str, path: str, method: str = "GET",
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"服务 {service_name} 不存在")
     
-    service = SERVICES[service_name]
-    url = f"{service['url']}{path}"
+    if method not in ("GET", "POST", "PUT", "DELETE"):
+        raise HTTPException(status_code=405, detail=f"不支持的HTTP方法: {method}")
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if method == "GET":
-                response = await client.get(url)
-            elif method == "POST":
-                response = await client.post(url, json=data)
-            elif method == "PUT":
-                response = await client.put(url, json=data)
-            elif method == "DELETE":
-                response = await client.delete(url)
-            else:
-                raise HTTPException(status_code=405, detail=f"不支持的HTTP方法: {method}")
-            
-            response.raise_for_status()
-            return response.json()
+        return await upstream.request_json(service_name, path, method, data)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"服务 {service_name} 请求失败: {str(e)}")
 
@@ -122,23 +121,8 @@ async def root():
 
 @app.get("/api/v1/health")
 async def health_check():
-    """健康检查"""
-    health_status = {}
-    
-    for service_name, service_info in SERVICES.items():
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{service_info['url']}{service_info['health']}")
-                health_status[service_name] = {
-                    "status": "healthy" if response.status_code == 200 else "unhealthy",
-                    "url": service_info['url']
-                }
-        except Exception as e:
-            health_status[service_name] = {
-                "status": "unhealthy",
-                "error": str(e),
-                "url": service_info['url']
-            }
+    """健康检查（并行探测，结果短时缓存）"""
+    health_status = await upstream.health()
     
     all_healthy = all(status["status"] == "healthy" for status in health_status.values())
     
@@ -167,18 +151,37 @@ async def list_services():
 
 @app.api_route("/api/v1/{service_name}/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def proxy_request(service_name: str, path: str, request: Request):
-    """代理请求到指定服务"""
+    """代理请求到指定服务
+    
+    请求体与响应体都以流的形式透传，不做JSON解析和重新编码；上游的状态码与
+    头部原样返回，只有连接失败等传输错误映射为502。
+    """
+    if service_name not in SERVICES:
+        raise HTTPException(status_code=404, detail=f"服务 {service_name} 不存在")
+    
     method = request.method
-    data = None
+    headers = forwardable_headers(request.headers.items(), drop=("host", "content-length"))
+    content = request.stream() if method in ("POST", "PUT") else None
     
-    if method in ["POST", "PUT"]:
-        try:
-            data = await request.json()
-        except:
-            pass
+    try:
+        response = await upstream.proxy(service_name, method, f"/api/v1/{path}",
+                                        params=request.url.query, headers=headers, content=content)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"服务 {service_name} 请求失败: {str(e)}")
     
-    result = await forward_request(service_name, f"/api/v1/{path}", method, data)
-    return JSONResponse(content=result)
+    if isinstance(response, CachedResponse):
+        return _with_headers(Response(content=response.body, status_code=response.status_code),
+                             response.headers)
+    streaming = StreamingResponse(response.aiter_raw(), status_code=response.status_code,
+                                  background=BackgroundTask(response.aclose))
+    return _with_headers(streaming, forwardable_headers(response.headers.multi_items()))
+
+
+def _with_headers(response: Response, headers) -> Response:
+    """用上游头部替换响应头部（保留Set-Cookie等重复头部）"""
+    response.raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in headers]
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+"""
+网关负载测试
+
+为每个服务启动本地桩服务，通过ASGI直接驱动网关应用，比较不同上游配置：
+- no_keepalive: 不保留空闲连接，每个请求新建TCP连接（等价于每次请求创建客户端）
+- pooled: 长连接池
+- pooled_cache: 长连接池 + ETag响应缓存
+
+运行：
+    python -m api_gateway.load_test --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+
+from . import gateway
+from .stub_service import StubService
+from .upstream import UpstreamConfig, UpstreamPool
+
+MODES = {
+    'no_keepalive': UpstreamConfig(max_keepalive_connections=0),
+    'pooled': UpstreamConfig(),
+    'pooled_cache': UpstreamConfig(response_cache=True),
+}
+
+
+async def run_mode(mode: str, requests: int, concurrency: int, payload_size: int,
+                   max_age: int, paths: int) -> Dict[str, float]:
+    """
+    以指定上游配置运行一轮负载
+
+    Args:
+        mode: MODES中的配置名
+        requests: 请求总数
+        concurrency: 并发数
+        payload_size: 桩服务响应体大小（字节）
+        max_age: 桩服务响应的max-age（秒）
+        paths: 不同资源路径的数量
+
+    Returns:
+        吞吐量、延迟分位数与桩服务统计
+    """
+    stubs = {name: StubService(payload_size=payload_size, max_age=max_age) for name in gateway.SERVICES}
+    await asyncio.gather(*(stub.start() for stub in stubs.values()))
+    original_urls = {name: info['url'] for name, info in gateway.SERVICES.items()}
+    for name, stub in stubs.items():
+        gateway.SERVICES[name]['url'] = stub.url
+    gateway.upstream = UpstreamPool(gateway.SERVICES, MODES[mode])
+
+    service_names = list(gateway.SERVICES)
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        for i in counter:
+            service = service_names[i % len(service_names)]
+            started = time.perf_counter()
+            response = await client.get(f"/api/v1/{service}/items/{i % paths}")
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    try:
+        transport = httpx.ASGITransport(app=gateway.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await gateway.upstream.aclose()
+        await asyncio.gather(*(stub.stop() for stub in stubs.values()))
+        for name, url in original_urls.items():
+            gateway.SERVICES[name]['url'] = url
+
+    latencies.sort()
+    return {
+        'throughput': requests / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': errors,
+        'upstream_connections': sum(stub.connections for stub in stubs.values()),
+        'upstream_requests': sum(stub.requests for stub in stubs.values()),
+        'not_modified': sum(stub.not_modified for stub in stubs.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API网关负载测试")
+    parser.add_argument('modes', nargs='*', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--payload-size', type=int, default=4096)
+    parser.add_argument('--max-age', type=int, default=0, help="0表示每次都用ETag重新验证")
+    parser.add_argument('--paths', type=int, default=20)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        result = asyncio.run(run_mode(mode, args.requests, args.concurrency, args.payload_size,
+                                      args.max_age, args.paths))
+        print(f"{mode:<14} {result['throughput']:>9.0f} req/s  p50={result['p50_ms']:.1f}ms  "
+              f"p99={result['p99_ms']:.1f}ms  errors={result['errors']}  "
+              f"upstream: connections={result['upstream_connections']} "
+              f"requests={result['upstream_requests']} 304={result['not_modified']}")
+
+
+if __name__ == "__main__":
+    main()
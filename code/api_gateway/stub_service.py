@@ -0,0 +1,136 @@
+"""
+本地桩服务
+
+基于asyncio的最小HTTP/1.1服务，支持keep-alive，用于网关的负载测试：
+- GET /api/v1/health 健康检查
+- GET /api/v1/<路径> 返回带ETag的JSON，支持If-None-Match（304）
+- POST/PUT /api/v1/<路径> 原样回显请求体
+- DELETE /api/v1/<路径> 返回204
+
+统计接受的连接数与请求数，用于观察连接复用效果。
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Dict, Optional, Tuple
+
+_REASONS = {200: 'OK', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found'}
+
+
+class StubService:
+    """本地桩服务
+
+    使用示例：
+        >>> stub = StubService(payload_size=2048, max_age=1)
+        >>> await stub.start()
+        >>> stub.url
+        'http://127.0.0.1:54321'
+        >>> await stub.stop()
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, payload_size: int = 1024,
+                 max_age: int = 0, latency: float = 0.0):
+        """
+        初始化桩服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口（0表示随机端口）
+            payload_size: GET响应体中填充数据的大小（字节）
+            max_age: GET响应的Cache-Control max-age（秒）
+            latency: 每个请求的模拟处理延迟（秒）
+        """
+        self.host = host
+        self.port = port
+        self.payload_size = payload_size
+        self.max_age = max_age
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _resource(self, path: str) -> Tuple[bytes, str]:
+        body = json.dumps({"path": path, "data": "x" * self.payload_size}).encode()
+        return body, '"' + hashlib.md5(body).hexdigest() + '"'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await self._read_body(reader, headers)
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                status, response_headers, response_body = self._respond(method, target.split('?', 1)[0],
+                                                                        headers, body)
+                head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                head.append(f"Content-Length: {len(response_body)}")
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + response_body)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length']))
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    return b''.join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        return b''
+
+    def _respond(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        json_headers = {'Content-Type': 'application/json'}
+        if path == '/api/v1/health':
+            return 200, json_headers, b'{"status": "healthy"}'
+        if method == 'GET':
+            payload, etag = self._resource(path)
+            cache_headers = {'ETag': etag, 'Cache-Control': f'max-age={self.max_age}'}
+            if headers.get('if-none-match') == etag:
+                self.not_modified += 1
+                return 304, cache_headers, b''
+            return 200, {**json_headers, **cache_headers}, payload
+        if method in ('POST', 'PUT'):
+            return 200, {'Content-Type': headers.get('content-type', 'application/octet-stream')}, body
+        if method == 'DELETE':
+            return 204, {}, b''
+        return 400, {}, b''
@@ -0,0 +1,463 @@
+"""
+网关上游连接管理
+
+为每个后端服务维护长连接的httpx客户端，提供：
+- HTTP/1.1 keep-alive连接池（可选HTTP/2，仅https上游）
+- 并行健康检查与结果缓存
+- 请求/响应体流式透传
+- 可选的、基于ETag的幂等GET响应缓存
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 逐跳头部只对单个连接有效，不能转发
+HOP_BY_HOP_HEADERS = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade',
+})
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+# 携带这些头部的请求属于特定用户，其响应只有显式public时才能共享
+CREDENTIAL_HEADERS = frozenset({'authorization', 'cookie'})
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@dataclass
+class UpstreamConfig:
+    """上游连接配置
+
+    Attributes:
+        timeout: 单次请求超时（秒）
+        max_connections: 每个服务的最大连接数
+        max_keepalive_connections: 每个服务保持的空闲长连接数
+        keepalive_expiry: 空闲长连接的保留时间（秒）
+        http2: 是否启用HTTP/2（需要安装h2，未安装时回退到HTTP/1.1）。httpx只通过TLS的ALPN
+            协商HTTP/2，不支持明文h2c，因此对http://上游无效
+        health_timeout: 健康检查超时（秒）
+        health_cache_ttl: 健康检查结果缓存时间（秒）
+        response_cache: 是否缓存幂等GET响应
+        response_cache_size: 响应缓存的最大条目数
+        response_cache_max_bytes: 可缓存的单个响应体上限（字节），更大的响应直接流式透传
+    """
+    timeout: float = 30.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    health_timeout: float = 5.0
+    health_cache_ttl: float = 5.0
+    response_cache: bool = False
+    response_cache_size: int = 1024
+    response_cache_max_bytes: int = 1 << 20
+
+    def __post_init__(self):
+        if self.max_connections <= 0:
+            raise ValueError("max_connections must be positive")
+        if self.max_keepalive_connections < 0:
+            raise ValueError("max_keepalive_connections must be non-negative")
+        if self.response_cache_size <= 0:
+            raise ValueError("response_cache_size must be positive")
+
+    @classmethod
+    def from_env(cls) -> 'UpstreamConfig':
+        """从GATEWAY_*环境变量读取配置"""
+        return cls(
+            timeout=float(os.getenv('GATEWAY_TIMEOUT', cls.timeout)),
+            max_connections=int(os.getenv('GATEWAY_MAX_CONNECTIONS', cls.max_connections)),
+            max_keepalive_connections=int(os.getenv('GATEWAY_MAX_KEEPALIVE', cls.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv('GATEWAY_KEEPALIVE_EXPIRY', cls.keepalive_expiry)),
+            http2=_env_flag('GATEWAY_HTTP2', cls.http2),
+            health_timeout=float(os.getenv('GATEWAY_HEALTH_TIMEOUT', cls.health_timeout)),
+            health_cache_ttl=float(os.getenv('GATEWAY_HEALTH_CACHE_TTL', cls.health_cache_ttl)),
+            response_cache=_env_flag('GATEWAY_RESPONSE_CACHE', cls.response_cache),
+            response_cache_size=int(os.getenv('GATEWAY_RESPONSE_CACHE_SIZE', cls.response_cache_size)),
+        )
+
+
+def forwardable_headers(headers: Iterable[Tuple[str, str]], drop: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """过滤逐跳头部（以及drop中的头部），保留重复头部的顺序"""
+    excluded = HOP_BY_HOP_HEADERS.union(name.lower() for name in drop)
+    return [(name, value) for name, value in headers if name.lower() not in excluded]
+
+
+@dataclass
+class CachedResponse:
+    """缓存的上游响应
+
+    Attributes:
+        status_code: 状态码
+        headers: 响应头部（已去除逐跳头部）
+        body: 响应体
+        etag: 实体标签（可选）
+        expires_at: 无需重新验证即可直接使用的截止时间
+        public: 响应是否显式声明public（可用于携带凭据的请求）
+    """
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    etag: Optional[str] = None
+    expires_at: float = 0.0
+    public: bool = False
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+def _vary_names(response: httpx.Response) -> Optional[Tuple[str, ...]]:
+    """响应Vary头部列出的请求头部名（小写、排序），Vary: *时返回None"""
+    names = set()
+    for value in response.headers.get_list('vary'):
+        names.update(name.strip().lower() for name in value.split(',') if name.strip())
+    if '*' in names:
+        return None
+    return tuple(sorted(names))
+
+
+def _header_values(headers: Iterable[Tuple[str, str]], names: Tuple[str, ...]) -> Tuple[str, ...]:
+    """按names取请求头部的值（重复头部以逗号合并，缺失为空串）"""
+    values: Dict[str, List[str]] = {}
+    for name, value in headers:
+        values.setdefault(name.lower(), []).append(value)
+    return tuple(', '.join(values.get(name, ())) for name in names)
+
+
+class ResponseCache:
+    """ETag感知的GET响应缓存（LRU）
+
+    键为(服务, 路径, 查询字符串)加上响应Vary头部所列请求头部的值。带max-age的
+    响应在有效期内直接返回；过期但带ETag的响应在下次请求时以If-None-Match
+    重新验证，上游返回304时继续使用缓存的响应体。
+
+    不缓存的响应：Cache-Control为no-store/private、既无ETag也无max-age、Vary: *，
+    以及携带Authorization/Cookie的请求得到的非public响应。携带凭据的请求也只
+    使用显式public的缓存条目，避免把一个用户的响应返回给另一个用户。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        # (服务, 路径, 查询字符串, Vary头部的值) -> 响应
+        self._entries: 'OrderedDict[Tuple[str, str, str, Tuple[str, ...]], CachedResponse]' = OrderedDict()
+        # (服务, 路径, 查询字符串) -> 最近一次响应的Vary头部名
+        self._vary: Dict[Tuple[str, str, str], Tuple[str, ...]] = {}
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    @staticmethod
+    def has_credentials(headers: Iterable[Tuple[str, str]]) -> bool:
+        """请求是否携带凭据头部"""
+        return any(name.lower() in CREDENTIAL_HEADERS for name, _ in headers)
+
+    def get(self, key: Tuple[str, str, str], headers: Iterable[Tuple[str, str]] = ()) -> Optional[CachedResponse]:
+        """
+        查找与请求匹配的缓存条目
+
+        Args:
+            key: (服务, 路径, 查询字符串)
+            headers: 请求头部，用于匹配Vary并判断是否携带凭据
+
+        Returns:
+            缓存条目，没有可用条目时为None
+        """
+        vary = self._vary.get(key)
+        if vary is None:
+            return None
+        headers = list(headers)
+        entry_key = key + (_header_values(headers, vary),)
+        entry = self._entries.get(entry_key)
+        if entry is None or (not entry.public and self.has_credentials(headers)):
+            return None
+        self._entries.move_to_end(entry_key)
+        return entry
+
+    @staticmethod
+    def cacheable(response: httpx.Response, headers: Iterable[Tuple[str, str]] = ()) -> bool:
+        """响应是否可以缓存（headers为产生该响应的请求头部）"""
+        if response.status_code != 200:
+            return False
+        cache_control = response.headers.get('cache-control', '').lower()
+        if 'no-store' in cache_control or 'private' in cache_control:
+            return False
+        if _vary_names(response) is None:
+            return False
+        if ResponseCache.has_credentials(headers) and 'public' not in cache_control:
+            return False
+        return 'etag' in response.headers or _MAX_AGE.search(cache_control) is not None
+
+    def store(self, key: Tuple[str, str, str], headers: Iterable[Tuple[str, str]],
+              response: httpx.Response, body: bytes) -> CachedResponse:
+        """
+        保存响应（调用方先用cacheable判断）
+
+        Args:
+            key: (服务, 路径, 查询字符串)
+            headers: 产生该响应的请求头部
+            response: 上游响应
+            body: 原始编码的响应体
+
+        Returns:
+            缓存条目
+        """
+        cache_control = response.headers.get('cache-control', '').lower()
+        match = _MAX_AGE.search(cache_control)
+        max_age = 0 if 'no-cache' in cache_control or match is None else int(match.group(1))
+        entry = CachedResponse(
+            status_code=response.status_code,
+            headers=forwardable_headers(response.headers.multi_items()),
+            body=body,
+            etag=response.headers.get('etag'),
+            expires_at=time.time() + max_age,
+            public='public' in cache_control,
+        )
+        vary = _vary_names(response) or ()
+        if self._vary.get(key, vary) != vary:
+            # Vary改变后旧条目的键不再可比，全部丢弃
+            self.invalidate(key[0], key[1], key[2])
+        self._vary[key] = vary
+        entry_key = key + (_header_values(headers, vary),)
+        self._entries[entry_key] = entry
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def refresh(self, entry: CachedResponse, response: httpx.Response):
+        """304重新验证成功后按新的Cache-Control延长有效期"""
+        match = _MAX_AGE.search(response.headers.get('cache-control', '').lower())
+        entry.expires_at = time.time() + (int(match.group(1)) if match else 0)
+
+    def invalidate(self, service_name: str, path: str, query: Optional[str] = None):
+        """
+        删除某个资源路径的条目（写操作后使相关资源失效）
+
+        Args:
+            service_name: 服务名称
+            path: 资源路径（精确匹配）
+            query: 查询字符串，缺省时删除该路径所有查询的条目
+        """
+        for key in [key for key in self._entries
+                    if key[:2] == (service_name, path) and (query is None or key[2] == query)]:
+            del self._entries[key]
+        for key in [key for key in self._vary
+                    if key[:2] == (service_name, path) and (query is None or key[2] == query)]:
+            del self._vary[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'hits': self.hits,
+                'revalidations': self.revalidations, 'misses': self.misses}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class UpstreamPool:
+    """按服务划分的长连接客户端池
+
+    每个服务一个httpx.AsyncClient，进程内所有请求共享其连接池，避免每次
+    请求重新建立TCP连接。需要在应用关闭时调用aclose()。
+
+    使用示例：
+        >>> pool = UpstreamPool(SERVICES, UpstreamConfig(response_cache=True))
+        >>> result = await pool.proxy("usl", "GET", "/api/v1/schemas")
+        >>> await pool.aclose()
+    """
+
+    def __init__(self, services: Mapping[str, Mapping[str, Any]], config: Optional[UpstreamConfig] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        初始化上游池
+
+        Args:
+            services: 服务名 -> {"url": 基础URL, "health": 健康检查路径, ...}
+            config: 上游连接配置
+            transport: 自定义传输层（如测试用的httpx.MockTransport），缺省使用连接池
+        """
+        self.services = services
+        self.config = config or UpstreamConfig()
+        self.transport = transport
+        self.cache = ResponseCache(self.config.response_cache_size) if self.config.response_cache else None
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._health: Optional[Dict[str, Dict[str, Any]]] = None
+        self._health_checked_at: float = 0.0
+        self._health_task: Optional[asyncio.Task] = None
+        if self.config.http2 and not H2_AVAILABLE:
+            logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+
+    def client(self, service_name: str) -> httpx.AsyncClient:
+        """获取服务的长连接客户端，首次使用时创建"""
+        client = self._clients.get(service_name)
+        if client is None:
+            service = self.services[service_name]
+            limits = httpx.Limits(max_connections=self.config.max_connections,
+                                  max_keepalive_connections=self.config.max_keepalive_connections,
+                                  keepalive_expiry=self.config.keepalive_expiry)
+            if self.config.http2 and H2_AVAILABLE and not service['url'].startswith('https://'):
+                logger.warning(f"HTTP/2 is only negotiated over TLS, {service_name} uses HTTP/1.1")
+            client = httpx.AsyncClient(base_url=service['url'], limits=limits, timeout=self.config.timeout,
+                                       http2=self.config.http2 and H2_AVAILABLE, transport=self.transport)
+            self._clients[service_name] = client
+        return client
+
+    async def aclose(self):
+        """关闭所有客户端及其连接"""
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+        if self._health_task is not None and not self._health_task.done():
+            self._health_task.cancel()
+
+    # ------------------------------------------------------------------
+    # 请求转发
+    # ------------------------------------------------------------------
+
+    async def proxy(
+        self,
+        service_name: str,
+        method: str,
+        path: str,
+        params: Union[None, str, Mapping[str, str]] = None,
+        headers: Optional[List[Tuple[str, str]]] = None,
+        content: Union[None, bytes, AsyncIterator[bytes]] = None
+    ) -> Union[CachedResponse, httpx.Response]:
+        """
+        转发请求
+
+        可缓存的GET返回CachedResponse（完整响应体）；其他情况返回尚未读取响应体
+        的httpx.Response，调用方负责流式读取并关闭。
+
+        Args:
+            service_name: 服务名称
+            method: HTTP方法
+            path: 上游路径
+            params: 查询参数（原始查询字符串或映射）
+            headers: 转发的请求头部（已去除逐跳头部）
+            content: 请求体（字节或异步字节流）
+
+        Returns:
+            CachedResponse或流式httpx.Response
+
+        Raises:
+            httpx.HTTPError: 上游请求失败
+        """
+        client = self.client(service_name)
+        headers = list(headers or [])
+        cache_key = None
+        cached = None
+        request_headers = headers
+        if self.cache is not None:
+            cache_key = (service_name, path, str(httpx.QueryParams(params or '')))
+            if method == 'GET':
+                # 缓存总是返回完整响应体，客户端自己的条件头部不转发
+                headers = [(name, value) for name, value in headers
+                           if name.lower() not in ('if-none-match', 'if-modified-since')]
+                request_headers = list(headers)
+                cached = self.cache.get(cache_key, request_headers)
+                if cached is not None and cached.is_fresh():
+                    self.cache.hits += 1
+                    return cached
+                if cached is not None and cached.etag:
+                    headers.append(('If-None-Match', cached.etag))
+            else:
+                # 写操作使同一资源路径下缓存的GET响应失效
+                self.cache.invalidate(service_name, path)
+
+        request = client.build_request(method, path, params=params, headers=headers, content=content)
+        response = await client.send(request, stream=True)
+        if cache_key is None or method != 'GET':
+            return response
+
+        if response.status_code == 304 and cached is not None:
+            # 读完（空）响应体后连接才会归还连接池，直接关闭会断开连接
+            await response.aread()
+            await response.aclose()
+            self.cache.revalidations += 1
+            self.cache.refresh(cached, response)
+            return cached
+
+        self.cache.misses += 1
+        length = response.headers.get('content-length')
+        if ResponseCache.cacheable(response, request_headers) and length is not None and \
+                int(length) <= self.config.response_cache_max_bytes:
+            try:
+                # 保留原始编码（如gzip），与缓存的Content-Encoding/Content-Length一致
+                body = b''.join([chunk async for chunk in response.aiter_raw()])
+            finally:
+                await response.aclose()
+            return self.cache.store(cache_key, request_headers, response, body)
+        return response
+
+    async def request_json(self, service_name: str, path: str, method: str = "GET",
+                           data: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        发送请求并解析JSON响应，上游返回错误状态时抛出httpx.HTTPStatusError
+
+        Args:
+            service_name: 服务名称
+            path: 上游路径
+            method: HTTP方法
+            data: JSON请求体（POST/PUT）
+
+        Returns:
+            解析后的JSON
+        """
+        client = self.client(service_name)
+        response = await client.request(method, path, json=data if method in ('POST', 'PUT') else None)
+        response.raise_for_status()
+        return response.json()
+
+    # ------------------------------------------------------------------
+    # 健康检查
+    # ------------------------------------------------------------------
+
+    async def _probe(self, service_name: str) -> Dict[str, Any]:
+        service = self.services[service_name]
+        try:
+            response = await self.client(service_name).get(service['health'], timeout=self.config.health_timeout)
+            return {"status": "healthy" if response.status_code == 200 else "unhealthy", "url": service['url']}
+        except Exception as e:
+            return {"status": "unhealthy", "error": str(e), "url": service['url']}
+
+    async def _probe_all(self) -> Dict[str, Dict[str, Any]]:
+        names = list(self.services)
+        results = await asyncio.gather(*(self._probe(name) for name in names))
+        self._health = dict(zip(names, results))
+        self._health_checked_at = time.time()
+        return self._health
+
+    async def health(self) -> Dict[str, Dict[str, Any]]:
+        """
+        并行探测所有服务的健康状态
+
+        结果缓存health_cache_ttl秒；缓存过期时并发的调用共享同一次探测。
+
+        Returns:
+            服务名 -> 健康状态
+        """
+        if self._health is not None and time.time() - self._health_checked_at < self.config.health_cache_ttl:
+            return self._health
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.ensure_future(self._probe_all())
+        return await asyncio.shield(self._health_task)
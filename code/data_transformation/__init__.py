@@ -145,6 +145,7 @@ from .data_optimization import (
 )
 from .data_streaming import (
     DataStreaming,
+    StreamRecord,
     StreamType
 )
 from .data_pipeline import (
@@ -212,7 +213,8 @@ from .data_extractor import (
 from .data_query import (
     DataQuery,
     SortOrder,
-    FilterOperator
+    FilterOperator,
+    IndexType
 )
 from .data_statistics import (
     DataStatistics,
@@ -319,7 +321,8 @@ from .data_transformation_optimizer import (
 from .data_transformation_scheduler import (
     DataTransformationScheduler,
     ScheduleType,
-    TaskStatus
+    TaskStatus,
+    MisfirePolicy
 )
 from .data_transformation_monitor import (
     DataTransformationMonitor,
@@ -551,6 +554,7 @@ __all__ = [
     'OptimizationType',
     # 数据流处理
     'DataStreaming',
+    'StreamRecord',
     'StreamType',
     # 数据管道
     'DataPipeline',
@@ -604,6 +608,7 @@ __all__ = [
     'DataQuery',
     'SortOrder',
     'FilterOperator',
+    'IndexType',
     # 数据统计
     'DataStatistics',
     'StatisticType',
@@ -686,6 +691,7 @@ __all__ = [
     'DataTransformationScheduler',
     'ScheduleType',
     'TaskStatus',
+    'MisfirePolicy',
     # 数据转换监控器
     'DataTransformationMonitor',
     'MonitorType',
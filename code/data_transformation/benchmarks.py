@@ -0,0 +1,262 @@
+"""
+数据转换模块性能基准
+
+提供各组件热点路径的基准测试，用法：
+    python -m data_transformation.benchmarks query --count 1000000
+    python -m data_transformation.benchmarks transform --count 1000000
+    python -m data_transformation.benchmarks executor --count 100000
+    python -m data_transformation.benchmarks scheduler --count 100000
+    python -m data_transformation.benchmarks streaming --count 1000000
+"""
+
+import argparse
+import random
+import threading
+import time
+from typing import Callable, Dict, List
+
+from .data_query import DataQuery, FilterOperator, QueryFilter, SortField, SortOrder
+from .data_streaming import DataStreaming, StreamRecord, StreamType
+from .data_transformation_engine import DataTransformationEngine
+from .data_transformation_executor import DataTransformationExecutor
+from .data_transformation_scheduler import DataTransformationScheduler
+
+
+def _timed(func: Callable[[], object]) -> float:
+    """执行函数并返回耗时（秒）"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _report(name: str, count: int, elapsed: float) -> Dict[str, float]:
+    rate = count / elapsed if elapsed > 0 else float('inf')
+    print(f"{name:<28} {count:>10} 次  {elapsed:8.3f} s  {rate:12.1f} 次/秒")
+    return {'count': count, 'seconds': elapsed, 'rate': rate}
+
+
+def generate_records(count: int, seed: int = 42) -> List[Dict[str, object]]:
+    """生成订单类测试记录"""
+    rng = random.Random(seed)
+    cities = [f"city_{i}" for i in range(200)]
+    statuses = ['created', 'paid', 'shipped', 'delivered', 'cancelled']
+    return [
+        {
+            'id': i,
+            'customer_id': rng.randrange(count // 10 + 1),
+            'city': rng.choice(cities),
+            'status': rng.choice(statuses),
+            'amount': round(rng.uniform(1, 5000), 2),
+            'created_at': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+        for i in range(count)
+    ]
+
+
+def _scan_query(records: List[Dict[str, object]], query: DataQuery, filters: List[QueryFilter],
+                sort_fields: List[SortField], page_size: int) -> List[Dict[str, object]]:
+    """整表扫描基线：逐条件过滤列表，整体排序后分页"""
+    data = query._apply_filters(records.copy(), filters)
+    for sort_field in reversed(sort_fields):
+        data = sorted(data, key=lambda record: record.get(sort_field.field),
+                      reverse=sort_field.order == SortOrder.DESC)
+    return data[:page_size]
+
+
+def benchmark_query(count: int = 1000000) -> Dict[str, Dict[str, float]]:
+    """比较整表扫描与列存索引查询（等值+范围过滤、排序取首页）"""
+    records = generate_records(count)
+    query = DataQuery()
+    results = {}
+
+    build = _timed(lambda: query.register_data_store(
+        'orders', records, hash_indexes=['city', 'status', 'customer_id'],
+        sorted_indexes=['amount', 'created_at']))
+    print(f"{'register+index':<28} {count:>10} 行  {build:8.3f} s")
+
+    workloads = {
+        'point': ([QueryFilter('customer_id', FilterOperator.EQ, 42)], []),
+        'eq+range+sort': ([QueryFilter('status', FilterOperator.EQ, 'paid'),
+                           QueryFilter('amount', FilterOperator.BETWEEN, (1000, 1200)),
+                           QueryFilter('city', FilterOperator.IN, ['city_1', 'city_2', 'city_3'])],
+                          [SortField('amount', SortOrder.DESC)]),
+        'range+topk': ([QueryFilter('created_at', FilterOperator.GTE, '2025-06-01')],
+                       [SortField('city', SortOrder.ASC), SortField('amount', SortOrder.DESC)]),
+        'residual': ([QueryFilter('id', FilterOperator.LT, count // 2),
+                       QueryFilter('status', FilterOperator.NE, 'cancelled')],
+                      [SortField('id', SortOrder.DESC)]),
+    }
+    for name, (filters, sort_fields) in workloads.items():
+        scans = 2
+        elapsed = _timed(lambda: [_scan_query(records, query, filters, sort_fields, 100) for _ in range(scans)])
+        results[f'{name}_scan'] = _report(f'{name} (scan)', scans, elapsed)
+        # 首次查询包含列与排名的构建
+        query.query('orders', filters, sort_fields, page=1, page_size=100)
+        repeats = 20
+        elapsed = _timed(lambda: [query.query('orders', filters, sort_fields, page=1, page_size=100)
+                                  for _ in range(repeats)])
+        results[f'{name}_indexed'] = _report(f'{name} (indexed)', repeats, elapsed)
+    return results
+
+
+def _transformation_engine() -> DataTransformationEngine:
+    engine = DataTransformationEngine()
+    engine.add_rule({'rule_id': 'amount', 'source_field': 'amount', 'target_field': 'amount_cents',
+                     'transformation_type': 'calculate',
+                     'rule_config': {'formula': lambda record: int(record['amount'] * 100)}})
+    engine.add_rule({'rule_id': 'customer', 'source_field': 'customer_id', 'target_field': 'customer_key',
+                     'transformation_type': 'type_cast', 'rule_config': {'target_type': 'string'}})
+    engine.add_rule({'rule_id': 'status', 'source_field': 'status', 'target_field': 'status_code',
+                     'transformation_type': 'value_map',
+                     'rule_config': {'value_map': {'created': 0, 'paid': 1, 'shipped': 2, 'delivered': 3},
+                                     'default_value': -1}})
+    engine.add_rule({'rule_id': 'city', 'source_field': 'city', 'target_field': 'city',
+                     'transformation_type': 'format_convert', 'rule_config': {'formatter': str.upper}})
+    return engine
+
+
+def benchmark_transform(count: int = 1000000) -> Dict[str, Dict[str, float]]:
+    """比较逐条transform与编译后的batch_transform（4条规则）"""
+    records = generate_records(count)
+    results = {}
+
+    engine = _transformation_engine()
+    elapsed = _timed(lambda: [engine.transform(record) for record in records])
+    results['per_record'] = _report('transform (per record)', count, elapsed)
+
+    engine = _transformation_engine()
+    elapsed = _timed(lambda: engine.batch_transform(records))
+    results['compiled'] = _report('batch_transform (compiled)', count, elapsed)
+
+    elapsed = _timed(lambda: engine.batch_transform(records, max_workers=4, use_processes=True))
+    results['compiled_processes'] = _report('batch_transform (4 procs)', count, elapsed)
+    return results
+
+
+def benchmark_executor(count: int = 100000) -> Dict[str, Dict[str, float]]:
+    """执行器吞吐量：提交count个空任务直到全部完成，输出排队与运行直方图分位数"""
+    executor = DataTransformationExecutor(max_workers=4)
+    executor.start_executor()
+    priorities = ['low', 'normal', 'high', 'critical']
+    done = threading.Event()
+    remaining = [count]
+    lock = threading.Lock()
+
+    def task():
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    def run():
+        for i in range(count):
+            executor.submit_task({'task_id': f'task_{i}', 'task_func': task, 'priority': priorities[i % 4]})
+        done.wait()
+
+    elapsed = _timed(run)
+    executor.stop_executor()
+    stats = executor.get_executor_stats()
+    print(f"queue_wait p50={stats['queue_wait']['p50_ms']}ms p99={stats['queue_wait']['p99_ms']}ms  "
+          f"run_time p99={stats['run_time']['p99_ms']}ms")
+    return {'tasks': _report('executor tasks', count, elapsed)}
+
+
+def benchmark_scheduler(count: int = 100000, rate: int = 1000, duration: float = 3.0) -> Dict[str, Dict[str, float]]:
+    """调度器开销：任务总数不同、总触发速率相同（rate次/秒）时的CPU占用"""
+    results = {}
+    for tasks in sorted({min(1000, count), count}):
+        scheduler = DataTransformationScheduler(max_workers=4)
+        interval = tasks / rate
+        rng = random.Random(42)
+        # 所有任务的首次执行都落在注册完成之后的同一起点
+        start_at = time.time() + 1.0 + tasks * 2e-5
+        for i in range(tasks):
+            scheduler.schedule_task({'task_id': f'task_{i}', 'task_func': lambda: None,
+                                     'schedule_type': 'interval',
+                                     'schedule_config': {'interval_seconds': interval,
+                                                         'start_seconds': start_at - time.time()
+                                                         + rng.uniform(0, interval)},
+                                     'jitter_seconds': 0.01})
+        scheduler.start_scheduler()
+        time.sleep(max(start_at - time.time(), 0))
+        cpu_start = time.process_time()
+        time.sleep(duration)
+        cpu = time.process_time() - cpu_start
+        scheduler.stop_scheduler()
+        stats = scheduler.get_scheduler_stats()
+        executions = stats['total_executions']
+        print(f"{tasks:>8} 个任务  执行 {executions:>6} 次  CPU {cpu / duration * 100:5.1f}%  "
+              f"每次 {cpu / max(executions, 1) * 1e6:6.1f} µs  "
+              f"平均分派延迟 {stats['average_dispatch_delay'] * 1000:.2f} ms")
+        results[str(tasks)] = {'count': executions, 'seconds': cpu, 'rate': executions / duration}
+    return results
+
+
+def benchmark_streaming(count: int = 1000000) -> Dict[str, Dict[str, float]]:
+    """流吞吐量：逐条发布与处理 对比 按城市分区、批量发布与微批处理（端到端直到全部处理完）"""
+    records = generate_records(count)
+    results = {}
+
+    def run(name: str, stream_type: StreamType, partitions: int, batch_size: int, chunk: int):
+        streaming = DataStreaming(buffer_size=10000)
+        streaming.create_stream('orders', stream_type, partitions=partitions, partition_key='city')
+        done = threading.Event()
+        lock = threading.Lock()
+        state = {'processed': 0, 'amount': 0.0}
+
+        def processed(batch: List[StreamRecord]):
+            amount = sum(record.data['amount'] for record in batch)
+            with lock:
+                state['amount'] += amount
+                state['processed'] += len(batch)
+                if state['processed'] >= count:
+                    done.set()
+
+        if stream_type == StreamType.STREAM:
+            streaming.subscribe('orders', lambda record: processed([record]))
+        else:
+            streaming.subscribe('orders', processed, batch_size=batch_size, batch_timeout=0.005)
+        streaming.start_streaming('orders')
+
+        def publish():
+            if chunk == 1:
+                for record in records:
+                    streaming.publish('orders', record)
+            else:
+                for start in range(0, count, chunk):
+                    streaming.publish_many('orders', records[start:start + chunk])
+            done.wait()
+
+        elapsed = _timed(publish)
+        streaming.stop_streaming('orders')
+        results[name] = _report(name, count, elapsed)
+
+    run('per-record stream', StreamType.STREAM, 1, 1, 1)
+    run('micro-batch (4 partitions)', StreamType.MICRO_BATCH, 4, 500, 1000)
+    return results
+
+
+BENCHMARKS = {
+    'executor': benchmark_executor,
+    'query': benchmark_query,
+    'scheduler': benchmark_scheduler,
+    'streaming': benchmark_streaming,
+    'transform': benchmark_transform,
+}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="数据转换模块性能基准")
+    parser.add_argument('benchmark', nargs='?', choices=sorted(BENCHMARKS), help="基准名称，缺省运行全部")
+    parser.add_argument('--count', type=int, default=1000000, help="数据规模")
+    args = parser.parse_args()
+
+    names = [args.benchmark] if args.benchmark else sorted(BENCHMARKS)
+    for name in names:
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name](args.count)
+
+
+if __name__ == '__main__':
+    main()
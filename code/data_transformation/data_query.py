@@ -2,14 +2,26 @@
 数据查询模块
 
 专注于数据查询、过滤、排序、分页
+
+注册的数据按列组织，可为字段建立哈希索引（等值/IN/LIKE）和有序索引（范围），
+查询时按选择度排列过滤条件，由索引确定候选行后在列上逐个下推剩余条件，
+排序使用top-k部分排序，只物化当前页的记录。
 """
 
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Callable
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from bisect import bisect_left, bisect_right
+import heapq
 import logging
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,6 +45,12 @@ class FilterOperator(Enum):
     BETWEEN = "between"  # 范围
 
 
+class IndexType(Enum):
+    """索引类型"""
+    HASH = "hash"  # 哈希索引：等值、IN、LIKE
+    SORTED = "sorted"  # 有序索引：GT/GTE/LT/LTE/BETWEEN
+
+
 @dataclass
 class QueryFilter:
     """查询过滤"""
@@ -59,70 +77,607 @@ class QueryResult:
     query_time: float
 
 
+# 无索引时各操作符的默认选择度估计
+_DEFAULT_SELECTIVITY = {
+    FilterOperator.EQ: 0.05,
+    FilterOperator.IN: 0.1,
+    FilterOperator.BETWEEN: 0.25,
+    FilterOperator.LIKE: 0.25,
+    FilterOperator.GT: 0.33,
+    FilterOperator.GTE: 0.33,
+    FilterOperator.LT: 0.33,
+    FilterOperator.LTE: 0.33,
+    FilterOperator.NE: 0.9,
+    FilterOperator.NOT_IN: 0.9,
+}
+
+_RANGE_OPERATORS = (FilterOperator.GT, FilterOperator.GTE, FilterOperator.LT,
+                    FilterOperator.LTE, FilterOperator.BETWEEN)
+
+# float64可精确表示的整数范围
+_FLOAT_EXACT_INT = 2 ** 53
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _match_value(field_value: Any, filter_item: QueryFilter) -> bool:
+    """匹配单个字段值，是所有过滤路径的语义基准"""
+    operator = filter_item.operator
+    filter_value = filter_item.value
+
+    if operator == FilterOperator.EQ:
+        return field_value == filter_value
+    elif operator == FilterOperator.NE:
+        return field_value != filter_value
+    elif operator == FilterOperator.GT:
+        return field_value is not None and field_value > filter_value
+    elif operator == FilterOperator.GTE:
+        return field_value is not None and field_value >= filter_value
+    elif operator == FilterOperator.LT:
+        return field_value is not None and field_value < filter_value
+    elif operator == FilterOperator.LTE:
+        return field_value is not None and field_value <= filter_value
+    elif operator == FilterOperator.IN:
+        return field_value in filter_value if isinstance(filter_value, list) else False
+    elif operator == FilterOperator.NOT_IN:
+        return field_value not in filter_value if isinstance(filter_value, list) else True
+    elif operator == FilterOperator.LIKE:
+        if isinstance(field_value, str) and isinstance(filter_value, str):
+            return filter_value.lower() in field_value.lower()
+        return False
+    elif operator == FilterOperator.BETWEEN:
+        if isinstance(filter_value, (list, tuple)) and len(filter_value) == 2:
+            return field_value is not None and filter_value[0] <= field_value <= filter_value[1]
+        return False
+    else:
+        return True
+
+
+def _row_ids(rows: Iterable[int]):
+    """行号集合的内部表示：NumPy可用时为int64数组，否则为列表"""
+    if NUMPY_AVAILABLE:
+        return np.fromiter(rows, dtype=np.int64)
+    return list(rows)
+
+
+class _Column:
+    """
+    单个字段的列数据
+
+    values保存原始值（缺失字段为None）；当所有非None值都是数值时，另存为
+    NumPy数组array，并用valid标记非None的行，数值条件在数组上向量化计算。
+    """
+
+    def __init__(self, values: List[Any]):
+        self.values = values
+        self.array = None
+        self.valid = None
+        self.hash_index: Optional[Dict[Any, Any]] = None
+        self.sorted_index: Optional[Tuple[Any, Any]] = None  # (按值排序的行号, 有序值)
+        self._sorted_kind: Tuple[type, ...] = ()
+        self._ranks: Optional[Tuple[Any, int]] = None
+        if NUMPY_AVAILABLE:
+            self._build_array()
+
+    def _build_array(self):
+        present = [value for value in self.values if value is not None]
+        if not present or not all(type(value) in (int, float, bool) for value in present):
+            return
+        if any(type(value) is float for value in present):
+            if any(type(value) is not float and abs(value) > _FLOAT_EXACT_INT for value in present):
+                return
+            dtype = np.float64
+        else:
+            dtype = np.int64
+        try:
+            self.array = np.array([0 if value is None else value for value in self.values], dtype=dtype)
+        except OverflowError:
+            return
+        self.valid = np.fromiter((value is not None for value in self.values), dtype=bool,
+                                 count=len(self.values))
+
+    def comparable(self, value: Any) -> bool:
+        """value能否与数值列精确地向量化比较"""
+        if self.array is None or type(value) not in (int, float, bool):
+            return False
+        if type(value) is int:
+            if self.array.dtype == np.float64:
+                return abs(value) <= _FLOAT_EXACT_INT
+            return _INT64_MIN <= value <= _INT64_MAX
+        return True
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+
+    def build_hash_index(self) -> bool:
+        index: Dict[Any, List[int]] = {}
+        try:
+            for row, value in enumerate(self.values):
+                index.setdefault(value, []).append(row)
+        except TypeError:
+            return False
+        self.hash_index = {value: _row_ids(rows) for value, rows in index.items()}
+        return True
+
+    def build_sorted_index(self) -> bool:
+        if self.array is not None:
+            rows = np.flatnonzero(self.valid)
+            keys = self.array[rows]
+            keep = ~np.isnan(keys) if keys.dtype == np.float64 else slice(None)
+            rows, keys = rows[keep], keys[keep]
+            order = np.argsort(keys, kind='stable')
+            self.sorted_index = (rows[order], keys[order])
+            return True
+        rows = [row for row, value in enumerate(self.values) if value is not None]
+        if all(isinstance(self.values[row], str) for row in rows):
+            self._sorted_kind = (str,)
+        elif all(type(self.values[row]) in (int, float, bool) and self.values[row] == self.values[row]
+                 for row in rows):
+            self._sorted_kind = (int, float, bool)
+        else:
+            return False
+        rows.sort(key=self.values.__getitem__)
+        self.sorted_index = (_row_ids(rows), [self.values[row] for row in rows])
+        return True
+
+    def index_plan(self, filter_item: QueryFilter) -> Optional[Tuple[int, Any]]:
+        """
+        用索引解析过滤条件
+
+        Returns:
+            (匹配行数, 按需生成有序行号的函数)，无法用索引解析时返回None
+        """
+        operator, value = filter_item.operator, filter_item.value
+        if self.hash_index is not None and operator in (FilterOperator.EQ, FilterOperator.IN,
+                                                        FilterOperator.LIKE):
+            postings = self._hash_postings(operator, value)
+            if postings is not None:
+                if len(postings) == 1:
+                    return len(postings[0]), lambda: postings[0]
+                return sum(len(rows) for rows in postings), lambda: self._union(postings)
+        if self.sorted_index is not None and operator in _RANGE_OPERATORS:
+            bounds = self._range_bounds(operator, value)
+            if bounds is not None:
+                start, end = bounds
+                return max(end - start, 0), lambda: self._sorted_slice(start, end)
+        return None
+
+    def _hash_postings(self, operator: FilterOperator, value: Any) -> Optional[List[Any]]:
+        index = self.hash_index
+        if operator == FilterOperator.LIKE:
+            if not isinstance(value, str):
+                return []
+            pattern = value.lower()
+            return [rows for key, rows in index.items() if isinstance(key, str) and pattern in key.lower()]
+        members = [value] if operator == FilterOperator.EQ else value
+        if operator == FilterOperator.IN and not isinstance(value, list):
+            return []
+        postings = []
+        for member in members:
+            # NaN不等于自身，哈希查找会按对象身份命中，交给逐行比较
+            if member != member:
+                return None
+            try:
+                rows = index.get(member)
+            except TypeError:
+                return None
+            if rows is not None:
+                postings.append(rows)
+        return postings
+
+    @staticmethod
+    def _union(postings: List[Any]):
+        # 不同键的行号互不相交，重复的只可能是同一个键（如IN [1, True]）
+        postings = list({id(rows): rows for rows in postings}.values())
+        if NUMPY_AVAILABLE:
+            return np.sort(np.concatenate(postings)) if postings else np.empty(0, dtype=np.int64)
+        return sorted(row for rows in postings for row in rows)
+
+    def _range_bounds(self, operator: FilterOperator, value: Any) -> Optional[Tuple[int, int]]:
+        if operator == FilterOperator.BETWEEN:
+            if not (isinstance(value, (list, tuple)) and len(value) == 2):
+                return 0, 0
+            low, high = value
+        else:
+            low = high = value
+        for bound in (low, high):
+            if self.array is not None and not self.comparable(bound):
+                return None
+            if self.array is None and (type(bound) not in self._sorted_kind or bound != bound):
+                return None
+        keys = self.sorted_index[1]
+        if self.array is not None:
+            def left(bound): return int(np.searchsorted(keys, bound, side='left'))
+            def right(bound): return int(np.searchsorted(keys, bound, side='right'))
+        else:
+            def left(bound): return bisect_left(keys, bound)
+            def right(bound): return bisect_right(keys, bound)
+        if operator == FilterOperator.GT:
+            return right(low), len(keys)
+        if operator == FilterOperator.GTE:
+            return left(low), len(keys)
+        if operator == FilterOperator.LT:
+            return 0, left(high)
+        if operator == FilterOperator.LTE:
+            return 0, right(high)
+        return left(low), right(high)
+
+    def _sorted_slice(self, start: int, end: int):
+        rows = self.sorted_index[0][start:end]
+        return np.sort(rows) if NUMPY_AVAILABLE else sorted(rows)
+
+    # ------------------------------------------------------------------
+    # 过滤与排序
+    # ------------------------------------------------------------------
+
+    def filter(self, filter_item: QueryFilter, rows):
+        """
+        在候选行上应用过滤条件
+
+        Args:
+            filter_item: 过滤条件
+            rows: 候选行号（None表示全部行）
+
+        Returns:
+            匹配的行号（保持原顺序）
+        """
+        if NUMPY_AVAILABLE:
+            if self.array is not None:
+                mask = self._mask(filter_item, rows)
+            else:
+                mask = self._hash_mask(filter_item, rows)
+            if mask is not None:
+                return np.flatnonzero(mask) if rows is None else rows[mask]
+        values = self.values
+        if rows is None:
+            rows = range(len(values))
+        elif NUMPY_AVAILABLE:
+            rows = rows.tolist()
+        return _row_ids(row for row in rows if _match_value(values[row], filter_item))
+
+    def _hash_mask(self, filter_item: QueryFilter, rows):
+        """用哈希索引生成匹配掩码（含NE/NOT_IN的补集）；无法使用索引时返回None"""
+        operator = filter_item.operator
+        negated = {FilterOperator.NE: FilterOperator.EQ, FilterOperator.NOT_IN: FilterOperator.IN}
+        if self.hash_index is None or operator not in (FilterOperator.EQ, FilterOperator.IN,
+                                                       FilterOperator.LIKE, *negated):
+            return None
+        # 候选行很少时逐行比较比构建整列掩码更快
+        if rows is not None and len(rows) * 32 < len(self.values):
+            return None
+        postings = self._hash_postings(negated.get(operator, operator), filter_item.value)
+        if postings is None:
+            return None
+        mask = np.zeros(len(self.values), dtype=bool)
+        for posting in postings:
+            mask[posting] = True
+        if operator in negated:
+            mask = ~mask
+        return mask if rows is None else mask[rows]
+
+    def _mask(self, filter_item: QueryFilter, rows):
+        """数值列上的向量化匹配，语义与_match_value一致；无法向量化时返回None"""
+        operator, value = filter_item.operator, filter_item.value
+        array = self.array if rows is None else self.array[rows]
+        valid = self.valid if rows is None else self.valid[rows]
+        if operator in (FilterOperator.EQ, FilterOperator.NE):
+            if value is None:
+                mask = ~valid
+            elif self.comparable(value):
+                mask = valid & (array == value)
+            elif isinstance(value, str):
+                mask = np.zeros(len(array), dtype=bool)
+            else:
+                return None
+            return ~mask if operator == FilterOperator.NE else mask
+        if operator in (FilterOperator.IN, FilterOperator.NOT_IN):
+            if not isinstance(value, list):
+                mask = np.zeros(len(array), dtype=bool)
+            else:
+                members = [member for member in value if member is not None and not isinstance(member, str)]
+                if not all(self.comparable(member) for member in members):
+                    return None
+                mask = valid & np.isin(array, members) if members else np.zeros(len(array), dtype=bool)
+                if any(member is None for member in value):
+                    mask |= ~valid
+            return ~mask if operator == FilterOperator.NOT_IN else mask
+        if operator == FilterOperator.BETWEEN:
+            if not (isinstance(value, (list, tuple)) and len(value) == 2):
+                return np.zeros(len(array), dtype=bool)
+            if not (self.comparable(value[0]) and self.comparable(value[1])):
+                return None
+            return valid & (array >= value[0]) & (array <= value[1])
+        if operator in _RANGE_OPERATORS:
+            if not self.comparable(value):
+                return None
+            if operator == FilterOperator.GT:
+                return valid & (array > value)
+            if operator == FilterOperator.GTE:
+                return valid & (array >= value)
+            if operator == FilterOperator.LT:
+                return valid & (array < value)
+            return valid & (array <= value)
+        if operator == FilterOperator.LIKE:
+            return np.zeros(len(array), dtype=bool)
+        return None
+
+    def ranks(self) -> Tuple[Any, int]:
+        """
+        每行的稠密排名（None为-1，排在最前）
+
+        Returns:
+            (排名数组, 不同值的个数)
+        """
+        if self._ranks is None:
+            if self.array is not None:
+                distinct, inverse = np.unique(self.array[self.valid], return_inverse=True)
+                ranks = np.full(len(self.array), -1, dtype=np.int64)
+                ranks[self.valid] = inverse
+                self._ranks = (ranks, len(distinct))
+            else:
+                values = self.values
+                rows = sorted((row for row, value in enumerate(values) if value is not None),
+                              key=values.__getitem__)
+                ranks = [-1] * len(values)
+                rank, previous = -1, None
+                for position, row in enumerate(rows):
+                    if position == 0 or values[row] != previous:
+                        rank += 1
+                        previous = values[row]
+                    ranks[row] = rank
+                self._ranks = (np.array(ranks, dtype=np.int64) if NUMPY_AVAILABLE else ranks, rank + 1)
+        return self._ranks
+
+
+class _ColumnStore:
+    """按列组织的数据存储，列在首次使用时构建，重建的列按登记的索引类型重新建索引"""
+
+    def __init__(self, records: List[Dict[str, Any]], index_types: Optional[Dict[str, List[IndexType]]] = None,
+                 version: Any = None):
+        self.records = records
+        self.size = len(records)
+        self.version = version
+        self.columns: Dict[str, _Column] = {}
+        self.index_types: Dict[str, List[IndexType]] = {
+            field: list(types) for field, types in (index_types or {}).items()}
+
+    def column(self, field: str) -> _Column:
+        column = self.columns.get(field)
+        if column is None:
+            column = _Column([record.get(field) for record in self.records])
+            self.columns[field] = column
+            for index_type in self.index_types.get(field, []):
+                self._build_index(field, column, index_type)
+        return column
+
+    def _build_index(self, field: str, column: _Column, index_type: IndexType) -> bool:
+        if index_type == IndexType.HASH:
+            built = column.build_hash_index()
+        else:
+            built = column.build_sorted_index()
+        if not built:
+            logger.warning(f"字段 {field} 的值不支持{index_type.value}索引，查询将逐行比较")
+        return built
+
+    def create_index(self, field: str, index_type: IndexType) -> bool:
+        types = self.index_types.setdefault(field, [])
+        if index_type not in types:
+            types.append(index_type)
+        return self._build_index(field, self.column(field), index_type)
+
+    def invalidate(self, fields: Optional[Iterable[str]] = None):
+        """丢弃列（及其索引），下次使用时按当前记录重建"""
+        if fields is None:
+            self.columns.clear()
+        else:
+            for field in fields:
+                self.columns.pop(field, None)
+
+    def filter(self, filters: List[QueryFilter]):
+        """
+        按选择度执行过滤条件
+
+        选择度最高的可索引条件确定候选行，其余条件按估计选择度依次在候选行上
+        计算，候选为空时提前结束。
+
+        Returns:
+            匹配的行号（升序），None表示全部行
+        """
+        planned = []
+        for filter_item in filters:
+            plan = self.column(filter_item.field).index_plan(filter_item)
+            if plan is not None:
+                selectivity = plan[0] / self.size if self.size else 0.0
+            else:
+                selectivity = _DEFAULT_SELECTIVITY.get(filter_item.operator, 1.0)
+            planned.append((selectivity, plan is None, filter_item, plan))
+        planned.sort(key=lambda item: (item[0], item[1]))
+
+        rows = None
+        for position, (_, _, filter_item, plan) in enumerate(planned):
+            if position == 0 and plan is not None:
+                rows = plan[1]()
+            else:
+                rows = self.column(filter_item.field).filter(filter_item, rows)
+            if len(rows) == 0:
+                break
+        return rows
+
+    def order(self, rows, sort_fields: List[SortField], limit: Optional[int]):
+        """
+        按排序字段排列行号，limit不为None时只保证前limit行有序（top-k）
+
+        相同排序键的行保持原顺序。
+
+        Args:
+            rows: 行号（None表示全部行）
+            sort_fields: 排序字段
+            limit: 需要的前缀长度
+
+        Returns:
+            排序后的行号
+        """
+        ranked = [(self.column(sort_field.field).ranks(), sort_field.order == SortOrder.DESC)
+                  for sort_field in sort_fields]
+        if rows is None:
+            rows = _row_ids(range(self.size))
+        if limit is not None and limit >= len(rows):
+            limit = None
+
+        if not NUMPY_AVAILABLE:
+            def sort_key(row):
+                return tuple(-ranks[row] if descending else ranks[row] for (ranks, _), descending in ranked)
+            if limit is None:
+                return sorted(rows, key=sort_key)
+            return heapq.nsmallest(limit, rows, key=sort_key)
+
+        # 把各字段排名与行号合成一个整数键（混合进制），可以直接做部分排序
+        radix_product = 1
+        for (_, distinct), _ in ranked:
+            radix_product *= distinct + 1
+        if radix_product * max(self.size, 1) <= _INT64_MAX:
+            composite = np.zeros(len(rows), dtype=np.int64)
+            for (ranks, distinct), descending in ranked:
+                shifted = ranks[rows] + 1
+                composite = composite * (distinct + 1) + (distinct - shifted if descending else shifted)
+            composite = composite * self.size + rows
+            if limit is None:
+                return rows[np.argsort(composite)]
+            top = np.argpartition(composite, limit - 1)[:limit]
+            return rows[top[np.argsort(composite[top])]]
+
+        keys = [-ranks[rows] if descending else ranks[rows] for (ranks, _), descending in reversed(ranked)]
+        ordered = rows[np.lexsort(keys)]
+        return ordered if limit is None else ordered[:limit]
+
+
 class DataQuery:
     """
     数据查询器
-    
+
     专注于数据查询、过滤、排序、分页
     """
-    
+
     def __init__(self):
         self.query_history: List[QueryResult] = []
         self.data_stores: Dict[str, List[Dict[str, Any]]] = {}
-    
-    def register_data_store(self, store_id: str, data: List[Dict[str, Any]]):
+        self._column_stores: Dict[str, _ColumnStore] = {}
+        self._versions: Dict[str, Callable[[], Any]] = {}
+
+    def register_data_store(self, store_id: str, data: List[Dict[str, Any]],
+                            hash_indexes: Optional[List[str]] = None,
+                            sorted_indexes: Optional[List[str]] = None,
+                            version: Optional[Callable[[], Any]] = None):
         """
         注册数据存储
-        
+
+        数据按列组织，字段列在首次查询时构建；数值列使用NumPy数组。数据列表
+        被替换或长度变化时自动重建。原地修改记录不会被察觉：修改后调用
+        invalidate，或提供version回调（返回值变化时重建）。
+
         Args:
             store_id: 存储ID
             data: 数据列表
+            hash_indexes: 建立哈希索引的字段（加速EQ/IN/LIKE）
+            sorted_indexes: 建立有序索引的字段（加速范围条件）
+            version: 返回数据版本的回调（如修改计数），每次查询前比较
         """
         self.data_stores[store_id] = data
-    
+        if version is None:
+            self._versions.pop(store_id, None)
+        else:
+            self._versions[store_id] = version
+        store = _ColumnStore(data, version=version() if version else None)
+        self._column_stores[store_id] = store
+        for field in hash_indexes or []:
+            store.create_index(field, IndexType.HASH)
+        for field in sorted_indexes or []:
+            store.create_index(field, IndexType.SORTED)
+
+    def invalidate(self, store_id: str, fields: Optional[List[str]] = None):
+        """
+        原地修改记录后使列与索引失效，下次查询时按当前数据重建（保留索引定义）
+
+        Args:
+            store_id: 存储ID
+            fields: 修改过的字段，None表示全部字段
+        """
+        if store_id not in self.data_stores:
+            raise ValueError(f"数据存储不存在: {store_id}")
+        store = self._column_stores.get(store_id)
+        if store is not None:
+            store.invalidate(fields)
+
+    def create_index(self, store_id: str, field: str, index_type: IndexType = IndexType.HASH) -> bool:
+        """
+        为已注册存储的字段建立索引
+
+        Args:
+            store_id: 存储ID
+            field: 字段名
+            index_type: 索引类型
+
+        Returns:
+            是否建立成功（值类型不支持时返回False）
+        """
+        return self._column_store(store_id).create_index(field, index_type)
+
+    def _column_store(self, store_id: str) -> _ColumnStore:
+        if store_id not in self.data_stores:
+            raise ValueError(f"数据存储不存在: {store_id}")
+        store = self._column_stores.get(store_id)
+        data = self.data_stores[store_id]
+        version_func = self._versions.get(store_id)
+        version = version_func() if version_func else None
+        if store is None or store.records is not data or store.size != len(data) or store.version != version:
+            # 索引定义保留，列在下次使用时按当前数据重建
+            store = _ColumnStore(data, None if store is None else store.index_types, version)
+            self._column_stores[store_id] = store
+        return store
+
     def query(self, store_id: str, filters: Optional[List[QueryFilter]] = None,
              sort_fields: Optional[List[SortField]] = None,
              page: int = 1, page_size: int = 100) -> QueryResult:
         """
         查询数据
-        
+
         Args:
             store_id: 存储ID
             filters: 过滤条件列表
-            sort_fields: 排序字段列表
+            sort_fields: 排序字段列表（各字段独立指定升降序，None排在升序最前）
             page: 页码
             page_size: 每页大小
-            
+
         Returns:
             查询结果
         """
-        if store_id not in self.data_stores:
-            raise ValueError(f"数据存储不存在: {store_id}")
-        
+        store = self._column_store(store_id)
+
         query_id = f"query_{datetime.utcnow().timestamp()}"
         start_time = datetime.utcnow()
-        
-        data = self.data_stores[store_id].copy()
-        
+
         # 应用过滤
-        if filters:
-            data = self._apply_filters(data, filters)
-        
+        rows = store.filter(filters) if filters else None
+
         # 获取总数
-        total_count = len(data)
-        
-        # 应用排序
-        if sort_fields:
-            data = self._apply_sort(data, sort_fields)
-        
-        # 应用分页
+        total_count = store.size if rows is None else len(rows)
+
+        # 应用分页（有排序时只对前end行做部分排序）
         start_index = (page - 1) * page_size
         end_index = start_index + page_size
-        paginated_data = data[start_index:end_index]
-        
+        if sort_fields and total_count:
+            limit = end_index if start_index >= 0 and end_index > 0 else None
+            rows = store.order(rows, sort_fields, limit)
+        elif rows is None:
+            rows = range(store.size)
+        page_rows = rows[start_index:end_index]
+        if NUMPY_AVAILABLE and not isinstance(page_rows, range):
+            page_rows = np.asarray(page_rows).tolist()
+        paginated_data = [store.records[row] for row in page_rows]
+
         end_time = datetime.utcnow()
         query_time = (end_time - start_time).total_seconds()
-        
+
         result = QueryResult(
             query_id=query_id,
             records=paginated_data,
@@ -131,115 +686,62 @@ class DataQuery:
             page_size=page_size,
             query_time=query_time
         )
-        
+
         self.query_history.append(result)
         return result
-    
+
     def _apply_filters(self, data: List[Dict[str, Any]],
                       filters: List[QueryFilter]) -> List[Dict[str, Any]]:
-        """应用过滤条件"""
+        """在记录列表上逐行应用过滤条件"""
         filtered_data = data
-        
+
         for filter_item in filters:
             filtered_data = [
                 record for record in filtered_data
                 if self._match_filter(record, filter_item)
             ]
-        
+
         return filtered_data
-    
+
     def _match_filter(self, record: Dict[str, Any], filter_item: QueryFilter) -> bool:
         """匹配过滤条件"""
-        field_value = record.get(filter_item.field)
-        operator = filter_item.operator
-        filter_value = filter_item.value
-        
-        if operator == FilterOperator.EQ:
-            return field_value == filter_value
-        elif operator == FilterOperator.NE:
-            return field_value != filter_value
-        elif operator == FilterOperator.GT:
-            return field_value is not None and field_value > filter_value
-        elif operator == FilterOperator.GTE:
-            return field_value is not None and field_value >= filter_value
-        elif operator == FilterOperator.LT:
-            return field_value is not None and field_value < filter_value
-        elif operator == FilterOperator.LTE:
-            return field_value is not None and field_value <= filter_value
-        elif operator == FilterOperator.IN:
-            return field_value in filter_value if isinstance(filter_value, list) else False
-        elif operator == FilterOperator.NOT_IN:
-            return field_value not in filter_value if isinstance(filter_value, list) else True
-        elif operator == FilterOperator.LIKE:
-            if isinstance(field_value, str) and isinstance(filter_value, str):
-                return filter_value.lower() in field_value.lower()
-            return False
-        elif operator == FilterOperator.BETWEEN:
-            if isinstance(filter_value, (list, tuple)) and len(filter_value) == 2:
-                return filter_value[0] <= field_value <= filter_value[1]
-            return False
-        else:
-            return True
-    
-    def _apply_sort(self, data: List[Dict[str, Any]],
-                   sort_fields: List[SortField]) -> List[Dict[str, Any]]:
-        """应用排序"""
-        def sort_key(record):
-            key_values = []
-            for sort_field in sort_fields:
-                value = record.get(sort_field.field)
-                # 处理None值
-                if value is None:
-                    value = '' if sort_field.order == SortOrder.ASC else 'zzz'
-                key_values.append((value, sort_field.order))
-            return key_values
-        
-        sorted_data = sorted(data, key=sort_key)
-        
-        # 处理降序
-        for i, sort_field in enumerate(sort_fields):
-            if sort_field.order == SortOrder.DESC:
-                sorted_data = sorted(sorted_data, key=lambda r: r.get(sort_field.field) or '', reverse=True)
-                break
-        
-        return sorted_data
-    
+        return _match_value(record.get(filter_item.field), filter_item)
+
     def count(self, store_id: str, filters: Optional[List[QueryFilter]] = None) -> int:
         """
         统计记录数
-        
+
         Args:
             store_id: 存储ID
             filters: 过滤条件列表
-            
+
         Returns:
             记录数
         """
         if store_id not in self.data_stores:
             return 0
-        
-        data = self.data_stores[store_id].copy()
-        
-        if filters:
-            data = self._apply_filters(data, filters)
-        
-        return len(data)
-    
+
+        store = self._column_store(store_id)
+        if not filters:
+            return store.size
+
+        return len(store.filter(filters))
+
     def get_query_stats(self) -> Dict[str, Any]:
         """
         获取查询统计
-        
+
         Returns:
             查询统计
         """
         total_queries = len(self.query_history)
         total_records_queried = sum(q.total_count for q in self.query_history)
-        
+
         if total_queries > 0:
             avg_time = sum(q.query_time for q in self.query_history) / total_queries
         else:
             avg_time = 0.0
-        
+
         return {
             'total_queries': total_queries,
             'total_records_queried': total_records_queried,
@@ -250,21 +752,21 @@ class DataQuery:
 def main():
     """主函数 - 示例用法"""
     query = DataQuery()
-    
+
     # 注册数据存储
     query.register_data_store('users', [
         {'id': 1, 'name': 'Alice', 'age': 25, 'city': 'Beijing'},
         {'id': 2, 'name': 'Bob', 'age': 30, 'city': 'Shanghai'},
         {'id': 3, 'name': 'Charlie', 'age': 25, 'city': 'Beijing'}
-    ])
-    
+    ], hash_indexes=['city'], sorted_indexes=['age'])
+
     # 查询数据
     filters = [
         QueryFilter('age', FilterOperator.GTE, 25),
         QueryFilter('city', FilterOperator.EQ, 'Beijing')
     ]
     sort_fields = [SortField('age', SortOrder.ASC)]
-    
+
     result = query.query('users', filters=filters, sort_fields=sort_fields, page=1, page_size=10)
     print(f"查询结果: 总数={result.total_count}, 返回记录数={len(result.records)}")
 
@@ -2,18 +2,37 @@
 数据流处理模块
 
 专注于数据流处理、实时数据处理、流式转换
+
+流按记录字段分区，每个消费组为每个分区维护独立的有界缓冲区，并为每个分区
+启动若干工作线程（可选进程池执行处理函数）。工作线程按数量或时间批量取出记录，
+窗口聚合按事件时间和水位线关闭窗口。
 """
 
-from typing import Dict, List, Any, Optional, Callable, Iterator
-from dataclasses import dataclass
-from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from enum import Enum
+import heapq
+import itertools
 import logging
+import math
 import queue
 import threading
+import time
+import zlib
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_GROUP = "default"
+
+# 工作线程等待记录的轮询间隔（秒），用于响应停止和空闲回调
+_POLL_INTERVAL = 0.1
+
+_EPOCH = datetime(1970, 1, 1)
+
 
 class StreamType(Enum):
     """流类型"""
@@ -29,6 +48,356 @@ class StreamRecord:
     data: Dict[str, Any]
     timestamp: datetime
     metadata: Dict[str, Any] = None
+    partition: int = 0
+    offset: int = 0
+
+
+def _run_processor(processor: Callable, records: List[StreamRecord], batched: bool) -> int:
+    """调用处理函数，返回失败的记录数（也在进程池中执行）"""
+    if batched:
+        try:
+            processor(records)
+            return 0
+        except Exception as e:
+            logger.error(f"流处理错误: {e}")
+            return len(records)
+    failed = 0
+    for record in records:
+        try:
+            processor(record)
+        except Exception as e:
+            logger.error(f"流处理错误: {e}")
+            failed += 1
+    return failed
+
+
+class _PartitionBuffer:
+    """有界分区缓冲区，批量取出只获取一次锁"""
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items: deque = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+    
+    def put_many(self, records: List[StreamRecord], timeout: float) -> int:
+        """放入记录，缓冲区满时最多等待timeout秒，返回放入的数量"""
+        deadline = time.monotonic() + timeout
+        put = 0
+        with self.lock:
+            while put < len(records):
+                space = self.capacity - len(self.items)
+                if space <= 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.not_full.wait(remaining):
+                        break
+                    continue
+                self.items.extend(records[put:put + space])
+                put += min(space, len(records) - put)
+                self.not_empty.notify_all()
+        return put
+    
+    def get_batch(self, max_items: int, timeout: float, linger: float) -> List[StreamRecord]:
+        """
+        取出一批记录
+        
+        Args:
+            max_items: 批次上限
+            timeout: 等待第一条记录的时间
+            linger: 取到第一条记录后，为凑满批次继续等待的时间
+        
+        Returns:
+            记录列表（超时为空）
+        """
+        with self.lock:
+            if not self.items and not self.not_empty.wait(timeout):
+                return []
+            if linger > 0 and len(self.items) < max_items:
+                deadline = time.monotonic() + linger
+                while self.items and len(self.items) < max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.not_empty.wait(remaining):
+                        break
+            count = min(max_items, len(self.items))
+            batch = [self.items.popleft() for _ in range(count)]
+            if batch:
+                self.not_full.notify_all()
+            return batch
+    
+    def wake_all(self):
+        with self.lock:
+            self.not_empty.notify_all()
+    
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class _PartitionMetrics:
+    """分区消费指标：已处理、失败、处理中及最近窗口内的吞吐量"""
+    
+    def __init__(self, rate_window: float = 5.0):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.rate_window = rate_window
+        self._buckets: deque = deque()  # (秒, 处理数)
+    
+    def begin(self, count: int):
+        with self.lock:
+            self.in_flight += count
+    
+    def end(self, count: int, failed: int):
+        second = int(time.monotonic())
+        with self.lock:
+            self.in_flight -= count
+            self.processed += count
+            self.failed += failed
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += count
+            else:
+                self._buckets.append([second, count])
+            while self._buckets and self._buckets[0][0] <= second - self.rate_window:
+                self._buckets.popleft()
+    
+    def throughput(self) -> float:
+        """最近rate_window秒内每秒处理的记录数"""
+        horizon = time.monotonic() - self.rate_window
+        with self.lock:
+            return sum(count for second, count in self._buckets if second > horizon) / self.rate_window
+
+
+@dataclass
+class _ConsumerGroup:
+    """消费组：每个分区一个缓冲区与workers_per_partition个工作线程"""
+    name: str
+    buffers: List[_PartitionBuffer]
+    metrics: List[_PartitionMetrics]
+    processor: Optional[Callable] = None
+    batched: bool = False
+    workers_per_partition: int = 1
+    batch_size: int = 1
+    batch_timeout: float = 0.0
+    use_processes: bool = False
+    on_idle: Optional[Callable[[], None]] = None
+    aggregator: Any = None
+    stop_event: threading.Event = field(default_factory=threading.Event)
+    threads: List[threading.Thread] = field(default_factory=list)
+    pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class _Stream:
+    """分区流"""
+    stream_id: str
+    stream_type: StreamType
+    partitions: int
+    partition_key: Optional[str]
+    buffer_size: int
+    groups: Dict[str, _ConsumerGroup] = field(default_factory=dict)
+    offsets: List[int] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    round_robin: Iterator[int] = None
+
+
+class _WindowAggregator:
+    """
+    基于水位线的窗口聚合
+    
+    事件时间取自timestamp_field（datetime或epoch秒）或记录的发布时间。各分区由
+    独立的工作线程消费、进度不一，因此分别记录每个分区已见的最大事件时间，水位线
+    为其中最小值减去allowed_lateness；超过idle_timeout没有新记录的分区不参与取最小值，
+    避免空闲分区阻塞窗口输出。窗口结束时间不晚于水位线时输出；落入已关闭窗口的记录
+    计为迟到并丢弃。slide大于window_size时落在窗口间隙中的记录不属于任何窗口，
+    单独计数后丢弃。超过idle_timeout没有新记录时输出所有窗口。
+    """
+    
+    def __init__(self, streaming: 'DataStreaming', target_stream_id: str, window_size: float,
+                 slide: float, allowed_lateness: float,
+                 aggregate_func: Callable[[List[StreamRecord]], Dict[str, Any]],
+                 timestamp_field: Optional[str], key_field: Optional[str], idle_timeout: float,
+                 partitions: int = 1):
+        self.streaming = streaming
+        self.target_stream_id = target_stream_id
+        self.window_size = window_size
+        self.slide = slide
+        self.allowed_lateness = allowed_lateness
+        self.aggregate_func = aggregate_func
+        self.timestamp_field = timestamp_field
+        self.key_field = key_field
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.windows: Dict[Tuple[Any, float], List[StreamRecord]] = {}
+        self._closing: List[Tuple[float, int, Any, float]] = []  # (结束时间, 序号, 键, 开始时间)
+        self._sequence = itertools.count()
+        self.max_event_time = -math.inf
+        self.partition_event_times = [-math.inf] * partitions
+        self.partition_seen_at = [time.monotonic()] * partitions
+        self.watermark = -math.inf
+        self.late_records = 0
+        self.gap_records = 0
+        self.emitted_windows = 0
+        self.last_record_at = time.monotonic()
+    
+    def _event_time(self, record: StreamRecord) -> float:
+        value = record.data.get(self.timestamp_field) if self.timestamp_field else record.timestamp
+        if isinstance(value, datetime):
+            return value.timestamp() if value.tzinfo else (value - _EPOCH).total_seconds()
+        return float(value)
+    
+    def process(self, records: List[StreamRecord]):
+        with self.lock:
+            for record in records:
+                event_time = self._event_time(record)
+                key = record.data.get(self.key_field) if self.key_field else None
+                start = math.floor(event_time / self.slide) * self.slide
+                if start + self.window_size <= event_time:
+                    self.gap_records += 1
+                    self._observe(record.partition, event_time)
+                    continue
+                accepted = False
+                while start + self.window_size > event_time:
+                    if start + self.window_size > self.watermark:
+                        window = self.windows.get((key, start))
+                        if window is None:
+                            window = self.windows[(key, start)] = []
+                            heapq.heappush(self._closing, (start + self.window_size, next(self._sequence), key, start))
+                        window.append(record)
+                        accepted = True
+                    start -= self.slide
+                if not accepted:
+                    self.late_records += 1
+                self._observe(record.partition, event_time)
+            now = time.monotonic()
+            for partition in {record.partition for record in records}:
+                self.partition_seen_at[partition] = now
+            self.last_record_at = now
+            active = [event_time for event_time, seen_at in zip(self.partition_event_times, self.partition_seen_at)
+                      if now - seen_at < self.idle_timeout]
+            if active:
+                self.watermark = max(self.watermark, min(active) - self.allowed_lateness)
+            ready = self._pop_closed(self.watermark)
+        self._emit(ready)
+    
+    def _observe(self, partition: int, event_time: float):
+        self.max_event_time = max(self.max_event_time, event_time)
+        self.partition_event_times[partition] = max(self.partition_event_times[partition], event_time)
+    
+    def on_idle(self):
+        """长时间没有新记录时输出所有未关闭的窗口"""
+        with self.lock:
+            if not self.windows or time.monotonic() - self.last_record_at < self.idle_timeout:
+                return
+            ready = self._pop_closed(math.inf)
+            self.watermark = max(self.watermark, self.max_event_time)
+        self._emit(ready)
+    
+    def _pop_closed(self, watermark: float) -> List[Tuple[Any, float, List[StreamRecord]]]:
+        ready = []
+        while self._closing and self._closing[0][0] <= watermark:
+            _, _, key, start = heapq.heappop(self._closing)
+            ready.append((key, start, self.windows.pop((key, start))))
+        return ready
+    
+    def _emit(self, ready: List[Tuple[Any, float, List[StreamRecord]]]):
+        for key, start, records in ready:
+            try:
+                aggregated_data = self.aggregate_func(records)
+            except Exception as e:
+                logger.error(f"窗口聚合错误: {e}")
+                continue
+            self.emitted_windows += 1
+            self.streaming.publish(self.target_stream_id, aggregated_data, {
+                'window_start': _EPOCH + timedelta(seconds=start),
+                'window_end': _EPOCH + timedelta(seconds=start + self.window_size),
+                'key': key,
+                'count': len(records)
+            })
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'open_windows': len(self.windows),
+                'emitted_windows': self.emitted_windows,
+                'late_records': self.late_records,
+                'gap_records': self.gap_records,
+                'watermark': self.watermark
+            }
+
+
+class _StreamQueue:
+    """
+    流的队列视图（兼容此前streams中的queue.Queue）
+    
+    put发布记录的数据与元数据；get与qsize作用于默认消费组（不存在时为第一个
+    消费组）的缓冲区，与正在运行的工作线程竞争记录。
+    """
+    
+    def __init__(self, streaming: 'DataStreaming', stream: _Stream):
+        self._streaming = streaming
+        self._stream = stream
+    
+    @property
+    def maxsize(self) -> int:
+        return self._stream.buffer_size * self._stream.partitions
+    
+    def _group(self) -> Optional[_ConsumerGroup]:
+        with self._stream.lock:
+            groups = self._stream.groups
+            return groups.get(DEFAULT_GROUP) or next(iter(groups.values()), None)
+    
+    def qsize(self) -> int:
+        group = self._group()
+        return sum(len(buffer) for buffer in group.buffers) if group else 0
+    
+    def empty(self) -> bool:
+        return self.qsize() == 0
+    
+    def full(self) -> bool:
+        return self.qsize() >= self.maxsize
+    
+    def put(self, record: Any, block: bool = True, timeout: Optional[float] = None):
+        if isinstance(record, StreamRecord):
+            data, metadata = record.data, record.metadata
+        else:
+            data, metadata = record, None
+        if not self._streaming.publish(self._stream.stream_id, data, metadata):
+            raise queue.Full
+    
+    def put_nowait(self, record: Any):
+        self.put(record, block=False)
+    
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> StreamRecord:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            group = self._group()
+            for buffer in group.buffers if group else ():
+                batch = buffer.get_batch(1, 0, 0)
+                if batch:
+                    return batch[0]
+            if not block or (deadline is not None and time.monotonic() >= deadline):
+                raise queue.Empty
+            time.sleep(0.01)
+    
+    def get_nowait(self) -> StreamRecord:
+        return self.get(block=False)
+
+
+class _StreamQueues(Mapping):
+    """只读映射：流ID -> 队列视图"""
+    
+    def __init__(self, streaming: 'DataStreaming'):
+        self._streaming = streaming
+    
+    def __getitem__(self, stream_id: str) -> _StreamQueue:
+        return _StreamQueue(self._streaming, self._streaming._streams[stream_id])
+    
+    def __iter__(self):
+        return iter(self._streaming._streams)
+    
+    def __len__(self) -> int:
+        return len(self._streaming._streams)
 
 
 class DataStreaming:
@@ -36,33 +405,105 @@ class DataStreaming:
     数据流处理器
     
     专注于数据流处理、实时数据处理、流式转换
+    
+    每个流有独立的启停状态；同一个流可以有多个消费组，每个消费组收到全部记录，
+    组内按分区分配给工作线程。没有任何订阅时发布的记录保存在默认消费组的缓冲区
+    中，由第一个订阅的消费组接管。
     """
     
     def __init__(self, buffer_size: int = 1000):
         self.buffer_size = buffer_size
-        self.streams: Dict[str, queue.Queue] = {}
+        self._streams: Dict[str, _Stream] = {}
         self.processors: Dict[str, Callable] = {}
-        self.streaming_active = False
-        self.streaming_threads: Dict[str, threading.Thread] = {}
+        self.streaming_threads: Dict[str, List[threading.Thread]] = {}
+    
+    @property
+    def streams(self) -> Mapping:
+        """流ID到队列视图的只读映射（兼容此前的Dict[str, queue.Queue]）"""
+        return _StreamQueues(self)
     
-    def create_stream(self, stream_id: str, stream_type: StreamType = StreamType.STREAM) -> bool:
+    @property
+    def streaming_active(self) -> bool:
+        """是否有流正在处理"""
+        return bool(self.streaming_threads)
+    
+    def create_stream(self, stream_id: str, stream_type: StreamType = StreamType.STREAM,
+                      partitions: int = 1, partition_key: Optional[str] = None,
+                      buffer_size: Optional[int] = None) -> bool:
         """
         创建数据流
         
         Args:
             stream_id: 流ID
-            stream_type: 流类型
-            
+            stream_type: 流类型（MICRO_BATCH/BATCH流的处理函数接收记录列表）
+            partitions: 分区数
+            partition_key: 分区字段，相同值的记录进入同一分区（缺省时轮询）
+            buffer_size: 每个分区缓冲区的容量（默认使用处理器的buffer_size）
+        
         Returns:
             是否成功
         """
-        if stream_id in self.streams:
+        if stream_id in self._streams:
             return False
+        if partitions <= 0:
+            raise ValueError("partitions must be positive")
         
-        stream_queue = queue.Queue(maxsize=self.buffer_size)
-        self.streams[stream_id] = stream_queue
+        stream = _Stream(
+            stream_id=stream_id,
+            stream_type=stream_type,
+            partitions=partitions,
+            partition_key=partition_key,
+            buffer_size=buffer_size or self.buffer_size,
+            offsets=[0] * partitions,
+            round_robin=itertools.cycle(range(partitions))
+        )
+        self._streams[stream_id] = stream
         return True
     
+    def _add_group(self, stream: _Stream, name: str) -> _ConsumerGroup:
+        """创建消费组（调用方持有stream.lock）"""
+        group = _ConsumerGroup(
+            name=name,
+            buffers=[_PartitionBuffer(stream.buffer_size) for _ in range(stream.partitions)],
+            metrics=[_PartitionMetrics() for _ in range(stream.partitions)],
+            batched=stream.stream_type != StreamType.STREAM
+        )
+        stream.groups[name] = group
+        return group
+    
+    def _subscribed_group(self, stream: _Stream, name: str) -> _ConsumerGroup:
+        """
+        获取订阅使用的消费组
+        
+        流上还没有订阅时，订阅前发布的记录缓存在无处理函数的默认消费组中，
+        由第一个订阅的消费组接管，之后不再有无人消费的缓冲区。
+        """
+        with stream.lock:
+            group = stream.groups.get(name)
+            if group is not None:
+                return group
+            backlog = stream.groups.get(DEFAULT_GROUP)
+            if backlog is not None and backlog.processor is None:
+                del stream.groups[DEFAULT_GROUP]
+                backlog.name = name
+                stream.groups[name] = backlog
+                return backlog
+            return self._add_group(stream, name)
+    
+    def _partition(self, stream: _Stream, data: Dict[str, Any]) -> int:
+        if stream.partitions == 1:
+            return 0
+        value = data.get(stream.partition_key) if stream.partition_key else None
+        if value is None:
+            return next(stream.round_robin)
+        if isinstance(value, str):
+            value = zlib.crc32(value.encode('utf-8'))
+        elif isinstance(value, bytes):
+            value = zlib.crc32(value)
+        elif not isinstance(value, int):
+            value = hash(value)
+        return value % stream.partitions
+    
     def publish(self, stream_id: str, data: Dict[str, Any],
                metadata: Optional[Dict[str, Any]] = None) -> bool:
         """
@@ -72,107 +513,192 @@ class DataStreaming:
             stream_id: 流ID
             data: 数据
             metadata: 元数据
-            
+        
         Returns:
             是否成功
         """
-        if stream_id not in self.streams:
+        return self.publish_many(stream_id, [data], metadata) == 1
+    
+    def publish_many(self, stream_id: str, data_list: List[Dict[str, Any]],
+                     metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        批量发布数据到流，同一分区的记录一次放入缓冲区
+        
+        Args:
+            stream_id: 流ID
+            data_list: 数据列表
+            metadata: 元数据（所有记录共用）
+        
+        Returns:
+            所有消费组都接收的记录数
+        """
+        stream = self._streams.get(stream_id)
+        if stream is None:
             logger.error(f"流不存在: {stream_id}")
-            return False
+            return 0
         
-        record = StreamRecord(
-            record_id=f"record_{datetime.utcnow().timestamp()}",
-            data=data,
-            timestamp=datetime.utcnow(),
-            metadata=metadata or {}
-        )
+        now = datetime.utcnow()
+        by_partition: Dict[int, List[StreamRecord]] = {}
+        with stream.lock:
+            groups = list(stream.groups.values()) or [self._add_group(stream, DEFAULT_GROUP)]
+            for data in data_list:
+                partition = self._partition(stream, data)
+                offset = stream.offsets[partition]
+                stream.offsets[partition] += 1
+                by_partition.setdefault(partition, []).append(StreamRecord(
+                    record_id=f"{stream_id}-{partition}-{offset}",
+                    data=data,
+                    timestamp=now,
+                    metadata=metadata or {},
+                    partition=partition,
+                    offset=offset
+                ))
         
-        try:
-            self.streams[stream_id].put(record, timeout=1.0)
-            return True
-        except queue.Full:
-            logger.warning(f"流缓冲区已满: {stream_id}")
-            return False
+        accepted = len(data_list)
+        for partition, records in by_partition.items():
+            for group in groups:
+                put = group.buffers[partition].put_many(records, timeout=1.0)
+                if put < len(records):
+                    logger.warning(f"流缓冲区已满: {stream_id}[{partition}] ({group.name})")
+                    accepted -= len(records) - put
+        return max(accepted, 0)
     
-    def subscribe(self, stream_id: str, processor: Callable[[StreamRecord], None]) -> bool:
+    def subscribe(self, stream_id: str, processor: Callable[[StreamRecord], None],
+                  group: str = DEFAULT_GROUP, workers_per_partition: int = 1,
+                  batch_size: int = 1, batch_timeout: float = 0.0,
+                  use_processes: bool = False, batched: Optional[bool] = None) -> bool:
         """
         订阅数据流
         
+        同一消费组重复订阅会替换处理函数。流上第一个订阅的消费组接管订阅前发布的
+        记录，之后新的消费组只接收订阅之后发布的记录；流已启动时新的消费组立即开始
+        消费。
+        
         Args:
             stream_id: 流ID
-            processor: 处理函数
-            
+            processor: 处理函数（批处理模式下接收记录列表）
+            group: 消费组名称
+            workers_per_partition: 每个分区的工作线程数（大于1时分区内不保证顺序）
+            batch_size: 每批最多取出的记录数
+            batch_timeout: 取到第一条记录后为凑满批次最多等待的时间（秒）
+            use_processes: 在进程池中执行处理函数（处理函数与记录必须可pickle）
+            batched: 处理函数是否接收记录列表（默认由流类型决定）
+        
         Returns:
             是否成功
         """
-        if stream_id not in self.streams:
+        stream = self._streams.get(stream_id)
+        if stream is None:
             logger.error(f"流不存在: {stream_id}")
             return False
         
-        self.processors[stream_id] = processor
+        consumer_group = self._subscribed_group(stream, group)
+        consumer_group.processor = processor
+        consumer_group.workers_per_partition = max(1, workers_per_partition)
+        consumer_group.batch_size = max(1, batch_size)
+        consumer_group.batch_timeout = batch_timeout
+        consumer_group.use_processes = use_processes
+        if batched is not None:
+            consumer_group.batched = batched
+        if group == DEFAULT_GROUP:
+            self.processors[stream_id] = processor
+        if stream_id in self.streaming_threads and not consumer_group.threads:
+            self.streaming_threads[stream_id].extend(self._start_group(stream, consumer_group))
         return True
     
     def start_streaming(self, stream_id: str) -> bool:
         """
-        启动流处理
+        启动流处理（该流所有已订阅的消费组）
         
         Args:
             stream_id: 流ID
-            
+        
         Returns:
             是否成功
         """
-        if stream_id not in self.streams or stream_id not in self.processors:
+        stream = self._streams.get(stream_id)
+        if stream is None or all(g.processor is None for g in stream.groups.values()):
             return False
         
         if stream_id in self.streaming_threads:
             return False  # 已经在运行
         
-        def stream_worker():
-            stream_queue = self.streams[stream_id]
-            processor = self.processors[stream_id]
-            
-            while self.streaming_active:
-                try:
-                    record = stream_queue.get(timeout=1.0)
-                    processor(record)
-                    stream_queue.task_done()
-                except queue.Empty:
-                    continue
-                except Exception as e:
-                    logger.error(f"流处理错误: {e}")
-        
-        self.streaming_active = True
-        thread = threading.Thread(target=stream_worker, daemon=True)
-        thread.start()
-        self.streaming_threads[stream_id] = thread
+        threads = []
+        for group in list(stream.groups.values()):
+            if group.processor is not None:
+                threads.extend(self._start_group(stream, group))
         
+        self.streaming_threads[stream_id] = threads
         return True
     
+    def _start_group(self, stream: _Stream, group: _ConsumerGroup) -> List[threading.Thread]:
+        """为消费组的每个分区启动工作线程"""
+        group.stop_event.clear()
+        if group.use_processes:
+            group.pool = ProcessPoolExecutor(max_workers=stream.partitions * group.workers_per_partition)
+        for partition in range(stream.partitions):
+            for worker in range(group.workers_per_partition):
+                thread = threading.Thread(target=self._consume, args=(group, partition), daemon=True,
+                                          name=f"stream-{stream.stream_id}-{group.name}-{partition}-{worker}")
+                thread.start()
+                group.threads.append(thread)
+        return list(group.threads)
+    
+    def _consume(self, group: _ConsumerGroup, partition: int):
+        """工作线程：批量取出分区记录并处理"""
+        buffer = group.buffers[partition]
+        metrics = group.metrics[partition]
+        while not group.stop_event.is_set():
+            batch = buffer.get_batch(group.batch_size, _POLL_INTERVAL, group.batch_timeout)
+            if not batch:
+                if group.on_idle is not None:
+                    group.on_idle()
+                continue
+            metrics.begin(len(batch))
+            failed = len(batch)
+            try:
+                if group.pool is not None:
+                    failed = group.pool.submit(_run_processor, group.processor, batch, group.batched).result()
+                else:
+                    failed = _run_processor(group.processor, batch, group.batched)
+            except Exception as e:
+                logger.error(f"流处理错误: {e}")
+            finally:
+                metrics.end(len(batch), failed)
+    
     def stop_streaming(self, stream_id: str) -> bool:
         """
-        停止流处理
+        停止流处理（只影响该流，缓冲区中未处理的记录保留）
         
         Args:
             stream_id: 流ID
-            
+        
         Returns:
             是否成功
         """
         if stream_id not in self.streaming_threads:
             return False
         
-        self.streaming_active = False
+        stream = self._streams[stream_id]
+        for group in stream.groups.values():
+            group.stop_event.set()
+            for buffer in group.buffers:
+                buffer.wake_all()
         
-        if stream_id in self.streaming_threads:
-            thread = self.streaming_threads[stream_id]
+        for thread in self.streaming_threads.pop(stream_id):
             thread.join(timeout=5.0)
-            del self.streaming_threads[stream_id]
+        
+        for group in stream.groups.values():
+            group.threads.clear()
+            if group.pool is not None:
+                group.pool.shutdown(wait=False)
+                group.pool = None
         
         return True
     
     def transform_stream(self, source_stream_id: str, target_stream_id: str,
-                        transform_func: Callable[[StreamRecord], Dict[str, Any]]) -> bool:
+                        transform_func: Callable[[StreamRecord], Dict[str, Any]],
+                        group: str = DEFAULT_GROUP) -> bool:
         """
         转换流数据
         
@@ -180,66 +706,139 @@ class DataStreaming:
             source_stream_id: 源流ID
             target_stream_id: 目标流ID
             transform_func: 转换函数
-            
+            group: 消费组名称
+        
         Returns:
             是否成功
         """
-        def processor(record: StreamRecord):
-            transformed_data = transform_func(record)
-            self.publish(target_stream_id, transformed_data, record.metadata)
+        def processor(records: List[StreamRecord]):
+            for record in records:
+                self.publish(target_stream_id, transform_func(record), record.metadata)
         
-        return self.subscribe(source_stream_id, processor)
+        return self.subscribe(source_stream_id, processor, group=group, batched=True)
     
-    def filter_stream(self, stream_id: str, filter_func: Callable[[StreamRecord], bool]) -> str:
+    def filter_stream(self, stream_id: str, filter_func: Callable[[StreamRecord], bool],
+                      group: str = DEFAULT_GROUP) -> str:
         """
         过滤流数据
         
         Args:
             stream_id: 流ID
             filter_func: 过滤函数
-            
+            group: 消费组名称
+        
         Returns:
             过滤后的流ID
         """
         filtered_stream_id = f"{stream_id}_filtered"
         self.create_stream(filtered_stream_id)
         
-        def processor(record: StreamRecord):
-            if filter_func(record):
-                self.publish(filtered_stream_id, record.data, record.metadata)
+        def processor(records: List[StreamRecord]):
+            for record in records:
+                if filter_func(record):
+                    self.publish(filtered_stream_id, record.data, record.metadata)
         
-        self.subscribe(stream_id, processor)
+        self.subscribe(stream_id, processor, group=group, batched=True)
         return filtered_stream_id
     
-    def aggregate_stream(self, stream_id: str, window_size: int,
-                        aggregate_func: Callable[[List[StreamRecord]], Dict[str, Any]]) -> str:
+    def aggregate_stream(self, stream_id: str, window_size: float,
+                        aggregate_func: Callable[[List[StreamRecord]], Dict[str, Any]],
+                        slide: Optional[float] = None, allowed_lateness: float = 0.0,
+                        timestamp_field: Optional[str] = None, key_field: Optional[str] = None,
+                        idle_timeout: Optional[float] = None, group: str = DEFAULT_GROUP,
+                        batch_size: int = 256, batch_timeout: float = 0.05) -> str:
         """
-        聚合流数据
+        按事件时间窗口聚合流数据
+        
+        窗口在水位线（各活跃分区已见最大事件时间的最小值减去allowed_lateness）
+        越过窗口结束时间时输出到聚合流，元数据包含window_start、window_end、key和count。
         
         Args:
             stream_id: 流ID
-            window_size: 窗口大小
+            window_size: 窗口长度（秒）
             aggregate_func: 聚合函数
-            
+            slide: 滑动步长（秒，默认等于window_size即滚动窗口）
+            allowed_lateness: 允许的乱序时间（秒）
+            timestamp_field: 事件时间字段（datetime或epoch秒，默认使用发布时间）
+            key_field: 分组字段（每个键独立开窗）
+            idle_timeout: 无新记录多久后输出所有窗口（秒，默认window_size）
+            group: 消费组名称
+            batch_size: 每批最多取出的记录数
+            batch_timeout: 凑批等待时间（秒）
+        
         Returns:
             聚合后的流ID
         """
+        if window_size <= 0:
+            raise ValueError("window_size must be positive")
         aggregated_stream_id = f"{stream_id}_aggregated"
         self.create_stream(aggregated_stream_id)
         
-        window = []
+        stream = self._streams.get(stream_id)
+        aggregator = _WindowAggregator(
+            self, aggregated_stream_id, window_size, slide or window_size, allowed_lateness,
+            aggregate_func, timestamp_field, key_field,
+            idle_timeout if idle_timeout is not None else window_size,
+            stream.partitions if stream is not None else 1
+        )
+        self.subscribe(stream_id, aggregator.process, group=group, batch_size=batch_size,
+                       batch_timeout=batch_timeout, batched=True)
+        consumer_group = self._streams[stream_id].groups[group]
+        consumer_group.on_idle = aggregator.on_idle
+        consumer_group.aggregator = aggregator
+        return aggregated_stream_id
+    
+    def get_stream_metrics(self, stream_id: str) -> Dict[str, Any]:
+        """
+        获取流的分区指标
         
-        def processor(record: StreamRecord):
-            nonlocal window
-            window.append(record)
-            
-            if len(window) >= window_size:
-                aggregated_data = aggregate_func(window)
-                self.publish(aggregated_stream_id, aggregated_data)
-                window = []
+        lag为分区缓冲区中未处理与正在处理的记录数，throughput为最近5秒内每秒
+        处理的记录数。
         
-        self.subscribe(stream_id, processor)
-        return aggregated_stream_id
+        Args:
+            stream_id: 流ID
+        
+        Returns:
+            按消费组与分区组织的指标
+        """
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            return {}
+        
+        with stream.lock:
+            published = list(stream.offsets)
+            groups = list(stream.groups.values())
+        
+        group_metrics = {}
+        for group in groups:
+            partitions = []
+            for partition, (buffer, metrics) in enumerate(zip(group.buffers, group.metrics)):
+                partitions.append({
+                    'partition': partition,
+                    'published': published[partition],
+                    'processed': metrics.processed,
+                    'failed': metrics.failed,
+                    'lag': len(buffer) + metrics.in_flight,
+                    'throughput': metrics.throughput()
+                })
+            group_metrics[group.name] = {
+                'running': bool(group.threads),
+                'workers': len(group.threads),
+                'lag': sum(p['lag'] for p in partitions),
+                'throughput': sum(p['throughput'] for p in partitions),
+                'partitions': partitions
+            }
+            if group.aggregator is not None:
+                group_metrics[group.name]['windows'] = group.aggregator.stats()
+        
+        return {
+            'stream_id': stream_id,
+            'stream_type': stream.stream_type.value,
+            'partitions': stream.partitions,
+            'published': sum(published),
+            'streaming': stream_id in self.streaming_threads,
+            'groups': group_metrics
+        }
 
 
 def main():
@@ -247,7 +846,7 @@ def main():
     streaming = DataStreaming()
     
     # 创建流
-    streaming.create_stream('input_stream')
+    streaming.create_stream('input_stream', partitions=4, partition_key='key')
     streaming.create_stream('output_stream')
     
     # 定义处理函数
@@ -262,6 +861,10 @@ def main():
     
     # 发布数据
     streaming.publish('input_stream', {'key': 'value'})
+    
+    time.sleep(0.2)
+    print(streaming.get_stream_metrics('input_stream')['groups'][DEFAULT_GROUP]['lag'])
+    streaming.stop_streaming('input_stream')
 
 
 if __name__ == '__main__':
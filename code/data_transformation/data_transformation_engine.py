@@ -4,14 +4,21 @@
 专注于统一的数据转换引擎、转换规则管理、转换执行
 """
 
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 import logging
+import multiprocessing
+import time
 
 logger = logging.getLogger(__name__)
 
+# 编译后的规则管道缓存上限
+_PIPELINE_CACHE_SIZE = 64
+
 
 class TransformationType(Enum):
     """转换类型"""
@@ -49,6 +56,129 @@ class TransformationResult:
     error: Optional[str] = None
 
 
+def _freeze(value: Any) -> Any:
+    """把规则配置转换为可哈希的指纹，可调用对象等按身份区分，标量带上类型（1、1.0与True不同）"""
+    if isinstance(value, dict):
+        return ('dict',) + tuple((_freeze(key), _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return ('set', frozenset(_freeze(item) for item in value))
+    if callable(value):
+        return ('id', id(value))
+    try:
+        hash(value)
+    except TypeError:
+        return ('id', id(value))
+    return (type(value).__name__, value)
+
+
+class CompiledPipeline:
+    """
+    编译后的规则管道
+
+    规则集被生成为一个在整批记录上循环的函数：规则类型、字段名和配置在编译时
+    确定，逐条记录只剩字典读写和转换本身，不再逐规则分派、计时和记录历史。
+    失败以(规则序号, 记录序号, 输入值, 错误)收集，由引擎统一记录。
+    """
+
+    def __init__(self, rules: List[TransformationRule]):
+        self.rules = rules
+        self.source = self._generate(rules)
+        namespace = dict(self._constants)
+        exec(compile(self.source, f"<pipeline {len(rules)} rules>", 'exec'), namespace)
+        self._run = namespace['_pipeline']
+
+    def __call__(self, records: List[Dict[str, Any]], offset: int = 0) -> Tuple[List[Dict[str, Any]], List[Tuple]]:
+        """
+        转换一批记录
+
+        Args:
+            records: 记录列表
+            offset: 第一条记录在整个批次中的序号（用于失败定位）
+
+        Returns:
+            (转换后的记录列表, 失败列表)
+        """
+        failures: List[Tuple] = []
+        return self._run(records, failures, offset), failures
+
+    def _constant(self, value: Any) -> str:
+        name = f"_c{len(self._constants)}"
+        self._constants[name] = value
+        return name
+
+    def _generate(self, rules: List[TransformationRule]) -> str:
+        self._constants: Dict[str, Any] = {}
+        lines = [
+            "def _pipeline(records, failures, offset):",
+            "    result = []",
+            "    append = result.append",
+            "    for index, record in enumerate(records, offset):",
+            "        out = record.copy()",
+        ]
+        for position, rule in enumerate(rules):
+            source, target = self._constant(rule.source_field), self._constant(rule.target_field)
+            lines.append("        try:")
+            lines.extend("            " + line for line in self._rule_body(rule, source, target))
+            lines.append("        except Exception as e:")
+            lines.append(f"            failures.append(({position}, index, record.get({source}), str(e)))")
+        lines.append("        append(out)")
+        lines.append("    return result")
+        return "\n".join(lines) + "\n"
+
+    def _rule_body(self, rule: TransformationRule, source: str, target: str) -> List[str]:
+        """生成单条规则的语句，语义与DataTransformationEngine._apply_transformation一致"""
+        config = rule.rule_config
+        transformation_type = rule.transformation_type
+        value = f"out.get({source})"
+
+        if transformation_type == TransformationType.TYPE_CAST:
+            cast = {'integer': 'int', 'float': 'float', 'string': 'str',
+                    'boolean': 'bool'}.get(config.get('target_type', 'string'))
+            if cast is None:
+                return [f"out[{target}] = {value}"]
+            return ["value = " + value,
+                    f"out[{target}] = {cast}(value) if value is not None else None"]
+
+        if transformation_type == TransformationType.VALUE_MAP:
+            value_map = self._constant(config.get('value_map', {}))
+            if 'default_value' in config:
+                return [f"out[{target}] = {value_map}.get({value}, {self._constant(config['default_value'])})"]
+            return ["value = " + value, f"out[{target}] = {value_map}.get(value, value)"]
+
+        function_key = {
+            TransformationType.FORMAT_CONVERT: 'formatter',
+            TransformationType.CALCULATE: 'formula',
+            TransformationType.FILTER: 'filter',
+            TransformationType.CUSTOM: 'transform',
+        }.get(transformation_type)
+        function = config.get(function_key) if function_key else None
+        if not (function and callable(function)):
+            return [f"out[{target}] = {value}"]
+        function = self._constant(function)
+        if transformation_type == TransformationType.FORMAT_CONVERT:
+            return [f"out[{target}] = {function}({value})"]
+        if transformation_type == TransformationType.CALCULATE:
+            return [f"out[{target}] = {function}(out)"]
+        if transformation_type == TransformationType.FILTER:
+            return ["value = " + value, f"if {function}(value):", f"    out[{target}] = value"]
+        return [f"out[{target}] = {function}({value}, out)"]
+
+
+# 进程池工作进程中的管道（fork时由初始化函数设置，不经过pickle）
+_worker_pipeline: Optional[CompiledPipeline] = None
+
+
+def _init_worker(pipeline: CompiledPipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+
+def _run_chunk(chunk: List[Dict[str, Any]], offset: int):
+    return _worker_pipeline(chunk, offset)
+
+
 class DataTransformationEngine:
     """
     数据转换引擎
@@ -59,6 +189,9 @@ class DataTransformationEngine:
     def __init__(self):
         self.rules: Dict[str, TransformationRule] = {}
         self.transformation_history: List[TransformationResult] = []
+        self._pipelines: 'OrderedDict[Tuple, CompiledPipeline]' = OrderedDict()
+        # 批量转换不逐条记录成功结果，统计由计数器累计
+        self._counters = {'total': 0, 'successful': 0, 'execution_time': 0.0}
     
     def add_rule(self, rule_config: Dict[str, Any]) -> TransformationRule:
         """
@@ -130,6 +263,7 @@ class DataTransformationEngine:
                 )
                 
                 self.transformation_history.append(transformation_result)
+                self._record_counts(1, 1, execution_time)
             
             except Exception as e:
                 logger.error(f"转换失败: {rule_id}, 错误: {e}")
@@ -147,6 +281,7 @@ class DataTransformationEngine:
                 )
                 
                 self.transformation_history.append(transformation_result)
+                self._record_counts(1, 0, execution_time)
         
         return transformed_data
     
@@ -216,18 +351,119 @@ class DataTransformationEngine:
         return result
     
     def batch_transform(self, data_list: List[Dict[str, Any]],
-                       rule_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+                       rule_ids: Optional[List[str]] = None,
+                       max_workers: int = 1,
+                       chunk_size: int = 50000,
+                       use_processes: bool = False) -> List[Dict[str, Any]]:
         """
         批量转换数据
         
+        规则集编译为一个批处理函数（按规则集指纹缓存），结果与逐条调用transform
+        一致。成功的转换只计入统计，失败的转换仍逐条记录到转换历史。
+        
         Args:
             data_list: 数据列表
             rule_ids: 规则ID列表（可选）
+            max_workers: 并行数，大于1时按chunk_size分块并行
+            chunk_size: 并行分块大小
+            use_processes: 使用进程池（需要fork启动方式；线程池只在规则函数释放GIL时有加速）
             
         Returns:
             转换后的数据列表
         """
-        return [self.transform(data, rule_ids) for data in data_list]
+        pipeline = self.compile(rule_ids)
+        start_time = time.perf_counter()
+        
+        if max_workers > 1 and len(data_list) > chunk_size:
+            results, failures = self._transform_parallel(pipeline, data_list, max_workers,
+                                                         chunk_size, use_processes)
+        else:
+            results, failures = pipeline(data_list)
+        
+        execution_time = time.perf_counter() - start_time
+        total = len(data_list) * len(pipeline.rules)
+        self._record_counts(total, total - len(failures), execution_time)
+        
+        for position, _, input_value, error in failures:
+            rule_id = pipeline.rules[position].rule_id
+            logger.error(f"转换失败: {rule_id}, 错误: {error}")
+            self.transformation_history.append(TransformationResult(
+                transformation_id=f"trans_{datetime.utcnow().timestamp()}",
+                rule_id=rule_id,
+                input_data=input_value,
+                output_data=None,
+                success=False,
+                execution_time=0.0,
+                error=error
+            ))
+        
+        return results
+    
+    def _transform_parallel(self, pipeline: CompiledPipeline, data_list: List[Dict[str, Any]],
+                            max_workers: int, chunk_size: int,
+                            use_processes: bool) -> Tuple[List[Dict[str, Any]], List[Tuple]]:
+        """分块并行转换，保持记录顺序"""
+        offsets = list(range(0, len(data_list), chunk_size))
+        chunks = [data_list[offset:offset + chunk_size] for offset in offsets]
+        
+        if use_processes and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning("当前平台不支持fork，批量转换改用线程池")
+            use_processes = False
+        
+        if use_processes:
+            executor = ProcessPoolExecutor(max_workers=max_workers,
+                                           mp_context=multiprocessing.get_context('fork'),
+                                           initializer=_init_worker, initargs=(pipeline,))
+            run = _run_chunk
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            run = pipeline
+        
+        results: List[Dict[str, Any]] = []
+        failures: List[Tuple] = []
+        with executor:
+            for chunk_results, chunk_failures in executor.map(run, chunks, offsets):
+                results.extend(chunk_results)
+                failures.extend(chunk_failures)
+        
+        return results, failures
+    
+    def compile(self, rule_ids: Optional[List[str]] = None) -> CompiledPipeline:
+        """
+        编译规则集
+        
+        规则的解析顺序与transform相同；编译结果按规则集指纹（规则内容与配置）
+        缓存，修改规则或配置后自动重新编译。
+        
+        Args:
+            rule_ids: 规则ID列表（可选，默认使用所有启用的规则）
+            
+        Returns:
+            编译后的规则管道
+        """
+        rules_to_use = rule_ids if rule_ids else [r.rule_id for r in self.rules.values() if r.enabled]
+        rules = [self.rules[rule_id] for rule_id in rules_to_use
+                 if rule_id in self.rules and self.rules[rule_id].enabled]
+        
+        fingerprint = tuple(
+            (rule.rule_id, rule.transformation_type, rule.source_field, rule.target_field,
+             _freeze(rule.rule_config))
+            for rule in rules
+        )
+        pipeline = self._pipelines.get(fingerprint)
+        if pipeline is None:
+            pipeline = CompiledPipeline(rules)
+            self._pipelines[fingerprint] = pipeline
+            if len(self._pipelines) > _PIPELINE_CACHE_SIZE:
+                self._pipelines.popitem(last=False)
+        else:
+            self._pipelines.move_to_end(fingerprint)
+        return pipeline
+    
+    def _record_counts(self, total: int, successful: int, execution_time: float):
+        self._counters['total'] += total
+        self._counters['successful'] += successful
+        self._counters['execution_time'] += execution_time
     
     def get_transformation_stats(self) -> Dict[str, Any]:
         """
@@ -236,12 +472,12 @@ class DataTransformationEngine:
         Returns:
             转换统计
         """
-        total_transformations = len(self.transformation_history)
-        successful_transformations = sum(1 for t in self.transformation_history if t.success)
+        total_transformations = self._counters['total']
+        successful_transformations = self._counters['successful']
         failed_transformations = total_transformations - successful_transformations
         
         if total_transformations > 0:
-            avg_time = sum(t.execution_time for t in self.transformation_history) / total_transformations
+            avg_time = self._counters['execution_time'] / total_transformations
         else:
             avg_time = 0.0
         
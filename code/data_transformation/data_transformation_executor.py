@@ -4,10 +4,15 @@
 专注于数据转换执行、执行管理、执行结果处理
 """
 
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from bisect import bisect_left
+import heapq
+import itertools
 import logging
 import threading
 import time
@@ -33,6 +38,64 @@ class ExecutionPriority(Enum):
     CRITICAL = "critical"
 
 
+# 优先级排名（越大越优先）
+_PRIORITY_ORDER = {
+    ExecutionPriority.CRITICAL: 4,
+    ExecutionPriority.HIGH: 3,
+    ExecutionPriority.NORMAL: 2,
+    ExecutionPriority.LOW: 1
+}
+
+
+class _FixedBucketHistogram:
+    """
+    固定边界的延迟直方图
+
+    按固定的毫秒边界计数，分位数取所在桶的上界；快照按桶列出计数，便于直接展示。
+    """
+
+    BOUNDS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """记录一次耗时（秒）"""
+        milliseconds = seconds * 1000
+        self.counts[bisect_left(self.BOUNDS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction: float) -> float:
+        """分位数（毫秒）"""
+        if self.count == 0:
+            return 0.0
+        threshold = fraction * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return self.BOUNDS_MS[index] if index < len(self.BOUNDS_MS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """直方图摘要：各桶计数（键为上界毫秒数）与分位数"""
+        labels = [f"<={bound}ms" for bound in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'max_ms': self.max,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count}
+        }
+
+
 @dataclass
 class ExecutionTask:
     """执行任务"""
@@ -64,14 +127,30 @@ class DataTransformationExecutor:
     专注于数据转换执行、执行管理、执行结果处理
     """
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, use_processes: bool = False):
+        """
+        初始化执行器
+        
+        Args:
+            max_workers: 工作线程数
+            use_processes: 在进程池中运行任务函数（CPU密集型任务；task_func必须可pickle），
+                此时任务的timeout生效：超时后终止进程池的工作进程并换用新池，同一池中
+                其他正在运行的任务在新池中重新运行
+        """
         self.max_workers = max_workers
+        self.use_processes = use_processes
         self.tasks: Dict[str, ExecutionTask] = {}
         self.execution_history: List[ExecutionResult] = []
         self.executor_active = False
         self.executor_threads: List[threading.Thread] = []
-        self.task_queue: List[str] = []
+        # 堆：(-优先级排名, 入队序号, 任务ID, 入队时间)，同优先级先进先出
+        self.task_queue: List[Tuple[int, int, str, float]] = []
         self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self._sequence = itertools.count()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.queue_wait_histogram = _FixedBucketHistogram()
+        self.run_time_histogram = _FixedBucketHistogram()
     
     def submit_task(self, task_config: Dict[str, Any]) -> ExecutionTask:
         """
@@ -101,30 +180,15 @@ class DataTransformationExecutor:
         return task
     
     def _add_to_queue(self, task_id: str):
-        """添加到队列"""
+        """添加到队列（调用方持有锁）"""
         task = self.tasks[task_id]
-        
-        # 根据优先级插入
-        inserted = False
-        for i, queued_id in enumerate(self.task_queue):
-            queued_task = self.tasks[queued_id]
-            if self._compare_priority(task.priority, queued_task.priority) > 0:
-                self.task_queue.insert(i, task_id)
-                inserted = True
-                break
-        
-        if not inserted:
-            self.task_queue.append(task_id)
+        entry = (-_PRIORITY_ORDER.get(task.priority, 0), next(self._sequence), task_id, time.perf_counter())
+        heapq.heappush(self.task_queue, entry)
+        self.condition.notify()
     
     def _compare_priority(self, p1: ExecutionPriority, p2: ExecutionPriority) -> int:
         """比较优先级"""
-        priority_order = {
-            ExecutionPriority.CRITICAL: 4,
-            ExecutionPriority.HIGH: 3,
-            ExecutionPriority.NORMAL: 2,
-            ExecutionPriority.LOW: 1
-        }
-        return priority_order.get(p1, 0) - priority_order.get(p2, 0)
+        return _PRIORITY_ORDER.get(p1, 0) - _PRIORITY_ORDER.get(p2, 0)
     
     def start_executor(self):
         """启动执行器"""
@@ -133,6 +197,9 @@ class DataTransformationExecutor:
         
         self.executor_active = True
         
+        if self.use_processes:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        
         for i in range(self.max_workers):
             thread = threading.Thread(target=self._worker_loop, daemon=True, name=f"Executor-{i}")
             thread.start()
@@ -141,34 +208,85 @@ class DataTransformationExecutor:
         logger.info(f"执行器已启动，工作线程数: {self.max_workers}")
     
     def stop_executor(self):
-        """停止执行器"""
-        self.executor_active = False
+        """停止执行器（队列中未开始的任务保留）"""
+        with self.condition:
+            self.executor_active = False
+            self.condition.notify_all()
         
         for thread in self.executor_threads:
             thread.join(timeout=5)
         
         self.executor_threads.clear()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
         logger.info("执行器已停止")
     
     def _worker_loop(self):
-        """工作线程循环"""
-        while self.executor_active:
+        """工作线程循环：队列为空时在条件变量上等待，有任务入队立即唤醒"""
+        while True:
+            task_id = self._get_next_task()
+            if task_id is None:
+                return
             try:
-                task_id = self._get_next_task()
-                if task_id:
-                    self._execute_task(task_id)
-                else:
-                    time.sleep(0.1)
+                self._execute_task(task_id)
             except Exception as e:
                 logger.error(f"工作线程错误: {e}")
-                time.sleep(1)
     
-    def _get_next_task(self) -> Optional[str]:
-        """获取下一个任务"""
+    def _get_next_task(self, block: bool = True) -> Optional[str]:
+        """
+        获取下一个任务
+        
+        Args:
+            block: 队列为空时是否等待
+            
+        Returns:
+            任务ID，执行器停止（或非阻塞且队列为空）时返回None
+        """
+        with self.condition:
+            while block and self.executor_active and not self.task_queue:
+                self.condition.wait()
+            if not self.task_queue or (block and not self.executor_active):
+                return None
+            _, _, task_id, enqueued_at = heapq.heappop(self.task_queue)
+            self.queue_wait_histogram.record(time.perf_counter() - enqueued_at)
+            return task_id
+    
+    def _run_task_func(self, task: ExecutionTask) -> Any:
+        """运行任务函数，进程池模式下按timeout等待"""
+        while True:
+            pool = self._process_pool
+            if pool is None:
+                return task.task_func()
+            try:
+                future = pool.submit(task.task_func)
+            except RuntimeError:
+                if pool is self._process_pool:
+                    raise
+                continue
+            try:
+                return future.result(timeout=task.timeout)
+            except FutureTimeoutError:
+                # 超时的任务仍占着工作进程，回收整个进程池释放它
+                self._recycle_process_pool(pool)
+                raise
+            except (BrokenProcessPool, CancelledError):
+                if pool is self._process_pool:
+                    self._recycle_process_pool(pool)
+                    raise
+                # 进程池因其他任务超时已被回收，在新池中重新运行
+    
+    def _recycle_process_pool(self, pool: ProcessPoolExecutor):
+        """用新进程池替换pool，并终止pool的工作进程"""
         with self.lock:
-            if self.task_queue:
-                return self.task_queue.pop(0)
-        return None
+            if self._process_pool is not pool:
+                return
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        for process in processes:
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"进程池已回收（终止 {len(processes)} 个工作进程）")
     
     def _execute_task(self, task_id: str):
         """执行任务"""
@@ -180,13 +298,8 @@ class DataTransformationExecutor:
         start_time = time.time()
         
         try:
-            # 检查超时
-            if task.timeout:
-                # 简化实现，实际应该使用超时机制
-                pass
-            
-            # 执行任务
-            result = task.task_func()
+            # 执行任务（超时只在进程池模式下生效）
+            result = self._run_task_func(task)
             
             execution_time = time.time() - start_time
             
@@ -201,8 +314,12 @@ class DataTransformationExecutor:
             
             with self.lock:
                 self.execution_history.append(execution_result)
+                self.run_time_histogram.record(execution_time)
         
         except Exception as e:
+            timed_out = isinstance(e, FutureTimeoutError)
+            if timed_out:
+                e = TimeoutError(f"任务超时（{task.timeout}秒）")
             logger.error(f"任务执行失败: {task.task_name}, 错误: {e}")
             execution_time = time.time() - start_time
             
@@ -210,13 +327,14 @@ class DataTransformationExecutor:
             if task.retry_count < task.max_retries:
                 task.retry_count += 1
                 with self.lock:
+                    self.run_time_histogram.record(execution_time)
                     self._add_to_queue(task_id)
                 return
             
             execution_result = ExecutionResult(
                 task_id=task_id,
                 execution_id=execution_id,
-                status=ExecutionStatus.FAILED,
+                status=ExecutionStatus.TIMEOUT if timed_out else ExecutionStatus.FAILED,
                 execution_time=execution_time,
                 error=str(e),
                 retry_count=task.retry_count
@@ -224,6 +342,7 @@ class DataTransformationExecutor:
             
             with self.lock:
                 self.execution_history.append(execution_result)
+                self.run_time_histogram.record(execution_time)
     
     def get_executor_stats(self) -> Dict[str, Any]:
         """
@@ -237,6 +356,8 @@ class DataTransformationExecutor:
             queued_tasks = len(self.task_queue)
             total_executions = len(self.execution_history)
             successful_executions = sum(1 for e in self.execution_history if e.status == ExecutionStatus.COMPLETED)
+            queue_wait = self.queue_wait_histogram.snapshot()
+            run_time = self.run_time_histogram.snapshot()
         
         return {
             'total_tasks': total_tasks,
@@ -246,7 +367,10 @@ class DataTransformationExecutor:
             'total_executions': total_executions,
             'successful_executions': successful_executions,
             'failed_executions': total_executions - successful_executions,
-            'success_rate': (successful_executions / total_executions * 100) if total_executions > 0 else 0.0
+            'success_rate': (successful_executions / total_executions * 100) if total_executions > 0 else 0.0,
+            'backend': 'process' if self.use_processes else 'thread',
+            'queue_wait': queue_wait,
+            'run_time': run_time
         }
 
 
@@ -2,18 +2,40 @@
 数据转换调度器模块
 
 专注于数据转换调度、定时任务、任务队列管理
+
+定时器保存在按触发时间排序的最小堆中，调度线程睡眠到最近的触发时间，
+到期任务交给有界工作线程池执行，调度开销与任务总数无关。
 """
 
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
+import calendar
+import heapq
+import itertools
 import logging
+import math
+import random
 import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+_EPOCH = datetime(1970, 1, 1)
+
+# 调度线程单次睡眠上限（秒），用于适应系统时钟调整
+_MAX_SLEEP = 60.0
+
+
+def _to_epoch(moment: datetime) -> float:
+    return (moment - _EPOCH).total_seconds()
+
+
+def _from_epoch(seconds: float) -> datetime:
+    return _EPOCH + timedelta(seconds=seconds)
+
 
 class ScheduleType(Enum):
     """调度类型"""
@@ -34,6 +56,13 @@ class TaskStatus(Enum):
     CANCELLED = "cancelled"  # 已取消
 
 
+class MisfirePolicy(Enum):
+    """错过触发时间（调度延迟或上一次执行未结束）时的处理策略"""
+    COALESCE = "coalesce"  # 合并：错过多个周期只补执行一次
+    RUN_ALL = "run_all"  # 逐个周期补执行
+    SKIP = "skip"  # 延迟超过宽限时间则跳过本次
+
+
 @dataclass
 class ScheduledTask:
     """调度任务"""
@@ -46,6 +75,11 @@ class ScheduledTask:
     next_run_time: Optional[datetime] = None
     last_run_time: Optional[datetime] = None
     enabled: bool = True
+    misfire_policy: MisfirePolicy = MisfirePolicy.COALESCE
+    misfire_grace_seconds: float = 1.0
+    jitter_seconds: float = 0.0
+    run_count: int = 0
+    missed_runs: int = 0
 
 
 @dataclass
@@ -64,20 +98,43 @@ class DataTransformationScheduler:
     数据转换调度器
     
     专注于数据转换调度、定时任务、任务队列管理
+    
+    每个任务在堆中至多有一个有效定时器（按代号惰性删除），选择下一个到期任务
+    为O(log n)。同一任务同时只运行一个实例，触发时上一次仍在运行则按错过处理。
     """
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 4):
+        """
+        初始化调度器
+        
+        Args:
+            max_workers: 执行任务的工作线程数
+        """
+        self.max_workers = max_workers
         self.tasks: Dict[str, ScheduledTask] = {}
         self.execution_history: List[TaskExecutionResult] = []
         self.scheduler_active = False
         self.scheduler_thread: Optional[threading.Thread] = None
+        
+        # 定时器堆：(触发时间, 序号, 任务ID, 代号, 未加抖动的计划时间)
+        self._timers: List[Tuple[float, int, str, int, float]] = []
+        self._generations: Dict[str, int] = {}
+        self._parked: Dict[str, float] = {}  # 被禁用的任务ID -> 计划时间
+        self._deferred: Dict[str, float] = {}  # RUN_ALL任务运行期间到期的计划时间
+        self._running: Set[str] = set()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._random = random.Random()
+        self._dispatch_delay = {'count': 0, 'total': 0.0, 'max': 0.0}
     
     def schedule_task(self, task_config: Dict[str, Any]) -> ScheduledTask:
         """
         调度任务
         
         Args:
-            task_config: 任务配置
+            task_config: 任务配置，除任务字段外可包含misfire_policy、
+                misfire_grace_seconds、jitter_seconds
             
         Returns:
             调度任务对象
@@ -86,6 +143,10 @@ class DataTransformationScheduler:
         
         schedule_type = ScheduleType(task_config.get('schedule_type', 'once'))
         schedule_config = task_config.get('schedule_config', {})
+        if schedule_type == ScheduleType.INTERVAL and schedule_config.get('interval_seconds', 3600) <= 0:
+            raise ValueError("interval_seconds must be positive")
+        if schedule_type == ScheduleType.CRON:
+            logger.warning(f"暂不支持Cron表达式，任务 {task_id} 只执行一次")
         
         # 计算下次执行时间
         next_run_time = self._calculate_next_run_time(schedule_type, schedule_config)
@@ -98,22 +159,81 @@ class DataTransformationScheduler:
             schedule_config=schedule_config,
             status=TaskStatus.PENDING,
             next_run_time=next_run_time,
-            enabled=task_config.get('enabled', True)
+            enabled=task_config.get('enabled', True),
+            misfire_policy=MisfirePolicy(task_config.get('misfire_policy', 'coalesce')),
+            misfire_grace_seconds=task_config.get('misfire_grace_seconds', 1.0),
+            jitter_seconds=task_config.get('jitter_seconds', 0.0)
         )
         
-        self.tasks[task_id] = task
+        with self._condition:
+            self.tasks[task_id] = task
+            self._generations[task_id] = self._generations.get(task_id, 0) + 1
+            self._parked.pop(task_id, None)
+            self._deferred.pop(task_id, None)
+            if task.enabled:
+                self._push(task, _to_epoch(next_run_time))
+            else:
+                self._parked[task_id] = _to_epoch(next_run_time)
         return task
     
+    def cancel_task(self, task_id: str) -> bool:
+        """
+        取消任务（正在运行的实例会执行完）
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            任务是否存在
+        """
+        with self._condition:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return False
+            self._generations[task_id] += 1
+            self._parked.pop(task_id, None)
+            self._deferred.pop(task_id, None)
+            task.status = TaskStatus.CANCELLED
+            task.next_run_time = None
+            return True
+    
+    def disable_task(self, task_id: str):
+        """禁用任务，到期时不执行并暂停调度"""
+        with self._condition:
+            self.tasks[task_id].enabled = False
+    
+    def enable_task(self, task_id: str):
+        """启用任务，被暂停的任务从原计划时间恢复调度（按错过策略处理延迟）"""
+        with self._condition:
+            task = self.tasks[task_id]
+            task.enabled = True
+            if task_id in self._parked:
+                self._push(task, self._parked.pop(task_id))
+    
     def _calculate_next_run_time(self, schedule_type: ScheduleType,
-                                 config: Dict[str, Any]) -> Optional[datetime]:
-        """计算下次执行时间"""
-        now = datetime.utcnow()
+                                 config: Dict[str, Any],
+                                 after: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        计算下次执行时间
+        
+        Args:
+            schedule_type: 调度类型
+            config: 调度配置
+            after: 基准时间（默认当前时间）
+        
+        Returns:
+            下次执行时间
+        """
+        now = after or datetime.utcnow()
         
         if schedule_type == ScheduleType.ONCE:
-            return now
+            return now + timedelta(seconds=config.get('delay_seconds', 0))
         
         elif schedule_type == ScheduleType.INTERVAL:
             interval_seconds = config.get('interval_seconds', 3600)
+            # start_seconds指定首次执行的延迟（默认一个间隔）
+            if after is None:
+                interval_seconds = config.get('start_seconds', interval_seconds)
             return now + timedelta(seconds=interval_seconds)
         
         elif schedule_type == ScheduleType.DAILY:
@@ -134,47 +254,137 @@ class DataTransformationScheduler:
             next_run = (now + timedelta(days=days_ahead)).replace(hour=hour, minute=minute, second=0, microsecond=0)
             return next_run
         
+        elif schedule_type == ScheduleType.MONTHLY:
+            day = config.get('day', 1)
+            hour = config.get('hour', 0)
+            minute = config.get('minute', 0)
+            year, month = now.year, now.month
+            while True:
+                last_day = calendar.monthrange(year, month)[1]
+                next_run = datetime(year, month, min(day, last_day), hour, minute)
+                if next_run > now:
+                    return next_run
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        
         return now
     
+    def _next_base(self, task: ScheduledTask, base: float, now: float) -> Optional[float]:
+        """
+        计算下一个计划时间（未加抖动）
+        
+        RUN_ALL从上一个计划时间顺延，保留错过的周期；其他策略跳到now之后的
+        第一个周期。只执行一次的任务返回None。
+        """
+        schedule_type = task.schedule_type
+        if schedule_type in (ScheduleType.ONCE, ScheduleType.CRON):
+            return None
+        catch_up = task.misfire_policy == MisfirePolicy.RUN_ALL
+        if schedule_type == ScheduleType.INTERVAL:
+            interval = task.schedule_config.get('interval_seconds', 3600)
+            if catch_up or now < base + interval:
+                return base + interval
+            return base + interval * (math.floor((now - base) / interval) + 1)
+        after = _from_epoch(base if catch_up else max(base, now))
+        return _to_epoch(self._calculate_next_run_time(schedule_type, task.schedule_config, after))
+    
+    def _push(self, task: ScheduledTask, base: float):
+        """加入定时器（调用方持有锁）"""
+        fire_at = base + (self._random.uniform(0, task.jitter_seconds) if task.jitter_seconds else 0.0)
+        entry = (fire_at, next(self._sequence), task.task_id, self._generations[task.task_id], base)
+        heapq.heappush(self._timers, entry)
+        task.next_run_time = _from_epoch(fire_at)
+        if self._timers[0] is entry:
+            self._condition.notify()
+    
     def start_scheduler(self):
         """启动调度器"""
         if self.scheduler_active:
             return
         
         self.scheduler_active = True
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scheduler-worker')
         self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
         self.scheduler_thread.start()
-        logger.info("调度器已启动")
+        logger.info(f"调度器已启动，工作线程数: {self.max_workers}")
     
     def stop_scheduler(self):
-        """停止调度器"""
-        self.scheduler_active = False
+        """停止调度器（正在运行的任务会执行完）"""
+        with self._condition:
+            self.scheduler_active = False
+            self._condition.notify_all()
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
         logger.info("调度器已停止")
     
     def _scheduler_loop(self):
-        """调度器循环"""
-        while self.scheduler_active:
-            try:
-                now = datetime.utcnow()
-                
-                for task in self.tasks.values():
-                    if not task.enabled or task.status == TaskStatus.RUNNING:
+        """调度器循环：睡眠到最近的触发时间，取出所有到期定时器并分派"""
+        while True:
+            with self._condition:
+                while self.scheduler_active:
+                    if not self._timers:
+                        self._condition.wait()
                         continue
-                    
-                    if task.next_run_time and task.next_run_time <= now:
-                        self._execute_task(task)
+                    delay = self._timers[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(timeout=min(delay, _MAX_SLEEP))
+                if not self.scheduler_active:
+                    return
                 
-                time.sleep(1)  # 每秒检查一次
-            
-            except Exception as e:
-                logger.error(f"调度器循环错误: {e}")
-                time.sleep(5)
+                now = time.time()
+                while self._timers and self._timers[0][0] <= now:
+                    entry = heapq.heappop(self._timers)
+                    try:
+                        self._dispatch(entry, now)
+                    except Exception as e:
+                        logger.error(f"调度器循环错误: {e}")
     
-    def _execute_task(self, task: ScheduledTask):
-        """执行任务"""
+    def _dispatch(self, entry: Tuple[float, int, str, int, float], now: float):
+        """处理一个到期定时器（调用方持有锁）"""
+        fire_at, _, task_id, generation, base = entry
+        task = self.tasks.get(task_id)
+        if task is None or self._generations.get(task_id) != generation:
+            return
+        if not task.enabled:
+            self._parked[task_id] = base
+            task.next_run_time = None
+            return
+        
+        lateness = now - fire_at
+        if task_id in self._running and task.misfire_policy == MisfirePolicy.RUN_ALL:
+            # 补执行不丢弃，等当前实例结束后从该计划时间继续
+            self._deferred[task_id] = base
+            return
+        if task_id in self._running:
+            run = False
+        elif task.misfire_policy == MisfirePolicy.SKIP and lateness > task.misfire_grace_seconds:
+            run = False
+        else:
+            run = True
+        
+        next_base = self._next_base(task, base, now)
+        if next_base is not None:
+            self._push(task, next_base)
+        else:
+            task.next_run_time = None
+        
+        if not run:
+            task.missed_runs += 1
+            logger.debug(f"任务错过执行: {task.task_name}, 延迟 {lateness:.3f}s")
+            return
+        
+        self._dispatch_delay['count'] += 1
+        self._dispatch_delay['total'] += lateness
+        self._dispatch_delay['max'] = max(self._dispatch_delay['max'], lateness)
+        self._running.add(task_id)
         task.status = TaskStatus.RUNNING
+        self._pool.submit(self._execute_task, task)
+    
+    def _execute_task(self, task: ScheduledTask):
+        """执行任务（工作线程）"""
         task.last_run_time = datetime.utcnow()
         
         execution_id = f"exec_{datetime.utcnow().timestamp()}"
@@ -185,10 +395,7 @@ class DataTransformationScheduler:
             result = task.task_func()
             
             execution_time = time.time() - start_time
-            
-            # 计算下次执行时间
-            task.next_run_time = self._calculate_next_run_time(task.schedule_type, task.schedule_config)
-            task.status = TaskStatus.COMPLETED
+            self._set_finished_status(task, TaskStatus.COMPLETED)
             
             execution_result = TaskExecutionResult(
                 task_id=task.task_id,
@@ -204,7 +411,7 @@ class DataTransformationScheduler:
             logger.error(f"任务执行失败: {task.task_name}, 错误: {e}")
             execution_time = time.time() - start_time
             
-            task.status = TaskStatus.FAILED
+            self._set_finished_status(task, TaskStatus.FAILED)
             
             execution_result = TaskExecutionResult(
                 task_id=task.task_id,
@@ -215,6 +422,21 @@ class DataTransformationScheduler:
             )
             
             self.execution_history.append(execution_result)
+        
+        finally:
+            with self._condition:
+                task.run_count += 1
+                self._running.discard(task.task_id)
+                deferred = self._deferred.pop(task.task_id, None)
+                if deferred is not None and self.tasks.get(task.task_id) is task \
+                        and task.status != TaskStatus.CANCELLED:
+                    self._push(task, deferred)
+    
+    def _set_finished_status(self, task: ScheduledTask, status: TaskStatus):
+        """写入执行结束状态，运行期间被取消的任务保持CANCELLED"""
+        with self._condition:
+            if task.status != TaskStatus.CANCELLED:
+                task.status = status
     
     def get_scheduler_stats(self) -> Dict[str, Any]:
         """
@@ -228,6 +450,11 @@ class DataTransformationScheduler:
         total_executions = len(self.execution_history)
         successful_executions = sum(1 for e in self.execution_history if e.status == TaskStatus.COMPLETED)
         
+        with self._condition:
+            delay = dict(self._dispatch_delay)
+            scheduled_timers = len(self._timers)
+            running_tasks = len(self._running)
+        
         return {
             'total_tasks': total_tasks,
             'enabled_tasks': enabled_tasks,
@@ -235,7 +462,13 @@ class DataTransformationScheduler:
             'total_executions': total_executions,
             'successful_executions': successful_executions,
             'failed_executions': total_executions - successful_executions,
-            'success_rate': (successful_executions / total_executions * 100) if total_executions > 0 else 0.0
+            'success_rate': (successful_executions / total_executions * 100) if total_executions > 0 else 0.0,
+            'max_workers': self.max_workers,
+            'scheduled_timers': scheduled_timers,
+            'running_tasks': running_tasks,
+            'missed_runs': sum(t.missed_runs for t in self.tasks.values()),
+            'average_dispatch_delay': delay['total'] / delay['count'] if delay['count'] else 0.0,
+            'max_dispatch_delay': delay['max']
         }
 
 
@@ -3,3 +3,15 @@
 
 测试数据转换模块的所有功能
 """
+
+import time
+
+
+def wait_for(predicate, timeout=10.0):
+    """轮询等待条件成立"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
@@ -0,0 +1,166 @@
+"""
+数据查询测试
+
+以逐行扫描为基准，验证列存储、索引过滤、top-k排序与失效重建的结果
+"""
+
+import random
+import unittest
+from unittest import mock
+
+from data_transformation import data_query
+from data_transformation.data_query import (
+    DataQuery,
+    FilterOperator,
+    IndexType,
+    QueryFilter,
+    SortField,
+    SortOrder
+)
+
+
+def generate_records(count, seed=7):
+    """生成含空值的测试记录"""
+    rng = random.Random(seed)
+    cities = ['Beijing', 'Shanghai', 'Shenzhen', 'Hangzhou', 'Chengdu']
+    return [
+        {
+            'id': i,
+            'city': rng.choice(cities),
+            'age': rng.choice([None, rng.randint(18, 70)]) if i % 7 == 0 else rng.randint(18, 70),
+            'score': round(rng.uniform(0, 100), 1),
+            'name': f"user_{rng.randint(0, 500)}",
+        }
+        for i in range(count)
+    ]
+
+
+def scan(records, filters, sort_fields):
+    """逐行扫描基准：逐条件过滤，稳定排序（None排在升序最前）"""
+    data = [record for record in records
+            if all(data_query._match_value(record.get(f.field), f) for f in filters)]
+    for sort_field in reversed(sort_fields):
+        data = sorted(data, key=lambda record: (record.get(sort_field.field) is not None,
+                                                record.get(sort_field.field)),
+                      reverse=sort_field.order == SortOrder.DESC)
+    return data
+
+
+FILTER_CASES = [
+    [QueryFilter('city', FilterOperator.EQ, 'Beijing')],
+    [QueryFilter('city', FilterOperator.NE, 'Beijing')],
+    [QueryFilter('city', FilterOperator.IN, ['Shanghai', 'Chengdu'])],
+    [QueryFilter('city', FilterOperator.NOT_IN, ['Shanghai', 'Chengdu'])],
+    [QueryFilter('name', FilterOperator.LIKE, 'USER_1')],
+    [QueryFilter('age', FilterOperator.GT, 40)],
+    [QueryFilter('age', FilterOperator.GTE, 40), QueryFilter('age', FilterOperator.LTE, 50)],
+    [QueryFilter('age', FilterOperator.LT, 25)],
+    [QueryFilter('age', FilterOperator.BETWEEN, [30, 35]), QueryFilter('city', FilterOperator.EQ, 'Shenzhen')],
+    [QueryFilter('score', FilterOperator.BETWEEN, (20.5, 60)), QueryFilter('name', FilterOperator.LIKE, '2')],
+    [QueryFilter('age', FilterOperator.EQ, None)],
+    [QueryFilter('city', FilterOperator.EQ, 'Nowhere')],
+]
+
+SORT_CASES = [
+    [],
+    [SortField('age', SortOrder.ASC)],
+    [SortField('age', SortOrder.DESC)],
+    [SortField('city', SortOrder.ASC), SortField('score', SortOrder.DESC)],
+]
+
+
+class TestDataQuery(unittest.TestCase):
+    """数据查询测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.records = generate_records(2000)
+    
+    def assert_matches_scan(self, query, store_id):
+        for filters in FILTER_CASES:
+            for sort_fields in SORT_CASES:
+                expected = scan(self.records, filters, sort_fields)
+                for page, page_size in ((1, 25), (3, 40), (1, 5000)):
+                    with self.subTest(filters=filters, sort_fields=sort_fields, page=page):
+                        result = query.query(store_id, filters=filters, sort_fields=sort_fields,
+                                             page=page, page_size=page_size)
+                        start = (page - 1) * page_size
+                        self.assertEqual(result.total_count, len(expected))
+                        self.assertEqual([r['id'] for r in result.records],
+                                         [r['id'] for r in expected[start:start + page_size]])
+                self.assertEqual(query.count(store_id, filters), len(expected))
+    
+    def test_matches_scan_with_indexes(self):
+        """测试带索引的查询与逐行扫描一致"""
+        query = DataQuery()
+        query.register_data_store('users', self.records, hash_indexes=['city', 'name'],
+                                  sorted_indexes=['age', 'score'])
+        self.assert_matches_scan(query, 'users')
+    
+    def test_matches_scan_without_indexes(self):
+        """测试无索引的列过滤与逐行扫描一致"""
+        query = DataQuery()
+        query.register_data_store('users', self.records)
+        self.assert_matches_scan(query, 'users')
+    
+    def test_matches_scan_without_numpy(self):
+        """测试纯Python路径与逐行扫描一致"""
+        with mock.patch.object(data_query, 'NUMPY_AVAILABLE', False):
+            query = DataQuery()
+            query.register_data_store('users', self.records, hash_indexes=['city'], sorted_indexes=['age'])
+            self.assert_matches_scan(query, 'users')
+    
+    def test_rebuild_after_append(self):
+        """测试数据列表长度变化后自动重建并保留索引"""
+        query = DataQuery()
+        query.register_data_store('users', self.records, hash_indexes=['city'])
+        filters = [QueryFilter('city', FilterOperator.EQ, 'Xian')]
+        self.assertEqual(query.count('users', filters), 0)
+        
+        self.records.append({'id': 9999, 'city': 'Xian', 'age': 30, 'score': 1.0, 'name': 'new'})
+        self.assertEqual(query.count('users', filters), 1)
+        self.assertIsNotNone(query._column_stores['users'].column('city').hash_index)
+    
+    def test_invalidate_after_in_place_update(self):
+        """测试原地修改记录后调用invalidate重建列与索引"""
+        query = DataQuery()
+        query.register_data_store('users', self.records, hash_indexes=['city'], sorted_indexes=['age'])
+        filters = [QueryFilter('city', FilterOperator.EQ, 'Xian')]
+        self.assertEqual(query.count('users', filters), 0)
+        
+        self.records[10]['city'] = 'Xian'
+        self.records[10]['age'] = 99
+        query.invalidate('users', ['city'])
+        self.assertEqual([r['id'] for r in query.query('users', filters=filters).records], [10])
+        query.invalidate('users')
+        self.assertEqual(query.count('users', [QueryFilter('age', FilterOperator.GT, 90)]), 1)
+        self.assertIsNotNone(query._column_stores['users'].column('age').sorted_index)
+        
+        with self.assertRaises(ValueError):
+            query.invalidate('missing')
+    
+    def test_version_hook_rebuilds(self):
+        """测试version回调返回值变化时自动重建"""
+        version = [0]
+        query = DataQuery()
+        query.register_data_store('users', self.records, hash_indexes=['city'], version=lambda: version[0])
+        filters = [QueryFilter('city', FilterOperator.EQ, 'Xian')]
+        self.assertEqual(query.count('users', filters), 0)
+        
+        self.records[0]['city'] = 'Xian'
+        version[0] += 1
+        self.assertEqual(query.count('users', filters), 1)
+        self.assertEqual(query.query('users', filters=filters).records, [self.records[0]])
+    
+    def test_create_index_type(self):
+        """测试为已注册存储建立索引"""
+        query = DataQuery()
+        query.register_data_store('users', self.records)
+        self.assertTrue(query.create_index('users', 'age', IndexType.SORTED))
+        self.assertTrue(query.create_index('users', 'city'))
+        with self.assertRaises(ValueError):
+            query.create_index('missing', 'city')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""
+数据流处理测试
+
+验证分区路由、消费组、微批处理、事件时间窗口与背压
+"""
+
+import queue
+import threading
+import time
+import unittest
+import zlib
+
+from data_transformation.data_streaming import (
+    DEFAULT_GROUP,
+    DataStreaming,
+    StreamRecord,
+    StreamType
+)
+from data_transformation.tests import wait_for
+
+
+class Collector:
+    """线程安全地收集处理函数收到的记录或批次"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = []
+    
+    def __call__(self, item):
+        with self.lock:
+            self.items.append(item)
+    
+    def __len__(self):
+        with self.lock:
+            return len(self.items)
+
+
+class TestDataStreaming(unittest.TestCase):
+    """数据流处理测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.streaming = DataStreaming(buffer_size=100)
+    
+    def tearDown(self):
+        """测试后清理"""
+        for stream_id in list(self.streaming.streaming_threads):
+            self.streaming.stop_streaming(stream_id)
+    
+    def test_partition_routing_by_key(self):
+        """测试相同键进入同一分区，分区内偏移量连续且保持顺序"""
+        self.streaming.create_stream('orders', partitions=4, partition_key='customer')
+        collector = Collector()
+        self.streaming.subscribe('orders', collector)
+        customers = ['alice', 'bob', 'carol', 'dave', 'erin']
+        data = [{'customer': customers[i % 5], 'seq': i} for i in range(60)]
+        self.assertEqual(self.streaming.publish_many('orders', data), 60)
+        self.streaming.start_streaming('orders')
+        self.assertTrue(wait_for(lambda: len(collector) == 60))
+        
+        by_partition = {}
+        for record in collector.items:
+            self.assertEqual(record.partition, zlib.crc32(record.data['customer'].encode('utf-8')) % 4)
+            by_partition.setdefault(record.partition, []).append(record)
+        for partition, records in by_partition.items():
+            self.assertEqual([r.offset for r in records], list(range(len(records))))
+            self.assertEqual([r.data['seq'] for r in records], sorted(r.data['seq'] for r in records))
+            self.assertEqual(records[0].record_id, f"orders-{partition}-0")
+    
+    def test_round_robin_without_key(self):
+        """测试缺少分区字段时轮询分配"""
+        self.streaming.create_stream('events', partitions=3)
+        self.streaming.publish_many('events', [{'n': i} for i in range(9)])
+        metrics = self.streaming.get_stream_metrics('events')
+        self.assertEqual([p['published'] for p in metrics['groups'][DEFAULT_GROUP]['partitions']], [3, 3, 3])
+    
+    def test_named_group_does_not_block_publish(self):
+        """测试只有命名消费组时发布不会因无人消费的默认缓冲区阻塞"""
+        self.streaming = DataStreaming(buffer_size=10)
+        self.streaming.create_stream('events')
+        collector = Collector()
+        self.streaming.subscribe('events', collector, group='audit')
+        self.streaming.start_streaming('events')
+        
+        started = time.monotonic()
+        accepted = sum(self.streaming.publish('events', {'n': i}) for i in range(50))
+        self.assertEqual(accepted, 50)
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertTrue(wait_for(lambda: len(collector) == 50))
+        self.assertEqual(list(self.streaming.get_stream_metrics('events')['groups']), ['audit'])
+    
+    def test_first_group_takes_over_backlog(self):
+        """测试订阅前发布的记录由第一个订阅的消费组处理"""
+        self.streaming.create_stream('events')
+        self.streaming.publish_many('events', [{'n': i} for i in range(3)])
+        collector = Collector()
+        self.streaming.subscribe('events', collector, group='audit')
+        self.streaming.start_streaming('events')
+        self.assertTrue(wait_for(lambda: len(collector) == 3))
+        self.assertEqual([r.data['n'] for r in collector.items], [0, 1, 2])
+    
+    def test_group_added_after_start_consumes(self):
+        """测试流启动后新增的消费组立即开始消费，且每个消费组收到全部记录"""
+        self.streaming.create_stream('events', partitions=2)
+        first, second = Collector(), Collector()
+        self.streaming.subscribe('events', first, group='first')
+        self.streaming.start_streaming('events')
+        self.streaming.subscribe('events', second, group='second', workers_per_partition=2)
+        
+        self.streaming.publish_many('events', [{'n': i} for i in range(20)])
+        self.assertTrue(wait_for(lambda: len(first) == 20 and len(second) == 20))
+        metrics = self.streaming.get_stream_metrics('events')
+        self.assertEqual(metrics['groups']['second']['workers'], 4)
+        self.assertEqual(len(self.streaming.streaming_threads['events']), 6)
+        self.assertTrue(self.streaming.stop_streaming('events'))
+        self.assertFalse(self.streaming.streaming_active)
+    
+    def test_micro_batching(self):
+        """测试微批流按batch_size分批交给处理函数"""
+        self.streaming.create_stream('batches', stream_type=StreamType.MICRO_BATCH)
+        collector = Collector()
+        self.streaming.subscribe('batches', collector, batch_size=10, batch_timeout=0.2)
+        self.streaming.publish_many('batches', [{'n': i} for i in range(25)])
+        self.streaming.start_streaming('batches')
+        self.assertTrue(wait_for(lambda: sum(len(batch) for batch in collector.items) == 25))
+        self.assertEqual([len(batch) for batch in collector.items], [10, 10, 5])
+        self.assertTrue(all(isinstance(record, StreamRecord) for record in collector.items[0]))
+    
+    def test_backpressure_when_buffer_full(self):
+        """测试缓冲区满时发布在超时后返回实际接收的数量"""
+        self.streaming = DataStreaming(buffer_size=5)
+        self.streaming.create_stream('events')
+        self.streaming.subscribe('events', Collector())
+        self.assertEqual(self.streaming.publish_many('events', [{'n': i} for i in range(8)]), 5)
+        self.assertFalse(self.streaming.publish('events', {'n': 8}))
+        self.assertEqual(self.streaming.get_stream_metrics('events')['groups'][DEFAULT_GROUP]['lag'], 5)
+    
+    def test_tumbling_window_with_watermark(self):
+        """测试滚动窗口在水位线越过结束时间时输出，迟到记录计数后丢弃"""
+        self.streaming.create_stream('readings')
+        aggregated_id = self.streaming.aggregate_stream(
+            'readings', window_size=10, timestamp_field='ts', key_field='sensor', idle_timeout=60,
+            aggregate_func=lambda records: {'total': sum(r.data['value'] for r in records)})
+        output = Collector()
+        self.streaming.subscribe(aggregated_id, output)
+        self.streaming.start_streaming(aggregated_id)
+        
+        self.streaming.publish_many('readings', [
+            {'sensor': 'a', 'ts': 1, 'value': 1},
+            {'sensor': 'b', 'ts': 2, 'value': 10},
+            {'sensor': 'a', 'ts': 8, 'value': 2},
+            {'sensor': 'a', 'ts': 12, 'value': 4},
+        ])
+        self.streaming.start_streaming('readings')
+        self.assertTrue(wait_for(lambda: len(output) == 2))
+        self.streaming.publish('readings', {'sensor': 'a', 'ts': 5, 'value': 100})
+        self.streaming.publish('readings', {'sensor': 'a', 'ts': 25, 'value': 0})
+        self.assertTrue(wait_for(lambda: len(output) == 3))
+        
+        results = sorted((r.metadata['key'], r.metadata['window_start'].timestamp() % 86400, r.data['total'])
+                         for r in output.items)
+        self.assertEqual(results, [('a', 0, 3), ('a', 10, 4), ('b', 0, 10)])
+        windows = self.streaming.get_stream_metrics('readings')['groups'][DEFAULT_GROUP]['windows']
+        self.assertEqual((windows['late_records'], windows['gap_records']), (1, 0))
+        self.assertEqual(windows['open_windows'], 1)
+    
+    def test_watermark_tracks_slowest_partition(self):
+        """测试各分区进度不一时水位线取最慢分区，有序数据不产生迟到记录"""
+        self.streaming.create_stream('readings', partitions=4, partition_key='k', buffer_size=20000)
+        aggregated_id = self.streaming.aggregate_stream(
+            'readings', window_size=10, allowed_lateness=5, timestamp_field='t', key_field='k', idle_timeout=60,
+            aggregate_func=lambda records: {'count': len(records)})
+        output = Collector()
+        self.streaming.subscribe(aggregated_id, output)
+        self.streaming.start_streaming(aggregated_id)
+        data = [{'k': i % 16, 't': i / 100} for i in range(20000)]
+        self.assertEqual(self.streaming.publish_many('readings', data), 20000)
+        self.streaming.start_streaming('readings')
+        metrics = lambda: self.streaming.get_stream_metrics('readings')['groups'][DEFAULT_GROUP]
+        self.assertTrue(wait_for(lambda: sum(p['processed'] for p in metrics()['partitions']) == 20000, timeout=30))
+        windows = metrics()['windows']
+        self.assertEqual(windows['late_records'], 0)
+        self.assertEqual((windows['emitted_windows'], windows['open_windows']), (16 * 19, 16))
+        self.assertTrue(wait_for(lambda: len(output) == 16 * 19))
+        self.assertEqual(sum(r.data['count'] for r in output.items), 19000)
+    
+    def test_sliding_window_gap_records(self):
+        """测试slide大于window_size时间隙中的记录不计为迟到"""
+        self.streaming.create_stream('readings')
+        self.streaming.aggregate_stream('readings', window_size=5, slide=10, timestamp_field='ts',
+                                        idle_timeout=60, aggregate_func=lambda records: {'count': len(records)})
+        self.streaming.publish_many('readings', [{'ts': ts} for ts in (1, 4, 7, 12, 18)])
+        self.streaming.start_streaming('readings')
+        metrics = lambda: self.streaming.get_stream_metrics('readings')['groups'][DEFAULT_GROUP]
+        self.assertTrue(wait_for(lambda: metrics()['partitions'][0]['processed'] == 5))
+        windows = metrics()['windows']
+        self.assertEqual((windows['late_records'], windows['gap_records']), (0, 2))
+        self.assertEqual(windows['emitted_windows'], 2)
+    
+    def test_streams_queue_view(self):
+        """测试streams保持流ID到队列的映射接口"""
+        self.streaming.create_stream('events', partitions=2)
+        self.assertIn('events', self.streaming.streams)
+        self.assertEqual(list(self.streaming.streams), ['events'])
+        stream_queue = self.streaming.streams['events']
+        self.assertTrue(stream_queue.empty())
+        self.assertEqual(stream_queue.maxsize, 200)
+        
+        stream_queue.put({'n': 1})
+        stream_queue.put(StreamRecord('r', {'n': 2}, None, {'source': 'test'}))
+        self.assertEqual(stream_queue.qsize(), 2)
+        records = [stream_queue.get(timeout=1), stream_queue.get_nowait()]
+        self.assertEqual(sorted(r.data['n'] for r in records), [1, 2])
+        with self.assertRaises(queue.Empty):
+            stream_queue.get(timeout=0.05)
+        with self.assertRaises(KeyError):
+            self.streaming.streams['missing']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+数据转换引擎测试
+
+验证编译后的批量管道与逐条transform结果一致
+"""
+
+import enum
+import multiprocessing
+import unittest
+
+from data_transformation.data_transformation_engine import (
+    CompiledPipeline,
+    DataTransformationEngine,
+    _freeze
+)
+
+
+def format_name(value):
+    return value.strip().title() if value else value
+
+
+def total_price(record):
+    return record['price'] * record['quantity']
+
+
+def is_positive(value):
+    return value is not None and value > 0
+
+
+def tag_city(value, record):
+    return f"{value}-{record['status']}"
+
+
+RULES = [
+    {'rule_id': 'cast_int', 'transformation_type': 'type_cast', 'source_field': 'quantity',
+     'rule_config': {'target_type': 'integer'}},
+    {'rule_id': 'cast_float', 'transformation_type': 'type_cast', 'source_field': 'price',
+     'rule_config': {'target_type': 'float'}},
+    {'rule_id': 'cast_str', 'transformation_type': 'type_cast', 'source_field': 'id',
+     'target_field': 'id_text', 'rule_config': {'target_type': 'string'}},
+    {'rule_id': 'cast_bool', 'transformation_type': 'type_cast', 'source_field': 'vip',
+     'rule_config': {'target_type': 'boolean'}},
+    {'rule_id': 'cast_unknown', 'transformation_type': 'type_cast', 'source_field': 'status',
+     'target_field': 'status_copy', 'rule_config': {'target_type': 'decimal'}},
+    {'rule_id': 'map_default', 'transformation_type': 'value_map', 'source_field': 'status',
+     'target_field': 'status_code', 'rule_config': {'value_map': {'paid': 1, 'shipped': 2}, 'default_value': 0}},
+    {'rule_id': 'map_passthrough', 'transformation_type': 'value_map', 'source_field': 'city',
+     'rule_config': {'value_map': {'bj': 'Beijing'}}},
+    {'rule_id': 'format', 'transformation_type': 'format_convert', 'source_field': 'name',
+     'rule_config': {'formatter': format_name}},
+    {'rule_id': 'calculate', 'transformation_type': 'calculate', 'source_field': 'price',
+     'target_field': 'total', 'rule_config': {'formula': total_price}},
+    {'rule_id': 'filter', 'transformation_type': 'filter', 'source_field': 'discount',
+     'target_field': 'valid_discount', 'rule_config': {'filter': is_positive}},
+    {'rule_id': 'custom', 'transformation_type': 'custom', 'source_field': 'city',
+     'target_field': 'city_tag', 'rule_config': {'transform': tag_city}},
+    {'rule_id': 'aggregate', 'transformation_type': 'aggregate', 'source_field': 'price',
+     'target_field': 'price_copy', 'rule_config': {}},
+    {'rule_id': 'join', 'transformation_type': 'join', 'source_field': 'id',
+     'target_field': 'join_key', 'rule_config': {}},
+    {'rule_id': 'no_function', 'transformation_type': 'custom', 'source_field': 'name',
+     'target_field': 'name_copy', 'rule_config': {}},
+    {'rule_id': 'disabled', 'transformation_type': 'type_cast', 'source_field': 'id',
+     'target_field': 'never', 'rule_config': {'target_type': 'string'}, 'enabled': False},
+]
+
+
+class Field(enum.Enum):
+    """repr不是合法Python表达式的字段名"""
+    PRICE = 'price'
+    TOTAL = 'total'
+
+
+def generate_records(count):
+    """生成测试记录，部分记录触发转换失败或空值分支"""
+    statuses = ['paid', 'shipped', 'created']
+    return [
+        {
+            'id': i,
+            'quantity': 'bad' if i % 11 == 0 else str(i % 5),
+            'price': None if i % 13 == 0 else i * 1.5,
+            'vip': None if i % 3 == 0 else i % 2,
+            'status': statuses[i % 3],
+            'city': 'bj' if i % 2 else 'sh',
+            'name': f"  user {i} ",
+            'discount': i % 4 - 1,
+        }
+        for i in range(count)
+    ]
+
+
+class TestCompiledPipeline(unittest.TestCase):
+    """编译管道测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.engine = DataTransformationEngine()
+        for rule in RULES:
+            self.engine.add_rule(rule)
+        self.records = generate_records(300)
+    
+    def expected(self, rule_ids=None):
+        reference = DataTransformationEngine()
+        reference.rules = self.engine.rules
+        return [reference.transform(record, rule_ids) for record in self.records]
+    
+    def test_matches_transform_for_every_rule_type(self):
+        """测试每种规则类型的批量结果与transform一致"""
+        for rule in RULES:
+            with self.subTest(rule=rule['rule_id']):
+                rule_ids = [rule['rule_id']]
+                self.assertEqual(self.engine.batch_transform(self.records, rule_ids), self.expected(rule_ids))
+    
+    def test_matches_transform_for_rule_set(self):
+        """测试完整规则集（含失败与禁用规则）的批量结果与transform一致"""
+        self.assertEqual(self.engine.batch_transform(self.records), self.expected())
+        failures = [r for r in self.engine.transformation_history if not r.success]
+        self.assertTrue(failures)
+        self.assertTrue(all(r.rule_id in ('cast_int', 'calculate') for r in failures))
+    
+    def test_thread_pool_matches_transform(self):
+        """测试线程池分块并行保持顺序与结果"""
+        result = self.engine.batch_transform(self.records, max_workers=3, chunk_size=40)
+        self.assertEqual(result, self.expected())
+    
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "需要fork启动方式")
+    def test_process_pool_matches_transform(self):
+        """测试进程池分块并行保持顺序、结果与失败记录"""
+        result = self.engine.batch_transform(self.records, max_workers=2, chunk_size=64, use_processes=True)
+        self.assertEqual(result, self.expected())
+        sequential = DataTransformationEngine()
+        sequential.rules = self.engine.rules
+        sequential.batch_transform(self.records)
+        self.assertEqual([(r.rule_id, r.input_data) for r in self.engine.transformation_history],
+                         [(r.rule_id, r.input_data) for r in sequential.transformation_history])
+    
+    def test_pipeline_cache_tracks_config_changes(self):
+        """测试修改规则配置（包括1与True这类相等的值）后重新编译"""
+        self.engine.rules['map_default'].rule_config['default_value'] = 1
+        pipeline = self.engine.compile(['map_default'])
+        self.assertIsInstance(pipeline, CompiledPipeline)
+        self.assertIs(self.engine.compile(['map_default']), pipeline)
+        self.assertEqual(self.engine.batch_transform([{'status': 'created'}], ['map_default']),
+                         [{'status': 'created', 'status_code': 1}])
+        
+        self.engine.rules['map_default'].rule_config['default_value'] = True
+        result = self.engine.batch_transform([{'status': 'created'}], ['map_default'])
+        self.assertIs(result[0]['status_code'], True)
+        self.assertIs(self.engine.transform({'status': 'created'}, ['map_default'])['status_code'], True)
+        self.assertIsNot(self.engine.compile(['map_default']), pipeline)
+    
+    def test_field_names_are_bound_as_constants(self):
+        """测试字段名作为常量绑定，repr不可求值或含引号的字段名也能编译"""
+        engine = DataTransformationEngine()
+        engine.add_rule({'rule_id': 'enum_field', 'transformation_type': 'type_cast', 'source_field': Field.PRICE,
+                         'target_field': Field.TOTAL, 'rule_config': {'target_type': 'float'}})
+        engine.add_rule({'rule_id': 'quoted_field', 'transformation_type': 'type_cast', 'source_field': "it's",
+                         'target_field': 'a"b', 'rule_config': {'target_type': 'integer'}})
+        records = [{Field.PRICE: '2.5', "it's": '3'}]
+        self.assertEqual(engine.batch_transform(records), [engine.transform(record) for record in records])
+        self.assertEqual(engine.batch_transform(records)[0][Field.TOTAL], 2.5)
+        self.assertEqual(engine.batch_transform(records)[0]['a"b'], 3)
+    
+    def test_freeze_distinguishes_equal_scalars_of_different_types(self):
+        """测试指纹区分1、1.0与True"""
+        fingerprints = {_freeze(1), _freeze(1.0), _freeze(True), _freeze({1: 'a'}), _freeze({True: 'a'})}
+        self.assertEqual(len(fingerprints), 5)
+        self.assertEqual(_freeze({'a': [1, (2, 'x')]}), _freeze({'a': [1, (2, 'x')]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
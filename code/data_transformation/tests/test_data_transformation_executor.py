@@ -0,0 +1,96 @@
+"""
+数据转换执行器测试
+
+验证任务堆的优先级与先进先出顺序、事件驱动唤醒以及进程池模式的超时回收
+"""
+
+import functools
+import multiprocessing
+import threading
+import time
+import unittest
+
+from data_transformation.data_transformation_executor import (
+    DataTransformationExecutor,
+    ExecutionStatus
+)
+from data_transformation.tests import wait_for
+
+
+class TestDataTransformationExecutor(unittest.TestCase):
+    """数据转换执行器测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.executor = DataTransformationExecutor(max_workers=1)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.executor.stop_executor()
+    
+    def test_priority_then_fifo_order(self):
+        """测试高优先级先执行，同优先级按提交顺序执行"""
+        order = []
+        submissions = [('low_1', 'low'), ('normal_1', 'normal'), ('critical_1', 'critical'),
+                       ('normal_2', 'normal'), ('high_1', 'high'), ('low_2', 'low'),
+                       ('critical_2', 'critical'), ('normal_3', 'normal')]
+        for task_id, priority in submissions:
+            self.executor.submit_task({
+                'task_id': task_id,
+                'task_func': functools.partial(order.append, task_id),
+                'priority': priority
+            })
+        
+        self.executor.start_executor()
+        self.assertTrue(wait_for(lambda: len(order) == len(submissions)))
+        self.assertEqual(order, ['critical_1', 'critical_2', 'high_1', 'normal_1',
+                                 'normal_2', 'normal_3', 'low_1', 'low_2'])
+    
+    def test_idle_worker_wakes_on_submit(self):
+        """测试空闲的工作线程在提交时立即被唤醒"""
+        self.executor.start_executor()
+        time.sleep(0.2)
+        done = threading.Event()
+        submitted_at = time.perf_counter()
+        self.executor.submit_task({'task_id': 'wake', 'task_func': done.set})
+        self.assertTrue(done.wait(1.0))
+        self.assertLess(time.perf_counter() - submitted_at, 0.05)
+        self.assertTrue(wait_for(lambda: self.executor.get_executor_stats()['successful_executions'] == 1))
+    
+    def test_retry_requeues_failed_task(self):
+        """测试失败任务按max_retries重新入队"""
+        attempts = []
+        
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ValueError("暂时失败")
+            return len(attempts)
+        
+        self.executor.submit_task({'task_id': 'flaky', 'task_func': flaky, 'max_retries': 2})
+        self.executor.start_executor()
+        self.assertTrue(wait_for(lambda: self.executor.execution_history))
+        result = self.executor.execution_history[0]
+        self.assertEqual(result.status, ExecutionStatus.COMPLETED)
+        self.assertEqual((result.result, result.retry_count), (3, 2))
+    
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "需要fork启动方式")
+    def test_process_timeout_frees_worker(self):
+        """测试进程池模式下超时任务的工作进程被回收，后续任务不被阻塞"""
+        executor = DataTransformationExecutor(max_workers=1, use_processes=True)
+        self.addCleanup(executor.stop_executor)
+        executor.start_executor()
+        executor.submit_task({'task_id': 'slow', 'task_func': functools.partial(time.sleep, 30),
+                              'timeout': 0.5})
+        executor.submit_task({'task_id': 'quick', 'task_func': functools.partial(pow, 2, 10),
+                              'timeout': 10})
+        
+        self.assertTrue(wait_for(lambda: len(executor.execution_history) == 2, timeout=15))
+        results = {r.task_id: r for r in executor.execution_history}
+        self.assertEqual(results['slow'].status, ExecutionStatus.TIMEOUT)
+        self.assertEqual(results['quick'].status, ExecutionStatus.COMPLETED)
+        self.assertEqual(results['quick'].result, 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+数据转换调度器测试
+
+验证定时器堆的触发顺序、错过触发时间的处理策略以及取消、禁用与启用
+"""
+
+import threading
+import time
+import unittest
+
+from data_transformation.data_transformation_scheduler import (
+    DataTransformationScheduler,
+    MisfirePolicy,
+    ScheduleType,
+    TaskStatus
+)
+from data_transformation.tests import wait_for
+
+
+class TestDataTransformationScheduler(unittest.TestCase):
+    """数据转换调度器测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.scheduler = DataTransformationScheduler(max_workers=2)
+        self.runs = []
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.scheduler.stop_scheduler()
+    
+    def record(self, name):
+        return lambda: self.runs.append(name)
+    
+    def test_timer_heap_fires_in_time_order(self):
+        """测试定时器按触发时间而非调度顺序执行"""
+        scheduler = DataTransformationScheduler(max_workers=1)
+        self.addCleanup(scheduler.stop_scheduler)
+        for index in (4, 1, 3, 0, 2):
+            scheduler.schedule_task({
+                'task_id': f"once_{index}",
+                'task_func': self.record(index),
+                'schedule_config': {'delay_seconds': 0.05 * index}
+            })
+        self.assertEqual(scheduler.get_scheduler_stats()['scheduled_timers'], 5)
+        
+        scheduler.start_scheduler()
+        self.assertTrue(wait_for(lambda: len(self.runs) == 5))
+        self.assertEqual(self.runs, [0, 1, 2, 3, 4])
+        self.assertTrue(wait_for(lambda: scheduler.get_scheduler_stats()['running_tasks'] == 0))
+        self.assertTrue(all(t.status == TaskStatus.COMPLETED and t.next_run_time is None
+                            for t in scheduler.tasks.values()))
+        self.assertEqual(scheduler.get_scheduler_stats()['scheduled_timers'], 0)
+    
+    def test_next_base_per_policy(self):
+        """测试各策略下一个计划时间：RUN_ALL顺延，其他策略跳到当前时间之后"""
+        task = self.scheduler.schedule_task({
+            'task_id': 'interval',
+            'task_func': self.record('interval'),
+            'schedule_type': 'interval',
+            'schedule_config': {'interval_seconds': 100}
+        })
+        self.assertEqual(self.scheduler._next_base(task, 0, 50), 100)
+        self.assertEqual(self.scheduler._next_base(task, 0, 350), 400)
+        task.misfire_policy = MisfirePolicy.SKIP
+        self.assertEqual(self.scheduler._next_base(task, 0, 350), 400)
+        task.misfire_policy = MisfirePolicy.RUN_ALL
+        self.assertEqual(self.scheduler._next_base(task, 0, 350), 100)
+        task.schedule_type = ScheduleType.ONCE
+        self.assertIsNone(self.scheduler._next_base(task, 0, 350))
+    
+    def test_misfire_coalesce_runs_once(self):
+        """测试COALESCE错过多个周期只补执行一次"""
+        task = self.scheduler.schedule_task({
+            'task_id': 'coalesce',
+            'task_func': self.record('coalesce'),
+            'schedule_type': 'interval',
+            'schedule_config': {'interval_seconds': 1, 'start_seconds': -3.5}
+        })
+        self.scheduler.start_scheduler()
+        self.assertTrue(wait_for(lambda: task.run_count == 1))
+        time.sleep(0.2)
+        self.assertEqual(self.runs, ['coalesce'])
+        self.assertGreater(task.next_run_time, task.last_run_time)
+    
+    def test_misfire_run_all_catches_up(self):
+        """测试RUN_ALL逐个周期补执行"""
+        task = self.scheduler.schedule_task({
+            'task_id': 'run_all',
+            'task_func': self.record('run_all'),
+            'schedule_type': 'interval',
+            'schedule_config': {'interval_seconds': 1, 'start_seconds': -3.5},
+            'misfire_policy': 'run_all'
+        })
+        self.scheduler.start_scheduler()
+        self.assertTrue(wait_for(lambda: task.run_count == 4))
+        time.sleep(0.2)
+        self.assertEqual(self.runs, ['run_all'] * 4)
+        self.assertEqual(task.missed_runs, 0)
+    
+    def test_misfire_skip_beyond_grace(self):
+        """测试SKIP在延迟超过宽限时间时跳过本次"""
+        task = self.scheduler.schedule_task({
+            'task_id': 'skip',
+            'task_func': self.record('skip'),
+            'schedule_type': 'interval',
+            'schedule_config': {'interval_seconds': 60, 'start_seconds': -5},
+            'misfire_policy': 'skip',
+            'misfire_grace_seconds': 1.0
+        })
+        self.scheduler.start_scheduler()
+        self.assertTrue(wait_for(lambda: task.missed_runs == 1))
+        time.sleep(0.1)
+        self.assertEqual(self.runs, [])
+        self.assertEqual(self.scheduler.get_scheduler_stats()['missed_runs'], 1)
+    
+    def test_cancel_running_task_keeps_cancelled(self):
+        """测试运行中取消的任务执行完后仍为CANCELLED且不再调度"""
+        started = threading.Event()
+        release = threading.Event()
+        
+        def blocking():
+            started.set()
+            release.wait(5)
+            self.runs.append('blocking')
+        
+        task = self.scheduler.schedule_task({
+            'task_id': 'blocking',
+            'task_func': blocking,
+            'schedule_type': 'interval',
+            'schedule_config': {'interval_seconds': 0.05, 'start_seconds': 0},
+            'misfire_policy': 'run_all'
+        })
+        self.scheduler.start_scheduler()
+        self.assertTrue(started.wait(5))
+        time.sleep(0.15)
+        self.assertTrue(self.scheduler.cancel_task('blocking'))
+        release.set()
+        
+        self.assertTrue(wait_for(lambda: self.scheduler.get_scheduler_stats()['running_tasks'] == 0))
+        time.sleep(0.2)
+        self.assertEqual(task.status, TaskStatus.CANCELLED)
+        self.assertIsNone(task.next_run_time)
+        self.assertEqual(self.runs, ['blocking'])
+        self.assertEqual(self.scheduler.execution_history[0].status, TaskStatus.COMPLETED)
+        self.assertFalse(self.scheduler.cancel_task('missing'))
+    
+    def test_disable_parks_and_enable_resumes(self):
+        """测试禁用的任务到期不执行，启用后从原计划时间恢复"""
+        task = self.scheduler.schedule_task({
+            'task_id': 'toggle',
+            'task_func': self.record('toggle'),
+            'schedule_config': {'delay_seconds': 0.05}
+        })
+        self.scheduler.disable_task('toggle')
+        self.scheduler.start_scheduler()
+        self.assertTrue(wait_for(lambda: task.next_run_time is None))
+        time.sleep(0.1)
+        self.assertEqual(self.runs, [])
+        self.assertEqual(self.scheduler.get_scheduler_stats()['enabled_tasks'], 0)
+        
+        self.scheduler.enable_task('toggle')
+        self.assertTrue(wait_for(lambda: self.runs == ['toggle']))
+        self.assertTrue(wait_for(lambda: task.status == TaskStatus.COMPLETED))
+    
+    def test_schedule_disabled_task_then_enable(self):
+        """测试以enabled=False调度的任务在启用后执行"""
+        self.scheduler.schedule_task({
+            'task_id': 'later',
+            'task_func': self.record('later'),
+            'enabled': False
+        })
+        self.scheduler.start_scheduler()
+        time.sleep(0.1)
+        self.assertEqual(self.runs, [])
+        self.scheduler.enable_task('later')
+        self.assertTrue(wait_for(lambda: self.runs == ['later']))
+    
+    def test_rejects_non_positive_interval(self):
+        """测试间隔必须为正数"""
+        with self.assertRaises(ValueError):
+            self.scheduler.schedule_task({
+                'task_func': self.record('bad'),
+                'schedule_type': 'interval',
+                'schedule_config': {'interval_seconds': 0}
+            })
+
+
+if __name__ == '__main__':
+    unittest.main()
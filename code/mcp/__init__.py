@@ -21,7 +21,8 @@ Usage:
 
 from .connection_pool import ConnectionPool, ConnectionPoolConfig, PooledConnection
 from .batch_processor import BatchProcessor, BatchConfig, BatchItem
-from .cache_manager import CacheManager, CacheConfig, CacheStrategy
+from .cache_manager import CacheManager, CacheConfig, CacheStrategy, ShardedMemoryCacheBackend, CountMinSketch
+from .cache_l2 import SQLiteCacheBackend
 
 __version__ = "1.0.0"
 __all__ = [
@@ -37,4 +38,7 @@ __all__ = [
     "CacheManager",
     "CacheConfig",
     "CacheStrategy",
+    "ShardedMemoryCacheBackend",
+    "CountMinSketch",
+    "SQLiteCacheBackend",
 ]
@@ -7,6 +7,9 @@ MCP请求批处理优化模块
 - 优先级队列
 - 批量压缩
 - 自适应批大小
+- 同步处理函数在线程池/进程池中执行，不阻塞事件循环
+- 重复请求合并到进行中的结果
+- 按延迟预算的最早截止时间优先（EDF）调度
 
 示例：
     >>> config = BatchConfig(batch_size=100, flush_interval=0.1)
@@ -17,13 +20,18 @@ MCP请求批处理优化模块
 """
 
 import asyncio
+import hashlib
 import logging
+import math
+import os
+import pickle
 import time
 import zlib
 from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum, IntEnum
-from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar, Union, AsyncIterator
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar, Union, AsyncIterator
 from functools import total_ordering
 import heapq
 
@@ -54,6 +62,7 @@ class BatchItem(Generic[T, R]):
         future: 异步Future对象（用于返回结果）
         id: 唯一标识
         metadata: 额外元数据
+        deadline: 截止时间戳（DEADLINE策略按此排序与组批）
     """
     data: T
     priority: Priority = Priority.NORMAL
@@ -62,6 +71,7 @@ class BatchItem(Generic[T, R]):
     id: int = field(default=0)
     metadata: Dict[str, Any] = field(default_factory=dict)
     retry_count: int = 0
+    deadline: Optional[float] = None
     
     _id_counter: int = 0
     
@@ -107,6 +117,15 @@ class BatchStrategy(Enum):
     TIME_WINDOW = "time_window"         # 时间窗口
     ADAPTIVE = "adaptive"               # 自适应
     PRIORITY_BASED = "priority_based"   # 基于优先级
+    DEADLINE = "deadline"               # 最早截止时间优先（EDF）
+
+
+class ExecutorMode(Enum):
+    """同步处理函数的执行方式（协程处理函数总是在事件循环中执行）"""
+    INLINE = "inline"     # 直接在事件循环中调用
+    THREAD = "thread"     # 线程池
+    PROCESS = "process"   # 进程池，处理函数必须可pickle
+    AUTO = "auto"         # 先在线程池中探测CPU占比，CPU密集且可pickle时切换到进程池
 
 
 @dataclass
@@ -124,11 +143,18 @@ class BatchConfig:
         compression_threshold: 压缩阈值（字节）
         max_retries: 最大重试次数
         retry_delay: 重试延迟（秒）
-        enable_deduplication: 是否启用去重
+        enable_deduplication: 是否启用去重（窗口内的重复请求共享同一结果）
         dedup_window: 去重窗口（秒）
+        dedup_buckets: 去重窗口划分的时间桶数，过期按整桶丢弃
         worker_count: 工作线程数
         queue_capacity: 队列容量
         timeout: 单项超时时间（秒）
+        latency_budget: 未指定时每项的默认延迟预算（秒），DEADLINE策略下截止时间为提交时间加预算
+        executor_mode: 同步处理函数的执行方式
+        executor_workers: 线程池/进程池的工作者数，缺省为CPU数
+        max_inflight_batches: 每个执行器同时执行的批次数上限，缺省为工作者数的两倍
+        auto_probe_batches: AUTO模式下用于探测CPU占比的批次数
+        auto_cpu_threshold: AUTO模式下CPU时间占执行时间的比例达到该值时视为CPU密集
     """
     batch_size: int = 100
     max_batch_size: int = 500
@@ -142,17 +168,68 @@ class BatchConfig:
     retry_delay: float = 1.0
     enable_deduplication: bool = False
     dedup_window: float = 60.0
+    dedup_buckets: int = 4
     worker_count: int = 2
     queue_capacity: int = 10000
     timeout: float = 30.0
+    latency_budget: float = 1.0
+    executor_mode: ExecutorMode = ExecutorMode.INLINE
+    executor_workers: Optional[int] = None
+    max_inflight_batches: Optional[int] = None
+    auto_probe_batches: int = 3
+    auto_cpu_threshold: float = 0.7
     
     def __post_init__(self):
+        if self.executor_workers is not None and self.executor_workers <= 0:
+            raise ValueError("executor_workers must be positive")
+        if self.max_inflight_batches is not None and self.max_inflight_batches <= 0:
+            raise ValueError("max_inflight_batches must be positive")
+        if self.dedup_buckets <= 0:
+            raise ValueError("dedup_buckets must be positive")
+        if self.latency_budget <= 0:
+            raise ValueError("latency_budget must be positive")
         if self.min_batch_size > self.batch_size:
             self.min_batch_size = self.batch_size
         if self.max_batch_size < self.batch_size:
             self.max_batch_size = self.batch_size
 
 
+class LatencyHistogram:
+    """对数分桶的延迟直方图
+    
+    桶边界按2^(1/8)递增（相对误差约9%），记录为O(1)，分位数按累计计数查找。
+    """
+    
+    _BUCKETS_PER_DOUBLING = 8
+    _MIN_VALUE = 1e-6
+    
+    def __init__(self, max_value: float = 3600.0):
+        self._counts = [0] * (self._bucket(max_value) + 1)
+        self.count = 0
+    
+    def _bucket(self, value: float) -> int:
+        if value <= self._MIN_VALUE:
+            return 0
+        return int(math.log2(value / self._MIN_VALUE) * self._BUCKETS_PER_DOUBLING) + 1
+    
+    def record(self, value: float):
+        """记录一个值（秒）"""
+        self._counts[min(self._bucket(value), len(self._counts) - 1)] += 1
+        self.count += 1
+    
+    def percentile(self, percent: float) -> float:
+        """返回分位数（所在桶的上边界），无数据时为0"""
+        if not self.count:
+            return 0.0
+        threshold = math.ceil(self.count * percent / 100)
+        cumulative = 0
+        for bucket, bucket_count in enumerate(self._counts):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return self._MIN_VALUE * 2 ** (bucket / self._BUCKETS_PER_DOUBLING)
+        return self._MIN_VALUE * 2 ** ((len(self._counts) - 1) / self._BUCKETS_PER_DOUBLING)
+
+
 class BatchMetrics:
     """批处理指标统计"""
     
@@ -166,6 +243,9 @@ class BatchMetrics:
         self.avg_batch_size: float = 0.0
         self.avg_processing_time: float = 0.0
         self.avg_wait_time: float = 0.0
+        self.avg_item_latency: float = 0.0
+        self.deadline_misses: int = 0
+        self.queue_wait = LatencyHistogram()
         self.queue_size_history: deque = deque(maxlen=100)
         self._batch_sizes: deque = deque(maxlen=100)
         self._processing_times: deque = deque(maxlen=100)
@@ -189,6 +269,22 @@ class BatchMetrics:
         self.avg_processing_time = sum(self._processing_times) / len(self._processing_times)
         self.avg_wait_time = sum(self._wait_times) / len(self._wait_times)
     
+    def record_queue_waits(self, batch: List[BatchItem], started_at: float):
+        """记录批次中每项的排队等待时间"""
+        for item in batch:
+            self.queue_wait.record(started_at - item.timestamp)
+    
+    def record_deadline_miss(self, count: int = 1):
+        """记录错过截止时间的项数"""
+        self.deadline_misses += count
+    
+    def record_item_latency(self, latency: float, alpha: float = 0.3):
+        """记录执行器实测的单项耗时（指数移动平均）"""
+        if self.avg_item_latency == 0.0:
+            self.avg_item_latency = latency
+        else:
+            self.avg_item_latency += alpha * (latency - self.avg_item_latency)
+    
     def record_failure(self, count: int = 1):
         """记录失败"""
         self.total_failed += count
@@ -217,11 +313,200 @@ class BatchMetrics:
             "avg_batch_size": round(self.avg_batch_size, 2),
             "avg_processing_time": round(self.avg_processing_time, 4),
             "avg_wait_time": round(self.avg_wait_time, 4),
+            "avg_item_latency": round(self.avg_item_latency, 6),
+            "queue_wait_p50": round(self.queue_wait.percentile(50), 6),
+            "queue_wait_p95": round(self.queue_wait.percentile(95), 6),
+            "queue_wait_p99": round(self.queue_wait.percentile(99), 6),
+            "deadline_misses": self.deadline_misses,
             "throughput": round(self.total_processed / (time.time() - self._started_at + 0.001), 2),
             "current_queue_size": self.queue_size_history[-1] if self.queue_size_history else 0,
         }
 
 
+def _canonical(data: Any) -> Any:
+    """规范形式：每个值标注类型（1、1.0与True不相等），dict与集合按元素排序"""
+    if isinstance(data, dict):
+        items = sorted(((_canonical(key), _canonical(value)) for key, value in data.items()), key=repr)
+        return (type(data).__name__, tuple(items))
+    if isinstance(data, (list, tuple)):
+        return (type(data).__name__, tuple(_canonical(value) for value in data))
+    if isinstance(data, (set, frozenset)):
+        return (type(data).__name__, tuple(sorted((_canonical(value) for value in data), key=repr)))
+    return (type(data).__name__, data)
+
+
+def _dedup_key(data: Any) -> Any:
+    """去重键：可哈希的规范形式直接使用，其他数据使用规范形式pickle字节的摘要"""
+    key = _canonical(data)
+    try:
+        hash(key)
+        return key
+    except TypeError:
+        pass
+    try:
+        return hashlib.blake2b(pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).digest()
+    except Exception:
+        return None
+
+
+class _DedupWindow:
+    """按时间分桶轮转的去重窗口
+    
+    窗口划分为若干时间桶，新键写入当前桶；查找依次检查各桶。整桶过期时直接
+    丢弃，插入与过期都是O(1)（按桶数计），不再每次提交重建整个字典。
+    """
+    
+    def __init__(self, window: float, bucket_count: int):
+        self.span = window / bucket_count
+        self.bucket_count = bucket_count
+        # (桶开始时间, 键 -> Future)，最新的桶在右端
+        self._buckets: deque = deque()
+    
+    def _rotate(self, now: float):
+        while self._buckets and now - self._buckets[0][0] >= self.span * self.bucket_count:
+            self._buckets.popleft()
+        if not self._buckets or now - self._buckets[-1][0] >= self.span:
+            self._buckets.append((now, {}))
+    
+    def get(self, key: Any, now: float) -> Optional[asyncio.Future]:
+        """查找窗口内的同键Future"""
+        self._rotate(now)
+        for _, entries in reversed(self._buckets):
+            future = entries.get(key)
+            if future is not None:
+                return future
+        return None
+    
+    def add(self, key: Any, future: asyncio.Future, now: float):
+        """登记Future；失败或取消的Future在完成时移除，后续重复请求重新执行"""
+        self._rotate(now)
+        entries = self._buckets[-1][1]
+        entries[key] = future
+        
+        def forget(done: asyncio.Future):
+            if (done.cancelled() or done.exception() is not None) and entries.get(key) is done:
+                del entries[key]
+        future.add_done_callback(forget)
+    
+    def clear(self):
+        self._buckets.clear()
+    
+    def __len__(self) -> int:
+        return sum(len(entries) for _, entries in self._buckets)
+
+
+# 进程池工作者中的处理函数：通过initializer每个进程只传输一次，之后每批只传输数据
+_process_worker_func: Optional[Callable] = None
+
+
+def _init_process_worker(func: Callable):
+    global _process_worker_func
+    _process_worker_func = func
+
+
+def _run_timed(func: Callable, data_list: List) -> Tuple[List, float, float]:
+    """执行处理函数，返回(结果, 耗时, 本线程CPU时间)"""
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    results = func(data_list)
+    return results, time.perf_counter() - start, time.thread_time() - cpu_start
+
+
+def _run_in_process(data_list: List) -> Tuple[List, float, float]:
+    return _run_timed(_process_worker_func, data_list)
+
+
+class _BatchExecutor:
+    """同步处理函数的执行器
+
+    按ExecutorMode把批次交给线程池或进程池执行，每个执行器用信号量限制在途
+    批次数。执行耗时在工作者中测量，不含排队时间，供自适应批大小使用。
+    """
+    
+    def __init__(self, func: Callable, config: BatchConfig):
+        self.func = func
+        self.config = config
+        self.workers = config.executor_workers or os.cpu_count() or 1
+        self.mode = config.executor_mode
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._probes: List[float] = []
+        
+        if self.mode in (ExecutorMode.PROCESS, ExecutorMode.AUTO) and not self._picklable(func):
+            if self.mode == ExecutorMode.PROCESS:
+                raise ValueError("process_func must be picklable for ExecutorMode.PROCESS")
+            logger.info("process_func is not picklable, AUTO executor mode uses threads")
+            self.mode = ExecutorMode.THREAD
+    
+    @staticmethod
+    def _picklable(func: Callable) -> bool:
+        try:
+            pickle.dumps(func)
+            return True
+        except Exception:
+            return False
+    
+    def _semaphore(self, name: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            limit = self.config.max_inflight_batches or self.workers * 2
+            semaphore = self._semaphores[name] = asyncio.Semaphore(limit)
+        return semaphore
+    
+    def _pool(self, name: str) -> Executor:
+        if name == 'process':
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_process_worker, initargs=(self.func,))
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-worker')
+        return self._thread_pool
+    
+    async def run(self, data_list: List) -> Tuple[List, float]:
+        """执行一个批次
+
+        Returns:
+            (结果列表, 工作者中测量的执行耗时)
+        """
+        if self.mode == ExecutorMode.INLINE:
+            results, elapsed, _ = _run_timed(self.func, data_list)
+            return results, elapsed
+        
+        name = 'process' if self.mode == ExecutorMode.PROCESS else 'thread'
+        loop = asyncio.get_running_loop()
+        async with self._semaphore(name):
+            if name == 'process':
+                results, elapsed, cpu = await loop.run_in_executor(self._pool(name), _run_in_process, data_list)
+            else:
+                results, elapsed, cpu = await loop.run_in_executor(self._pool(name), _run_timed, self.func, data_list)
+        
+        if self.mode == ExecutorMode.AUTO:
+            self._probe(elapsed, cpu)
+        return results, elapsed
+    
+    def _probe(self, elapsed: float, cpu: float):
+        """AUTO模式：累计探测批次的CPU占比，决定使用线程池还是进程池"""
+        self._probes.append(cpu / elapsed if elapsed > 0 else 0.0)
+        if len(self._probes) < self.config.auto_probe_batches:
+            return
+        cpu_ratio = sum(self._probes) / len(self._probes)
+        # 单核上进程池无法并行，线程池已足以让出事件循环
+        if cpu_ratio >= self.config.auto_cpu_threshold and self.workers > 1:
+            self.mode = ExecutorMode.PROCESS
+        else:
+            self.mode = ExecutorMode.THREAD
+        logger.info(f"AUTO executor mode selected {self.mode.value} (cpu ratio {cpu_ratio:.2f})")
+    
+    async def shutdown(self):
+        """关闭线程池与进程池，在后台线程中等待在途批次结束，不阻塞事件循环"""
+        pools = [pool for pool in (self._thread_pool, self._process_pool) if pool is not None]
+        self._thread_pool = self._process_pool = None
+        loop = asyncio.get_running_loop()
+        for pool in pools:
+            await loop.run_in_executor(None, lambda pool=pool: pool.shutdown(wait=True))
+
+
 class BatchProcessor(Generic[T, R]):
     """MCP请求批处理器
     
@@ -278,9 +563,8 @@ class BatchProcessor(Generic[T, R]):
         self._workers: List[asyncio.Task] = []
         self._scheduler_task: Optional[asyncio.Task] = None
         
-        # 去重
-        self._recent_hashes: Dict[int, float] = {}
-        self._dedup_lock: asyncio.Lock = asyncio.Lock()
+        # 去重：窗口内的重复请求共享同一Future
+        self._dedup = _DedupWindow(self.config.dedup_window, self.config.dedup_buckets)
         
         # 指标
         self._metrics = BatchMetrics()
@@ -288,6 +572,11 @@ class BatchProcessor(Generic[T, R]):
         # 自适应调整
         self._current_batch_size: int = self.config.batch_size
         self._performance_history: deque = deque(maxlen=10)
+        
+        # 同步处理函数的执行器
+        self._executor: Optional[_BatchExecutor] = None
+        if not asyncio.iscoroutinefunction(self._process_func):
+            self._executor = _BatchExecutor(self._process_func, self.config)
     
     @staticmethod
     def _default_process_func(items: List[T]) -> List[R]:
@@ -349,6 +638,9 @@ class BatchProcessor(Generic[T, R]):
         # 处理剩余项目
         await self._drain_remaining()
         
+        if self._executor is not None:
+            await self._executor.shutdown()
+        
         logger.info("Batch processor stopped")
     
     async def _wait_for_empty(self):
@@ -379,14 +671,19 @@ class BatchProcessor(Generic[T, R]):
         self,
         data: T,
         priority: Priority = Priority.NORMAL,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        latency_budget: Optional[float] = None
     ) -> R:
         """提交单个请求
         
+        启用去重时，去重窗口内与已提交请求相同的数据不再入队，而是等待并返回
+        该请求的结果；失败的请求不会被后续重复请求复用。
+        
         Args:
             data: 请求数据
             priority: 优先级
             metadata: 元数据
+            latency_budget: 延迟预算（秒），缺省为配置的latency_budget
             
         Returns:
             处理结果
@@ -398,17 +695,20 @@ class BatchProcessor(Generic[T, R]):
         if not self._is_running:
             raise RuntimeError("Batch processor is not running")
         
-        # 去重检查
+        # 去重检查：合并到进行中（或窗口内已完成）的请求
+        dedup_key = None
         if self.config.enable_deduplication:
-            if await self._check_duplicate(data):
+            now = time.time()
+            dedup_key = _dedup_key(data)
+            existing = self._dedup.get(dedup_key, now) if dedup_key is not None else None
+            if existing is not None:
                 self._metrics.record_dedup()
-                raise ValueError("Duplicate request detected")
+                # shield：本调用超时不取消其他调用方共享的Future
+                return await asyncio.wait_for(asyncio.shield(existing), timeout=self.config.timeout)
         
-        item = BatchItem(
-            data=data,
-            priority=priority,
-            metadata=metadata or {}
-        )
+        item = self._new_item(data, priority, metadata, latency_budget)
+        if dedup_key is not None:
+            self._dedup.add(dedup_key, item.future, item.timestamp)
         
         self._metrics.record_submit()
         
@@ -417,7 +717,7 @@ class BatchProcessor(Generic[T, R]):
             self._emergency_queue.append(item)
             self._flush_event.set()
         else:
-            await self._queue.put((priority.value, item))
+            await self._enqueue(item)
         
         self._metrics.update_queue_size(self._queue.qsize() + len(self._emergency_queue))
         
@@ -433,22 +733,24 @@ class BatchProcessor(Generic[T, R]):
     async def submit_many(
         self,
         items: List[T],
-        priority: Priority = Priority.NORMAL
+        priority: Priority = Priority.NORMAL,
+        latency_budget: Optional[float] = None
     ) -> List[R]:
         """批量提交请求
         
         Args:
             items: 请求数据列表
             priority: 优先级
+            latency_budget: 每项的延迟预算（秒），缺省为配置的latency_budget
             
         Returns:
             结果列表
         """
         futures = []
         for data in items:
-            item = BatchItem(data=data, priority=priority)
+            item = self._new_item(data, priority, None, latency_budget)
             self._metrics.record_submit()
-            await self._queue.put((priority.value, item))
+            await self._enqueue(item)
             futures.append(item.future)
         
         self._metrics.update_queue_size(self._queue.qsize())
@@ -457,27 +759,20 @@ class BatchProcessor(Generic[T, R]):
         results = await asyncio.gather(*futures, return_exceptions=True)
         return results  # type: ignore
     
-    async def _check_duplicate(self, data: T) -> bool:
-        """检查是否为重复请求"""
-        try:
-            data_hash = hash(str(data))
-        except Exception:
-            return False
-        
-        async with self._dedup_lock:
-            now = time.time()
-            
-            # 清理过期记录
-            self._recent_hashes = {
-                h: t for h, t in self._recent_hashes.items()
-                if now - t < self.config.dedup_window
-            }
-            
-            if data_hash in self._recent_hashes:
-                return True
-            
-            self._recent_hashes[data_hash] = now
-            return False
+    def _new_item(self, data: T, priority: Priority, metadata: Optional[Dict[str, Any]],
+                  latency_budget: Optional[float]) -> BatchItem:
+        """创建批处理项，截止时间为提交时间加延迟预算"""
+        item = BatchItem(data=data, priority=priority, metadata=metadata or {})
+        item.deadline = item.timestamp + (latency_budget if latency_budget is not None
+                                          else self.config.latency_budget)
+        return item
+    
+    async def _enqueue(self, item: BatchItem):
+        """入队：DEADLINE策略按截止时间排序，其他策略按优先级排序"""
+        if self.config.strategy == BatchStrategy.DEADLINE:
+            await self._queue.put((item.deadline, item))
+        else:
+            await self._queue.put((item.priority.value, item))
     
     async def _scheduler_loop(self):
         """调度器循环 - 基于时间窗口触发刷新"""
@@ -502,9 +797,14 @@ class BatchProcessor(Generic[T, R]):
             await self._process_batch(batch)
     
     async def _collect_batch(self) -> List[BatchItem]:
-        """收集批次"""
+        """收集批次
+        
+        DEADLINE策略下，批次在最早截止时间减去预计执行时间（实测单项耗时乘以
+        批大小）之前关闭，保证批内最紧的请求仍能按时完成。
+        """
         batch: List[BatchItem] = []
         batch_size = self._current_batch_size
+        edf = self.config.strategy == BatchStrategy.DEADLINE
         
         # 首先处理紧急队列
         while self._emergency_queue and len(batch) < batch_size:
@@ -512,12 +812,16 @@ class BatchProcessor(Generic[T, R]):
         
         # 从主队列收集
         deadline = time.time() + self.config.max_wait_time
+        if edf and batch:
+            deadline = min(deadline, self._batch_close_time(batch))
         
         while len(batch) < batch_size and time.time() < deadline:
             try:
                 timeout = max(0, deadline - time.time())
                 _, item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
                 batch.append(item)
+                if edf:
+                    deadline = min(deadline, self._batch_close_time(batch))
             except asyncio.TimeoutError:
                 break
             except Exception as e:
@@ -526,6 +830,15 @@ class BatchProcessor(Generic[T, R]):
         
         return batch
     
+    def _batch_close_time(self, batch: List[BatchItem]) -> float:
+        """批次最晚的关闭时间：最早截止时间减去再加一项后的预计执行时间
+
+        预计执行时间至少按一个刷新间隔计，为调度本身留出余量。
+        """
+        earliest = min((item.deadline for item in batch if item.deadline is not None), default=math.inf)
+        projected = self._metrics.avg_item_latency * (len(batch) + 1)
+        return earliest - max(projected, self.config.flush_interval)
+    
     async def _worker_loop(self, worker_id: int):
         """工作线程循环"""
         logger.debug(f"Worker {worker_id} started")
@@ -559,6 +872,7 @@ class BatchProcessor(Generic[T, R]):
             return
         
         start_time = time.time()
+        self._metrics.record_queue_waits(batch, start_time)
         
         try:
             # 提取数据
@@ -569,20 +883,27 @@ class BatchProcessor(Generic[T, R]):
                 data_list = await self._compress_batch(data_list)
             
             # 执行处理
-            results = await self._execute_with_retry(data_list)
+            results, execution_time = await self._execute_with_retry(data_list)
             
             # 分发结果
+            finished_at = time.time()
+            misses = 0
             for item, result in zip(batch, results):
                 item.set_result(result)
+                if item.deadline is not None and finished_at > item.deadline:
+                    misses += 1
+            if misses:
+                self._metrics.record_deadline_miss(misses)
             
             # 记录指标
             processing_time = time.time() - start_time
             wait_time = start_time - batch[0].timestamp if batch else 0
             self._metrics.record_process(len(batch), processing_time, wait_time)
+            self._metrics.record_item_latency(execution_time / len(batch))
             
             # 自适应调整
             if self.config.strategy == BatchStrategy.ADAPTIVE:
-                await self._adapt_batch_size(processing_time, len(batch))
+                await self._adapt_batch_size(execution_time, len(batch))
                 
         except Exception as e:
             logger.error(f"Batch processing error: {e}")
@@ -596,16 +917,21 @@ class BatchProcessor(Generic[T, R]):
         # 简化实现：实际应根据数据类型进行压缩
         return data_list
     
-    async def _execute_with_retry(self, data_list: List[T]) -> List[R]:
-        """带重试的执行"""
+    async def _execute_with_retry(self, data_list: List[T]) -> Tuple[List[R], float]:
+        """带重试的执行
+        
+        Returns:
+            (结果列表, 成功那次尝试的执行耗时)
+        """
         last_exception = None
         
         for attempt in range(self.config.max_retries):
             try:
-                if asyncio.iscoroutinefunction(self._process_func):
-                    return await self._process_func(data_list)
-                else:
-                    return self._process_func(data_list)
+                if self._executor is not None:
+                    return await self._executor.run(data_list)
+                start = time.perf_counter()
+                results = await self._process_func(data_list)
+                return results, time.perf_counter() - start
             except Exception as e:
                 last_exception = e
                 if attempt < self.config.max_retries - 1:
@@ -614,27 +940,27 @@ class BatchProcessor(Generic[T, R]):
         
         raise last_exception or RuntimeError("All retry attempts failed")
     
-    async def _adapt_batch_size(self, processing_time: float, batch_size: int):
+    async def _adapt_batch_size(self, execution_time: float, batch_size: int):
         """自适应调整批大小
         
-        根据处理时间动态调整批大小以优化吞吐量。
+        根据执行器实测的单项耗时（不含排队与重试等待）估算当前批大小的执行时间，
+        动态调整批大小以优化吞吐量。
         """
-        self._performance_history.append((batch_size, processing_time))
+        self._performance_history.append((batch_size, execution_time))
         
         if len(self._performance_history) < 5:
             return
         
-        # 计算最近效率
-        recent_throughput = sum(s / max(t, 0.001) for s, t in self._performance_history) / len(self._performance_history)
+        projected_time = self._metrics.avg_item_latency * self._current_batch_size
         
         # 如果处理时间太长，减小批大小
-        if processing_time > self.config.flush_interval * 2:
+        if projected_time > self.config.flush_interval * 2:
             self._current_batch_size = max(
                 self.config.min_batch_size,
                 int(self._current_batch_size * 0.9)
             )
         # 如果处理时间很短且队列积压，增加批大小
-        elif processing_time < self.config.flush_interval * 0.5 and self._queue.qsize() > batch_size:
+        elif projected_time < self.config.flush_interval * 0.5 and self._queue.qsize() > batch_size:
             self._current_batch_size = min(
                 self.config.max_batch_size,
                 int(self._current_batch_size * 1.1)
@@ -642,7 +968,10 @@ class BatchProcessor(Generic[T, R]):
     
     def get_metrics(self) -> Dict[str, Any]:
         """获取指标"""
-        return self._metrics.to_dict()
+        metrics = self._metrics.to_dict()
+        metrics["executor_mode"] = self._executor.mode.value if self._executor is not None else "async"
+        metrics["current_batch_size"] = self._current_batch_size
+        return metrics
     
     def get_queue_size(self) -> int:
         """获取队列大小"""
@@ -660,38 +989,137 @@ class StreamingBatchProcessor(BatchProcessor):
     """流式批处理器
     
     支持流式处理的批处理器，适用于大数据量场景。
+    
+    读取输入与处理批次流水线进行：后台任务从上游迭代器读取并组批，批次并发
+    处理，结果按输入顺序（或完成顺序）交给消费者。在途与已完成未消费的批次数
+    有上限，消费者慢时读取任务阻塞在上限处，上游迭代器随之被限流。
     """
     
     async def submit_stream(
         self,
         data_stream: AsyncIterator[T],
-        priority: Priority = Priority.NORMAL
+        priority: Priority = Priority.NORMAL,
+        ordered: bool = True,
+        max_inflight_batches: Optional[int] = None,
+        return_exceptions: bool = False
     ) -> AsyncIterator[R]:
         """提交流式数据
         
+        批次满或输入停顿超过flush_interval时提交当前批次。
+        
         Args:
             data_stream: 数据流
             priority: 优先级
+            ordered: 是否按输入顺序返回结果，否则按批次完成顺序返回
+            max_inflight_batches: 在途与待消费批次数上限，缺省为配置的
+                max_inflight_batches，未配置时为worker_count + 1
+            return_exceptions: 失败项是否以异常对象的形式返回并继续处理；
+                否则在返回失败项之前的结果后抛出该异常
             
         Yields:
             处理结果
         """
+        limit = max_inflight_batches or self.config.max_inflight_batches or self.config.worker_count + 1
+        slots = asyncio.Semaphore(limit)
+        # 有序模式下按提交顺序放入批次任务，无序模式下按完成顺序放入；None表示结束
+        batches: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(self._produce_stream(data_stream, priority, slots, batches, ordered))
+        
+        try:
+            while True:
+                task = await batches.get()
+                if task is None:
+                    break
+                for item in await task:
+                    if item.future.cancelled():
+                        error: Optional[BaseException] = asyncio.CancelledError()
+                    else:
+                        error = item.future.exception()
+                    if error is None:
+                        yield item.future.result()
+                    elif return_exceptions:
+                        yield error  # type: ignore
+                    else:
+                        raise error
+                slots.release()
+            # 上游迭代器的异常在所有已读数据的结果返回后抛出
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+    
+    async def _produce_stream(
+        self,
+        data_stream: AsyncIterator[T],
+        priority: Priority,
+        slots: asyncio.Semaphore,
+        batches: asyncio.Queue,
+        ordered: bool
+    ):
+        """读取上游并提交批次，结束（或出错）后放入结束标记"""
+        iterator = data_stream.__aiter__()
         buffer: List[BatchItem] = []
+        pending: set = set()
+        next_data: Optional[asyncio.Future] = None
         
-        async for data in data_stream:
-            item = BatchItem(data=data, priority=priority)
-            buffer.append(item)
+        async def launch(items: List[BatchItem]):
+            # 背压：上限内的批次都未被消费时在此等待，不再读取上游
+            await slots.acquire()
+            task = asyncio.ensure_future(self._run_stream_batch(items))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            if ordered:
+                batches.put_nowait(task)
+            else:
+                task.add_done_callback(batches.put_nowait)
+        
+        try:
+            while True:
+                if next_data is None:
+                    next_data = asyncio.ensure_future(iterator.__anext__())
+                done, _ = await asyncio.wait({next_data}, timeout=self.config.flush_interval if buffer else None)
+                if not done:
+                    # 输入停顿，先提交已缓冲的部分批次
+                    await launch(buffer)
+                    buffer = []
+                    continue
+                
+                try:
+                    data = next_data.result()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    # 上游出错：已读取的数据照常提交，结果返回后再抛出异常
+                    if buffer:
+                        await launch(buffer)
+                        buffer = []
+                    raise
+                finally:
+                    next_data = None
+                
+                buffer.append(self._new_item(data, priority, None, None))
+                self._metrics.record_submit()
+                if len(buffer) >= self._current_batch_size:
+                    await launch(buffer)
+                    buffer = []
             
-            if len(buffer) >= self._current_batch_size:
-                await self._process_batch(buffer)
-                for item in buffer:
-                    if item.future.done():
-                        yield await item.future
-                buffer.clear()
-        
-        # 处理剩余
-        if buffer:
-            await self._process_batch(buffer)
-            for item in buffer:
-                if item.future.done():
-                    yield await item.future
+            if buffer:
+                await launch(buffer)
+        finally:
+            if next_data is not None:
+                next_data.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            batches.put_nowait(None)
+    
+    async def _run_stream_batch(self, items: List[BatchItem]) -> List[BatchItem]:
+        """处理一个流式批次，处理函数少返回的项标记为失败"""
+        await self._process_batch(items)
+        for item in items:
+            if not item.future.done():
+                item.set_exception(RuntimeError(f"No result returned for item {item.id}"))
+            elif not item.future.cancelled():
+                # 标记异常已取出：未被消费的失败项不触发未处理异常告警
+                item.future.exception()
+        return items
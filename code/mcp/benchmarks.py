@@ -0,0 +1,441 @@
+"""
+MCP性能优化模块基准
+
+提供缓存、批处理等组件热点路径的基准测试，用法：
+    python -m mcp.benchmarks cache_backend --count 200000
+    python -m mcp.benchmarks cache_policies --count 200000 [--trace keys.txt]
+    python -m mcp.benchmarks bloom --count 200000
+    python -m mcp.benchmarks snapshot --count 200000
+    python -m mcp.benchmarks l2 --count 20000
+    python -m mcp.benchmarks batch_executor --count 2000
+    python -m mcp.benchmarks connection_pool --count 20000
+"""
+
+import argparse
+import asyncio
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .batch_processor import BatchConfig, BatchProcessor, BatchStrategy, ExecutorMode
+from .connection_pool import ConnectionPool, ConnectionPoolConfig
+from .cache_manager import (
+    BloomFilter, CacheConfig, CacheEntry, CacheStats, CacheStrategy, MemoryCacheBackend, MultiLevelCache,
+    ScalableBloomFilter, ShardedMemoryCacheBackend
+)
+
+_REPLAY_POLICIES = (CacheStrategy.LRU, CacheStrategy.LFU, CacheStrategy.FIFO, CacheStrategy.W_TINYLFU)
+
+
+def _report(name: str, count: int, elapsed: float) -> Dict[str, float]:
+    rate = count / elapsed if elapsed > 0 else float('inf')
+    print(f"{name:<36} {count:>10} 次  {elapsed:8.3f} s  {rate:12.0f} 次/秒")
+    return {'count': count, 'seconds': elapsed, 'rate': rate}
+
+
+def zipf_keys(count: int, universe: int, skew: float = 1.1, seed: int = 42) -> List[str]:
+    """生成服从Zipf分布的键序列"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** skew) for rank in range(1, universe + 1)]
+    return [f"schema:{index}" for index in rng.choices(range(universe), weights=weights, k=count)]
+
+
+async def _run_backend(backend, keys: List[str], concurrency: int, write_ratio: float) -> float:
+    """concurrency个任务分摊执行keys上的读写混合负载，返回耗时"""
+    expires_at = time.time() + 3600
+    slices = [keys[i::concurrency] for i in range(concurrency)]
+
+    async def worker(worker_keys: List[str], seed: int):
+        rng = random.Random(seed)
+        for key in worker_keys:
+            if rng.random() < write_ratio or await backend.get(key) is None:
+                await backend.set(key, CacheEntry(key=key, value=key, expires_at=expires_at))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(slice_keys, i) for i, slice_keys in enumerate(slices)))
+    return time.perf_counter() - start
+
+
+def benchmark_cache_backend(count: int = 200000) -> Dict[str, Dict[str, float]]:
+    """
+    对比单锁内存后端与分片后端在1/10/100个并发任务下的吞吐量
+
+    负载为Zipf分布的键上90%读、10%写，未命中时回填。
+
+    Args:
+        count: 操作次数
+
+    Returns:
+        各后端与并发度的基准结果
+    """
+    keys = zipf_keys(count, universe=max(1000, count // 10))
+    results = {}
+    for strategy in (CacheStrategy.LRU, CacheStrategy.LFU):
+        for concurrency in (1, 10, 100):
+            for name, backend_cls, shards in (('memory', MemoryCacheBackend, 1),
+                                              ('sharded', ShardedMemoryCacheBackend, 16)):
+                config = CacheConfig(max_size=max(100, count // 50), strategy=strategy, shard_count=shards)
+                elapsed = asyncio.run(_run_backend(backend_cls(config), keys, concurrency, 0.1))
+                label = f"{name} {strategy.value} x{concurrency}"
+                results[label] = _report(label, count, elapsed)
+    return results
+
+
+def load_trace(path: str) -> List[str]:
+    """读取键访问轨迹文件，每行一次访问，取第一列为键"""
+    with open(path, 'r', encoding='utf-8') as stream:
+        return [line.split()[0] for line in stream if line.strip()]
+
+
+def scan_trace(count: int, universe: int, scan_length: int, seed: int = 42) -> List[str]:
+    """Zipf热点访问中周期性穿插一次性顺序扫描"""
+    hot = zipf_keys(count, universe, seed=seed)
+    keys: List[str] = []
+    scan_id = 0
+    for i, key in enumerate(hot):
+        keys.append(key)
+        if i % (scan_length * 4) == 0:
+            keys.extend(f"scan:{scan_id}:{n}" for n in range(scan_length))
+            scan_id += 1
+    return keys[:count]
+
+
+def replay_trace(keys: Iterable[str], strategy: CacheStrategy, capacity: int) -> CacheStats:
+    """
+    将键访问轨迹回放到指定策略的缓存上，未命中时写入
+
+    Args:
+        keys: 键访问序列
+        strategy: 缓存策略
+        capacity: 缓存容量
+
+    Returns:
+        回放的命中统计
+    """
+    backend = ShardedMemoryCacheBackend(CacheConfig(max_size=capacity, strategy=strategy, shard_count=1))
+    stats = CacheStats()
+    expires_at = time.time() + 86400
+
+    async def replay():
+        for key in keys:
+            if await backend.get(key) is not None:
+                stats.record_hit(0.0)
+            else:
+                stats.record_miss(0.0)
+                await backend.set(key, CacheEntry(key=key, value=None, expires_at=expires_at))
+
+    asyncio.run(replay())
+    stats.evictions = sum(shard['evictions'] for shard in backend.shard_stats())
+    return stats
+
+
+def benchmark_cache_policies(count: int = 200000, trace_path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    在相同轨迹上对比各淘汰策略的命中率
+
+    缺省使用三种合成轨迹：Zipf热点、热点加顺序扫描、略大于容量的循环访问；
+    提供trace_path时回放记录的轨迹。
+
+    Args:
+        count: 合成轨迹的访问次数
+        trace_path: 记录的轨迹文件（可选）
+
+    Returns:
+        轨迹/策略 -> 命中率
+    """
+    capacity = max(100, count // 100)
+    if trace_path:
+        traces = {'recorded': load_trace(trace_path)}
+    else:
+        traces = {
+            'zipf': zipf_keys(count, universe=capacity * 20),
+            'zipf+scan': scan_trace(count, universe=capacity * 20, scan_length=capacity * 2),
+            'loop': [f"loop:{i % (capacity + capacity // 5)}" for i in range(count)],
+        }
+
+    print(f"{'trace':<12}" + ''.join(f"{policy.value:>12}" for policy in _REPLAY_POLICIES) + f"   容量 {capacity}")
+    results = {}
+    for name, keys in traces.items():
+        rates = {}
+        for policy in _REPLAY_POLICIES:
+            rates[policy.value] = replay_trace(keys, policy, capacity).hit_rate
+        print(f"{name:<12}" + ''.join(f"{rates[policy.value]:>12.2%}" for policy in _REPLAY_POLICIES))
+        results[name] = rates
+    return results
+
+
+def benchmark_bloom(count: int = 200000) -> Dict[str, Dict[str, float]]:
+    """
+    布隆过滤器逐个与批量添加/查询的吞吐量，以及实测误判率
+
+    Args:
+        count: 元素数
+
+    Returns:
+        各操作的基准结果
+    """
+    present = [f"schema:{i}" for i in range(count)]
+    absent = [f"missing:{i}" for i in range(count)]
+    results = {}
+
+    bloom = BloomFilter(expected_items=count, fp_rate=0.01)
+    start = time.perf_counter()
+    for key in present:
+        bloom.add_item(key)
+    results['add_item'] = _report('bloom add_item', count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    false_positives = sum(key in bloom for key in absent)
+    results['contains'] = _report('bloom contains', count, time.perf_counter() - start)
+
+    batch = BloomFilter(expected_items=count, fp_rate=0.01)
+    start = time.perf_counter()
+    batch.add_many(present)
+    results['add_many'] = _report('bloom add_many', count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch.contains_many(absent)
+    results['contains_many'] = _report('bloom contains_many', count, time.perf_counter() - start)
+
+    scalable = ScalableBloomFilter(initial_capacity=max(1, count // 16), fp_rate=0.01)
+    start = time.perf_counter()
+    scalable.add_many(present)
+    results['scalable add_many'] = _report('scalable add_many', count, time.perf_counter() - start)
+    scalable_fp = sum(scalable.contains_many(absent))
+
+    print(f"位数组 {len(bloom.bit_array)} 字节，k={bloom.hash_count}，"
+          f"误判率 {false_positives / count:.4f}（可扩展 {len(scalable.filters)} 级：{scalable_fp / count:.4f}）")
+    results['fp_rate'] = {'bloom': false_positives / count, 'scalable': scalable_fp / count}
+    return results
+
+
+def benchmark_snapshot(count: int = 200000) -> Dict[str, Dict[str, float]]:
+    """
+    对比整体pickle持久化与分段快照的写入、启动与首次访问耗时
+
+    Args:
+        count: 缓存条目数
+
+    Returns:
+        各阶段的基准结果
+    """
+    from .cache_snapshot import SnapshotStore
+
+    expires_at = time.time() + 3600
+    data = {f"schema:{i}": {'id': i, 'fields': [f"field_{n}" for n in range(8)]} for i in range(count)}
+    directory = tempfile.mkdtemp(prefix='cache-snapshot-')
+    results = {}
+    try:
+        legacy_path = os.path.join(directory, 'cache.pkl')
+        start = time.perf_counter()
+        with open(legacy_path, 'wb') as f:
+            pickle.dump(data, f)
+        results['pickle dump'] = _report('pickle dump (全量)', count, time.perf_counter() - start)
+        start = time.perf_counter()
+        with open(legacy_path, 'rb') as f:
+            pickle.load(f)
+        results['pickle load'] = _report('pickle load (启动)', count, time.perf_counter() - start)
+
+        store = SnapshotStore(os.path.join(directory, 'segments'))
+        start = time.perf_counter()
+        store.write((key, value, expires_at, None) for key, value in data.items())
+        results['snapshot write'] = _report('snapshot write (全量)', count, time.perf_counter() - start)
+        changed = max(1, count // 100)
+        start = time.perf_counter()
+        store.write((f"schema:{i}", data[f"schema:{i}"], expires_at, None) for i in range(changed))
+        results['snapshot increment'] = _report('snapshot write (1%增量)', changed, time.perf_counter() - start)
+        store.close()
+
+        start = time.perf_counter()
+        store = SnapshotStore(os.path.join(directory, 'segments'))
+        store.get('schema:0')
+        results['snapshot open'] = _report('snapshot open + 首次读取', 1, time.perf_counter() - start)
+
+        keys = [f"schema:{index}" for index in random.Random(42).sample(range(count), min(count, 10000))]
+        start = time.perf_counter()
+        for key in keys:
+            store.get(key)
+        results['snapshot get'] = _report('snapshot get (随机)', len(keys), time.perf_counter() - start)
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def benchmark_l2(count: int = 20000) -> Dict[str, Dict[str, float]]:
+    """
+    SQLite共享L2：同步逐个写入与异步合并写回、顺序读取与并发合并读取的对比
+
+    Args:
+        count: 写入与读取的键数（写入负载中每个键写两次）
+
+    Returns:
+        各模式的基准结果
+    """
+    from .cache_l2 import SQLiteCacheBackend
+
+    directory = tempfile.mkdtemp(prefix='cache-l2-')
+    keys = [f"schema:{i}" for i in range(count)]
+    results = {}
+
+    async def write(write_behind: bool) -> float:
+        l2 = SQLiteCacheBackend(os.path.join(directory, f"l2-{write_behind}.db"))
+        cache = MultiLevelCache(CacheConfig(max_size=count, l2_write_behind=write_behind,
+                                            enable_bloom_filter=False), l2_backend=l2)
+        start = time.perf_counter()
+        for key in keys + keys:
+            await cache.set(key, {'key': key})
+        await cache.flush_l2()
+        elapsed = time.perf_counter() - start
+        await cache.stop()
+        return elapsed
+
+    async def read(concurrency: int) -> float:
+        l2 = SQLiteCacheBackend(os.path.join(directory, "l2-True.db"))
+        slices = [keys[i::concurrency] for i in range(concurrency)]
+
+        async def worker(worker_keys: List[str]):
+            for key in worker_keys:
+                await l2.get(key)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(slice_keys) for slice_keys in slices))
+        elapsed = time.perf_counter() - start
+        await l2.close()
+        return elapsed
+
+    try:
+        results['sync write'] = _report('L2 同步写入', count * 2, asyncio.run(write(False)))
+        results['write-behind'] = _report('L2 异步合并写回', count * 2, asyncio.run(write(True)))
+        for concurrency in (1, 64):
+            label = f"L2 get x{concurrency}"
+            results[label] = _report(label, count, asyncio.run(read(concurrency)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def _cpu_bound_batch(items: List[int]) -> List[int]:
+    """模拟CPU密集的模式转换：每项约0.2毫秒纯计算"""
+    return [sum(i * i for i in range(2000)) + item for item in items]
+
+
+def benchmark_batch_executor(count: int = 2000) -> Dict[str, Dict[str, float]]:
+    """
+    CPU密集同步处理函数在各执行器模式下的吞吐量与事件循环最大停顿
+
+    Args:
+        count: 处理项数
+
+    Returns:
+        各模式的基准结果（含max_loop_stall，秒）
+    """
+    results = {}
+
+    async def run(mode: ExecutorMode) -> Dict[str, float]:
+        config = BatchConfig(batch_size=50, worker_count=4, max_wait_time=0.05, executor_mode=mode,
+                             strategy=BatchStrategy.FIXED_SIZE)
+        processor = BatchProcessor(config, _cpu_bound_batch)
+        stall = 0.0
+
+        async def monitor():
+            nonlocal stall
+            while True:
+                before = time.perf_counter()
+                await asyncio.sleep(0.001)
+                stall = max(stall, time.perf_counter() - before - 0.001)
+
+        await processor.start()
+        monitor_task = asyncio.create_task(monitor())
+        start = time.perf_counter()
+        await processor.submit_many(list(range(count)))
+        elapsed = time.perf_counter() - start
+        monitor_task.cancel()
+        await processor.stop()
+        result = _report(f"batch {mode.value}", count, elapsed)
+        print(f"{'':<36} 事件循环最大停顿 {stall * 1000:8.1f} ms")
+        result['max_loop_stall'] = stall
+        return result
+
+    for mode in (ExecutorMode.INLINE, ExecutorMode.THREAD, ExecutorMode.PROCESS):
+        results[mode.value] = asyncio.run(run(mode))
+    return results
+
+
+def benchmark_connection_pool(count: int = 20000) -> Dict[str, Dict[str, float]]:
+    """
+    连接池获取/释放延迟：各负载均衡策略在不同池大小下的顺序与并发（任务数为池大小两倍）吞吐量，
+    以及多路复用（每个连接8个在途请求）下的吞吐量
+
+    Args:
+        count: 获取/释放次数
+
+    Returns:
+        各场景的基准结果
+    """
+    results = {}
+
+    async def run(strategy: str, size: int, concurrency: int, depth: int = 1) -> float:
+        pool = ConnectionPool(ConnectionPoolConfig(min_connections=size, max_connections=size, enable_warmup=False,
+                                                   load_balance_strategy=strategy, acquire_timeout=60.0,
+                                                   max_inflight_per_connection=depth))
+        await pool.initialize()
+
+        async def worker(iterations: int):
+            for _ in range(iterations):
+                conn = await pool.get_connection()
+                await asyncio.sleep(0)
+                await pool.release(conn)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(count // concurrency) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        await pool.close()
+        return elapsed
+
+    for strategy in ('round_robin', 'least_busy', 'random'):
+        for size in (8, 512):
+            for concurrency in (1, size * 2):
+                label = f"{strategy} pool={size} x{concurrency}"
+                iterations = count // concurrency * concurrency
+                results[label] = _report(label, iterations, asyncio.run(run(strategy, size, concurrency)))
+    for strategy in ('round_robin', 'least_busy'):
+        label = f"{strategy} pool=8 depth=8 x64"
+        results[label] = _report(label, count, asyncio.run(run(strategy, 8, 64, depth=8)))
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[..., Dict]] = {
+    'batch_executor': benchmark_batch_executor,
+    'bloom': benchmark_bloom,
+    'cache_backend': benchmark_cache_backend,
+    'cache_policies': benchmark_cache_policies,
+    'connection_pool': benchmark_connection_pool,
+    'l2': benchmark_l2,
+    'snapshot': benchmark_snapshot,
+}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="MCP性能优化模块基准")
+    parser.add_argument('benchmark', nargs='?', choices=sorted(BENCHMARKS), help="基准名称，缺省运行全部")
+    parser.add_argument('--count', type=int, default=200000, help="数据规模")
+    parser.add_argument('--trace', help="cache_policies回放的键轨迹文件")
+    args = parser.parse_args()
+
+    names = [args.benchmark] if args.benchmark else sorted(BENCHMARKS)
+    for name in names:
+        print(f"\n=== {name} ===")
+        if name == 'cache_policies':
+            BENCHMARKS[name](args.count, trace_path=args.trace)
+        else:
+            BENCHMARKS[name](args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+MCP共享二级缓存模块
+
+基于SQLite（WAL模式）的进程间共享缓存后端，作为MultiLevelCache的L2：
+- 同一事件循环轮次内的并发get合并为一次批量查询
+- set_many/delete_many在单个事务中完成
+- 每次写入同时记录失效通知，其他进程轮询后剔除各自L1中的旧值
+
+多个工作进程指向同一个数据库文件即可共享转换结果，WAL模式下读者不阻塞写者。
+
+示例：
+    >>> l2 = SQLiteCacheBackend("/var/cache/schemas.db")
+    >>> cache = MultiLevelCache(CacheConfig(max_size=1000), l2_backend=l2)
+    >>> await cache.start()
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .cache_manager import CacheBackend, CacheEntry, K, V
+from .cache_snapshot import _decode_key, _encode_key
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的变量数上限较低的版本为999
+_MAX_VARIABLES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key BLOB PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_at REAL,
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cache_invalidations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key BLOB NOT NULL,
+    origin TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _chunks(items: List, size: int = _MAX_VARIABLES) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCacheBackend(CacheBackend[K, V]):
+    """SQLite共享缓存后端
+
+    所有数据库操作在单个后台线程中执行，事件循环不会被磁盘I/O阻塞。
+    键按快照模块的规则编码（字符串为UTF-8，其他为pickle），值使用pickle。
+
+    失效通知记录在cache_invalidations表中并标注写入方，invalidations()只返回
+    其他实例写入的键；超过invalidation_retention秒的通知会被清理，轮询间隔
+    必须小于该值。
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, invalidation_retention: float = 60.0):
+        """
+        初始化SQLite后端
+
+        Args:
+            path: 数据库文件路径（多个进程共享同一文件）
+            busy_timeout: 等待其他进程释放写锁的超时时间（秒）
+            invalidation_retention: 失效通知保留时间（秒）
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.invalidation_retention = invalidation_retention
+        self.origin = uuid.uuid4().hex
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-l2')
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._last_seq = self._execute_sync(self._init_schema)
+
+        # 同一轮次的单键get合并为批量查询：键 -> 等待结果的Future列表
+        self._pending_gets: Dict[K, List[asyncio.Future]] = {}
+        self._get_flush_scheduled = False
+
+        self._stats = {'batched_gets': 0, 'get_batches': 0, 'writes': 0, 'write_batches': 0,
+                       'invalidations_sent': 0, 'invalidations_received': 0}
+
+    # ------------------------------------------------------------------
+    # 连接与执行
+    # ------------------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        """当前线程的连接，首次使用时打开"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._connections.append(connection)
+        return connection
+
+    def _init_schema(self, connection: sqlite3.Connection) -> int:
+        connection.executescript(_SCHEMA)
+        row = connection.execute('SELECT MAX(seq) FROM cache_invalidations').fetchone()
+        return row[0] or 0
+
+    def _execute_sync(self, operation, *args):
+        """在后台线程中同步执行，仅用于初始化"""
+        return self._executor.submit(lambda: operation(self._connection(), *args)).result()
+
+    async def _execute(self, operation, *args):
+        """在后台线程中执行数据库操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: operation(self._connection(), *args))
+
+    # ------------------------------------------------------------------
+    # 数据库操作（后台线程）
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _select(connection: sqlite3.Connection, encoded_keys: List[bytes], now: float) -> Dict[bytes, Tuple]:
+        rows = {}
+        for chunk in _chunks(encoded_keys):
+            placeholders = ','.join('?' * len(chunk))
+            cursor = connection.execute(
+                f'SELECT key, value, expires_at, stale_at, size FROM cache_entries '
+                f'WHERE key IN ({placeholders}) AND expires_at > ?', (*chunk, now))
+            for row in cursor:
+                rows[row[0]] = row[1:]
+        return rows
+
+    def _write(self, connection: sqlite3.Connection, upserts: List[Tuple], deletes: List[bytes]) -> int:
+        """在一个事务中写入与删除，并为每个键记录失效通知"""
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if upserts:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, stale_at, size) '
+                    'VALUES (?, ?, ?, ?, ?)', upserts)
+            for chunk in _chunks(deletes):
+                connection.execute(f'DELETE FROM cache_entries WHERE key IN ({",".join("?" * len(chunk))})', chunk)
+            touched = [row[0] for row in upserts] + deletes
+            connection.executemany(
+                'INSERT INTO cache_invalidations (key, origin, created_at) VALUES (?, ?, ?)',
+                [(key, self.origin, now) for key in touched])
+            connection.execute('DELETE FROM cache_invalidations WHERE created_at < ?',
+                               (now - self.invalidation_retention,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return len(touched)
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _entry(key: K, row: Tuple) -> CacheEntry[V]:
+        value, expires_at, stale_at, size = row
+        return CacheEntry(key=key, value=pickle.loads(value), expires_at=expires_at, size=size, stale_at=stale_at)
+
+    async def get_many(self, keys: List[K]) -> Dict[K, CacheEntry[V]]:
+        """批量获取未过期的条目
+
+        Args:
+            keys: 键列表
+
+        Returns:
+            命中的键 -> 条目
+        """
+        if not keys:
+            return {}
+        encoded = {_encode_key(key): key for key in keys}
+        rows = await self._execute(self._select, list(encoded), time.time())
+        self._stats['get_batches'] += 1
+        self._stats['batched_gets'] += len(encoded)
+        return {encoded[encoded_key]: self._entry(encoded[encoded_key], row) for encoded_key, row in rows.items()}
+
+    async def get(self, key: K) -> Optional[CacheEntry[V]]:
+        """获取条目，同一轮次内的并发调用合并为一次批量查询"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending_gets.setdefault(key, []).append(future)
+        if not self._get_flush_scheduled:
+            self._get_flush_scheduled = True
+            asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self._flush_gets()))
+        return await future
+
+    async def _flush_gets(self):
+        pending, self._pending_gets = self._pending_gets, {}
+        self._get_flush_scheduled = False
+        try:
+            entries = await self.get_many(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, futures in pending.items():
+            entry = entries.get(key)
+            for future in futures:
+                if not future.done():
+                    future.set_result(entry)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    async def set_many(self, entries: Dict[K, CacheEntry[V]]) -> int:
+        """在一个事务中写入多个条目，返回写入数"""
+        if not entries:
+            return 0
+        upserts = [(_encode_key(key), pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL),
+                    entry.expires_at, entry.stale_at, entry.size) for key, entry in entries.items()]
+        written = await self._execute(self._write, upserts, [])
+        self._record_write(written)
+        return written
+
+    async def delete_many(self, keys: List[K]) -> int:
+        """在一个事务中删除多个键，返回处理的键数"""
+        if not keys:
+            return 0
+        written = await self._execute(self._write, [], [_encode_key(key) for key in keys])
+        self._record_write(written)
+        return written
+
+    def _record_write(self, count: int):
+        self._stats['writes'] += count
+        self._stats['write_batches'] += 1
+        self._stats['invalidations_sent'] += count
+
+    async def set(self, key: K, entry: CacheEntry[V]) -> bool:
+        return await self.set_many({key: entry}) == 1
+
+    async def delete(self, key: K) -> bool:
+        existed = await self.get(key) is not None
+        await self.delete_many([key])
+        return existed
+
+    async def clear(self):
+        def clear_all(connection: sqlite3.Connection):
+            keys = [row[0] for row in connection.execute('SELECT key FROM cache_entries')]
+            if keys:
+                self._write(connection, [], keys)
+        await self._execute(clear_all)
+
+    # ------------------------------------------------------------------
+    # 查询与失效
+    # ------------------------------------------------------------------
+
+    async def keys(self) -> List[K]:
+        rows = await self._execute(
+            lambda connection, now: connection.execute(
+                'SELECT key FROM cache_entries WHERE expires_at > ?', (now,)).fetchall(), time.time())
+        return [_decode_key(row[0]) for row in rows]
+
+    async def size(self) -> int:
+        row = await self._execute(
+            lambda connection, now: connection.execute(
+                'SELECT COUNT(*) FROM cache_entries WHERE expires_at > ?', (now,)).fetchone(), time.time())
+        return row[0]
+
+    async def purge_expired(self) -> int:
+        """删除已过期的条目（不发送失效通知），返回删除数"""
+        def purge(connection: sqlite3.Connection, now: float) -> int:
+            return connection.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,)).rowcount
+        return await self._execute(purge, time.time())
+
+    async def invalidations(self) -> List[K]:
+        """返回自上次调用以来其他实例写入或删除的键"""
+        def poll(connection: sqlite3.Connection, last_seq: int):
+            return connection.execute(
+                'SELECT seq, key, origin FROM cache_invalidations WHERE seq > ? ORDER BY seq',
+                (last_seq,)).fetchall()
+        rows = await self._execute(poll, self._last_seq)
+        if not rows:
+            return []
+        self._last_seq = rows[-1][0]
+        keys = list(dict.fromkeys(_decode_key(key) for _, key, origin in rows if origin != self.origin))
+        self._stats['invalidations_received'] += len(keys)
+        return keys
+
+    def stats(self) -> Dict[str, Any]:
+        """批量读写与失效通知统计"""
+        return dict(self._stats)
+
+    async def close(self):
+        """关闭连接并停止后台线程"""
+        def close_all(connection: sqlite3.Connection):
+            for opened in self._connections:
+                opened.close()
+            self._connections.clear()
+            self._local.connection = None
+        if self._executor is not None:
+            await self._execute(close_all)
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -17,21 +17,37 @@ MCP缓存管理优化模块
 
 import asyncio
 import hashlib
+import inspect
 import json
 import logging
+import math
+import os
 import pickle
+import random
+import struct
+import sys
+import threading
 import time
 from abc import ABC, abstractmethod
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, deque
 from dataclasses import dataclass, field
 from enum import Enum, auto
 from typing import (
     Any, Callable, Dict, Generic, Hashable, List, Optional, 
     Set, Tuple, TypeVar, Union, AsyncIterator
 )
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 import heapq
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .cache_snapshot import SnapshotStore
+
 logger = logging.getLogger(__name__)
 
 K = TypeVar('K', bound=Hashable)
@@ -45,6 +61,7 @@ class CacheStrategy(Enum):
     FIFO = "fifo"        # 先进先出
     TTL = "ttl"          # 基于过期时间
     ADAPTIVE = "adaptive"  # 自适应策略
+    W_TINYLFU = "w-tinylfu"  # 窗口LRU + 频率准入 + 分段LRU主区
 
 
 @dataclass
@@ -56,18 +73,32 @@ class CacheConfig:
         ttl: 默认过期时间（秒）
         cleanup_interval: 清理间隔（秒）
         enable_stats: 是否启用统计
-        enable_persistence: 是否启用持久化
-        persistence_path: 持久化路径
+        enable_persistence: 是否启用持久化（停止时写入快照）
+        persistence_path: 快照目录（旧版的单个pickle文件仍可恢复）
+        snapshot_interval: 后台增量快照间隔（秒），0表示只在停止时写入
+        lazy_restore: 恢复时只映射快照索引，条目在首次访问时加载
         enable_compression: 是否启用压缩
         compression_threshold: 压缩阈值（字节）
         enable_bloom_filter: 是否启用布隆过滤器（防穿透）
-        enable_mutex: 是否启用互斥锁（防击穿）
-        mutex_timeout: 互斥锁超时时间（秒）
+        bloom_expected_items: 布隆过滤器初始容量（超出后自动扩展）
+        bloom_fp_rate: 布隆过滤器目标误判率
+        enable_mutex: 是否合并同一key的并发加载（single-flight，防击穿）
+        mutex_timeout: 加载超时时间（秒）
+        stale_ttl: 过期后的宽限期（秒），期间get_with_loader返回旧值并后台刷新，0为禁用
+        early_expiration_beta: 概率性提前刷新系数（XFetch的beta），0为禁用
+        max_inflight_loads: 同时进行的合并加载数上限，超出后不再合并而直接加载
         strategy: 缓存策略
         hot_key_threshold: 热点key阈值
         hot_key_duration: 热点key持续时间（秒）
         enable_prefetch: 是否启用预取
         prefetch_batch_size: 预取批量大小
+        shard_count: 分片数，大于1或策略为W_TINYLFU时使用分片内存后端（容量按分片均分）
+        max_bytes: 内存预算（字节，可选），超出时按条目大小加权淘汰
+        namespace_separator: 键中命名空间的分隔符，用于按命名空间统计内存
+        l2_write_behind: MultiLevelCache是否异步批量写入L2（同一key的多次写入合并为一次）
+        l2_flush_interval: L2写回间隔（秒）
+        l2_batch_size: 待写回的key达到该数量时立即写回
+        l2_invalidation_interval: 轮询L2失效通知的间隔（秒），0为禁用
     """
     max_size: int = 1000
     ttl: float = 300.0
@@ -75,20 +106,54 @@ class CacheConfig:
     enable_stats: bool = True
     enable_persistence: bool = False
     persistence_path: Optional[str] = None
+    snapshot_interval: float = 0.0
+    lazy_restore: bool = True
     enable_compression: bool = False
     compression_threshold: int = 1024
     enable_bloom_filter: bool = True
+    bloom_expected_items: int = 100000
+    bloom_fp_rate: float = 0.01
     enable_mutex: bool = True
     mutex_timeout: float = 10.0
+    stale_ttl: float = 0.0
+    early_expiration_beta: float = 1.0
+    max_inflight_loads: int = 1024
     strategy: CacheStrategy = CacheStrategy.LRU
     hot_key_threshold: int = 100
     hot_key_duration: float = 60.0
     enable_prefetch: bool = False
     prefetch_batch_size: int = 10
+    shard_count: int = 1
+    max_bytes: Optional[int] = None
+    namespace_separator: str = ':'
+    l2_write_behind: bool = True
+    l2_flush_interval: float = 0.05
+    l2_batch_size: int = 256
+    l2_invalidation_interval: float = 0.5
     
     def __post_init__(self):
         if self.max_size <= 0:
             raise ValueError("max_size must be positive")
+        if self.shard_count <= 0:
+            raise ValueError("shard_count must be positive")
+        if self.snapshot_interval < 0:
+            raise ValueError("snapshot_interval must be non-negative")
+        if self.max_bytes is not None and self.max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        if self.stale_ttl < 0:
+            raise ValueError("stale_ttl must be non-negative")
+        if self.early_expiration_beta < 0:
+            raise ValueError("early_expiration_beta must be non-negative")
+        if self.max_inflight_loads <= 0:
+            raise ValueError("max_inflight_loads must be positive")
+        if self.bloom_expected_items <= 0:
+            raise ValueError("bloom_expected_items must be positive")
+        if not 0 < self.bloom_fp_rate < 1:
+            raise ValueError("bloom_fp_rate must be between 0 and 1")
+        if self.l2_flush_interval < 0 or self.l2_invalidation_interval < 0:
+            raise ValueError("l2 intervals must be non-negative")
+        if self.l2_batch_size <= 0:
+            raise ValueError("l2_batch_size must be positive")
 
 
 @dataclass
@@ -103,6 +168,8 @@ class CacheEntry(Generic[V]):
         access_count: 访问次数
         last_accessed: 最后访问时间
         size: 条目大小（字节）
+        stale_at: 变旧时间，之后到expires_at之间可作为旧值返回并后台刷新（None表示无宽限期）
+        load_time: 加载该值的耗时（秒），用于概率性提前过期
     """
     key: K
     value: V
@@ -111,19 +178,138 @@ class CacheEntry(Generic[V]):
     access_count: int = 0
     last_accessed: float = field(default_factory=time.time)
     size: int = 0
+    stale_at: Optional[float] = None
+    load_time: float = 0.0
     
     def is_expired(self) -> bool:
         """检查是否过期"""
         return time.time() > self.expires_at
     
+    def is_stale(self) -> bool:
+        """检查是否已过新鲜期（宽限期内仍可返回旧值）"""
+        return self.stale_at is not None and time.time() > self.stale_at
+    
+    @property
+    def fresh_until(self) -> float:
+        """新鲜期结束时间"""
+        return self.stale_at if self.stale_at is not None else self.expires_at
+    
     def touch(self):
         """更新访问信息"""
         self.access_count += 1
         self.last_accessed = time.time()
     
     def time_to_live(self) -> float:
-        """获取剩余生存时间"""
-        return max(0, self.expires_at - time.time())
+        """获取剩余生存时间（新鲜期）"""
+        return max(0, self.fresh_until - time.time())
+
+
+class SizeEstimator:
+    """对象内存大小估算器
+    
+    沿容器和对象属性累加sys.getsizeof，同一调用中共享的对象只计一次，
+    可处理循环引用。比pickle序列化更接近实际内存占用。
+    
+    元素多于sample_size的容器只按步长抽取sample_size个元素展开，
+    再按比例放大，使大文档的估算开销与规模无关；sample_size为0时精确计算。
+    每个类型的属性布局（__slots__名称、是否有__dict__）只解析一次并缓存。
+    """
+    
+    _LEAF_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), range, memoryview)
+    _SEQUENCE_TYPES = (list, tuple, set, frozenset, deque)
+    
+    def __init__(self, sample_size: int = 64):
+        """
+        Args:
+            sample_size: 容器展开的最大元素数，0表示不抽样
+        """
+        self.sample_size = sample_size
+        # 单例与定长标量按类型记录固定大小，无需逐个计算
+        self._fixed: Dict[type, int] = {type(None): 0, bool: 0, float: sys.getsizeof(0.0),
+                                        complex: sys.getsizeof(0j)}
+        self._layouts: Dict[type, Tuple[Tuple[str, ...], bool]] = {}
+    
+    def _layout(self, cls: type) -> Tuple[Tuple[str, ...], bool]:
+        """类型的(__slots__属性名, 实例是否有__dict__)"""
+        layout = self._layouts.get(cls)
+        if layout is None:
+            slots: List[str] = []
+            for base in cls.__mro__:
+                names = base.__dict__.get('__slots__', ())
+                slots.extend([names] if isinstance(names, str) else names)
+            slots = [name for name in slots if name not in ('__dict__', '__weakref__')]
+            has_dict = any('__dict__' in base.__dict__ for base in cls.__mro__)
+            layout = self._layouts[cls] = (tuple(slots), has_dict)
+        return layout
+    
+    def _sample(self, items: List, weight: float) -> Tuple[List, float]:
+        """按步长抽样，返回样本及其权重"""
+        count = len(items)
+        if not self.sample_size or count <= self.sample_size:
+            return items, weight
+        picked = items[::count // self.sample_size][:self.sample_size]
+        return picked, weight * count / len(picked)
+    
+    def __call__(self, value: Any) -> int:
+        """
+        估算value及其引用对象的总字节数
+        
+        Args:
+            value: 任意对象
+            
+        Returns:
+            估算的字节数
+        """
+        fixed, leaf_types, sequence_types = self._fixed, self._LEAF_TYPES, self._SEQUENCE_TYPES
+        if type(value) in leaf_types:
+            return fixed.get(type(value), sys.getsizeof(value, 0))
+        limit = self.sample_size or sys.maxsize
+        seen: Set[int] = set()
+        total = 0.0
+        stack: List[Tuple[Any, float]] = [(value, 1.0)]
+        while stack:
+            obj, weight = stack.pop()
+            cls = type(obj)
+            size = fixed.get(cls)
+            if size is not None:
+                total += size * weight
+                continue
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            total += sys.getsizeof(obj, 0) * weight
+            if cls in leaf_types:
+                continue
+            if isinstance(obj, dict):
+                if len(obj) <= limit:
+                    for key, child in obj.items():
+                        stack.append((key, weight))
+                        stack.append((child, weight))
+                    continue
+                keys, child_weight = self._sample(list(obj), weight)
+                values, _ = self._sample(list(obj.values()), weight)
+                stack.extend((child, child_weight) for child in keys)
+                stack.extend((child, child_weight) for child in values)
+            elif isinstance(obj, sequence_types):
+                if len(obj) <= limit:
+                    stack.extend((child, weight) for child in obj)
+                    continue
+                items = obj if isinstance(obj, (list, tuple)) else list(obj)
+                children, child_weight = self._sample(items, weight)
+                stack.extend((child, child_weight) for child in children)
+            elif isinstance(obj, leaf_types) or isinstance(obj, type):
+                continue
+            else:
+                slots, has_dict = self._layout(cls)
+                for name in slots:
+                    attr = getattr(obj, name, None)
+                    if attr is not None:
+                        stack.append((attr, weight))
+                if has_dict:
+                    attrs = getattr(obj, '__dict__', None)
+                    if attrs is not None:
+                        stack.append((attrs, weight))
+        return int(total)
 
 
 class CacheStats:
@@ -137,6 +323,9 @@ class CacheStats:
         self.evictions: int = 0
         self.expirations: int = 0
         self.total_size: int = 0
+        self.stale_hits: int = 0
+        self.refreshes: int = 0
+        self.coalesced: int = 0
         self._hit_times: List[float] = []
         self._miss_times: List[float] = []
         self._started_at: float = time.time()
@@ -192,6 +381,22 @@ class CacheStats:
         """记录过期"""
         self.expirations += 1
     
+    @staticmethod
+    def roll_up(stats: Dict[str, Any], shard_stats: List[Dict[str, int]]) -> Dict[str, Any]:
+        """将后端各分片的统计汇总到统计字典
+        
+        Args:
+            stats: to_dict()的结果
+            shard_stats: 各分片统计（size/evictions/expirations等）
+            
+        Returns:
+            附带shards明细的统计字典
+        """
+        stats['evictions'] += sum(shard['evictions'] for shard in shard_stats)
+        stats['expirations'] += sum(shard['expirations'] for shard in shard_stats)
+        stats['shards'] = shard_stats
+        return stats
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
@@ -204,6 +409,9 @@ class CacheStats:
             "evictions": self.evictions,
             "expirations": self.expirations,
             "total_size": self.total_size,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "coalesced": self.coalesced,
             "avg_hit_time": round(self.avg_hit_time, 6),
             "avg_miss_time": round(self.avg_miss_time, 6),
             "uptime": round(time.time() - self._started_at, 2),
@@ -211,37 +419,457 @@ class CacheStats:
 
 
 class BloomFilter:
-    """布隆过滤器 - 用于防止缓存穿透"""
+    """布隆过滤器 - 用于防止缓存穿透
     
-    def __init__(self, size: int = 100000, hash_count: int = 5):
-        self.size = size
-        self.hash_count = hash_count
-        self.bit_array = [False] * size
-        self._lock = asyncio.Lock()
+    位数组按位压缩存放在bytearray中。每个元素只计算一次128位BLAKE2摘要，
+    由其高低64位做双重哈希得到hash_count个位置：(h1 + i * h2) mod size。
+    未指定size/hash_count时按预期元素数和目标误判率计算最优值。
+    批量接口在有NumPy时向量化计算位置和读写位。
     
-    def _hashes(self, item: str) -> List[int]:
-        """生成多个哈希值"""
-        result = []
-        for i in range(self.hash_count):
-            hash_val = hashlib.md5(f"{item}:{i}".encode()).hexdigest()
-            result.append(int(hash_val, 16) % self.size)
-        return result
+    写操作持有threading.Lock，查询不加锁（单字节读取是原子的）。
+    """
+    
+    _MAGIC = b'BLM1'
+    _HEADER = struct.Struct('<4sQIQQd')  # magic, size, hash_count, count, expected_items, fp_rate
+    _MASK64 = (1 << 64) - 1
+    
+    def __init__(self, size: Optional[int] = None, hash_count: Optional[int] = None,
+                 expected_items: int = 100000, fp_rate: float = 0.01):
+        """
+        Args:
+            size: 位数（可选，缺省按expected_items和fp_rate计算）
+            hash_count: 哈希函数个数（可选，缺省按最优值计算）
+            expected_items: 预期元素数
+            fp_rate: 目标误判率
+        """
+        if expected_items <= 0:
+            raise ValueError("expected_items must be positive")
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be between 0 and 1")
+        optimal_size, optimal_hashes = self.optimal_parameters(expected_items, fp_rate)
+        self.size = size if size is not None else optimal_size
+        self.hash_count = hash_count if hash_count is not None else optimal_hashes
+        if self.size <= 0 or self.hash_count <= 0:
+            raise ValueError("size and hash_count must be positive")
+        self.expected_items = expected_items
+        self.fp_rate = fp_rate
+        self.count = 0
+        self.bit_array = bytearray(self._cell_count())
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def optimal_parameters(expected_items: int, fp_rate: float) -> Tuple[int, int]:
+        """按预期元素数n和误判率p计算位数m = -n·ln(p)/ln(2)²与哈希数k = m/n·ln(2)"""
+        size = max(8, math.ceil(-expected_items * math.log(fp_rate) / (math.log(2) ** 2)))
+        hash_count = max(1, round(size / expected_items * math.log(2)))
+        return size, hash_count
+    
+    def _cell_count(self) -> int:
+        return (self.size + 7) >> 3
+    
+    @staticmethod
+    def _digest(item) -> bytes:
+        data = item if isinstance(item, (bytes, bytearray)) else str(item).encode()
+        return hashlib.blake2b(data, digest_size=16).digest()
+    
+    def _positions(self, item) -> List[int]:
+        """双重哈希得到元素的hash_count个位置"""
+        digest = int.from_bytes(self._digest(item), 'little')
+        size = self.size
+        base = (digest & self._MASK64) % size
+        # 步长为0时所有位置会重合为一个位
+        step = (digest >> 64) % size or 1
+        return [(base + i * step) % size for i in range(self.hash_count)]
+    
+    def _batch_positions(self, items: List) -> 'np.ndarray':
+        """批量计算位置，返回形状为(len(items), hash_count)的uint64数组"""
+        digests = np.frombuffer(b''.join(self._digest(item) for item in items), dtype='<u8').reshape(-1, 2)
+        size = np.uint64(self.size)
+        base = digests[:, 0:1] % size
+        step = digests[:, 1:2] % size
+        step[step == 0] = 1
+        # base + i * step < size * hash_count，不会溢出uint64
+        return (base + step * np.arange(self.hash_count, dtype=np.uint64)) % size
+    
+    def _mark(self, positions: List[int]) -> bool:
+        """置位，返回元素此前是否可能已存在；调用方需持有锁"""
+        bits = self.bit_array
+        present = True
+        for position in positions:
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not bits[byte] & bit:
+                present = False
+                bits[byte] |= bit
+        return present
+    
+    def _test(self, positions: List[int]) -> bool:
+        bits = self.bit_array
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in positions)
+    
+    def _mark_batch(self, positions: 'np.ndarray'):
+        cells = np.frombuffer(self.bit_array, dtype=np.uint8)
+        np.bitwise_or.at(cells, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+    
+    def _test_batch(self, positions: 'np.ndarray') -> 'np.ndarray':
+        cells = np.frombuffer(self.bit_array, dtype=np.uint8)
+        bits = (cells[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+    
+    def add_item(self, item) -> bool:
+        """
+        添加元素（同步）
+        
+        Returns:
+            元素此前是否可能已存在
+        """
+        positions = self._positions(item)
+        with self._lock:
+            present = self._mark(positions)
+            if not present:
+                self.count += 1
+        return present
+    
+    def __contains__(self, item) -> bool:
+        # 热路径：逐个计算位置，遇到未置位即返回
+        digest = int.from_bytes(self._digest(item), 'little')
+        size, bits = self.size, self.bit_array
+        position = (digest & self._MASK64) % size
+        step = (digest >> 64) % size or 1
+        for _ in range(self.hash_count):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+            if position >= size:
+                position -= size
+        return True
+    
+    def __len__(self) -> int:
+        """已添加的不同元素数（近似）"""
+        return self.count
+    
+    def add_many(self, items) -> int:
+        """
+        批量添加元素
+        
+        Args:
+            items: 元素可迭代对象
+            
+        Returns:
+            处理的元素数（count只计入此前不存在的元素）
+        """
+        items = list(items)
+        if not items:
+            return 0
+        if NUMPY_AVAILABLE:
+            positions = self._batch_positions(items)
+            with self._lock:
+                # 只计入此前不存在的元素，批内重复的元素按位置去重后计一次
+                new_rows = positions[~self._test_batch(positions)]
+                if len(new_rows):
+                    self.count += len(np.unique(new_rows, axis=0))
+                self._mark_batch(positions)
+        else:
+            with self._lock:
+                for item in items:
+                    if not self._mark(self._positions(item)):
+                        self.count += 1
+        return len(items)
+    
+    def contains_many(self, items) -> List[bool]:
+        """批量检查元素，返回与items对应的结果列表"""
+        items = list(items)
+        if not items:
+            return []
+        if NUMPY_AVAILABLE:
+            return self._test_batch(self._batch_positions(items)).tolist()
+        return [self._test(self._positions(item)) for item in items]
+    
+    @property
+    def estimated_fp_rate(self) -> float:
+        """按当前元素数估计的误判率 (1 - e^(-kn/m))^k"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
     
     async def add(self, item: str):
         """添加元素"""
-        async with self._lock:
-            for idx in self._hashes(item):
-                self.bit_array[idx] = True
+        self.add_item(item)
     
     async def contains(self, item: str) -> bool:
         """检查元素可能存在或肯定不存在"""
-        async with self._lock:
-            return all(self.bit_array[idx] for idx in self._hashes(item))
+        return item in self
     
     async def clear(self):
         """清空过滤器"""
-        async with self._lock:
-            self.bit_array = [False] * self.size
+        with self._lock:
+            self.bit_array = bytearray(self._cell_count())
+            self.count = 0
+    
+    def to_bytes(self) -> bytes:
+        """序列化为快照"""
+        with self._lock:
+            header = self._HEADER.pack(self._MAGIC, self.size, self.hash_count, self.count,
+                                       self.expected_items, self.fp_rate)
+            return header + bytes(self.bit_array)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> 'BloomFilter':
+        """
+        从快照恢复
+        
+        Raises:
+            ValueError: 当快照格式不匹配时
+        """
+        magic, size, hash_count, count, expected_items, fp_rate = cls._HEADER.unpack_from(data, offset)
+        if magic != cls._MAGIC:
+            raise ValueError("Invalid bloom filter snapshot")
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hash_count, bloom.count = size, hash_count, count
+        bloom.expected_items, bloom.fp_rate = expected_items, fp_rate
+        start = offset + cls._HEADER.size
+        bloom.bit_array = bytearray(data[start:start + bloom._cell_count()])
+        if len(bloom.bit_array) != bloom._cell_count():
+            raise ValueError("Truncated bloom filter snapshot")
+        bloom._lock = threading.Lock()
+        return bloom
+    
+    @property
+    def snapshot_size(self) -> int:
+        return self._HEADER.size + self._cell_count()
+    
+    def save(self, path: str):
+        """写入快照文件（先写临时文件再替换）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'BloomFilter':
+        """从快照文件加载"""
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class CountingBloomFilter(BloomFilter):
+    """计数布隆过滤器
+    
+    每个位置为一个字节计数器（饱和于255），支持删除元素。
+    只能删除确实添加过的元素，否则会产生误判为不存在。饱和的计数器不再递减。
+    """
+    
+    _MAGIC = b'BLC1'
+    
+    def _cell_count(self) -> int:
+        return self.size
+    
+    def _mark(self, positions: List[int]) -> bool:
+        counters = self.bit_array
+        present = all(counters[position] for position in positions)
+        for position in positions:
+            if counters[position] < 255:
+                counters[position] += 1
+        return present
+    
+    def _test(self, positions: List[int]) -> bool:
+        counters = self.bit_array
+        return all(counters[position] for position in positions)
+    
+    def __contains__(self, item) -> bool:
+        return self._test(self._positions(item))
+    
+    def _mark_batch(self, positions: 'np.ndarray'):
+        counters = np.frombuffer(self.bit_array, dtype=np.uint8)
+        unique, increments = np.unique(positions, return_counts=True)
+        counters[unique] = np.minimum(counters[unique].astype(np.int64) + increments, 255)
+    
+    def _test_batch(self, positions: 'np.ndarray') -> 'np.ndarray':
+        counters = np.frombuffer(self.bit_array, dtype=np.uint8)
+        return (counters[positions] > 0).all(axis=1)
+    
+    def remove(self, item) -> bool:
+        """
+        删除元素
+        
+        Returns:
+            元素是否可能存在（不存在时不修改计数）
+        """
+        positions = self._positions(item)
+        with self._lock:
+            counters = self.bit_array
+            if not all(counters[position] for position in positions):
+                return False
+            for position in positions:
+                if counters[position] < 255:
+                    counters[position] -= 1
+            self.count = max(0, self.count - 1)
+        return True
+    
+    async def discard(self, item: str) -> bool:
+        """删除元素（异步接口）"""
+        return self.remove(item)
+
+
+class ScalableBloomFilter:
+    """可扩展布隆过滤器
+    
+    由一串容量依次乘以growth的布隆过滤器组成。当前过滤器达到容量后新建一个，
+    新过滤器的误判率乘以tightening，使总误判率收敛于fp_rate / (1 - tightening)以内。
+    查询需检查所有子过滤器。
+    """
+    
+    _MAGIC = b'BLS1'
+    _HEADER = struct.Struct('<4sQdIdBI')  # magic, initial_capacity, fp_rate, growth, tightening, counting, stages
+    
+    def __init__(self, initial_capacity: int = 10000, fp_rate: float = 0.01,
+                 growth: int = 2, tightening: float = 0.5, counting: bool = False):
+        """
+        Args:
+            initial_capacity: 首个过滤器的容量
+            fp_rate: 首个过滤器的误判率
+            growth: 容量增长倍数
+            tightening: 误判率收紧系数
+            counting: 是否使用计数过滤器（支持删除）
+        """
+        if growth < 1:
+            raise ValueError("growth must be at least 1")
+        if not 0 < tightening < 1:
+            raise ValueError("tightening must be between 0 and 1")
+        self.initial_capacity = initial_capacity
+        self.fp_rate = fp_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.counting = counting
+        self._filter_cls = CountingBloomFilter if counting else BloomFilter
+        self.filters: List[BloomFilter] = [self._filter_cls(expected_items=initial_capacity, fp_rate=fp_rate)]
+        self._lock = threading.Lock()
+    
+    def _grow(self) -> BloomFilter:
+        """当前过滤器已满时新建下一个，调用方需持有锁"""
+        current = self.filters[-1]
+        if current.count < current.expected_items:
+            return current
+        successor = self._filter_cls(expected_items=current.expected_items * self.growth,
+                                     fp_rate=current.fp_rate * self.tightening)
+        self.filters.append(successor)
+        logger.debug(f"Bloom filter grown to {len(self.filters)} stages")
+        return successor
+    
+    def add_item(self, item) -> bool:
+        """添加元素，返回元素此前是否可能已存在"""
+        if item in self:
+            return True
+        with self._lock:
+            return self._grow().add_item(item)
+    
+    def __contains__(self, item) -> bool:
+        return any(item in bloom for bloom in reversed(self.filters))
+    
+    def __len__(self) -> int:
+        return sum(len(bloom) for bloom in self.filters)
+    
+    def add_many(self, items) -> int:
+        """批量添加尚不存在的元素，返回新增数量"""
+        items = list(dict.fromkeys(items))
+        items = [item for item, present in zip(items, self.contains_many(items)) if not present]
+        added = 0
+        with self._lock:
+            while added < len(items):
+                current = self._grow()
+                room = max(1, current.expected_items - current.count)
+                added += current.add_many(items[added:added + room])
+        return added
+    
+    def contains_many(self, items) -> List[bool]:
+        """批量检查元素"""
+        items = list(items)
+        result = [False] * len(items)
+        for bloom in self.filters:
+            pending = [i for i, found in enumerate(result) if not found]
+            if not pending:
+                break
+            for i, found in zip(pending, bloom.contains_many([items[i] for i in pending])):
+                result[i] = found
+        return result
+    
+    def remove(self, item) -> bool:
+        """
+        删除元素（仅counting为True时可用）
+        
+        Raises:
+            TypeError: 当不是计数过滤器时
+        """
+        if not self.counting:
+            raise TypeError("remove requires counting=True")
+        with self._lock:
+            for bloom in reversed(self.filters):
+                if item in bloom:
+                    return bloom.remove(item)
+        return False
+    
+    @property
+    def estimated_fp_rate(self) -> float:
+        """各子过滤器误判率的并"""
+        miss = 1.0
+        for bloom in self.filters:
+            miss *= 1 - bloom.estimated_fp_rate
+        return 1 - miss
+    
+    async def add(self, item: str):
+        """添加元素"""
+        self.add_item(item)
+    
+    async def contains(self, item: str) -> bool:
+        """检查元素可能存在或肯定不存在"""
+        return item in self
+    
+    async def discard(self, item: str) -> bool:
+        """删除元素（异步接口）"""
+        return self.remove(item)
+    
+    async def clear(self):
+        """清空过滤器，恢复为单个初始过滤器"""
+        with self._lock:
+            self.filters = [self._filter_cls(expected_items=self.initial_capacity, fp_rate=self.fp_rate)]
+    
+    def to_bytes(self) -> bytes:
+        """序列化为快照"""
+        with self._lock:
+            header = self._HEADER.pack(self._MAGIC, self.initial_capacity, self.fp_rate, self.growth,
+                                       self.tightening, self.counting, len(self.filters))
+            return header + b''.join(bloom.to_bytes() for bloom in self.filters)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ScalableBloomFilter':
+        """
+        从快照恢复
+        
+        Raises:
+            ValueError: 当快照格式不匹配时
+        """
+        magic, initial_capacity, fp_rate, growth, tightening, counting, stages = cls._HEADER.unpack_from(data, 0)
+        if magic != cls._MAGIC:
+            raise ValueError("Invalid scalable bloom filter snapshot")
+        scalable = cls(initial_capacity, fp_rate, growth, tightening, bool(counting))
+        scalable.filters = []
+        offset = cls._HEADER.size
+        for _ in range(stages):
+            bloom = scalable._filter_cls.from_bytes(data, offset)
+            scalable.filters.append(bloom)
+            offset += bloom.snapshot_size
+        return scalable
+    
+    def save(self, path: str):
+        """写入快照文件（先写临时文件再替换）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'ScalableBloomFilter':
+        """从快照文件加载"""
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
 
 
 class CacheBackend(ABC, Generic[K, V]):
@@ -276,15 +904,56 @@ class CacheBackend(ABC, Generic[K, V]):
     async def size(self) -> int:
         """获取缓存大小"""
         pass
+    
+    async def peek(self, key: K) -> Optional[CacheEntry[V]]:
+        """获取条目但不更新淘汰顺序和访问信息"""
+        return await self.get(key)
+    
+    async def get_many(self, keys: List[K]) -> Dict[K, CacheEntry[V]]:
+        """批量获取条目，返回命中的键 -> 条目（远程后端应以一次往返实现）"""
+        entries = {}
+        for key in keys:
+            entry = await self.get(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+    
+    async def set_many(self, entries: Dict[K, CacheEntry[V]]) -> int:
+        """批量设置条目，返回成功数"""
+        count = 0
+        for key, entry in entries.items():
+            if await self.set(key, entry):
+                count += 1
+        return count
+    
+    async def delete_many(self, keys: List[K]) -> int:
+        """批量删除条目，返回成功数"""
+        count = 0
+        for key in keys:
+            if await self.delete(key):
+                count += 1
+        return count
+    
+    async def invalidations(self) -> List[K]:
+        """返回自上次调用以来被其他进程修改的键，进程内后端没有外部写入者"""
+        return []
+    
+    async def close(self):
+        """释放后端持有的连接等资源"""
+        pass
 
 
 class MemoryCacheBackend(CacheBackend[K, V]):
-    """内存缓存后端"""
+    """内存缓存后端
+    
+    配置了max_bytes时按条目大小加权淘汰：写入后按策略驱逐直到总字节数不超过预算。
+    """
     
     def __init__(self, config: CacheConfig):
         self.config = config
         self._data: Dict[K, CacheEntry[V]] = {}
         self._lock = asyncio.Lock()
+        self._bytes = 0
         
         # 根据策略选择数据结构
         if config.strategy == CacheStrategy.LRU:
@@ -305,19 +974,40 @@ class MemoryCacheBackend(CacheBackend[K, V]):
                 entry.touch()
                 return entry
             elif entry and entry.is_expired():
-                del self._data[key]
+                self._remove(key)
             return None
     
     async def set(self, key: K, entry: CacheEntry[V]) -> bool:
         async with self._lock:
+            max_bytes = self.config.max_bytes
+            old = self._data.get(key)
+            if max_bytes is not None and entry.size > max_bytes:
+                # 超过预算的条目不缓存，旧值也一并移除
+                if old is not None:
+                    self._remove(key)
+                return False
+            
             # 检查是否需要驱逐
-            if len(self._data) >= self.config.max_size and key not in self._data:
+            if len(self._data) >= self.config.max_size and old is None:
                 await self._evict()
             
             self._data[key] = entry
-            if self.config.strategy == CacheStrategy.LFU:
+            self._bytes += entry.size - (old.size if old is not None else 0)
+            if self.config.strategy == CacheStrategy.LRU:
+                # 更新已有键也算最近使用，避免下面的字节淘汰先驱逐刚写入的条目
+                self._data.move_to_end(key)
+            elif self.config.strategy == CacheStrategy.LFU:
                 self._frequency[key] = entry.access_count
-            return True
+            
+            while max_bytes is not None and self._bytes > max_bytes and self._data:
+                await self._evict()
+            return key in self._data
+    
+    def _remove(self, key: K):
+        """移除条目，调用方需持有锁"""
+        self._bytes -= self._data.pop(key).size
+        if self.config.strategy == CacheStrategy.LFU:
+            self._frequency.pop(key, None)
     
     async def _evict(self):
         """驱逐条目"""
@@ -326,38 +1016,51 @@ class MemoryCacheBackend(CacheBackend[K, V]):
         
         if self.config.strategy == CacheStrategy.LRU:
             # 驱逐最久未使用
-            key, _ = self._data.popitem(last=False)
+            key, entry = self._data.popitem(last=False)
         elif self.config.strategy == CacheStrategy.LFU:
             # 驱逐使用频率最低
             min_freq_key = min(self._frequency, key=self._frequency.get)
-            del self._data[min_freq_key]
+            entry = self._data.pop(min_freq_key)
             del self._frequency[min_freq_key]
             key = min_freq_key
         elif self.config.strategy == CacheStrategy.FIFO:
             # 驱逐最早进入
             key = next(iter(self._data))
-            del self._data[key]
+            entry = self._data.pop(key)
         else:
             # 默认LRU
-            key, _ = self._data.popitem(last=False)
+            key, entry = self._data.popitem(last=False)
+        self._bytes -= entry.size
         
         logger.debug(f"Evicted key: {key}")
     
     async def delete(self, key: K) -> bool:
         async with self._lock:
             if key in self._data:
-                del self._data[key]
-                if self.config.strategy == CacheStrategy.LFU:
-                    del self._frequency[key]
+                self._remove(key)
                 return True
             return False
     
     async def clear(self):
         async with self._lock:
             self._data.clear()
+            self._bytes = 0
             if self.config.strategy == CacheStrategy.LFU:
                 self._frequency.clear()
     
+    @property
+    def bytes_used(self) -> int:
+        """当前条目总字节数"""
+        return self._bytes
+    
+    async def peek(self, key: K) -> Optional[CacheEntry[V]]:
+        return self._data.get(key)
+    
+    async def entry_sizes(self) -> List[Tuple[K, int]]:
+        """所有条目的(键, 字节数)"""
+        async with self._lock:
+            return [(k, v.size) for k, v in self._data.items()]
+    
     async def keys(self) -> List[K]:
         async with self._lock:
             return list(self._data.keys())
@@ -372,6 +1075,414 @@ class MemoryCacheBackend(CacheBackend[K, V]):
             return [k for k, v in self._data.items() if v.is_expired()]
 
 
+class _CacheSegment:
+    """分片内的缓存段
+    
+    各策略的维护操作均为O(1)：
+    - LRU: OrderedDict，命中时move_to_end，驱逐时popitem(last=False)
+    - FIFO: dict插入顺序，驱逐最早插入的键
+    - LFU: 频率桶（频率 -> 按到达顺序的键集合）加最小频率指针，
+      驱逐最小频率桶中最早的键（同频率时退化为LRU）
+    
+    设置byte_capacity时按条目大小（CacheEntry.size）加权：写入后按同一淘汰顺序
+    驱逐，直到总字节数不超过预算；单个条目超过预算时拒绝写入。
+    """
+    
+    __slots__ = ('capacity', 'strategy', 'data', 'lock', 'frequency', 'buckets',
+                 'min_frequency', 'evictions', 'expirations', 'byte_capacity', 'bytes')
+    
+    def __init__(self, capacity: int, strategy: CacheStrategy, byte_capacity: Optional[int] = None):
+        self.capacity = capacity
+        self.strategy = strategy
+        self.byte_capacity = byte_capacity
+        self.bytes = 0
+        self.data: Dict[Any, CacheEntry] = {} if strategy in (CacheStrategy.FIFO, CacheStrategy.LFU) else OrderedDict()
+        self.lock = threading.Lock()
+        self.frequency: Dict[Any, int] = {}
+        self.buckets: Dict[int, OrderedDict] = {}
+        self.min_frequency = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def _bump(self, key):
+        """命中时更新淘汰顺序，调用方需持有锁"""
+        if self.strategy == CacheStrategy.LFU:
+            freq = self.frequency[key]
+            bucket = self.buckets[freq]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[freq]
+                if self.min_frequency == freq:
+                    self.min_frequency = freq + 1
+            self.frequency[key] = freq + 1
+            self.buckets.setdefault(freq + 1, OrderedDict())[key] = None
+        elif self.strategy != CacheStrategy.FIFO:
+            self.data.move_to_end(key)
+    
+    def _forget(self, key):
+        """从LFU结构中移除键，调用方需持有锁"""
+        freq = self.frequency.pop(key, None)
+        if freq is None:
+            return
+        bucket = self.buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[freq]
+    
+    def get(self, key) -> Optional[CacheEntry]:
+        # dict读取本身是原子的，不加锁；淘汰顺序的更新只在锁空闲时进行，
+        # 竞争激烈时跳过一次更新，代价是淘汰顺序略有近似
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry.is_expired():
+            with self.lock:
+                if self.data.get(key) is entry:
+                    self._discard(key)
+                    self.expirations += 1
+            return None
+        if self.strategy != CacheStrategy.FIFO and self.lock.acquire(False):
+            if key in self.data:
+                if self.strategy == CacheStrategy.LFU:
+                    self._bump(key)
+                else:
+                    self.data.move_to_end(key)
+            self.lock.release()
+        entry.touch()
+        return entry
+    
+    def _discard(self, key):
+        """移除条目及其淘汰结构，调用方需持有锁"""
+        self.bytes -= self.data.pop(key).size
+        self._forget(key)
+    
+    def _oversized(self, key, entry: CacheEntry) -> bool:
+        """条目超过字节预算时拒绝写入（并移除旧值），调用方需持有锁"""
+        if self.byte_capacity is None or entry.size <= self.byte_capacity:
+            return False
+        if key in self.data:
+            self._discard(key)
+        return True
+    
+    def _trim_bytes(self):
+        """按淘汰顺序驱逐直到不超过字节预算，调用方需持有锁"""
+        while self.byte_capacity is not None and self.bytes > self.byte_capacity and self.data:
+            self._evict()
+    
+    def set(self, key, entry: CacheEntry) -> bool:
+        """写入条目，超过字节预算被拒绝时返回False"""
+        with self.lock:
+            if self._oversized(key, entry):
+                return False
+            old = self.data.get(key)
+            if old is not None:
+                self.bytes += entry.size - old.size
+                self.data[key] = entry
+                self._bump(key)
+            else:
+                if len(self.data) >= self.capacity:
+                    self._evict()
+                self.data[key] = entry
+                self.bytes += entry.size
+                if self.strategy == CacheStrategy.LFU:
+                    self.frequency[key] = 1
+                    self.buckets.setdefault(1, OrderedDict())[key] = None
+                    self.min_frequency = 1
+            self._trim_bytes()
+        return True
+    
+    def _evict(self):
+        """驱逐一个条目，调用方需持有锁"""
+        if self.strategy == CacheStrategy.LFU:
+            if self.min_frequency not in self.buckets:
+                # 删除操作可能清空了最小频率桶
+                self.min_frequency = min(self.buckets)
+            bucket = self.buckets[self.min_frequency]
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_frequency]
+            del self.frequency[key]
+            entry = self.data.pop(key)
+        elif self.strategy == CacheStrategy.FIFO:
+            key = next(iter(self.data))
+            entry = self.data.pop(key)
+        else:
+            key, entry = self.data.popitem(last=False)
+        self.bytes -= entry.size
+        self.evictions += 1
+        return key
+    
+    def delete(self, key) -> bool:
+        with self.lock:
+            if key not in self.data:
+                return False
+            self._discard(key)
+            return True
+    
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.frequency.clear()
+            self.buckets.clear()
+            self.min_frequency = 0
+            self.bytes = 0
+    
+    def entry_sizes(self) -> List[Tuple[Any, int]]:
+        with self.lock:
+            return [(k, v.size) for k, v in self.data.items()]
+    
+    def expired_keys(self) -> List[Any]:
+        with self.lock:
+            return [k for k, v in self.data.items() if v.is_expired()]
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self.data),
+            'capacity': self.capacity,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'bytes': self.bytes,
+        }
+
+
+class CountMinSketch:
+    """Count-Min频率草图
+    
+    depth行计数器存放在一个bytearray中，计数上限15（相当于4位计数器）。
+    累计记录sample_size次后所有计数减半，使历史热点随时间老化。
+    """
+    
+    _SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    _MASK64 = (1 << 64) - 1
+    
+    def __init__(self, capacity: int, depth: int = 4):
+        width = 16
+        while width < capacity:
+            width <<= 1
+        self.width = width
+        self.depth = min(depth, len(self._SEEDS))
+        self.sample_size = 10 * max(capacity, 1)
+        self.table = bytearray(self.width * self.depth)
+        self.additions = 0
+    
+    def _indexes(self, key) -> List[int]:
+        h = hash(key) & self._MASK64
+        mask = self.width - 1
+        return [
+            row * self.width + ((((h ^ seed) * seed) & self._MASK64) >> 32 & mask)
+            for row, seed in enumerate(self._SEEDS[:self.depth])
+        ]
+    
+    def increment(self, key):
+        """记录一次访问"""
+        table = self.table
+        for index in self._indexes(key):
+            if table[index] < 15:
+                table[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.reset()
+    
+    def estimate(self, key) -> int:
+        """估计访问频率"""
+        table = self.table
+        return min(table[index] for index in self._indexes(key))
+    
+    def reset(self):
+        """所有计数减半（老化）"""
+        self.table = bytearray(value >> 1 for value in self.table)
+        self.additions //= 2
+
+
+class _WTinyLFUSegment(_CacheSegment):
+    """W-TinyLFU缓存段
+    
+    新键先进入约占容量1%的窗口LRU；窗口溢出时，被挤出的候选与主区的
+    淘汰对象比较草图频率，频率更高者留下。主区为分段LRU：
+    试用区（20%）中的键再次命中后晋升到保护区（80%），保护区溢出时降级回试用区。
+    扫描型访问只会在窗口中短暂停留，不会冲掉主区中的热点。
+    """
+    
+    __slots__ = ('sketch', 'window', 'probation', 'protected', 'window_capacity', 'main_capacity',
+                 'protected_capacity')
+    
+    def __init__(self, capacity: int, strategy: CacheStrategy = CacheStrategy.W_TINYLFU,
+                 byte_capacity: Optional[int] = None):
+        super().__init__(capacity, strategy, byte_capacity)
+        self.data = {}
+        self.sketch = CountMinSketch(capacity)
+        self.window_capacity = max(1, capacity // 100)
+        self.main_capacity = capacity - self.window_capacity
+        self.protected_capacity = max(1, self.main_capacity * 4 // 5)
+        self.window: 'OrderedDict[Any, None]' = OrderedDict()
+        self.probation: 'OrderedDict[Any, None]' = OrderedDict()
+        self.protected: 'OrderedDict[Any, None]' = OrderedDict()
+    
+    def _region(self, key) -> Optional[OrderedDict]:
+        for region in (self.window, self.probation, self.protected):
+            if key in region:
+                return region
+        return None
+    
+    def _bump(self, key):
+        """命中时调整区域，调用方需持有锁"""
+        if key in self.window:
+            self.window.move_to_end(key)
+        elif key in self.probation:
+            del self.probation[key]
+            self.protected[key] = None
+            if len(self.protected) > self.protected_capacity:
+                demoted, _ = self.protected.popitem(last=False)
+                self.probation[demoted] = None
+        elif key in self.protected:
+            self.protected.move_to_end(key)
+    
+    def _forget(self, key):
+        region = self._region(key)
+        if region is not None:
+            del region[key]
+    
+    def get(self, key) -> Optional[CacheEntry]:
+        with self.lock:
+            self.sketch.increment(key)
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            if entry.is_expired():
+                self._discard(key)
+                self.expirations += 1
+                return None
+            self._bump(key)
+        entry.touch()
+        return entry
+    
+    def set(self, key, entry: CacheEntry) -> bool:
+        with self.lock:
+            if self._oversized(key, entry):
+                return False
+            old = self.data.get(key)
+            if old is not None:
+                self.bytes += entry.size - old.size
+                self.data[key] = entry
+                self._bump(key)
+            else:
+                self.data[key] = entry
+                self.bytes += entry.size
+                self.window[key] = None
+                if len(self.window) > self.window_capacity:
+                    candidate, _ = self.window.popitem(last=False)
+                    self._admit(candidate)
+            self._trim_bytes()
+        return True
+    
+    def _evict(self):
+        """超出字节预算时依次从试用区、保护区、窗口的最旧端驱逐"""
+        for region in (self.probation, self.protected, self.window):
+            if region:
+                key, _ = region.popitem(last=False)
+                self.bytes -= self.data.pop(key).size
+                self.evictions += 1
+                return key
+        return None
+    
+    def _admit(self, candidate) -> Optional[Any]:
+        """窗口挤出的候选尝试进入主区，返回被驱逐的键"""
+        if len(self.probation) + len(self.protected) < self.main_capacity:
+            self.probation[candidate] = None
+            return None
+        victims = self.probation or self.protected
+        victim = next(iter(victims), None)
+        if victim is not None and self.sketch.estimate(candidate) > self.sketch.estimate(victim):
+            del victims[victim]
+            self.probation[candidate] = None
+            evicted = victim
+        else:
+            evicted = candidate
+        self.bytes -= self.data.pop(evicted).size
+        self.evictions += 1
+        return evicted
+    
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.window.clear()
+            self.probation.clear()
+            self.protected.clear()
+            self.bytes = 0
+
+
+class ShardedMemoryCacheBackend(CacheBackend[K, V]):
+    """分片内存缓存后端
+    
+    按键的哈希分到shard_count个独立的段，每段有自己的锁和淘汰结构，
+    不同段的操作互不阻塞。各段容量为max_size（及max_bytes）均分（向上取整），
+    淘汰在段内进行，因此全局淘汰顺序是近似的。
+    
+    锁为threading.Lock，后端可同时被事件循环和线程池中的代码使用；
+    读路径不加锁（见_CacheSegment.get）。
+    """
+    
+    def __init__(self, config: CacheConfig):
+        self.config = config
+        self.shard_count = config.shard_count
+        capacity = -(-config.max_size // self.shard_count)
+        byte_capacity = -(-config.max_bytes // self.shard_count) if config.max_bytes is not None else None
+        segment_cls = _WTinyLFUSegment if config.strategy == CacheStrategy.W_TINYLFU else _CacheSegment
+        self._shards = [segment_cls(capacity, config.strategy, byte_capacity) for _ in range(self.shard_count)]
+    
+    def _shard(self, key: K) -> _CacheSegment:
+        return self._shards[hash(key) % self.shard_count]
+    
+    async def get(self, key: K) -> Optional[CacheEntry[V]]:
+        return self._shards[hash(key) % self.shard_count].get(key)
+    
+    async def set(self, key: K, entry: CacheEntry[V]) -> bool:
+        return self._shards[hash(key) % self.shard_count].set(key, entry)
+    
+    async def delete(self, key: K) -> bool:
+        return self._shard(key).delete(key)
+    
+    async def clear(self):
+        for shard in self._shards:
+            shard.clear()
+    
+    async def keys(self) -> List[K]:
+        keys: List[K] = []
+        for shard in self._shards:
+            with shard.lock:
+                keys.extend(shard.data)
+        return keys
+    
+    async def size(self) -> int:
+        return sum(len(shard.data) for shard in self._shards)
+    
+    async def get_expired_keys(self) -> List[K]:
+        """获取过期键"""
+        expired: List[K] = []
+        for shard in self._shards:
+            expired.extend(shard.expired_keys())
+        return expired
+    
+    def shard_stats(self) -> List[Dict[str, int]]:
+        """各分片的统计"""
+        return [shard.stats() for shard in self._shards]
+    
+    @property
+    def bytes_used(self) -> int:
+        """当前条目总字节数"""
+        return sum(shard.bytes for shard in self._shards)
+    
+    async def peek(self, key: K) -> Optional[CacheEntry[V]]:
+        return self._shard(key).data.get(key)
+    
+    async def entry_sizes(self) -> List[Tuple[K, int]]:
+        """所有条目的(键, 字节数)"""
+        sizes: List[Tuple[K, int]] = []
+        for shard in self._shards:
+            sizes.extend(shard.entry_sizes())
+        return sizes
+
+
 class CacheManager(Generic[K, V]):
     """MCP缓存管理器
     
@@ -408,23 +1519,27 @@ class CacheManager(Generic[K, V]):
         _backend: 缓存后端
         _stats: 统计信息
         _hot_keys: 热点key记录
-        _mutexes: 互斥锁字典（防击穿）
+        _inflight: 进行中的加载任务（single-flight，完成即移除）
     """
     
     def __init__(self, config: Optional[CacheConfig] = None):
         self.config = config or CacheConfig()
-        self._backend = MemoryCacheBackend[K, V](self.config)
+        # W-TinyLFU只由分片后端实现（shard_count为1时即单段）
+        if self.config.shard_count > 1 or self.config.strategy == CacheStrategy.W_TINYLFU:
+            self._backend = ShardedMemoryCacheBackend[K, V](self.config)
+        else:
+            self._backend = MemoryCacheBackend[K, V](self.config)
         
         # 防护机制
-        self._bloom_filter: Optional[BloomFilter] = None
+        self._bloom_filter: Optional[ScalableBloomFilter] = None
         if self.config.enable_bloom_filter:
-            self._bloom_filter = BloomFilter()
+            self._bloom_filter = ScalableBloomFilter(self.config.bloom_expected_items, self.config.bloom_fp_rate)
         
-        self._mutexes: Dict[K, asyncio.Lock] = {}
-        self._mutex_lock = asyncio.Lock()
+        self._inflight: Dict[K, asyncio.Task] = {}
         
         # 统计
         self._stats = CacheStats()
+        self._sizer = SizeEstimator()
         
         # 热点key
         self._hot_keys: Dict[K, Tuple[int, float]] = {}
@@ -437,6 +1552,15 @@ class CacheManager(Generic[K, V]):
         # 预取队列
         self._prefetch_queue: asyncio.Queue = asyncio.Queue()
         self._prefetch_task: Optional[asyncio.Task] = None
+        
+        # 快照：自上次快照以来变更的键 -> (版本, 是否删除)
+        self._snapshot: Optional[SnapshotStore] = None
+        self._lazy_restore: bool = False
+        self._dirty: Dict[K, Tuple[int, bool]] = {}
+        self._dirty_version: int = 0
+        self._snapshot_lock = asyncio.Lock()
+        self._snapshot_executor: Optional[ThreadPoolExecutor] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
     
     async def start(self):
         """启动缓存管理器"""
@@ -452,6 +1576,10 @@ class CacheManager(Generic[K, V]):
         if self.config.enable_prefetch:
             self._prefetch_task = asyncio.create_task(self._prefetch_loop())
         
+        # 启动增量快照任务
+        if self.config.enable_persistence and self.config.snapshot_interval > 0:
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+        
         logger.info("Cache manager started")
     
     async def stop(self):
@@ -462,10 +1590,15 @@ class CacheManager(Generic[K, V]):
             self._cleanup_task.cancel()
         if self._prefetch_task:
             self._prefetch_task.cancel()
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
         
         # 持久化（如果启用）
         if self.config.enable_persistence:
             await self._persist()
+        if self._snapshot_executor is not None:
+            self._snapshot_executor.shutdown(wait=True)
+            self._snapshot_executor = None
         
         logger.info("Cache manager stopped")
     
@@ -479,28 +1612,66 @@ class CacheManager(Generic[K, V]):
         Returns:
             缓存值或默认值
         """
+        entry = await self._get_entry(key)
+        return entry.value if entry is not None else default
+    
+    async def _get_entry(self, key: K, allow_stale: bool = False) -> Optional[CacheEntry[V]]:
+        """查找条目并记录统计
+        
+        Args:
+            key: 缓存键
+            allow_stale: 是否返回宽限期内的旧条目
+            
+        Returns:
+            缓存条目，未命中时为None
+        """
         start_time = time.time()
         
-        # 检查布隆过滤器（防穿透）
-        if self._bloom_filter and not await self._bloom_filter.contains(str(key)):
-            self._stats.record_miss(time.time() - start_time)
-            return default
+        # 检查布隆过滤器（防穿透），肯定不存在时跳过本级后端
+        bloom_negative = self._bloom_filter is not None and str(key) not in self._bloom_filter
         
-        # 获取缓存
-        entry = await self._backend.get(key)
+        # 获取缓存，本级未命中时再查下一级
+        entry = None if bloom_negative else await self._lookup(key)
+        if not entry or not (allow_stale or not entry.is_stale()):
+            entry = await self._lookup_next_level(key, allow_stale)
         
-        if entry:
+        if entry and (allow_stale or not entry.is_stale()):
             duration = time.time() - start_time
             self._stats.record_hit(duration)
             await self._update_hot_key(key)
-            return entry.value
+            return entry
         
         # 记录热点key可能的击穿
-        await self._track_miss(key)
+        if not bloom_negative:
+            await self._track_miss(key)
         
         duration = time.time() - start_time
         self._stats.record_miss(duration)
-        return default
+        return None
+    
+    async def _lookup_next_level(self, key: K, allow_stale: bool) -> Optional[CacheEntry[V]]:
+        """本级未命中时查询下一级缓存（单级缓存没有下一级）"""
+        return None
+    
+    async def _lookup(self, key: K) -> Optional[CacheEntry[V]]:
+        """从后端获取条目，延迟恢复期间未命中时再查快照"""
+        entry = await self._backend.get(key)
+        if entry is None and self._lazy_restore:
+            entry = await self._load_from_snapshot(key)
+        return entry
+    
+    async def _load_from_snapshot(self, key: K) -> Optional[CacheEntry[V]]:
+        """从快照加载单个条目到后端，快照之后变更过的键不读取快照"""
+        if key in self._dirty:
+            return None
+        record = self._snapshot.get(key)
+        if record is None:
+            return None
+        entry = CacheEntry(key=key, value=record.value, expires_at=record.expires_at,
+                           size=await self._calculate_size(record.value), stale_at=record.stale_at)
+        if not await self._backend.set(key, entry):
+            return None
+        return entry
     
     async def get_with_loader(
         self,
@@ -510,7 +1681,9 @@ class CacheManager(Generic[K, V]):
     ) -> V:
         """获取缓存值，如果不存在则加载
         
-        使用互斥锁防止缓存击穿。
+        同一key的并发未命中共享一个加载任务（single-flight）。配置了stale_ttl时，
+        宽限期内的旧值直接返回并在后台刷新；新鲜值按XFetch规则以随剩余时间
+        增大的概率提前在后台刷新，避免大量key同时过期引发的加载风暴。
         
         Args:
             key: 缓存键
@@ -520,82 +1693,125 @@ class CacheManager(Generic[K, V]):
         Returns:
             缓存值
         """
-        # 先尝试获取
-        value = await self.get(key)
-        if value is not None:
-            return value
-        
-        # 获取互斥锁（防击穿）
-        if self.config.enable_mutex:
-            async with self._get_mutex(key):
-                # 双重检查
-                value = await self.get(key)
-                if value is not None:
-                    return value
-                
-                # 加载数据
-                value = await self._load_with_timeout(loader)
-                await self.set(key, value, ttl)
-                return value
+        entry = await self._get_entry(key, allow_stale=True)
+        if entry is not None:
+            if entry.is_stale():
+                self._stats.stale_hits += 1
+                self._refresh(key, loader, ttl)
+            elif self._should_refresh_early(entry):
+                self._refresh(key, loader, ttl)
+            return entry.value
+        
+        if not self.config.enable_mutex:
+            return await self._load(key, loader, ttl)
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats.coalesced += 1
         else:
-            value = await self._load_with_timeout(loader)
-            await self.set(key, value, ttl)
-            return value
+            task = self._start_load(key, loader, ttl)
+            if task is None:
+                return await self._load(key, loader, ttl)
+        # shield：单个调用方被取消时不影响其他等待者共享的加载
+        return await asyncio.shield(task)
+    
+    def _should_refresh_early(self, entry: CacheEntry[V]) -> bool:
+        """XFetch：now - load_time * beta * ln(rand) >= 新鲜期结束时提前刷新"""
+        beta = self.config.early_expiration_beta
+        if beta <= 0 or entry.load_time <= 0:
+            return False
+        return time.time() - entry.load_time * beta * math.log(1.0 - random.random()) >= entry.fresh_until
     
-    def _get_mutex(self, key: K) -> asyncio.Lock:
-        """获取key对应的互斥锁"""
-        if key not in self._mutexes:
-            self._mutexes[key] = asyncio.Lock()
-        return self._mutexes[key]
+    def _refresh(self, key: K, loader: Callable[[], V], ttl: Optional[float]):
+        """后台刷新key，已有进行中的加载时不重复发起"""
+        if key in self._inflight:
+            return
+        if self._start_load(key, loader, ttl) is not None:
+            self._stats.refreshes += 1
+    
+    def _start_load(self, key: K, loader: Callable[[], V], ttl: Optional[float]) -> Optional[asyncio.Task]:
+        """登记并启动加载任务，登记表已满时返回None"""
+        if len(self._inflight) >= self.config.max_inflight_loads:
+            logger.debug(f"In-flight load limit reached, loading {key} without coalescing")
+            return None
+        task = asyncio.ensure_future(self._load(key, loader, ttl))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish_load(key, done))
+        return task
+    
+    def _finish_load(self, key: K, task: asyncio.Task):
+        """加载完成后从登记表移除，并取出异常避免未处理异常告警"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Load failed for key {key}: {task.exception()}")
+    
+    async def _load(self, key: K, loader: Callable[[], V], ttl: Optional[float]) -> V:
+        """执行加载并写入缓存"""
+        start_time = time.perf_counter()
+        value = await self._load_with_timeout(loader)
+        await self.set(key, value, ttl, load_time=time.perf_counter() - start_time)
+        return value
     
     async def _load_with_timeout(self, loader: Callable[[], V]) -> V:
-        """带超时的加载"""
-        if asyncio.iscoroutinefunction(loader):
-            return await asyncio.wait_for(loader(), timeout=self.config.mutex_timeout)
-        return loader()
+        """带超时的加载，loader可以是协程函数或返回可等待对象的普通函数"""
+        result = loader()
+        if inspect.isawaitable(result):
+            return await asyncio.wait_for(result, timeout=self.config.mutex_timeout)
+        return result
     
     async def set(
         self,
         key: K,
         value: V,
         ttl: Optional[float] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        load_time: float = 0.0,
+        size: Optional[int] = None
     ) -> bool:
         """设置缓存值
         
         Args:
             key: 缓存键
             value: 缓存值
-            ttl: 过期时间（秒）
+            ttl: 过期时间（秒），配置了stale_ttl时条目在此之后还保留stale_ttl秒旧值
             metadata: 元数据
+            load_time: 加载该值的耗时（秒），用于概率性提前刷新
+            size: 条目大小（字节，可选），缺省由SizeEstimator估算
             
         Returns:
-            是否设置成功
+            是否设置成功（超过max_bytes的值不会被缓存）
         """
         ttl = ttl or self.config.ttl
         
         # 计算大小
-        size = await self._calculate_size(value)
+        if size is None:
+            size = await self._calculate_size(value)
         
+        now = time.time()
         entry = CacheEntry(
             key=key,
             value=value,
-            expires_at=time.time() + ttl,
-            size=size
+            expires_at=now + ttl + self.config.stale_ttl,
+            size=size,
+            stale_at=now + ttl if self.config.stale_ttl > 0 else None,
+            load_time=load_time
         )
         
         if metadata:
             entry.metadata = metadata
         
         # 更新布隆过滤器
-        if self._bloom_filter:
-            await self._bloom_filter.add(str(key))
+        if self._bloom_filter is not None:
+            self._bloom_filter.add_item(str(key))
         
         result = await self._backend.set(key, entry)
         
         if result:
             self._stats.record_set()
-            self._stats.total_size += size
+            self._mark_dirty(key)
+        else:
+            logger.debug(f"Value for {key} ({size} bytes) exceeds max_bytes, not cached")
         
         return result
     
@@ -627,6 +1843,8 @@ class CacheManager(Generic[K, V]):
         result = await self._backend.delete(key)
         if result:
             self._stats.record_delete()
+        # 键可能只存在于快照中，删除同样需要记录
+        self._mark_dirty(key, deleted=True)
         return result
     
     async def delete_many(self, keys: List[K]) -> int:
@@ -647,16 +1865,19 @@ class CacheManager(Generic[K, V]):
     async def clear(self):
         """清空所有缓存"""
         await self._backend.clear()
-        if self._bloom_filter:
+        if self._bloom_filter is not None:
             await self._bloom_filter.clear()
         self._hot_keys.clear()
-        self._stats.total_size = 0
+        if self._snapshot is not None:
+            self._snapshot.clear()
+        self._dirty.clear()
+        self._lazy_restore = False
         logger.info("Cache cleared")
     
     async def exists(self, key: K) -> bool:
         """检查key是否存在"""
-        entry = await self._backend.get(key)
-        return entry is not None and not entry.is_expired()
+        entry = await self._lookup(key)
+        return entry is not None and not entry.is_expired() and not entry.is_stale()
     
     async def ttl(self, key: K) -> float:
         """获取key的剩余生存时间
@@ -664,7 +1885,7 @@ class CacheManager(Generic[K, V]):
         Returns:
             剩余秒数，-1表示不存在或永不过期
         """
-        entry = await self._backend.get(key)
+        entry = await self._lookup(key)
         if entry:
             return entry.time_to_live()
         return -1
@@ -679,9 +1900,13 @@ class CacheManager(Generic[K, V]):
         Returns:
             是否设置成功
         """
-        entry = await self._backend.get(key)
+        entry = await self._lookup(key)
         if entry:
-            entry.expires_at = time.time() + ttl
+            now = time.time()
+            entry.expires_at = now + ttl + self.config.stale_ttl
+            if entry.stale_at is not None:
+                entry.stale_at = now + ttl
+            self._mark_dirty(key)
             return True
         return False
     
@@ -722,7 +1947,7 @@ class CacheManager(Generic[K, V]):
     
     async def _cleanup_expired(self):
         """清理过期条目"""
-        if isinstance(self._backend, MemoryCacheBackend):
+        if isinstance(self._backend, (MemoryCacheBackend, ShardedMemoryCacheBackend)):
             expired_keys = await self._backend.get_expired_keys()
             for key in expired_keys:
                 await self._backend.delete(key)
@@ -773,11 +1998,8 @@ class CacheManager(Generic[K, V]):
             return [(k, v[0]) for k, v in sorted_keys[:limit]]
     
     async def _calculate_size(self, value: V) -> int:
-        """计算值的大小"""
-        try:
-            return len(pickle.dumps(value))
-        except Exception:
-            return 0
+        """估算值的内存大小（字节）"""
+        return self._sizer(value)
     
     async def _prefetch_loop(self):
         """预取循环"""
@@ -796,42 +2018,136 @@ class CacheManager(Generic[K, V]):
         if self.config.enable_prefetch:
             await self._prefetch_queue.put((key, loader))
     
+    def _mark_dirty(self, key: K, deleted: bool = False):
+        """记录自上次快照以来变更的键"""
+        if self.config.enable_persistence or self._snapshot is not None:
+            self._dirty_version += 1
+            self._dirty[key] = (self._dirty_version, deleted)
+    
+    def _snapshot_store(self) -> Optional[SnapshotStore]:
+        """打开快照目录，旧版pickle文件在此时被新格式取代"""
+        if self._snapshot is None and self.config.persistence_path:
+            path = self.config.persistence_path
+            if os.path.isfile(path):
+                os.remove(path)
+            self._snapshot = SnapshotStore(path)
+        return self._snapshot
+    
+    async def snapshot(self) -> int:
+        """增量快照：把自上次快照以来变更的键追加到快照
+        
+        条目在事件循环中收集，序列化与文件写入在后台线程中进行。
+        
+        Returns:
+            写入的条目数
+        """
+        store = self._snapshot_store()
+        if store is None:
+            return 0
+        
+        async with self._snapshot_lock:
+            pending = dict(self._dirty)
+            if not pending:
+                return 0
+            records = []
+            deleted = []
+            for key, (_, is_deleted) in pending.items():
+                entry = None if is_deleted else await self._backend.peek(key)
+                if entry is None or entry.is_expired():
+                    # 已删除或在快照前被驱逐，快照中的旧值也需失效
+                    deleted.append(key)
+                else:
+                    records.append((key, entry.value, entry.expires_at, entry.stale_at))
+            
+            if self._snapshot_executor is None:
+                self._snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-snapshot')
+            loop = asyncio.get_running_loop()
+            written = await loop.run_in_executor(self._snapshot_executor, store.write, records, deleted)
+            
+            # 写入期间再次变更的键保留到下一次快照
+            for key, (version, _) in pending.items():
+                current = self._dirty.get(key)
+                if current is not None and current[0] == version:
+                    del self._dirty[key]
+            return written
+    
+    async def _snapshot_loop(self):
+        """增量快照循环"""
+        while self._is_running:
+            try:
+                await asyncio.sleep(self.config.snapshot_interval)
+                await self.snapshot()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Snapshot error: {e}")
+    
     async def _persist(self):
         """持久化缓存"""
         if not self.config.persistence_path:
             return
         
         try:
-            data = {}
-            keys = await self._backend.keys()
-            for key in keys:
-                entry = await self._backend.get(key)
-                if entry and not entry.is_expired():
-                    data[key] = entry.value
-            
-            with open(self.config.persistence_path, 'wb') as f:
-                pickle.dump(data, f)
+            written = await self.snapshot()
+            if self._bloom_filter is not None:
+                self._bloom_filter.save(self._bloom_snapshot_path())
             
-            logger.info(f"Cache persisted to {self.config.persistence_path}")
+            logger.info(f"Cache persisted to {self.config.persistence_path} ({written} entries written)")
         except Exception as e:
             logger.error(f"Persist error: {e}")
     
+    def _bloom_snapshot_path(self) -> str:
+        """布隆过滤器快照与缓存持久化文件放在一起"""
+        return f"{self.config.persistence_path}.bloom"
+    
     async def restore(self) -> int:
         """从持久化恢复缓存
         
+        lazy_restore为True时只映射快照索引，条目在首次访问时加载；否则加载全部
+        未过期条目。过期时间与宽限期按快照中的记录恢复。
+        
         Returns:
-            恢复的数量
+            恢复（或可延迟恢复）的条目数
         """
-        if not self.config.persistence_path:
+        path = self.config.persistence_path
+        if not path:
             return 0
         
         try:
-            with open(self.config.persistence_path, 'rb') as f:
-                data = pickle.load(f)
+            # 先恢复布隆过滤器快照，预热时重复的键不会再占用容量
+            bloom_path = self._bloom_snapshot_path()
+            bloom_restored = self._bloom_filter is not None and os.path.exists(bloom_path)
+            if bloom_restored:
+                self._bloom_filter = ScalableBloomFilter.load(bloom_path)
+            
+            if os.path.isfile(path):
+                # 旧版格式：单个pickle文件
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                await self.warmup(data)
+                logger.info(f"Cache restored from legacy snapshot {path}")
+                return len(data)
+            if not os.path.isdir(path):
+                return 0
+            
+            store = self._snapshot_store()
+            if self.config.lazy_restore:
+                if self._bloom_filter is not None and not bloom_restored:
+                    self._bloom_filter.add_many(str(key) for key in store.keys())
+                self._lazy_restore = True
+                logger.info(f"Cache snapshot attached from {path} ({len(store)} entries, lazy)")
+                return len(store)
             
-            await self.warmup(data)
-            logger.info(f"Cache restored from {self.config.persistence_path}")
-            return len(data)
+            count = 0
+            for record in store.iter_records():
+                entry = CacheEntry(key=record.key, value=record.value, expires_at=record.expires_at,
+                                   size=await self._calculate_size(record.value), stale_at=record.stale_at)
+                if await self._backend.set(record.key, entry):
+                    if self._bloom_filter is not None and not bloom_restored:
+                        self._bloom_filter.add_item(str(record.key))
+                    count += 1
+            logger.info(f"Cache restored from {path} ({count} entries)")
+            return count
         except Exception as e:
             logger.error(f"Restore error: {e}")
             return 0
@@ -899,11 +2215,47 @@ class CacheManager(Generic[K, V]):
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息（同步版本）"""
         stats = self._stats.to_dict()
+        if isinstance(self._backend, (MemoryCacheBackend, ShardedMemoryCacheBackend)):
+            stats['total_size'] = self._backend.bytes_used
+            stats['max_bytes'] = self.config.max_bytes
+        if isinstance(self._backend, ShardedMemoryCacheBackend):
+            CacheStats.roll_up(stats, self._backend.shard_stats())
         return stats
     
+    async def memory_breakdown(self, top_n: int = 10) -> Dict[str, Any]:
+        """按命名空间统计内存占用并列出最大的键
+        
+        命名空间为键在namespace_separator之前的部分，不含分隔符的键归入空命名空间。
+        
+        Args:
+            top_n: 返回的最大键数量
+            
+        Returns:
+            total_bytes、max_bytes、namespaces（命名空间 -> keys/bytes，按字节数降序）
+            与largest_keys（(键, 字节数)列表）
+        """
+        if not isinstance(self._backend, (MemoryCacheBackend, ShardedMemoryCacheBackend)):
+            return {'total_bytes': 0, 'max_bytes': self.config.max_bytes, 'namespaces': {}, 'largest_keys': []}
+        
+        sizes = await self._backend.entry_sizes()
+        separator = self.config.namespace_separator
+        namespaces: Dict[str, Dict[str, int]] = defaultdict(lambda: {'keys': 0, 'bytes': 0})
+        for key, size in sizes:
+            namespace = str(key).split(separator, 1)[0] if separator in str(key) else ''
+            usage = namespaces[namespace]
+            usage['keys'] += 1
+            usage['bytes'] += size
+        
+        return {
+            'total_bytes': sum(size for _, size in sizes),
+            'max_bytes': self.config.max_bytes,
+            'namespaces': dict(sorted(namespaces.items(), key=lambda item: item[1]['bytes'], reverse=True)),
+            'largest_keys': heapq.nlargest(top_n, sizes, key=lambda item: item[1]),
+        }
+    
     async def get_stats_async(self) -> Dict[str, Any]:
         """异步获取统计信息"""
-        stats = self._stats.to_dict()
+        stats = self.get_stats()
         stats['size'] = await self._backend.size()
         return stats
     
@@ -919,6 +2271,11 @@ class MultiLevelCache(CacheManager):
     """多级缓存管理器
     
     实现L1（内存）+ L2（持久化/分布式）两级缓存。
+    
+    L2写入默认异步进行：set只更新L1并登记待写回的key，同一key的多次写入在
+    写回前合并，写回时调用L2的set_many/delete_many批量完成。L1未命中时从L2
+    读取并回填L1（不再写回L2）。start后定期轮询L2的失效通知，把其他进程
+    修改过的key从L1中剔除，保持各进程L1与L2一致。
     """
     
     def __init__(
@@ -929,32 +2286,204 @@ class MultiLevelCache(CacheManager):
         super().__init__(l1_config)
         self._l1 = self._backend
         self._l2 = l2_backend  # 可扩展为Redis等
+        # 待写回L2的key -> 条目（None表示删除）
+        self._l2_pending: Dict[K, Optional[CacheEntry[V]]] = {}
+        # 正在写回、尚未提交的批次，读取时与_l2_pending一样优先于L2
+        self._l2_inflight: Dict[K, Optional[CacheEntry[V]]] = {}
+        self._l2_flush_task: Optional[asyncio.Task] = None
+        self._l2_flush_lock = asyncio.Lock()
+        self._invalidation_task: Optional[asyncio.Task] = None
     
-    async def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
-        """获取值 - 先查L1，再查L2"""
-        # L1查询
-        value = await super().get(key)
-        if value is not None:
-            return value
-        
-        # L2查询（如果有）
+    async def start(self):
+        """启动缓存管理器与L2失效通知轮询"""
+        await super().start()
+        if self._l2 and self.config.l2_invalidation_interval > 0 and self._invalidation_task is None:
+            self._invalidation_task = asyncio.create_task(self._invalidation_loop())
+    
+    async def stop(self):
+        """停止缓存管理器，写回待写入L2的数据后关闭L2"""
+        if self._invalidation_task:
+            self._invalidation_task.cancel()
+            self._invalidation_task = None
+        await super().stop()
         if self._l2:
+            await self.flush_l2()
+            await self._l2.close()
+    
+    async def _lookup_next_level(self, key: K, allow_stale: bool) -> Optional[CacheEntry[V]]:
+        """L1未命中时查询L2，尚未写回的删除优先；命中与否由_get_entry统一计入统计"""
+        if not self._l2:
+            return None
+        unflushed, entry = self._unflushed(key)
+        if not unflushed:
             entry = await self._l2.get(key)
-            if entry and not entry.is_expired():
-                # 回填L1
-                await self.set(key, entry.value)
-                return entry.value
+            # 读取L2期间本进程可能写入或删除了该key，以未写回的数据为准
+            unflushed, pending = self._unflushed(key)
+            if unflushed:
+                entry = pending
+            elif entry is not None:
+                await self._fill_l1(key, entry)
+        if entry is not None and not entry.is_expired() and (allow_stale or not entry.is_stale()):
+            return entry
+        return None
+    
+    def _unflushed(self, key: K) -> Tuple[bool, Optional[CacheEntry[V]]]:
+        """本进程尚未提交到L2的写入：(是否存在, 条目或None表示删除)"""
+        for pending in (self._l2_pending, self._l2_inflight):
+            if key in pending:
+                return True, pending[key]
+        return False, None
+    
+    async def _fill_l1(self, key: K, entry: CacheEntry[V]):
+        """把L2条目回填L1，保留其过期时间"""
+        if entry.is_expired():
+            return
+        if not entry.size:
+            entry.size = await self._calculate_size(entry.value)
+        if self._bloom_filter is not None:
+            self._bloom_filter.add_item(str(key))
+        await self._l1.set(key, entry)
+    
+    async def get_many(self, keys: List[K]) -> Dict[K, V]:
+        """批量获取 - L1未命中的key通过一次L2批量查询获取
+        
+        Args:
+            keys: 键列表
+            
+        Returns:
+            命中的键 -> 值
+        """
+        values: Dict[K, V] = {}
+        missing = []
+        for key in keys:
+            entry = await self._l1.get(key)
+            if entry is not None and not entry.is_stale():
+                values[key] = entry.value
+                self._stats.record_hit(0.0)
+                continue
+            unflushed, pending = self._unflushed(key)
+            if not unflushed:
+                missing.append(key)
+            elif pending is not None and not pending.is_stale():
+                values[key] = pending.value
         
-        return default
+        if self._l2 and missing:
+            for key, entry in (await self._l2.get_many(missing)).items():
+                unflushed, pending = self._unflushed(key)
+                if unflushed:
+                    entry = pending
+                    if entry is None:
+                        continue
+                else:
+                    await self._fill_l1(key, entry)
+                if not entry.is_stale():
+                    values[key] = entry.value
+        for key in missing:
+            if key in values:
+                self._stats.record_hit(0.0)
+            else:
+                self._stats.record_miss(0.0)
+        return values
     
     async def set(self, key: K, value: V, ttl: Optional[float] = None, **kwargs) -> bool:
-        """设置值 - 同时设置L1和L2"""
+        """设置值 - 写入L1，并同步或异步写入L2"""
         # 设置L1
         result = await super().set(key, value, ttl, **kwargs)
         
         # 设置L2
         if self._l2:
-            entry = CacheEntry(key=key, value=value, expires_at=time.time() + (ttl or self.config.ttl))
-            await self._l2.set(key, entry)
+            ttl = ttl or self.config.ttl
+            now = time.time()
+            entry = CacheEntry(
+                key=key,
+                value=value,
+                expires_at=now + ttl + self.config.stale_ttl,
+                size=kwargs.get('size') or 0,
+                stale_at=now + ttl if self.config.stale_ttl > 0 else None
+            )
+            await self._write_l2(key, entry)
         
         return result
+    
+    async def delete(self, key: K) -> bool:
+        """删除 - 同时删除L1和L2"""
+        result = await super().delete(key)
+        if self._l2:
+            await self._write_l2(key, None)
+        return result
+    
+    async def _write_l2(self, key: K, entry: Optional[CacheEntry[V]]):
+        """写入L2：write-behind模式下登记并调度写回，否则立即写入"""
+        if not self.config.l2_write_behind:
+            if entry is None:
+                await self._l2.delete(key)
+            else:
+                await self._l2.set(key, entry)
+            return
+        
+        self._l2_pending[key] = entry
+        if len(self._l2_pending) >= self.config.l2_batch_size:
+            await self.flush_l2()
+        elif self._l2_flush_task is None or self._l2_flush_task.done():
+            self._l2_flush_task = asyncio.ensure_future(self._delayed_flush())
+    
+    async def _delayed_flush(self):
+        """等待写回间隔，期间的写入合并为一批"""
+        try:
+            await asyncio.sleep(self.config.l2_flush_interval)
+            await self.flush_l2()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"L2 write-behind error: {e}")
+    
+    async def flush_l2(self) -> int:
+        """立即把待写入的数据批量写回L2
+        
+        Returns:
+            写回的key数
+        """
+        async with self._l2_flush_lock:
+            pending, self._l2_pending = self._l2_pending, {}
+            if not pending:
+                return 0
+            # 提交前读取仍能看到这一批，避免从L2读到旧值回填L1
+            self._l2_inflight = pending
+            upserts = {key: entry for key, entry in pending.items() if entry is not None}
+            deletes = [key for key, entry in pending.items() if entry is None]
+            try:
+                if upserts:
+                    await self._l2.set_many(upserts)
+                if deletes:
+                    await self._l2.delete_many(deletes)
+            except Exception:
+                # 写回失败时放回待写队列，不覆盖期间的新写入
+                for key, entry in pending.items():
+                    self._l2_pending.setdefault(key, entry)
+                raise
+            finally:
+                self._l2_inflight = {}
+            return len(pending)
+    
+    async def _invalidation_loop(self):
+        """轮询L2失效通知，把其他进程修改过的key从L1剔除"""
+        while self._is_running:
+            try:
+                await asyncio.sleep(self.config.l2_invalidation_interval)
+                await self.apply_invalidations()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"L2 invalidation error: {e}")
+    
+    async def apply_invalidations(self) -> int:
+        """拉取一次L2失效通知并剔除L1中的对应key，本进程尚未写回的key除外
+        
+        Returns:
+            剔除的key数
+        """
+        count = 0
+        for key in await self._l2.invalidations():
+            if not self._unflushed(key)[0] and await self._l1.delete(key):
+                count += 1
+        return count
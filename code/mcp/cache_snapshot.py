@@ -0,0 +1,449 @@
+"""
+MCP缓存快照模块
+
+为CacheManager提供只追加、分段的快照存储：
+- 每次增量快照把变更的条目追加为一个新的段文件
+- 索引为按键哈希排序的定长记录数组，通过mmap二分查找，打开时无需读取数据
+- 单个键可按需从快照读取（延迟恢复）
+- 保留TTL元数据，过期条目在读取时跳过
+- 失效数据超过一半时自动压缩
+
+目录结构：
+    <directory>/index.idx       排序索引
+    <directory>/seg-00000001.dat 段文件
+
+示例：
+    >>> store = SnapshotStore("/var/cache/schemas")
+    >>> store.write([("key", "value", time.time() + 300, None)], deleted=[])
+    >>> record = store.get("key")
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 段记录头：键长度、值长度、过期时间、变旧时间（NaN表示无）
+_RECORD = struct.Struct('<IIdd')
+# 索引头：魔数、版本、记录数、下一个段号
+_INDEX_HEADER = struct.Struct('<4sIQI')
+# 索引记录：键哈希、段号、偏移、记录长度、过期时间、变旧时间
+_INDEX_ENTRY = struct.Struct('<QIQIdd')
+if NUMPY_AVAILABLE:
+    # 与_INDEX_ENTRY逐字节一致的结构化类型，用于向量化合并索引
+    _INDEX_DTYPE = np.dtype([('hash', '<u8'), ('segment', '<u4'), ('offset', '<u8'), ('length', '<u4'),
+                             ('expires_at', '<f8'), ('stale_at', '<f8')])
+_INDEX_MAGIC = b'CIX1'
+_INDEX_VERSION = 1
+_INDEX_NAME = 'index.idx'
+
+
+@dataclass
+class SnapshotRecord:
+    """快照中的一个条目
+
+    Attributes:
+        key: 缓存键
+        value: 缓存值
+        expires_at: 过期时间
+        stale_at: 变旧时间（None表示无宽限期）
+    """
+    key: Any
+    value: Any
+    expires_at: float
+    stale_at: Optional[float] = None
+
+
+def _encode_key(key: Any) -> bytes:
+    """键编码：字符串直接用UTF-8，其他键用pickle"""
+    if isinstance(key, str):
+        return b's' + key.encode('utf-8')
+    return b'p' + pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_key(data: bytes) -> Any:
+    if data[:1] == b's':
+        return data[1:].decode('utf-8')
+    return pickle.loads(data[1:])
+
+
+def _key_hash(encoded_key: bytes) -> int:
+    """跨进程稳定的64位键哈希"""
+    return int.from_bytes(hashlib.blake2b(encoded_key, digest_size=8).digest(), 'little')
+
+
+def _segment_name(segment_id: int) -> str:
+    return f"seg-{segment_id:08d}.dat"
+
+
+class SnapshotStore:
+    """只追加的分段快照存储
+
+    索引按64位键哈希排序，查找时在mmap上二分，只读取命中记录所在段的对应区间。
+    读取时校验键本身，哈希冲突的键视为不存在。
+
+    write/compact可在后台线程中调用，get可同时在事件循环中调用：新的段和索引
+    写入临时文件后原子替换，替换与读取由同一把锁保护。
+    """
+
+    def __init__(self, directory: str, compact_ratio: float = 0.5, compact_min_bytes: int = 1 << 20):
+        """
+        初始化快照存储
+
+        Args:
+            directory: 快照目录（不存在时创建）
+            compact_ratio: 失效字节占比超过该值时压缩
+            compact_min_bytes: 段文件总大小低于该值时不压缩
+        """
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._index_file = None
+        self._index: Optional[mmap.mmap] = None
+        self._count = 0
+        self._next_segment = 1
+        self._segments: Dict[int, mmap.mmap] = {}
+        self._segment_files: Dict[int, Any] = {}
+        self._open_index()
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, _INDEX_NAME)
+
+    def _open_index(self):
+        """映射索引文件，调用方需持有锁或处于初始化阶段"""
+        path = self._index_path()
+        if not os.path.exists(path):
+            self._count = 0
+            return
+        index_file = open(path, 'rb')
+        try:
+            index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            index_file.close()
+            raise ValueError(f"Empty snapshot index: {path}")
+        magic, version, count, next_segment = _INDEX_HEADER.unpack_from(index, 0)
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            index.close()
+            index_file.close()
+            raise ValueError(f"Invalid snapshot index: {path}")
+        self._index_file, self._index = index_file, index
+        self._count, self._next_segment = count, next_segment
+
+    def _close_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+        self._index = self._index_file = None
+
+    def _entry(self, position: int) -> Tuple[int, int, int, int, float, float]:
+        return _INDEX_ENTRY.unpack_from(self._index, _INDEX_HEADER.size + position * _INDEX_ENTRY.size)
+
+    def _find(self, key_hash: int) -> Optional[Tuple[int, int, int, int, float, float]]:
+        """在mmap索引上二分查找哈希，调用方需持有锁"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry_hash, = struct.unpack_from('<Q', self._index, _INDEX_HEADER.size + middle * _INDEX_ENTRY.size)
+            if entry_hash < key_hash:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count:
+            entry = self._entry(low)
+            if entry[0] == key_hash:
+                return entry
+        return None
+
+    def _entries(self) -> List[Tuple[int, int, int, int, float, float]]:
+        """读取全部索引记录，调用方需持有锁"""
+        if not self._count:
+            return []
+        start = _INDEX_HEADER.size
+        return list(_INDEX_ENTRY.iter_unpack(self._index[start:start + self._count * _INDEX_ENTRY.size]))
+
+    def _merged_index(self, new_entries: Dict[int, Tuple], removed: set, now: float) -> Tuple[bytes, int]:
+        """合并现有索引与新记录：去掉过期、删除和被覆盖的键，按哈希排序后打包
+
+        Returns:
+            (索引记录字节, 记录数)
+        """
+        removed = removed | new_entries.keys()
+        if NUMPY_AVAILABLE:
+            with self._lock:
+                current = np.frombuffer(self._index, dtype=_INDEX_DTYPE, count=self._count,
+                                        offset=_INDEX_HEADER.size).copy() if self._count else \
+                    np.empty(0, dtype=_INDEX_DTYPE)
+            keep = current['expires_at'] > now
+            if removed:
+                keep &= ~np.isin(current['hash'], np.fromiter(removed, dtype=np.uint64, count=len(removed)))
+            merged = np.concatenate([current[keep], np.array(list(new_entries.values()), dtype=_INDEX_DTYPE)])
+            merged = merged[np.argsort(merged['hash'], kind='stable')]
+            return merged.tobytes(), len(merged)
+
+        with self._lock:
+            merged = [entry for entry in self._entries() if entry[4] > now and entry[0] not in removed]
+        merged.extend(new_entries.values())
+        merged.sort(key=lambda entry: entry[0])
+        pack = _INDEX_ENTRY.pack
+        return b''.join(pack(*entry) for entry in merged), len(merged)
+
+    def _write_index(self, packed: bytes, count: int, next_segment: int) -> str:
+        """写出索引到临时文件，返回其路径"""
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, count, next_segment))
+            f.write(packed)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _install_index(self, tmp_path: str):
+        """原子替换索引并重新映射，调用方需持有锁"""
+        self._close_index()
+        os.replace(tmp_path, self._index_path())
+        self._open_index()
+
+    # ------------------------------------------------------------------
+    # 段
+    # ------------------------------------------------------------------
+
+    def _segment(self, segment_id: int) -> mmap.mmap:
+        """按需映射段文件，调用方需持有锁"""
+        segment = self._segments.get(segment_id)
+        if segment is None:
+            segment_file = open(os.path.join(self.directory, _segment_name(segment_id)), 'rb')
+            segment = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._segment_files[segment_id] = segment_file
+            self._segments[segment_id] = segment
+        return segment
+
+    def _close_segments(self, segment_ids: Iterable[int]):
+        for segment_id in list(segment_ids):
+            segment = self._segments.pop(segment_id, None)
+            if segment is not None:
+                segment.close()
+                self._segment_files.pop(segment_id).close()
+
+    def _read(self, entry: Tuple) -> Tuple[bytes, bytes]:
+        """读取记录的(键编码, 值编码)，调用方需持有锁"""
+        _, segment_id, offset, length, _, _ = entry
+        segment = self._segment(segment_id)
+        key_length, value_length, _, _ = _RECORD.unpack_from(segment, offset)
+        start = offset + _RECORD.size
+        return segment[start:start + key_length], segment[start + key_length:start + key_length + value_length]
+
+    @staticmethod
+    def _record(encoded_key: bytes, value: bytes, expires_at: float, stale_at: Optional[float]) -> bytes:
+        return _RECORD.pack(len(encoded_key), len(value), expires_at,
+                            math.nan if stale_at is None else stale_at) + encoded_key + value
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """索引中的条目数（含尚未清理的过期条目）"""
+        return self._count
+
+    def get(self, key: Any, now: Optional[float] = None) -> Optional[SnapshotRecord]:
+        """
+        读取单个条目
+
+        Args:
+            key: 缓存键
+            now: 判断过期的当前时间（可选，缺省为time.time()）
+
+        Returns:
+            快照记录，不存在或已过期时为None
+        """
+        encoded_key = _encode_key(key)
+        key_hash = _key_hash(encoded_key)
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._index is None:
+                return None
+            entry = self._find(key_hash)
+            if entry is None or entry[4] <= now:
+                return None
+            stored_key, value = self._read(entry)
+        if stored_key != encoded_key:
+            return None
+        stale_at = entry[5]
+        return SnapshotRecord(key, pickle.loads(value), entry[4], None if math.isnan(stale_at) else stale_at)
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+
+    def keys(self, now: Optional[float] = None) -> List[Any]:
+        """所有未过期的键（需读取各记录的键）"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return [_decode_key(self._read(entry)[0]) for entry in self._entries() if entry[4] > now]
+
+    def iter_records(self, now: Optional[float] = None) -> Iterator[SnapshotRecord]:
+        """按段顺序遍历所有未过期的条目"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = sorted((entry for entry in self._entries() if entry[4] > now),
+                             key=lambda entry: (entry[1], entry[2]))
+        for entry in entries:
+            with self._lock:
+                try:
+                    encoded_key, value = self._read(entry)
+                except (OSError, ValueError):
+                    # 读取期间被压缩替换，跳过
+                    continue
+            stale_at = entry[5]
+            yield SnapshotRecord(_decode_key(encoded_key), pickle.loads(value), entry[4],
+                                 None if math.isnan(stale_at) else stale_at)
+
+    def write(self, records: Iterable[Tuple[Any, Any, float, Optional[float]]],
+              deleted: Iterable[Any] = ()) -> int:
+        """
+        追加一批变更（增量快照）
+
+        新值写入一个新的段文件，删除的键从索引中移除，然后原子替换索引。
+        可在后台线程中调用；同一时间只有一个写入者。
+
+        Args:
+            records: (键, 值, 过期时间, 变旧时间)序列
+            deleted: 删除的键
+
+        Returns:
+            写入的条目数
+        """
+        with self._write_lock:
+            now = time.time()
+            segment_id = self._next_segment
+            segment_path = os.path.join(self.directory, _segment_name(segment_id))
+            new_entries: Dict[int, Tuple] = {}
+            offset = 0
+            with open(segment_path, 'wb') as f:
+                for key, value, expires_at, stale_at in records:
+                    if expires_at <= now:
+                        continue
+                    encoded_key = _encode_key(key)
+                    try:
+                        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                    except Exception as e:
+                        logger.warning(f"Skipping unpicklable cache value for {key}: {e}")
+                        continue
+                    record = self._record(encoded_key, payload, expires_at, stale_at)
+                    f.write(record)
+                    key_hash = _key_hash(encoded_key)
+                    new_entries[key_hash] = (key_hash, segment_id, offset, len(record), expires_at,
+                                             math.nan if stale_at is None else stale_at)
+                    offset += len(record)
+                f.flush()
+                os.fsync(f.fileno())
+            if not offset:
+                os.remove(segment_path)
+            deleted_hashes = {_key_hash(_encode_key(key)) for key in deleted}
+
+            packed, count = self._merged_index(new_entries, deleted_hashes, now)
+            tmp_path = self._write_index(packed, count, segment_id + 1 if offset else segment_id)
+            with self._lock:
+                self._install_index(tmp_path)
+
+            if self._should_compact():
+                self._compact()
+            return len(new_entries)
+
+    def _segment_sizes(self) -> Dict[int, int]:
+        sizes = {}
+        for name in os.listdir(self.directory):
+            if name.startswith('seg-') and name.endswith('.dat'):
+                sizes[int(name[4:-4])] = os.path.getsize(os.path.join(self.directory, name))
+        return sizes
+
+    def stats(self) -> Dict[str, int]:
+        """条目数、段数、段文件总字节数与有效字节数"""
+        with self._lock:
+            live_bytes = sum(entry[3] for entry in self._entries())
+        sizes = self._segment_sizes()
+        return {'entries': self._count, 'segments': len(sizes),
+                'total_bytes': sum(sizes.values()), 'live_bytes': live_bytes}
+
+    def _should_compact(self) -> bool:
+        stats = self.stats()
+        if stats['total_bytes'] < self.compact_min_bytes:
+            return False
+        return stats['total_bytes'] - stats['live_bytes'] > stats['total_bytes'] * self.compact_ratio
+
+    def compact(self):
+        """把有效条目重写到一个新段并删除旧段"""
+        with self._write_lock:
+            self._compact()
+
+    def _compact(self):
+        """压缩，调用方需持有写锁"""
+        now = time.time()
+        with self._lock:
+            entries = sorted((entry for entry in self._entries() if entry[4] > now),
+                             key=lambda entry: (entry[1], entry[2]))
+        segment_id = self._next_segment
+        segment_path = os.path.join(self.directory, _segment_name(segment_id))
+        new_entries = []
+        offset = 0
+        with open(segment_path, 'wb') as f:
+            for entry in entries:
+                with self._lock:
+                    segment = self._segment(entry[1])
+                    record = segment[entry[2]:entry[2] + entry[3]]
+                f.write(record)
+                new_entries.append((entry[0], segment_id, offset) + entry[3:])
+                offset += entry[3]
+            f.flush()
+            os.fsync(f.fileno())
+        if not offset:
+            os.remove(segment_path)
+        new_entries.sort(key=lambda entry: entry[0])
+        pack = _INDEX_ENTRY.pack
+        tmp_path = self._write_index(b''.join(pack(*entry) for entry in new_entries), len(new_entries),
+                                     segment_id + 1)
+        old_segments = [sid for sid in self._segment_sizes() if sid != segment_id]
+        with self._lock:
+            self._install_index(tmp_path)
+            self._close_segments(old_segments)
+        for old_id in old_segments:
+            os.remove(os.path.join(self.directory, _segment_name(old_id)))
+        logger.info(f"Snapshot compacted: {len(new_entries)} entries in {self.directory}")
+
+    def clear(self):
+        """删除所有段与索引"""
+        with self._write_lock, self._lock:
+            self._close_index()
+            self._close_segments(list(self._segments))
+            for name in os.listdir(self.directory):
+                if name == _INDEX_NAME or (name.startswith('seg-') and name.endswith('.dat')):
+                    os.remove(os.path.join(self.directory, name))
+            self._count = 0
+            self._next_segment = 1
+
+    def close(self):
+        """释放映射与文件句柄"""
+        with self._lock:
+            self._close_index()
+            self._close_segments(list(self._segments))
@@ -6,7 +6,8 @@ MCP连接池优化模块
 - 动态连接扩容/缩容
 - 连接健康检查
 - 连接超时管理
-- 负载均衡策略
+- 负载均衡策略（空闲连接集合按策略组织，选择为O(1)或O(log n)）
+- 连接多路复用（单个连接同时承载多个请求）
 
 示例：
     >>> config = ConnectionPoolConfig(max_connections=20, min_connections=5)
@@ -16,9 +17,11 @@ MCP连接池优化模块
 """
 
 import asyncio
+import heapq
 import logging
+import random
 import time
-from collections import deque
+from collections import OrderedDict, deque
 from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
 from enum import Enum
@@ -55,6 +58,7 @@ class ConnectionPoolConfig:
         load_balance_strategy: 负载均衡策略
         retry_attempts: 连接重试次数
         retry_delay: 重试延迟（秒）
+        max_inflight_per_connection: 每个连接同时承载的请求数（多路复用深度），1为独占
     """
     max_connections: int = 20
     min_connections: int = 5
@@ -69,8 +73,11 @@ class ConnectionPoolConfig:
     retry_attempts: int = 3
     retry_delay: float = 1.0
     enable_metrics: bool = True
+    max_inflight_per_connection: int = 1
     
     def __post_init__(self):
+        if self.max_inflight_per_connection < 1:
+            raise ValueError("max_inflight_per_connection must be at least 1")
         if self.min_connections > self.max_connections:
             raise ValueError("min_connections cannot be greater than max_connections")
         if self.warmup_size > self.max_connections:
@@ -122,6 +129,7 @@ class PooledConnection:
         created_at: 创建时间
         last_used_at: 最后使用时间
         use_count: 使用次数
+        inflight: 进行中的请求数（多路复用时可大于1）
     """
     
     _id_counter: int = 0
@@ -133,6 +141,7 @@ class PooledConnection:
         self.created_at: float = time.time()
         self.last_used_at: float = time.time()
         self.use_count: int = 0
+        self.inflight: int = 0
         self.health_check_failures: int = 0
         
         self._assign_id_sync()
@@ -142,14 +151,17 @@ class PooledConnection:
         self.id: int = PooledConnection._id_counter
     
     def mark_busy(self):
-        """标记为忙碌状态"""
+        """标记为忙碌状态（进行中的请求数加一）"""
         self.state = ConnectionState.BUSY
         self.last_used_at = time.time()
         self.use_count += 1
+        self.inflight += 1
     
     def mark_idle(self):
-        """标记为空闲状态"""
-        self.state = ConnectionState.IDLE
+        """结束一个请求，没有进行中的请求时标记为空闲状态"""
+        self.inflight = max(0, self.inflight - 1)
+        if self.inflight == 0:
+            self.state = ConnectionState.IDLE
         self.last_used_at = time.time()
     
     def mark_unhealthy(self):
@@ -187,6 +199,139 @@ class PooledConnection:
         return f"PooledConnection(id={self.id}, state={self.state.value}, use_count={self.use_count})"
 
 
+class _FifoIdleSet:
+    """按可用先后排列的可用连接集合（round_robin/FIFO），取出与删除均为O(1)
+    
+    取出的连接用完后放回队尾，连接依次轮转使用。
+    """
+    
+    def __init__(self):
+        self._connections: 'OrderedDict[PooledConnection, None]' = OrderedDict()
+    
+    def add(self, conn: PooledConnection):
+        self._connections[conn] = None
+    
+    def take(self) -> PooledConnection:
+        conn, _ = self._connections.popitem(last=False)
+        return conn
+    
+    def discard(self, conn: PooledConnection) -> bool:
+        if conn not in self._connections:
+            return False
+        del self._connections[conn]
+        return True
+    
+    def clear(self):
+        self._connections.clear()
+    
+    def __contains__(self, conn: PooledConnection) -> bool:
+        return conn in self._connections
+    
+    def __iter__(self):
+        return iter(list(self._connections))
+    
+    def __len__(self) -> int:
+        return len(self._connections)
+
+
+class _HeapIdleSet(_FifoIdleSet):
+    """按（进行中请求数, 使用次数）组织的最小堆（least_busy），取出为O(log n)
+    
+    删除采用惰性标记：被删除的堆项在取出时跳过。
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._heap: List[list] = []
+        self._entries: Dict[PooledConnection, list] = {}
+    
+    def add(self, conn: PooledConnection):
+        self.discard(conn)
+        entry = [conn.inflight, conn.use_count, conn.id, conn]
+        self._entries[conn] = entry
+        heapq.heappush(self._heap, entry)
+    
+    def take(self) -> PooledConnection:
+        while self._heap:
+            conn = heapq.heappop(self._heap)[3]
+            if conn is not None:
+                del self._entries[conn]
+                return conn
+        raise KeyError("take from an empty idle set")
+    
+    def discard(self, conn: PooledConnection) -> bool:
+        entry = self._entries.pop(conn, None)
+        if entry is None:
+            return False
+        entry[3] = None
+        # 失效项过多时重建堆，避免堆无限增长
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [item for item in self._heap if item[3] is not None]
+            heapq.heapify(self._heap)
+        return True
+    
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+    
+    def __contains__(self, conn: PooledConnection) -> bool:
+        return conn in self._entries
+    
+    def __iter__(self):
+        return iter(list(self._entries))
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _RandomIdleSet(_FifoIdleSet):
+    """支持O(1)随机取出的可用连接集合（random）：列表加位置索引，删除时与末尾交换"""
+    
+    def __init__(self):
+        super().__init__()
+        self._items: List[PooledConnection] = []
+        self._positions: Dict[PooledConnection, int] = {}
+    
+    def add(self, conn: PooledConnection):
+        if conn not in self._positions:
+            self._positions[conn] = len(self._items)
+            self._items.append(conn)
+    
+    def take(self) -> PooledConnection:
+        conn = self._items[random.randrange(len(self._items))]
+        self.discard(conn)
+        return conn
+    
+    def discard(self, conn: PooledConnection) -> bool:
+        position = self._positions.pop(conn, None)
+        if position is None:
+            return False
+        last = self._items.pop()
+        if last is not conn:
+            self._items[position] = last
+            self._positions[last] = position
+        return True
+    
+    def clear(self):
+        self._items.clear()
+        self._positions.clear()
+    
+    def __contains__(self, conn: PooledConnection) -> bool:
+        return conn in self._positions
+    
+    def __iter__(self):
+        return iter(list(self._items))
+    
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+_IDLE_SETS = {
+    "least_busy": _HeapIdleSet,
+    "random": _RandomIdleSet,
+}
+
+
 class ConnectionPool:
     """MCP连接池管理器
     
@@ -216,10 +361,15 @@ class ConnectionPool:
         >>> 
         >>> await pool.close()
     
+    可用连接按负载均衡策略组织为不同的集合（FIFO轮转、最小堆、随机数组），
+    获取连接为O(1)或O(log n)且不需要加锁；没有可用连接时调用方在等待队列中
+    排队，释放的连接直接交给最早的等待者。max_inflight_per_connection大于1时，
+    连接在进行中的请求数达到该深度之前一直保持可用（多路复用）。
+    
     Attributes:
         config: 连接池配置
-        _pool: 连接池队列
-        _semaphore: 连接数量信号量
+        _pool: 可用连接集合（进行中的请求数未达到复用深度的健康连接）
+        _waiting_queue: 等待连接的Future队列
         _connection_factory: 连接创建工厂函数
         _metrics: 性能指标统计
     """
@@ -233,14 +383,12 @@ class ConnectionPool:
         self._connection_factory = connection_factory or self._default_connection_factory
         
         # 连接池数据结构
-        self._pool: deque = deque()
+        self._pool = _IDLE_SETS.get(self.config.load_balance_strategy, _FifoIdleSet)()
         self._all_connections: Set[PooledConnection] = set()
         self._busy_connections: Set[PooledConnection] = set()
         
-        # 同步原语
+        # 同步原语（只用于创建/替换连接等维护操作，获取与释放不加锁）
         self._lock: asyncio.Lock = asyncio.Lock()
-        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(self.config.max_connections)
-        self._condition: asyncio.Condition = asyncio.Condition(self._lock)
         
         # 后台任务
         self._health_check_task: Optional[asyncio.Task] = None
@@ -250,7 +398,6 @@ class ConnectionPool:
         
         # 指标
         self._metrics = ConnectionMetrics()
-        self._round_robin_index: int = 0
         
         # 等待队列
         self._waiting_queue: deque = deque()
@@ -276,8 +423,7 @@ class ConnectionPool:
             # 创建最小连接数
             for _ in range(self.config.min_connections):
                 conn = await self._create_connection()
-                self._pool.append(conn)
-                self._all_connections.add(conn)
+                self._add_connection(conn)
             
             self._metrics.total_connections = len(self._all_connections)
             logger.info(f"Connection pool initialized with {len(self._pool)} connections")
@@ -322,8 +468,7 @@ class ConnectionPool:
             connections = await asyncio.gather(*tasks)
             async with self._lock:
                 for conn in connections:
-                    self._pool.append(conn)
-                    self._all_connections.add(conn)
+                    self._add_connection(conn)
                 self._metrics.total_connections = len(self._all_connections)
             logger.info(f"Warmed up {len(connections)} connections")
         except Exception as e:
@@ -379,9 +524,8 @@ class ConnectionPool:
             
             async with self._lock:
                 self._all_connections.discard(old_conn)
-                self._pool = deque(c for c in self._pool if c != old_conn)
-                self._pool.append(new_conn)
-                self._all_connections.add(new_conn)
+                self._pool.discard(old_conn)
+                self._add_connection(new_conn)
                 self._metrics.total_connections = len(self._all_connections)
             
             await old_conn.close()
@@ -410,9 +554,9 @@ class ConnectionPool:
             to_check = list(self._pool)[:max(0, current_size - self.config.min_connections)]
             
             for conn in to_check:
-                if conn.is_expired(self.config.max_lifetime, self.config.idle_timeout):
+                if conn.inflight == 0 and conn.is_expired(self.config.max_lifetime, self.config.idle_timeout):
                     expired_connections.append(conn)
-                    self._pool.remove(conn)
+                    self._pool.discard(conn)
                     self._all_connections.discard(conn)
             
             self._metrics.total_connections = len(self._all_connections)
@@ -437,17 +581,47 @@ class ConnectionPool:
                 for _ in range(needed):
                     try:
                         conn = await self._create_connection()
-                        self._pool.append(conn)
-                        self._all_connections.add(conn)
+                        self._add_connection(conn)
                     except Exception as e:
                         logger.warning(f"Failed to expand pool: {e}")
                         break
                 
                 self._metrics.total_connections = len(self._all_connections)
     
+    def _add_connection(self, conn: PooledConnection):
+        """登记新连接为可用，并交给等待者"""
+        self._all_connections.add(conn)
+        self._pool.add(conn)
+        self._hand_off()
+    
+    def _checkout(self) -> PooledConnection:
+        """取出一个可用连接并计入一个进行中的请求，未达到复用深度时放回可用集合"""
+        conn = self._select_connection()
+        conn.mark_busy()
+        if conn.inflight < self.config.max_inflight_per_connection:
+            self._pool.add(conn)
+        self._busy_connections.add(conn)
+        return conn
+    
+    def _hand_off(self):
+        """把可用连接依次交给仍在等待的调用方"""
+        while self._waiting_queue and len(self._pool):
+            waiter = self._waiting_queue.popleft()
+            if not waiter.done():
+                waiter.set_result(self._checkout())
+        self._update_connection_metrics()
+    
+    def _update_connection_metrics(self):
+        self._metrics.active_connections = len(self._busy_connections)
+        self._metrics.idle_connections = len(self._all_connections) - len(self._busy_connections)
+        self._metrics.waiting_requests = len(self._waiting_queue)
+    
     async def get_connection(self) -> PooledConnection:
         """获取连接
         
+        有可用连接时直接取出；否则在等待队列中排队，由release把连接直接交给
+        最早的等待者。
+        
         Returns:
             PooledConnection: 池化连接对象
             
@@ -461,66 +635,46 @@ class ConnectionPool:
         if self._is_closing:
             raise RuntimeError("Connection pool is closing")
         
-        start_time = time.time()
         self._metrics.total_requests += 1
         
+        # 快速路径：没有排队者且有可用连接
+        if len(self._pool) and not self._waiting_queue:
+            conn = self._checkout()
+            self._update_connection_metrics()
+            self._metrics.record_wait_time(0.0)
+            return conn
+        
+        start_time = time.time()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting_queue.append(waiter)
+        self._update_connection_metrics()
         try:
             async with asyncio.timeout(self.config.acquire_timeout):
-                await self._semaphore.acquire()
-                
-                async with self._condition:
-                    while not self._pool and not self._is_closing:
-                        self._metrics.waiting_requests += 1
-                        await self._condition.wait()
-                        self._metrics.waiting_requests -= 1
-                    
-                    if self._is_closing:
-                        self._semaphore.release()
-                        raise RuntimeError("Connection pool is closing")
-                    
-                    # 根据负载均衡策略选择连接
-                    conn = self._select_connection()
-                    conn.mark_busy()
-                    self._busy_connections.add(conn)
-                    self._metrics.active_connections = len(self._busy_connections)
-                    self._metrics.idle_connections = len(self._pool)
-                    
-                    wait_time = time.time() - start_time
-                    self._metrics.record_wait_time(wait_time)
-                    
-                    return conn
-                    
+                conn = await waiter
         except asyncio.TimeoutError:
-            self._metrics.failed_requests += 1
-            raise TimeoutError(f"Failed to acquire connection within {self.config.acquire_timeout}s")
+            if waiter.done() and not waiter.cancelled():
+                # 超时与交付同时发生：连接已经分配给本调用方
+                conn = waiter.result()
+            else:
+                self._metrics.failed_requests += 1
+                self._update_connection_metrics()
+                raise TimeoutError(f"Failed to acquire connection within {self.config.acquire_timeout}s")
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+        
+        self._metrics.record_wait_time(time.time() - start_time)
+        return conn
     
     def _select_connection(self) -> PooledConnection:
-        """根据负载均衡策略选择连接"""
-        if not self._pool:
-            raise RuntimeError("No available connections")
+        """根据负载均衡策略选择连接
         
-        strategy = self.config.load_balance_strategy
-        
-        if strategy == "round_robin":
-            conn = self._pool[self._round_robin_index % len(self._pool)]
-            self._round_robin_index += 1
-            self._pool.remove(conn)
-            return conn
-        
-        elif strategy == "least_busy":
-            # 选择使用次数最少的连接
-            conn = min(self._pool, key=lambda c: c.use_count)
-            self._pool.remove(conn)
-            return conn
-        
-        elif strategy == "random":
-            import random
-            conn = random.choice(list(self._pool))
-            self._pool.remove(conn)
-            return conn
-        
-        else:  # 默认FIFO
-            return self._pool.popleft()
+        可用集合本身按策略组织：round_robin/FIFO按可用先后轮转，least_busy取
+        进行中请求数与使用次数最少的连接，random随机取出。
+        """
+        if not len(self._pool):
+            raise RuntimeError("No available connections")
+        return self._pool.take()
     
     async def release(self, conn: PooledConnection):
         """释放连接回连接池
@@ -531,22 +685,20 @@ class ConnectionPool:
         if conn is None:
             return
         
-        async with self._lock:
-            if conn in self._busy_connections:
-                self._busy_connections.remove(conn)
-            
-            if conn.is_healthy() and not conn.is_expired(self.config.max_lifetime, self.config.idle_timeout):
-                conn.mark_idle()
-                self._pool.append(conn)
-            else:
-                # 连接不健康或已过期，移除并替换
-                self._all_connections.discard(conn)
-                asyncio.create_task(self._replace_connection(conn))
-            
-            self._metrics.active_connections = len(self._busy_connections)
-            self._metrics.idle_connections = len(self._pool)
-            self._semaphore.release()
-            self._condition.notify()
+        self._pool.discard(conn)
+        conn.mark_idle()
+        if conn.inflight == 0:
+            self._busy_connections.discard(conn)
+        
+        if conn.is_healthy() and not conn.is_expired(self.config.max_lifetime, self.config.idle_timeout):
+            if conn in self._all_connections and not self._is_closing:
+                self._pool.add(conn)
+        elif conn in self._all_connections and conn.inflight == 0:
+            # 连接不健康或已过期，移除并替换；多路复用时等进行中的请求都结束后再替换
+            self._all_connections.discard(conn)
+            asyncio.create_task(self._replace_connection(conn))
+        
+        self._hand_off()
     
     @asynccontextmanager
     async def acquire(self) -> AsyncGenerator[PooledConnection, None]:
@@ -593,6 +745,12 @@ class ConnectionPool:
         if self._maintenance_task:
             self._maintenance_task.cancel()
         
+        # 唤醒所有等待者
+        while self._waiting_queue:
+            waiter = self._waiting_queue.popleft()
+            if not waiter.done():
+                waiter.set_exception(RuntimeError("Connection pool is closing"))
+        
         # 关闭所有连接
         async with self._lock:
             close_tasks = [conn.close() for conn in self._all_connections]
@@ -33,13 +33,23 @@ from .bpmn_processor import (
 from .epcis_processor import (
     EPCISProcessor
 )
+from .epcis_trace import (
+    TraceabilityGraph
+)
 from .edifact_parser import (
     EDIFACTParser,
-    EDIFACTMessageType
+    EDIFACTMessageType,
+    EDIFACTLazySegment,
+    CompiledEDIFACTSchema
 )
 from .ais_processor import (
     AISProcessor,
-    AISMessageType
+    AISMessageType,
+    AISBatch
+)
+from .spatial_index import (
+    SpatioTemporalIndex,
+    haversine_distance
 )
 from .exceptions import (
     SchemaDeepeningError,
@@ -96,12 +106,19 @@ __all__ = [
     'ProcessStatus',
     # EPCIS处理器
     'EPCISProcessor',
+    'TraceabilityGraph',
     # EDIFACT解析器
     'EDIFACTParser',
     'EDIFACTMessageType',
+    'EDIFACTLazySegment',
+    'CompiledEDIFACTSchema',
     # AIS处理器
     'AISProcessor',
     'AISMessageType',
+    'AISBatch',
+    # 时空索引
+    'SpatioTemporalIndex',
+    'haversine_distance',
     # 异常类
     'SchemaDeepeningError',
     'ConversionError',
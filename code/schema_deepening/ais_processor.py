@@ -4,14 +4,32 @@ AIS数据处理器
 专注于AIS消息解析、位置追踪、轨迹分析
 """
 
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Iterator, Callable, Union
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import IntEnum
+from array import array
+from collections import deque, OrderedDict
+from functools import reduce
+from itertools import islice
+from pathlib import Path
+import operator
+import queue
+import socket
 import struct
+import threading
+import time
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
 from .logger import logger
-from .exceptions import ParseError, ValidationError
+from .exceptions import ParseError, ValidationError, ProcessingError
+from .spatial_index import SpatioTemporalIndex, haversine_distance, to_epoch_seconds
 
 
 class AISMessageType(IntEnum):
@@ -42,6 +60,33 @@ class AISMessageType(IntEnum):
     TYPE_24 = 24  # 静态数据报告
 
 
+# 6位ASCII装甲字符到6位值的查找表：'0'-'W' -> 0-39，'`'-'w' -> 40-63
+_SIXBIT_VALUES = {
+    chr(code): (code - 48 if code < 88 else code - 56)
+    for code in list(range(48, 88)) + list(range(96, 120))
+}
+# 逐字符展开为6位二进制串（逐句解析路径使用）
+_SIXBIT_BITS = {char: format(value, '06b') for char, value in _SIXBIT_VALUES.items()}
+# 每个6位值恰好是两个八进制数字，translate后一次int(..., 8)即可打包成整数（批量路径使用）
+_SIXBIT_TO_OCTAL = str.maketrans({char: format(value, '02o') for char, value in _SIXBIT_VALUES.items()})
+
+_POSITION_REPORT_TYPES = frozenset({1, 2, 3})
+_CLASS_B_REPORT_TYPES = frozenset({18, 19})
+_POSITION_REPORT_BITS = 168
+_MAX_PENDING_FRAGMENTS = 1024
+_NAN = float('nan')
+
+if NUMPY_AVAILABLE:
+    # 字节到6位值/十六进制值的向量化查找表，64/255表示非法字符
+    _SIXBIT_LOOKUP = np.full(256, 64, dtype=np.uint8)
+    for _char, _value in _SIXBIT_VALUES.items():
+        _SIXBIT_LOOKUP[ord(_char)] = _value
+    _HEX_LOOKUP = np.full(256, 255, dtype=np.int64)
+    for _value, _char in enumerate('0123456789ABCDEF'):
+        _HEX_LOOKUP[ord(_char)] = _value
+        _HEX_LOOKUP[ord(_char.lower())] = _value
+
+
 @dataclass
 class AISPosition:
     """AIS位置"""
@@ -68,6 +113,44 @@ class AISMessage:
     raw_data: str = None
 
 
+@dataclass
+class AISBatch:
+    """
+    AIS批量解码结果（列式存储）
+
+    每条成功解码的消息占一行；非位置报告消息的位置列为NaN，
+    导航状态列为-1（B类报告不携带导航状态）。
+    """
+    message_type: array = field(default_factory=lambda: array('B'))
+    mmsi: array = field(default_factory=lambda: array('l'))
+    latitude: array = field(default_factory=lambda: array('d'))
+    longitude: array = field(default_factory=lambda: array('d'))
+    speed: array = field(default_factory=lambda: array('d'))
+    course: array = field(default_factory=lambda: array('d'))
+    heading: array = field(default_factory=lambda: array('d'))
+    navigation_status: array = field(default_factory=lambda: array('b'))
+    total_sentences: int = 0
+    checksum_errors: int = 0
+    malformed: int = 0
+    pending_fragments: int = 0
+
+    COLUMNS = ('message_type', 'mmsi', 'latitude', 'longitude',
+               'speed', 'course', 'heading', 'navigation_status')
+
+    def __len__(self) -> int:
+        return len(self.mmsi)
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """
+        转换为NumPy数组（零拷贝共享底层缓冲区，需要安装NumPy）
+
+        Returns:
+            列名到NumPy数组的映射
+        """
+        return {name: np.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+                for name in self.COLUMNS}
+
+
 class AISProcessor:
     """
     AIS数据处理器
@@ -75,9 +158,26 @@ class AISProcessor:
     专注于AIS消息解析、位置追踪、轨迹分析
     """
     
-    def __init__(self):
+    def __init__(self, max_positions_per_vessel: Optional[int] = None,
+                 vessel_ttl: Optional[float] = None, max_messages: Optional[int] = None,
+                 spatial_index: Optional[SpatioTemporalIndex] = None):
+        """
+        初始化AIS处理器
+        
+        Args:
+            max_positions_per_vessel: 每艘船保留的最近位置数（环形缓冲区），None表示不限
+            vessel_ttl: 船舶超过该秒数未更新位置即被淘汰，None表示不淘汰
+            max_messages: messages中保留的最近消息数，None表示不限
+            spatial_index: 时空索引，提供时所有记录的位置同时写入索引
+        """
+        self.spatial_index = spatial_index
         self.messages: Dict[str, AISMessage] = {}
-        self.positions: Dict[str, List[AISPosition]] = {}  # MMSI到位置列表的映射
+        self.positions: Dict[str, Union[List[AISPosition], deque]] = {}  # MMSI到位置列表的映射
+        self.max_positions_per_vessel = max_positions_per_vessel
+        self.vessel_ttl = vessel_ttl
+        self.max_messages = max_messages
+        self._last_seen: 'OrderedDict[str, float]' = OrderedDict()  # MMSI到最近更新时间（单调时钟）
+        self._fragments: Dict[Tuple[str, str], List[str]] = {}  # (序列号, 信道)到待重组分片的映射
         logger.info("AISProcessor initialized")
     
     def parse_nmea(self, nmea_sentence: str) -> AISMessage:
@@ -124,48 +224,57 @@ class AISProcessor:
         )
         
         self.messages[message_id] = message
+        if self.max_messages is not None and len(self.messages) > self.max_messages:
+            del self.messages[next(iter(self.messages))]
         
         # 更新位置历史
         if position:
-            if mmsi not in self.positions:
-                self.positions[mmsi] = []
-            self.positions[mmsi].append(position)
+            self._record_position(position, time.monotonic())
+            self._evict_stale_vessels(time.monotonic())
         
         return message
     
+    def _record_position(self, position: AISPosition, seen_at: float) -> None:
+        """追加位置到船舶轨迹并刷新最近更新时间"""
+        mmsi = position.mmsi
+        track = self.positions.get(mmsi)
+        if track is None:
+            track = [] if self.max_positions_per_vessel is None else deque(maxlen=self.max_positions_per_vessel)
+            self.positions[mmsi] = track
+        track.append(position)
+        
+        if self.spatial_index is not None:
+            self.spatial_index.insert(
+                int(mmsi), position.latitude, position.longitude, position.timestamp,
+                position.speed, position.course, position.heading, position.navigation_status
+            )
+        
+        if self.vessel_ttl is not None:
+            self._last_seen[mmsi] = seen_at
+            self._last_seen.move_to_end(mmsi)
+    
+    def _evict_stale_vessels(self, now: float) -> int:
+        """淘汰超过vessel_ttl未更新的船舶，返回淘汰数量"""
+        if self.vessel_ttl is None:
+            return 0
+        
+        cutoff = now - self.vessel_ttl
+        evicted = 0
+        while self._last_seen:
+            mmsi, seen_at = next(iter(self._last_seen.items()))
+            if seen_at >= cutoff:
+                break
+            del self._last_seen[mmsi]
+            self.positions.pop(mmsi, None)
+            evicted += 1
+        
+        if evicted:
+            logger.debug(f"淘汰{evicted}艘超过{self.vessel_ttl}秒未更新的船舶")
+        return evicted
+    
     def _decode_6bit_ascii(self, payload: str) -> str:
-        """解码6位ASCII到二进制字符串"""
-        binary = ""
-        for char in payload:
-            # 6位ASCII字符范围：0-63
-            # 映射：0-9 -> 48-57, : -> 58, ; -> 59, < -> 60, = -> 61, > -> 62, ? -> 63
-            # A-W -> 64-87, 但实际编码是：0-9, :, ;, <, =, >, ?, @, A-W
-            ascii_val = ord(char)
-            
-            # 转换为6位值
-            if 48 <= ascii_val <= 57:  # 0-9
-                value = ascii_val - 48
-            elif ascii_val == 58:  # :
-                value = 10
-            elif ascii_val == 59:  # ;
-                value = 11
-            elif ascii_val == 60:  # <
-                value = 12
-            elif ascii_val == 61:  # =
-                value = 13
-            elif ascii_val == 62:  # >
-                value = 14
-            elif ascii_val == 63:  # ?
-                value = 15
-            elif 64 <= ascii_val <= 87:  # @, A-W
-                value = ascii_val - 64 + 16
-            else:
-                value = 0
-            
-            # 转换为6位二进制
-            binary += format(value, '06b')
-        
-        return binary
+        """解码6位ASCII到二进制字符串（非法字符按0处理）"""
+        return ''.join([_SIXBIT_BITS.get(char, '000000') for char in payload])
     
     def _parse_message_type(self, binary_payload: str) -> AISMessageType:
         """解析消息类型（前6位）"""
@@ -234,6 +343,421 @@ class AISProcessor:
             navigation_status=navigation_status
         )
     
+    def parse_nmea_batch(self, sentences: Iterable[str], verify_checksum: bool = True,
+                         chunk_size: int = 65536) -> AISBatch:
+        """
+        批量解析NMEA格式AIS消息
+        
+        按ITU-R M.1371位偏移提取字段，不创建逐条消息对象，也不写入messages/positions。
+        安装NumPy时单分片句子按块向量化解码，其余句子（多分片、非标准格式）
+        走查找表打包整数的逐句路径；多分片句子跨批次重组，未完成的分片保留到下一次调用。
+        
+        Args:
+            sentences: NMEA句子序列
+            verify_checksum: 是否校验NMEA校验和，校验失败的句子被丢弃
+            chunk_size: 向量化解码的块大小
+            
+        Returns:
+            列式批量解码结果（行顺序与输入顺序一致）
+        """
+        batch = AISBatch()
+        iterator = iter(sentences)
+        
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            if NUMPY_AVAILABLE:
+                self._decode_chunk_numpy(chunk, batch, verify_checksum)
+            else:
+                self._decode_sentences(chunk, batch, verify_checksum)
+        
+        batch.pending_fragments = len(self._fragments)
+        logger.debug(f"批量解析AIS消息: {batch.total_sentences}条句子, {len(batch)}条解码成功, "
+                     f"{batch.checksum_errors}条校验失败, {batch.malformed}条格式错误")
+        return batch
+    
+    def _decode_sentences(self, sentences: List[str], batch: AISBatch, verify_checksum: bool,
+                          rows: Optional[List[int]] = None) -> None:
+        """
+        逐句解码并追加到批量结果
+        
+        负载经查找表转换为八进制串后一次打包为整数，字段通过移位提取。
+        
+        Args:
+            sentences: NMEA句子列表
+            batch: 追加结果的批量对象
+            verify_checksum: 是否校验NMEA校验和
+            rows: 若提供，记录每条解码结果在sentences中的下标
+        """
+        pending = self._fragments
+        col_type = batch.message_type.append
+        col_mmsi = batch.mmsi.append
+        col_lat = batch.latitude.append
+        col_lon = batch.longitude.append
+        col_speed = batch.speed.append
+        col_course = batch.course.append
+        col_heading = batch.heading.append
+        col_status = batch.navigation_status.append
+        checksum_errors = malformed = 0
+        
+        for index, sentence in enumerate(sentences):
+            sentence = sentence.strip()
+            star = sentence.rfind('*')
+            if verify_checksum and (star < 0 or not _nmea_checksum_ok(sentence, star)):
+                checksum_errors += 1
+                continue
+            
+            parts = (sentence[:star] if star >= 0 else sentence).split(',')
+            if len(parts) < 7:
+                malformed += 1
+                continue
+            fragment_count, fragment_number, sequence_id, channel, payload, fill = parts[1:7]
+            
+            # 多分片消息重组
+            if fragment_count != '1':
+                key = (sequence_id, channel)
+                if fragment_number == '1':
+                    if key not in pending and len(pending) >= _MAX_PENDING_FRAGMENTS:
+                        del pending[next(iter(pending))]
+                        malformed += 1
+                    pending[key] = [payload]
+                    continue
+                fragments = pending.get(key)
+                if fragments is None or str(len(fragments) + 1) != fragment_number:
+                    pending.pop(key, None)
+                    malformed += 1
+                    continue
+                fragments.append(payload)
+                if fragment_number != fragment_count:
+                    continue
+                del pending[key]
+                payload = ''.join(fragments)
+            
+            try:
+                bits = int(payload.translate(_SIXBIT_TO_OCTAL), 8)
+                bit_length = 6 * len(payload) - (int(fill) if fill else 0)
+            except ValueError:
+                malformed += 1
+                continue
+            if bit_length < 38:
+                malformed += 1
+                continue
+            
+            if rows is not None:
+                rows.append(index)
+            total_bits = 6 * len(payload)
+            message_type = bits >> (total_bits - 6)
+            col_type(message_type)
+            col_mmsi((bits >> (total_bits - 38)) & 0x3FFFFFFF)
+            
+            if bit_length >= _POSITION_REPORT_BITS and message_type in _POSITION_REPORT_TYPES:
+                head = bits >> (total_bits - _POSITION_REPORT_BITS)
+                col_status((head >> 126) & 0xF)
+                speed = (head >> 108) & 0x3FF
+                longitude = (head >> 79) & 0xFFFFFFF
+                latitude = (head >> 52) & 0x7FFFFFF
+                course = (head >> 40) & 0xFFF
+                heading = (head >> 31) & 0x1FF
+            elif bit_length >= _POSITION_REPORT_BITS and message_type in _CLASS_B_REPORT_TYPES:
+                head = bits >> (total_bits - _POSITION_REPORT_BITS)
+                col_status(-1)
+                speed = (head >> 112) & 0x3FF
+                longitude = (head >> 83) & 0xFFFFFFF
+                latitude = (head >> 56) & 0x7FFFFFF
+                course = (head >> 44) & 0xFFF
+                heading = (head >> 35) & 0x1FF
+            else:
+                col_status(-1)
+                col_lat(_NAN)
+                col_lon(_NAN)
+                col_speed(_NAN)
+                col_course(_NAN)
+                col_heading(_NAN)
+                continue
+            
+            # 经纬度为补码，181°/91°表示不可用
+            if longitude & 0x8000000:
+                longitude -= 0x10000000
+            if latitude & 0x4000000:
+                latitude -= 0x8000000
+            col_lon(longitude / 600000.0 if longitude != 108600000 else _NAN)
+            col_lat(latitude / 600000.0 if latitude != 54600000 else _NAN)
+            col_speed(speed / 10.0 if speed != 1023 else _NAN)
+            col_course(course / 10.0 if course < 3600 else _NAN)
+            col_heading(float(heading) if heading != 511 else _NAN)
+        
+        batch.total_sentences += len(sentences)
+        batch.checksum_errors += checksum_errors
+        batch.malformed += malformed
+    
+    def _decode_chunk_numpy(self, chunk: List[str], batch: AISBatch, verify_checksum: bool) -> None:
+        """
+        向量化解码一块句子并追加到批量结果
+        
+        整块拼接为一个字节缓冲区，用逗号/星号位置定位各句负载，
+        校验和按区间归约异或一次算出，负载前168位经查找表转为6位值矩阵，
+        每4个6位值拼成3个字节后按大端64位字读出，再移位提取字段。
+        多分片及格式不规则的句子回退到逐句路径，最终按输入顺序合并。
+        """
+        count = len(chunk)
+        text = '\n'.join(chunk)
+        # 仅在存在首尾空白时才逐句strip，常见输入直接拼接
+        if text.count('\n') != count - 1 or '\r' in text or ' ' in text or '\t' in text:
+            text = '\n'.join([sentence.strip() for sentence in chunk])
+        try:
+            # 末尾补齐一个负载宽度，保证滑动窗口不越界
+            data = text.encode('ascii') + bytes(_POSITION_REPORT_BITS // 6)
+        except UnicodeEncodeError:
+            self._decode_sentences(chunk, batch, verify_checksum)
+            return
+        
+        buf = np.frombuffer(data, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == 10)
+        if len(newlines) != count - 1:
+            self._decode_sentences(chunk, batch, verify_checksum)
+            return
+        text_length = len(data) - _POSITION_REPORT_BITS // 6
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [text_length]))
+        
+        # 规则句子：恰好6个逗号、1个星号，单分片且负载不超过168位
+        commas = np.flatnonzero(buf == 44)
+        stars = np.flatnonzero(buf == 42)
+        bounds = np.concatenate((starts, [text_length]))
+        first_comma = np.searchsorted(commas, bounds)
+        first_star = np.searchsorted(stars, bounds)
+        regular = (np.diff(first_comma) == 6) & (np.diff(first_star) == 1)
+        lines = np.flatnonzero(regular)
+        comma_pos = commas[first_comma[lines][:, None] + np.arange(6)]
+        star_pos = stars[first_star[lines]]
+        fill_char = buf[comma_pos[:, 5] + 1]
+        single = (comma_pos[:, 1] == comma_pos[:, 0] + 2) & (buf[comma_pos[:, 0] + 1] == 49) & \
+                 (star_pos == comma_pos[:, 5] + 2) & (fill_char >= 48) & (fill_char <= 57) & \
+                 (comma_pos[:, 5] - comma_pos[:, 4] - 1 <= _POSITION_REPORT_BITS // 6)
+        lines, comma_pos, star_pos = lines[single], comma_pos[single], star_pos[single]
+        fill = fill_char[single].astype(np.int64) - 48
+        line_starts, line_ends = starts[lines], ends[lines]
+        
+        # 校验和：'!'与'*'之间的区间异或，奇数位的区间是句间间隙，直接丢弃
+        keep = np.ones(len(lines), dtype=bool)
+        if verify_checksum:
+            bounds = np.empty(2 * len(lines), dtype=np.int64)
+            bounds[0::2] = line_starts + 1
+            bounds[1::2] = star_pos
+            checksum = np.bitwise_xor.reduceat(buf, bounds)[0::2] if len(lines) else bounds
+            high = _HEX_LOOKUP[buf[star_pos + 1]]
+            low = _HEX_LOOKUP[buf[star_pos + 2]]
+            keep = (star_pos + 2 < line_ends) & (high < 16) & (low < 16) & \
+                   (checksum == (high << 4 | low))
+            batch.checksum_errors += int(len(keep) - keep.sum())
+        
+        # 负载合法性：负载之后紧跟的逗号必不在字母表内，
+        # 因此首个非法字符落在负载长度之内即为坏负载
+        payload_start = comma_pos[:, 4] + 1
+        payload_length = comma_pos[:, 5] - payload_start
+        values = _SIXBIT_LOOKUP.take(sliding_window_view(buf, _POSITION_REPORT_BITS // 6)[payload_start])
+        invalid = values == 64
+        first_invalid = invalid.argmax(axis=1)
+        bad_payload = invalid[np.arange(len(lines)), first_invalid] & (first_invalid < payload_length)
+        bit_length = 6 * payload_length - fill
+        decodable = keep & ~bad_payload & (bit_length >= 38)
+        batch.malformed += int((keep & ~decodable).sum())
+        
+        single_lines, lines = lines, lines[decodable]
+        bit_length = bit_length[decodable]
+        sextets = values[decodable].reshape(-1, 7, 4)
+        
+        # 每4个6位值拼成3个字节，168位补齐到192位后按3个大端64位字读出，任一字段最多跨两个字
+        packed = np.zeros((len(sextets), 24), dtype=np.uint8)
+        packed[:, 0:21:3] = (sextets[:, :, 0] << 2) | (sextets[:, :, 1] >> 4)
+        packed[:, 1:21:3] = (sextets[:, :, 1] << 4) | (sextets[:, :, 2] >> 2)
+        packed[:, 2:21:3] = (sextets[:, :, 2] << 6) | sextets[:, :, 3]
+        words = packed.view('>u8').astype(np.uint64).T
+        
+        def bits_at(start: int, length: int) -> 'np.ndarray':
+            index, offset = divmod(start, 64)
+            if offset + length <= 64:
+                result = (words[index] >> np.uint64(64 - offset - length)) & np.uint64((1 << length) - 1)
+            else:
+                spill = offset + length - 64
+                result = ((words[index] & np.uint64((1 << (64 - offset)) - 1)) << np.uint64(spill)) | \
+                         (words[index + 1] >> np.uint64(64 - spill))
+            return result.astype(np.int64)
+        
+        message_type = bits_at(0, 6)
+        mmsi = bits_at(8, 30)
+        full = bit_length >= _POSITION_REPORT_BITS
+        class_a = full & (message_type >= 1) & (message_type <= 3)
+        class_b = full & ((message_type == 18) | (message_type == 19))
+        has_position = class_a | class_b
+        
+        speed = np.where(class_a, bits_at(50, 10), bits_at(46, 10))
+        longitude = np.where(class_a, bits_at(61, 28), bits_at(57, 28))
+        latitude = np.where(class_a, bits_at(89, 27), bits_at(85, 27))
+        course = np.where(class_a, bits_at(116, 12), bits_at(112, 12))
+        heading = np.where(class_a, bits_at(128, 9), bits_at(124, 9))
+        longitude = np.where(longitude & 0x8000000, longitude - 0x10000000, longitude)
+        latitude = np.where(latitude & 0x4000000, latitude - 0x8000000, latitude)
+        
+        vector = {
+            'message_type': message_type,
+            'mmsi': mmsi,
+            'latitude': np.where(has_position & (latitude != 54600000), latitude / 600000.0, np.nan),
+            'longitude': np.where(has_position & (longitude != 108600000), longitude / 600000.0, np.nan),
+            'speed': np.where(has_position & (speed != 1023), speed / 10.0, np.nan),
+            'course': np.where(has_position & (course < 3600), course / 10.0, np.nan),
+            'heading': np.where(has_position & (heading != 511), heading.astype(np.float64), np.nan),
+            'navigation_status': np.where(class_a, bits_at(38, 4), -1),
+        }
+        
+        # 不规则句子回退逐句路径，按输入顺序合并
+        irregular = np.ones(count, dtype=bool)
+        irregular[single_lines] = False
+        irregular_lines = np.flatnonzero(irregular)
+        if len(irregular_lines):
+            fallback = AISBatch()
+            rows: List[int] = []
+            self._decode_sentences([chunk[i] for i in irregular_lines], fallback, verify_checksum, rows)
+            batch.checksum_errors += fallback.checksum_errors
+            batch.malformed += fallback.malformed
+            order = np.argsort(np.concatenate((lines, irregular_lines[rows])), kind='stable')
+            fallback_columns = fallback.to_numpy()
+            for name in AISBatch.COLUMNS:
+                vector[name] = np.concatenate((vector[name], fallback_columns[name]))[order]
+        
+        batch.total_sentences += count
+        for name in AISBatch.COLUMNS:
+            column = getattr(batch, name)
+            column.frombytes(vector[name].astype(column.typecode).tobytes())
+    
+    def stream_nmea(self, source: Union[str, Path, Any], batch_size: int = 10000,
+                    flush_interval: float = 1.0, verify_checksum: bool = True) -> Iterator[AISBatch]:
+        """
+        流式解析NMEA数据源
+        
+        按batch_size或flush_interval（以先到者为准，在新句子到达时检查）分批解码，
+        解码后的位置写入各船舶的轨迹缓冲区并淘汰过期船舶；消息本身不写入messages。
+        作为生成器按需拉取，消费者处理慢时上游读取随之暂停。
+        
+        Args:
+            source: 数据源，见iter_nmea_lines
+            batch_size: 每批最大句子数
+            flush_interval: 每批最长等待时间（秒）
+            verify_checksum: 是否校验NMEA校验和
+            
+        Yields:
+            每批的列式解码结果
+        """
+        buffer: List[str] = []
+        deadline = time.monotonic() + flush_interval
+        
+        for line in iter_nmea_lines(source):
+            buffer.append(line)
+            if len(buffer) >= batch_size or time.monotonic() >= deadline:
+                yield self._ingest_batch(buffer, verify_checksum)
+                buffer = []
+                deadline = time.monotonic() + flush_interval
+        
+        if buffer:
+            yield self._ingest_batch(buffer, verify_checksum)
+    
+    def ingest_nmea(self, source: Union[str, Path, Any], consumer: Callable[[AISBatch], Any],
+                    max_pending_batches: int = 4, **stream_options) -> Dict[str, Any]:
+        """
+        从数据源持续摄取NMEA数据并交给消费者
+        
+        读取与解码在后台线程中进行，批次经有界队列交给当前线程的消费者
+        （如存储的批量写入方法）；队列满时后台线程阻塞，从而对上游读取施加背压。
+        
+        Args:
+            source: 数据源，见iter_nmea_lines
+            consumer: 批次消费函数
+            max_pending_batches: 已解码但未消费的最大批次数
+            **stream_options: 传给stream_nmea的参数
+            
+        Returns:
+            摄取统计信息
+        """
+        batches: queue.Queue = queue.Queue(maxsize=max_pending_batches)
+        finished = object()
+        stop = threading.Event()
+        
+        def offer(item) -> bool:
+            # 队列满时阻塞等待消费者，消费者退出后放弃
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for batch in self.stream_nmea(source, **stream_options):
+                    if not offer(batch):
+                        return
+                offer(finished)
+            except Exception as e:
+                offer(e)
+        
+        stats = {'batches': 0, 'sentences': 0, 'decoded': 0, 'checksum_errors': 0, 'malformed': 0}
+        started = time.perf_counter()
+        producer = threading.Thread(target=produce, name='ais-ingest', daemon=True)
+        producer.start()
+        
+        try:
+            while True:
+                item = batches.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise ProcessingError(f"NMEA摄取失败: {str(item)}") from item
+                consumer(item)
+                stats['batches'] += 1
+                stats['sentences'] += item.total_sentences
+                stats['decoded'] += len(item)
+                stats['checksum_errors'] += item.checksum_errors
+                stats['malformed'] += item.malformed
+        finally:
+            stop.set()
+            # 阻塞在套接字读取上的生产者线程无法被打断，仅有限等待（守护线程随进程退出）
+            producer.join(timeout=1.0)
+        
+        elapsed = time.perf_counter() - started
+        stats['seconds'] = elapsed
+        stats['sentences_per_second'] = stats['sentences'] / elapsed if elapsed > 0 else 0.0
+        stats['tracked_vessels'] = len(self.positions)
+        logger.info(f"NMEA摄取完成: {stats['sentences']}条句子, {stats['decoded']}条解码, "
+                    f"{stats['sentences_per_second']:.0f}条/秒")
+        return stats
+    
+    def _ingest_batch(self, sentences: List[str], verify_checksum: bool) -> AISBatch:
+        """解码一批句子，更新船舶轨迹并淘汰过期船舶"""
+        batch = self.parse_nmea_batch(sentences, verify_checksum=verify_checksum)
+        now = time.monotonic()
+        timestamp = datetime.utcnow()
+        
+        for message_type, mmsi, latitude, longitude, speed, course, heading, status in zip(
+                batch.message_type, batch.mmsi, batch.latitude, batch.longitude,
+                batch.speed, batch.course, batch.heading, batch.navigation_status):
+            if latitude != latitude or longitude != longitude:  # NaN：无位置
+                continue
+            self._record_position(AISPosition(
+                mmsi=str(mmsi).zfill(9),
+                latitude=latitude,
+                longitude=longitude,
+                timestamp=timestamp,
+                speed=speed if speed == speed else None,
+                course=course if course == course else None,
+                heading=heading if heading == heading else None,
+                navigation_status=status if status >= 0 else None
+            ), now)
+        
+        self._evict_stale_vessels(now)
+        return batch
+    
     def get_vessel_trajectory(self, mmsi: str, start_time: Optional[datetime] = None,
                              end_time: Optional[datetime] = None) -> List[AISPosition]:
         """
@@ -250,7 +774,7 @@ class AISProcessor:
         if mmsi not in self.positions:
             return []
         
-        positions = self.positions[mmsi]
+        positions = list(self.positions[mmsi])
         
         # 时间过滤
         if start_time:
@@ -264,6 +788,75 @@ class AISProcessor:
         
         return positions
     
+    def query_area(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                   start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """
+        查询时间范围内位于矩形区域的位置（需要时空索引）
+        
+        Args:
+            min_lat: 最小纬度
+            min_lon: 最小经度（大于max_lon时表示跨越180°经线）
+            max_lat: 最大纬度
+            max_lon: 最大经度
+            start_time: 开始时间
+            end_time: 结束时间
+            
+        Returns:
+            按时间排序的位置记录
+        """
+        return self._require_index().query_bbox(min_lat, min_lon, max_lat, max_lon, start_time, end_time)
+    
+    def query_radius(self, latitude: float, longitude: float, radius_nm: float,
+                     start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """
+        查询时间范围内距某点radius_nm海里以内的位置（需要时空索引）
+        
+        Args:
+            latitude: 中心纬度
+            longitude: 中心经度
+            radius_nm: 半径（海里）
+            start_time: 开始时间
+            end_time: 结束时间
+            
+        Returns:
+            按时间排序的位置记录，附带distance_nm
+        """
+        return self._require_index().query_radius(latitude, longitude, radius_nm, start_time, end_time)
+    
+    def vessels_near(self, mmsi: str, at_time: datetime, radius_nm: float,
+                     time_window: float = 300.0) -> List[Dict[str, Any]]:
+        """
+        查询某时刻某船附近的其他船舶（需要时空索引）
+        
+        参考船取轨迹中时间上最接近at_time的位置，其他船各取一个最接近at_time的位置。
+        
+        Args:
+            mmsi: 参考船舶的MMSI
+            at_time: 参考时间
+            radius_nm: 半径（海里）
+            time_window: 允许的时间偏差（秒）
+            
+        Returns:
+            按距离排序的位置记录，附带distance_nm；参考船在时间窗口内无位置时返回空列表
+        """
+        index = self._require_index()
+        target = to_epoch_seconds(at_time)
+        reference = min(
+            self.positions.get(mmsi, ()),
+            key=lambda p: abs(to_epoch_seconds(p.timestamp) - target),
+            default=None
+        )
+        if reference is None or abs(to_epoch_seconds(reference.timestamp) - target) > time_window:
+            return []
+        
+        return index.nearest_in_time(reference.latitude, reference.longitude, at_time,
+                                     radius_nm, time_window, exclude_mmsi=int(mmsi))
+    
+    def _require_index(self) -> SpatioTemporalIndex:
+        if self.spatial_index is None:
+            raise ProcessingError("未启用时空索引，请在构造AISProcessor时传入spatial_index")
+        return self.spatial_index
+    
     def calculate_distance(self, pos1: AISPosition, pos2: AISPosition) -> float:
         """
         计算两点间距离（海里）
@@ -275,23 +868,74 @@ class AISProcessor:
         Returns:
             距离（海里）
         """
-        import math
-        
-        # 使用Haversine公式
-        lat1_rad = math.radians(pos1.latitude)
-        lat2_rad = math.radians(pos2.latitude)
-        delta_lat = math.radians(pos2.latitude - pos1.latitude)
-        delta_lon = math.radians(pos2.longitude - pos1.longitude)
-        
-        a = math.sin(delta_lat / 2) ** 2 + \
-            math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        # 地球半径（海里）
-        R = 3440.065  # 海里
+        return haversine_distance(pos1.latitude, pos1.longitude, pos2.latitude, pos2.longitude)
+
+
+def iter_nmea_lines(source: Union[str, Path, Any], timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    逐行读取NMEA数据源
+    
+    Args:
+        source: 文件路径、已打开的文件/管道对象（文本或二进制），
+                或形如"udp://host:port"（绑定并接收数据报）、"tcp://host:port"（连接并读取）的地址
+        timeout: 套接字空闲超时（秒），超时后结束读取；None表示一直等待
         
-        distance = R * c
-        return distance
+    Yields:
+        去除首尾空白后的非空句子
+    """
+    if isinstance(source, str) and source.startswith(('udp://', 'tcp://')):
+        scheme, address = source.split('://', 1)
+        host, port = address.rsplit(':', 1)
+        if scheme == 'udp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, int(port)))
+        else:
+            sock = socket.create_connection((host, int(port)))
+        sock.settimeout(timeout)
+        try:
+            if scheme == 'udp':
+                while True:
+                    try:
+                        datagram = sock.recv(65535)
+                    except socket.timeout:
+                        return
+                    for line in datagram.decode('ascii', 'replace').splitlines():
+                        line = line.strip()
+                        if line:
+                            yield line
+            else:
+                with sock.makefile('r', encoding='ascii', errors='replace', newline='') as stream:
+                    try:
+                        for line in stream:
+                            line = line.strip()
+                            if line:
+                                yield line
+                    except socket.timeout:
+                        return
+        finally:
+            sock.close()
+        return
+    
+    if isinstance(source, (str, Path)):
+        with open(source, 'r', encoding='ascii', errors='replace') as stream:
+            yield from iter_nmea_lines(stream)
+        return
+    
+    for line in source:
+        if isinstance(line, bytes):
+            line = line.decode('ascii', 'replace')
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _nmea_checksum_ok(sentence: str, star: int) -> bool:
+    """校验NMEA校验和（起始符与'*'之间所有字符的异或）"""
+    try:
+        expected = int(sentence[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+    return reduce(operator.xor, sentence[1:star].encode('ascii', 'replace'), 0) == expected
 
 
 def main():
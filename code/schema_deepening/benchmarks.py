@@ -0,0 +1,460 @@
+"""
+Schema深化模块性能基准
+
+提供各处理器热点路径的基准测试，用法：
+    python -m schema_deepening.benchmarks ais --count 200000
+    python -m schema_deepening.benchmarks edifact --count 1000000
+    python -m schema_deepening.benchmarks epcis --count 1000000
+"""
+
+import argparse
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from functools import reduce
+from typing import Callable, Dict, List, Optional
+
+from .ais_processor import AISProcessor
+from .edifact_parser import EDIFACTParser
+from .epcis_processor import EPCISProcessor, EPCISEvent, EPCISEventType
+from .epcis_trace import TraceabilityGraph
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# 真实AIVDM样本（A类位置报告、B类位置报告）
+_AIS_SAMPLE_SENTENCES = [
+    "!AIVDM,1,1,,B,177KQJ5000G?tO`K>RA1wUbN0TKH,0*5C",
+    "!AIVDM,1,1,,A,133m@ogP00PD;88MD5MTDww@2D7k,0*46",
+    "!AIVDM,1,1,,B,B52K>;h00Fc>jpUlNV@ikwpUoP06,0*4F",
+]
+
+
+class _OriginalDecoderAISProcessor(AISProcessor):
+    """逐句路径的对照基线：沿用优化前逐字符分支+字符串拼接的6位ASCII解码"""
+
+    def _decode_6bit_ascii(self, payload: str) -> str:
+        binary = ""
+        for char in payload:
+            ascii_val = ord(char)
+            if 48 <= ascii_val <= 57:  # 0-9
+                value = ascii_val - 48
+            elif ascii_val == 58:  # :
+                value = 10
+            elif ascii_val == 59:  # ;
+                value = 11
+            elif ascii_val == 60:  # <
+                value = 12
+            elif ascii_val == 61:  # =
+                value = 13
+            elif ascii_val == 62:  # >
+                value = 14
+            elif ascii_val == 63:  # ?
+                value = 15
+            elif 64 <= ascii_val <= 87:  # @, A-W
+                value = ascii_val - 64 + 16
+            else:
+                value = 0
+            binary += format(value, '06b')
+        return binary
+
+
+def _timed(func: Callable[[], object]) -> float:
+    """执行函数并返回耗时（秒）"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _report(name: str, count: int, elapsed: float) -> Dict[str, float]:
+    rate = count / elapsed if elapsed > 0 else float('inf')
+    print(f"{name:<28} {count:>10} 条  {elapsed:8.3f} s  {rate:12.0f} 条/秒")
+    return {'count': count, 'seconds': elapsed, 'rate': rate}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB），平台不支持时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB计，macOS以字节计
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def encode_position_report(mmsi: int, latitude: float, longitude: float, speed: float = 0.0,
+                           course: float = 0.0, heading: int = 511, status: int = 15) -> str:
+    """
+    编码A类位置报告（消息类型1）为NMEA句子，用于生成合成数据
+
+    Returns:
+        带校验和的AIVDM句子
+    """
+    fields = [
+        (1, 6), (0, 2), (mmsi, 30), (status, 4), (128, 8), (int(round(speed * 10)), 10), (0, 1),
+        (int(round(longitude * 600000)) & 0xFFFFFFF, 28), (int(round(latitude * 600000)) & 0x7FFFFFF, 27),
+        (int(round(course * 10)), 12), (heading, 9), (60, 6), (0, 2), (0, 3), (0, 1), (0, 19),
+    ]
+    bits = 0
+    for value, width in fields:
+        bits = (bits << width) | value
+    payload = ''.join(
+        chr(value + 48 if value < 40 else value + 56)
+        for value in ((bits >> shift) & 0x3F for shift in range(162, -1, -6))
+    )
+    body = f"AIVDM,1,1,,A,{payload},0"
+    checksum = reduce(lambda acc, char: acc ^ ord(char), body, 0)
+    return f"!{body}*{checksum:02X}"
+
+
+def generate_ais_sentences(count: int, vessels: int = 5000, seed: int = 42) -> List[str]:
+    """生成在若干船舶间轮转的合成位置报告"""
+    rng = random.Random(seed)
+    fleet = [(200000000 + i, rng.uniform(-60, 60), rng.uniform(-170, 170)) for i in range(vessels)]
+    sentences = []
+    for i in range(count):
+        mmsi, latitude, longitude = fleet[i % vessels]
+        step = i // vessels * 0.001
+        sentences.append(encode_position_report(
+            mmsi, latitude + step, longitude + step,
+            speed=rng.uniform(0, 25), course=rng.uniform(0, 359), heading=rng.randrange(360), status=0
+        ))
+    return sentences
+
+
+def benchmark_ais_decode(count: int = 100000) -> Dict[str, Dict[str, float]]:
+    """
+    对比逐句解析与批量解析AIS消息的吞吐量
+
+    Args:
+        count: 句子数量
+
+    Returns:
+        各路径的基准结果
+    """
+    sentences: List[str] = [
+        _AIS_SAMPLE_SENTENCES[i % len(_AIS_SAMPLE_SENTENCES)] for i in range(count)
+    ]
+    # 逐句路径每条都会创建消息对象，取较小样本避免内存膨胀
+    scalar_count = min(count, 20000)
+
+    original_processor = _OriginalDecoderAISProcessor()
+    original_elapsed = _timed(lambda: [original_processor.parse_nmea(s) for s in sentences[:scalar_count]])
+
+    scalar_processor = AISProcessor()
+    scalar_elapsed = _timed(lambda: [scalar_processor.parse_nmea(s) for s in sentences[:scalar_count]])
+
+    batch_processor = AISProcessor()
+    batch_elapsed = _timed(lambda: batch_processor.parse_nmea_batch(sentences))
+
+    results = {
+        'parse_nmea_original': _report('parse_nmea(原解码器)', scalar_count, original_elapsed),
+        'parse_nmea': _report('parse_nmea', scalar_count, scalar_elapsed),
+        'parse_nmea_batch': _report('parse_nmea_batch', count, batch_elapsed),
+    }
+    batch_rate = results['parse_nmea_batch']['rate']
+    speedup = batch_rate / results['parse_nmea_original']['rate']
+    scalar_speedup = batch_rate / results['parse_nmea']['rate']
+    print(f"加速比（相对原解码器）: {speedup:.1f}x  （相对当前逐句路径）: {scalar_speedup:.1f}x")
+    results['speedup'] = {'ratio': speedup, 'scalar_ratio': scalar_speedup}
+    return results
+
+
+def _serve_tcp_stand_in(path: str) -> int:
+    """启动本地TCP替身服务，向第一个连接推送文件内容后关闭，返回端口"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def serve():
+        connection, _ = server.accept()
+        with connection, open(path, 'rb') as stream:
+            while True:
+                chunk = stream.read(1 << 16)
+                if not chunk:
+                    break
+                connection.sendall(chunk)
+        server.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def benchmark_ais_stream(count: int = 100000) -> Dict[str, Dict[str, float]]:
+    """
+    流式摄取AIS数据的吞吐量与峰值内存
+
+    分别从文件和本地TCP替身服务读取合成数据，每船保留最近100个位置，
+    消费者为空操作。
+
+    Args:
+        count: 句子数量
+
+    Returns:
+        各数据源的基准结果
+    """
+    fd, path = tempfile.mkstemp(suffix='.nmea')
+    with os.fdopen(fd, 'w') as stream:
+        for start in range(0, count, 10000):
+            stream.write('\n'.join(generate_ais_sentences(min(10000, count - start), seed=start)) + '\n')
+
+    results = {}
+    try:
+        for name, source in (('file', path), ('tcp', None)):
+            if source is None:
+                source = f"tcp://127.0.0.1:{_serve_tcp_stand_in(path)}"
+            processor = AISProcessor(max_positions_per_vessel=100, vessel_ttl=300)
+            stats = processor.ingest_nmea(source, consumer=lambda batch: None, batch_size=20000)
+            results[name] = _report(f"ingest_nmea ({name})", stats['sentences'], stats['seconds'])
+            results[name]['tracked_vessels'] = stats['tracked_vessels']
+    finally:
+        os.remove(path)
+
+    peak = _peak_rss_mb()
+    if peak is not None:
+        print(f"峰值RSS: {peak:.1f} MB")
+    results['memory'] = {'peak_rss_mb': peak}
+    return results
+
+
+def write_edifact_interchange(path: str, segments: int, seed: int = 42) -> int:
+    """
+    生成合成EDIFACT交换文件（ORDERS消息，含UNA、释放字符和UNB/UNZ信封）
+
+    Args:
+        path: 输出文件路径
+        segments: 消息内段数的近似总量
+        seed: 随机种子
+
+    Returns:
+        消息数
+    """
+    rng = random.Random(seed)
+    messages = 0
+    written = 0
+    with open(path, 'wb') as stream:
+        stream.write(b"UNA:+.? 'UNB+UNOC:3+SENDER:14+RECEIVER:14+250121:1200+BENCH1'\n")
+        while written < segments:
+            messages += 1
+            lines = rng.randint(2, 8)
+            body = [
+                f"UNH+{messages}+ORDERS:D:96A:UN",
+                f"BGM+220+PO{messages:08d}+9",
+                "DTM+137:20250121:102",
+                f"NAD+BY+{rng.randrange(10 ** 12):013d}::9",
+                "FTX+AAA+++Deliver to dock 4?+5, ring bell?'s twice",
+            ]
+            for line in range(1, lines + 1):
+                body.append(f"LIN+{line}++{rng.randrange(10 ** 12):013d}:EN")
+                body.append(f"QTY+21:{rng.randint(1, 500)}:PCE")
+                body.append(f"PRI+AAA:{rng.uniform(1, 100):.2f}")
+            body.append(f"UNT+{len(body) + 1}+{messages}")
+            stream.write(("'".join(body) + "'\n").encode('latin-1'))
+            written += len(body)
+        stream.write(f"UNZ+{messages}+BENCH1'\n".encode('latin-1'))
+    return messages
+
+
+def benchmark_edifact_convert(count: int = 1000000) -> Dict[str, Dict[str, float]]:
+    """
+    对比逐条转换与批量并行转换EDIFACT交换为XML的吞吐量
+
+    逐条路径对每条消息调用validate_message和convert_to_xml；批量路径使用预编译定义，
+    分别在当前进程、有序进程池和无序进程池中运行。
+
+    Args:
+        count: 段数量
+
+    Returns:
+        各路径的基准结果（按段计）
+    """
+    fd, source = tempfile.mkstemp(suffix='.edi')
+    os.close(fd)
+    write_edifact_interchange(source, count)
+    parser = EDIFACTParser()
+    # 至少2个工作进程，保证单核机器上也走进程池路径
+    workers = max(2, os.cpu_count() or 1)
+    results = {}
+    converted = []
+
+    def per_message():
+        with open(os.devnull, 'wb') as output:
+            for message in parser.iter_messages(source):
+                parser.validate_message(message)
+                output.write(parser.convert_to_xml(message).encode('utf-8'))
+                converted.append(len(message.segments))
+
+    try:
+        elapsed = _timed(per_message)
+        results['convert_to_xml'] = _report('convert_to_xml', sum(converted), elapsed)
+        for name, options in (('batch (1 process)', {'workers': 1}),
+                              (f'batch ({workers} ordered)', {'workers': workers, 'ordered': True}),
+                              (f'batch ({workers} unordered)', {'workers': workers, 'ordered': False})):
+            with open(os.devnull, 'wb') as output:
+                stats = parser.convert_interchange_to_xml(source, output, **options)
+            results[name] = _report(name, stats['segments'], stats['seconds'])
+    finally:
+        os.remove(source)
+
+    print(f"CPU数: {os.cpu_count()}")
+    peak = _peak_rss_mb()
+    if peak is not None:
+        print(f"峰值RSS: {peak:.1f} MB")
+    results['memory'] = {'peak_rss_mb': peak}
+    return results
+
+
+def write_epcis_document(path: str, count: int, seed: int = 42) -> None:
+    """生成包含count个ObjectEvent的合成EPCIS文档"""
+    rng = random.Random(seed)
+    steps = ['commissioning', 'packing', 'shipping', 'receiving', 'storing']
+    with open(path, 'w', encoding='utf-8') as stream:
+        stream.write('<epcis:EPCISDocument xmlns:epcis="urn:epcglobal:epcis:xsd:1">'
+                     '<EPCISBody><EventList>\n')
+        for i in range(count):
+            minute, second = divmod(i % 3600, 60)
+            stream.write(
+                f'<epcis:ObjectEvent id="ev{i}">'
+                f'<epcis:eventTime>2024-01-{1 + i // 86400 % 28:02d}T{i // 3600 % 24:02d}:{minute:02d}:{second:02d}Z'
+                f'</epcis:eventTime>'
+                f'<epcis:epcList><epcis:epc>urn:epc:id:sgtin:0614141.107346.{rng.randrange(count)}</epcis:epc>'
+                f'</epcis:epcList><epcis:action>OBSERVE</epcis:action>'
+                f'<epcis:bizStep>{steps[i % len(steps)]}</epcis:bizStep>'
+                f'<epcis:readPoint><epcis:id>urn:epc:id:sgln:0614141.{i % 50:05d}.0</epcis:id></epcis:readPoint>'
+                f'</epcis:ObjectEvent>\n'
+            )
+        stream.write('</EventList></EPCISBody></epcis:EPCISDocument>\n')
+
+
+def benchmark_epcis_ingest(count: int = 100000) -> Dict[str, Dict[str, float]]:
+    """
+    流式摄取EPCIS文档的吞吐量、峰值内存与索引查询耗时
+
+    先以retain=False只解析不保存，测量与文档大小无关的解析内存；
+    再保存事件建立索引，对比时间范围查询的索引路径与线性扫描。
+
+    Args:
+        count: 事件数量
+
+    Returns:
+        各阶段的基准结果
+    """
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    write_epcis_document(path, count)
+    results = {}
+    try:
+        stats = EPCISProcessor().ingest_epcis(path, retain=False)
+        results['stream'] = _report('ingest_epcis (retain=False)', stats['events'], stats['seconds'])
+        peak = _peak_rss_mb()
+        if peak is not None:
+            print(f"峰值RSS（仅解析）: {peak:.1f} MB")
+        results['stream']['peak_rss_mb'] = peak
+
+        processor = EPCISProcessor()
+        stats = processor.ingest_epcis(path)
+        results['indexed'] = _report('ingest_epcis (indexed)', stats['events'], stats['seconds'])
+    finally:
+        os.remove(path)
+
+    start = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 1, 6, 5, tzinfo=timezone.utc)
+    queries = 200
+    found = []
+    indexed = _timed(lambda: [found.append(len(processor.query_events_by_time_range(start, end)))
+                              for _ in range(queries)])
+    scan = _timed(lambda: [sorted((e for e in processor.events.values() if start <= e.event_time <= end),
+                                  key=lambda e: e.event_time) for _ in range(queries)])
+    results['time_range'] = _report(f'time range (k={found[0]})', queries, indexed)
+    results['time_range_scan'] = _report('time range (linear scan)', queries, scan)
+    return results
+
+
+def benchmark_epcis_trace(count: int = 1000000) -> Dict[str, Dict[str, float]]:
+    """
+    追溯图的构建吞吐量、内存与追溯查询延迟
+
+    合成供应链：原料批次加工为单品，每24个单品装一箱，每40箱装一托盘。
+
+    Args:
+        count: 单品数量
+
+    Returns:
+        各阶段的基准结果
+    """
+    base = datetime(2024, 1, 1)
+    lots = max(1, count // 1000)
+    graph = TraceabilityGraph()
+
+    def build():
+        for start in range(0, count, 1000):
+            items = [f"urn:epc:id:sgtin:0614141.107346.{i}" for i in range(start, min(start + 1000, count))]
+            graph.add_event(EPCISEvent(
+                event_id=f"t{start}", event_type=EPCISEventType.TRANSFORMATION_EVENT, event_time=base,
+                input_epc_list=[f"urn:epc:class:lgtin:0614141.107346.L{start // 1000}",
+                                f"urn:epc:class:lgtin:0614141.107346.L{(start // 1000 + 1) % lots}"],
+                output_epc_list=items))
+            for offset in range(0, len(items), 24):
+                case = f"urn:epc:id:sscc:0614141.1{(start + offset) // 24:09d}"
+                graph.add_event(EPCISEvent(
+                    event_id=f"c{start + offset}", event_type=EPCISEventType.AGGREGATION_EVENT,
+                    event_time=base, parent_id=case, child_epcs=items[offset:offset + 24], action='ADD'))
+                if (start + offset) // 24 % 40 == 0:
+                    pallet_case = (start + offset) // 24
+                    graph.add_event(EPCISEvent(
+                        event_id=f"p{pallet_case}", event_type=EPCISEventType.AGGREGATION_EVENT,
+                        event_time=base, parent_id=f"urn:epc:id:sscc:0614141.2{pallet_case:09d}",
+                        child_epcs=[f"urn:epc:id:sscc:0614141.1{c:09d}" for c in range(pallet_case, pallet_case + 40)],
+                        action='ADD'))
+
+    results = {'build': _report('add_event (items)', count, _timed(build))}
+    results['build']['edges'] = graph.edge_count
+    results['csr'] = _report('CSR build (forward)', graph.edge_count,
+                             _timed(lambda: graph.trace_forward("urn:epc:id:sgtin:0614141.107346.0", max_depth=1)))
+
+    rng = random.Random(7)
+    queries = 1000
+    lot_ids = [f"urn:epc:class:lgtin:0614141.107346.L{rng.randrange(lots)}" for _ in range(queries)]
+    item_ids = [f"urn:epc:id:sgtin:0614141.107346.{rng.randrange(count)}" for _ in range(queries)]
+    results['forward'] = _report('trace_forward (lot recall)', queries,
+                                 _timed(lambda: [graph.trace_forward(epc) for epc in lot_ids]))
+    results['backward'] = _report('trace_backward (item)', queries,
+                                  _timed(lambda: [graph.trace_backward(epc) for epc in item_ids]))
+    peak = _peak_rss_mb()
+    if peak is not None:
+        print(f"峰值RSS: {peak:.1f} MB")
+    results['memory'] = {'peak_rss_mb': peak}
+    return results
+
+
+BENCHMARKS = {
+    'ais': benchmark_ais_decode,
+    'ais_stream': benchmark_ais_stream,
+    'edifact': benchmark_edifact_convert,
+    'epcis': benchmark_epcis_ingest,
+    'trace': benchmark_epcis_trace,
+}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Schema深化模块性能基准")
+    parser.add_argument('benchmark', nargs='?', choices=sorted(BENCHMARKS), help="基准名称，缺省运行全部")
+    parser.add_argument('--count', type=int, default=100000, help="数据规模")
+    args = parser.parse_args()
+
+    names = [args.benchmark] if args.benchmark else sorted(BENCHMARKS)
+    for name in names:
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name](args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,14 +4,19 @@ EDIFACT解析器
 专注于EDIFACT消息解析、验证、转换
 """
 
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Union, NamedTuple, BinaryIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+import mmap
+import os
 import re
+import time
 
 from .logger import logger
-from .exceptions import ParseError, ValidationError
+from .exceptions import ParseError, ValidationError, ConversionError
 
 
 class EDIFACTMessageType(Enum):
@@ -39,8 +44,382 @@ class EDIFACTMessage:
     """EDIFACT消息"""
     message_id: str
     message_type: EDIFACTMessageType
-    segments: List[EDIFACTSegment]
+    segments: List[EDIFACTSegment]  # 流式解析时为EDIFACTLazySegment
     created_at: datetime
+    interchange_reference: Optional[str] = None  # 所属交换（UNB）的控制参考号
+
+
+class EDIFACTSyntax(NamedTuple):
+    """EDIFACT服务字符（UNA）与字符编码"""
+    component_separator: str = ':'
+    element_separator: str = '+'
+    decimal_mark: str = '.'
+    release_character: str = '?'
+    segment_terminator: str = "'"
+    encoding: str = 'latin-1'
+
+
+# UNB语法标识符对应的字符编码，未列出的按latin-1解码（兼容UNOA~UNOC）
+_SYNTAX_ENCODINGS = {
+    'UNOW': 'utf-8',
+    'UNOY': 'utf-8',
+}
+
+_ENVELOPE_TAGS = {'UNA', 'UNB', 'UNZ', 'UNG', 'UNE'}
+
+_WHITESPACE = b' \t\r\n'
+
+
+def _split_unreleased(text: str, separator: str, release: Optional[str]) -> List[str]:
+    """按未被释放字符转义的分隔符切分，保留释放字符供下一级处理"""
+    if not release or release not in text:
+        return text.split(separator)
+
+    parts = []
+    start = 0
+    index = 0
+    length = len(text)
+    while index < length:
+        char = text[index]
+        if char == release:
+            index += 2
+            continue
+        if char == separator:
+            parts.append(text[start:index])
+            start = index + 1
+        index += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unescape(text: str, release: Optional[str]) -> str:
+    """去除释放字符（"?+"还原为"+"，"??"还原为"?"）"""
+    if not release or release not in text:
+        return text
+    return re.sub(re.escape(release) + '(.)', r'\1', text, flags=re.DOTALL)
+
+
+def _split_elements(body: str, syntax: EDIFACTSyntax) -> List[List[str]]:
+    """
+    将段标识符之后的内容切分为元素
+
+    Args:
+        body: 段标识符之后的文本（以元素分隔符开头）
+        syntax: 服务字符
+
+    Returns:
+        元素列表，复合元素切分为组件，空元素为空列表
+    """
+    if body.startswith(syntax.element_separator):
+        body = body[1:]
+    elif not body:
+        return []
+
+    release = syntax.release_character
+    elements = []
+    for element_str in _split_unreleased(body, syntax.element_separator, release):
+        if not element_str:
+            elements.append([])
+            continue
+        elements.append([
+            _unescape(component, release)
+            for component in _split_unreleased(element_str, syntax.component_separator, release)
+        ])
+    return elements
+
+
+class EDIFACTLazySegment:
+    """
+    按需解析元素的EDIFACT段
+
+    只保存段的原始字节，首次访问elements时才解码并切分，
+    与EDIFACTSegment具有相同的tag/name/elements接口。
+    """
+
+    __slots__ = ('tag', 'name', '_raw', '_syntax', '_elements')
+
+    def __init__(self, tag: str, name: str, raw: bytes, syntax: EDIFACTSyntax):
+        self.tag = tag
+        self.name = name
+        self._raw = raw
+        self._syntax = syntax
+        self._elements: Optional[List[List[str]]] = None
+
+    @property
+    def raw(self) -> str:
+        """段的原始文本（不含段终止符）"""
+        return self._raw.decode(self._syntax.encoding)
+
+    @property
+    def elements(self) -> List[List[str]]:
+        if self._elements is None:
+            self._elements = _split_elements(self.raw[3:], self._syntax)
+        return self._elements
+
+    def element(self, index: int, component: int = 0, default: str = '') -> str:
+        """获取指定元素的指定组件，不存在时返回default"""
+        elements = self.elements
+        if index < len(elements) and component < len(elements[index]):
+            return elements[index][component]
+        return default
+
+    def __repr__(self) -> str:
+        return f"EDIFACTLazySegment(tag={self.tag!r}, raw={bytes(self._raw[:40])!r})"
+
+
+EDIFACTSource = Union[str, bytes, bytearray, memoryview, 'os.PathLike', BinaryIO]
+
+
+def _iter_chunks(source: EDIFACTSource, chunk_size: int) -> Iterator[bytes]:
+    """
+    按块读取EDIFACT数据源
+
+    bytes/bytearray已在内存中且支持原地查找，整体作为一个块返回以避免复制；
+    memoryview/mmap按块切片；文件路径和二进制文件对象按块读取。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield source
+    elif isinstance(source, (memoryview, mmap.mmap)):
+        view = memoryview(source).cast('B')
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size].tobytes()
+    elif isinstance(source, (str, os.PathLike)):
+        try:
+            stream = open(source, 'rb')
+        except OSError as e:
+            raise ParseError(f"无法读取EDIFACT文件: {str(e)}") from e
+        with stream:
+            yield from _iter_chunks(stream, chunk_size)
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            if isinstance(chunk, str):
+                raise ParseError("EDIFACT文件对象必须以二进制模式打开")
+            yield chunk
+    else:
+        raise ParseError(f"不支持的EDIFACT数据源类型: {type(source).__name__}")
+
+
+def _read_service_string(chunks: Iterator[bytes]) -> Tuple[EDIFACTSyntax, Iterator[bytes], int]:
+    """
+    读取UNA服务字符串
+
+    Returns:
+        (服务字符, 数据块迭代器, 第一块中数据段的起始偏移)
+    """
+    head = b''
+    offset = 0
+    for chunk in chunks:
+        head = head + chunk if head else chunk
+        while offset < len(head) and head[offset] in _WHITESPACE:
+            offset += 1
+        if len(head) - offset >= 9:
+            break
+
+    syntax = EDIFACTSyntax()
+    if head[offset:offset + 3] == b'UNA' and len(head) - offset >= 9:
+        advice = bytes(head[offset + 3:offset + 9]).decode('latin-1')
+        syntax = EDIFACTSyntax(
+            component_separator=advice[0],
+            element_separator=advice[1],
+            decimal_mark=advice[2],
+            release_character=advice[3].strip(),
+            segment_terminator=advice[5],
+        )
+        offset += 9
+
+    def remaining():
+        if head:
+            yield head
+        yield from chunks
+
+    return syntax, remaining(), offset
+
+
+def _iter_raw_segments(chunks: Iterator[bytes], syntax: EDIFACTSyntax, offset: int = 0) -> Iterator[bytes]:
+    """
+    单遍扫描切分段
+
+    用bytes.find查找段终止符，前面紧邻奇数个释放字符的终止符视为字面量；
+    块尾不完整的段保留到下一块拼接。
+
+    Args:
+        chunks: 数据块迭代器
+        syntax: 服务字符
+        offset: 第一块中的起始偏移
+
+    Returns:
+        去除首尾空白的段原始字节（不含段终止符）
+    """
+    terminator = syntax.segment_terminator.encode('latin-1')
+    release = ord(syntax.release_character) if syntax.release_character else None
+    pending = b''
+    for chunk in chunks:
+        buffer = pending + chunk if pending else chunk
+        start = search = offset
+        offset = 0
+        while True:
+            end = buffer.find(terminator, search)
+            if end < 0:
+                break
+            if release is not None:
+                escape_start = end
+                while escape_start > start and buffer[escape_start - 1] == release:
+                    escape_start -= 1
+                if (end - escape_start) % 2:
+                    search = end + 1
+                    continue
+            segment = bytes(buffer[start:end].strip(_WHITESPACE))
+            if segment:
+                yield segment
+            start = search = end + 1
+        pending = bytes(buffer[start:])
+    pending = pending.strip(_WHITESPACE)
+    if pending:
+        yield pending
+
+
+_XML_TEXT_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_XML_ATTR_ESCAPE = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\n': '&#10;', '\r': '&#13;', '\t': '&#09;',
+})
+
+
+class CompiledEDIFACTSchema:
+    """
+    预编译的段/消息定义
+
+    把段定义编译为带转义属性的XML开始标签，把消息类型表编译为代码到类型值的映射，
+    批量转换时每个段只做一次字典查找。实例可序列化，供进程池工作进程使用。
+    """
+
+    def __init__(self, segment_definitions: Dict[str, Dict[str, Any]],
+                 message_types: Dict[str, EDIFACTMessageType]):
+        self.segment_tags = {
+            tag: self._segment_tag(tag, definition.get('name', ''))
+            for tag, definition in segment_definitions.items()
+        }
+        self.message_types = {code: message_type.value for code, message_type in message_types.items()}
+        self.default_message_type = EDIFACTMessageType.ORDERS.value
+
+    @staticmethod
+    def _segment_tag(tag: str, name: str) -> str:
+        return f'<Segment tag="{tag.translate(_XML_ATTR_ESCAPE)}" name="{name.translate(_XML_ATTR_ESCAPE)}"'
+
+    def validate(self, tags: List[str], declared_count: str) -> Tuple[List[str], List[str]]:
+        """
+        验证消息结构，规则与EDIFACTParser.validate_message一致
+
+        Args:
+            tags: 消息各段标识符
+            declared_count: UNT段声明的段数
+
+        Returns:
+            (错误列表, 警告列表)
+        """
+        errors = []
+        warnings = []
+        has_unh = 'UNH' in tags
+        has_unt = 'UNT' in tags
+        if not has_unh:
+            errors.append("消息缺少UNH段（消息头）")
+        if not has_unt:
+            errors.append("消息缺少UNT段（消息尾）")
+        if has_unh and has_unt:
+            actual_count = int(declared_count) if declared_count.isdigit() else 0
+            if actual_count != len(tags):
+                warnings.append(f"段计数不匹配：期望 {len(tags)}，实际 {actual_count}")
+        return errors, warnings
+
+    def render(self, message_id: str, segments: List[Tuple[str, List[List[str]]]]) -> str:
+        """
+        生成单条消息的XML，输出与EDIFACTParser.convert_to_xml一致
+
+        Args:
+            message_id: 消息ID
+            segments: (段标识符, 元素列表)列表
+
+        Returns:
+            XML字符串
+        """
+        message_type = self.default_message_type
+        for tag, elements in segments:
+            if tag == 'UNH':
+                if len(elements) > 1 and elements[1]:
+                    message_type = self.message_types.get(elements[1][0], self.default_message_type)
+                break
+
+        parts = [
+            f'<EDIFACTMessage messageId="{message_id.translate(_XML_ATTR_ESCAPE)}" messageType="{message_type}">'
+        ]
+        append = parts.append
+        for tag, elements in segments:
+            opener = self.segment_tags.get(tag)
+            if opener is None:
+                opener = self.segment_tags[tag] = self._segment_tag(tag, '')
+            if not elements:
+                append(opener + ' />')
+                continue
+            append(opener + '>')
+            for position, element in enumerate(elements, 1):
+                if len(element) == 1:
+                    if element[0]:
+                        append(f'<Element position="{position}">{element[0].translate(_XML_TEXT_ESCAPE)}</Element>')
+                    else:
+                        append(f'<Element position="{position}" />')
+                    continue
+                if not element:
+                    append(f'<Element position="{position}" />')
+                    continue
+                append(f'<Element position="{position}">')
+                for index, component in enumerate(element, 1):
+                    if component:
+                        append(f'<Component position="{index}">{component.translate(_XML_TEXT_ESCAPE)}</Component>')
+                    else:
+                        append(f'<Component position="{index}" />')
+                append('</Element>')
+            append('</Segment>')
+        append('</EDIFACTMessage>')
+        return ''.join(parts)
+
+
+# 消息块：[(消息ID, 服务字符, 段原始字节列表)]
+_MessageChunk = List[Tuple[str, EDIFACTSyntax, List[bytes]]]
+
+_worker_schema: Optional[CompiledEDIFACTSchema] = None
+
+
+def _init_convert_worker(schema: CompiledEDIFACTSchema):
+    """进程池工作进程初始化，每个进程只接收一次编译后的定义"""
+    global _worker_schema
+    _worker_schema = schema
+
+
+def _convert_chunk(chunk: _MessageChunk, schema: Optional[CompiledEDIFACTSchema] = None,
+                   validate: bool = True) -> List[Tuple[bytes, str, List[str], List[str]]]:
+    """
+    转换一块消息
+
+    Returns:
+        [(UTF-8编码的XML, 消息ID, 错误列表, 警告列表)]
+    """
+    schema = schema or _worker_schema
+    results = []
+    for message_id, syntax, raws in chunk:
+        segments = [
+            (raw[:3].decode('latin-1'), _split_elements(raw[3:].decode(syntax.encoding), syntax))
+            for raw in raws
+        ]
+        errors, warnings = [], []
+        if validate:
+            unt = next((elements for tag, elements in segments if tag == 'UNT'), None)
+            declared = unt[0][0] if unt and unt[0] else ''
+            errors, warnings = schema.validate([tag for tag, _ in segments], declared)
+        results.append((schema.render(message_id, segments).encode('utf-8'), message_id, errors, warnings))
+    return results
 
 
 class EDIFACTParser:
@@ -123,10 +502,13 @@ class EDIFACTParser:
         segment_terminator = separators['segment_terminator']
         element_separator = separators['element_separator']
         component_separator = separators['component_separator']
+        release_character = separators['release_character']
         
-        # 解析段
+        # 解析段（UNA服务字符串本身不是数据段）
+        if edifact_message.startswith('UNA'):
+            edifact_message = edifact_message[9:]
         segments = []
-        segment_strings = edifact_message.split(segment_terminator)
+        segment_strings = _split_unreleased(edifact_message, segment_terminator, release_character)
         
         for segment_str in segment_strings:
             segment_str = segment_str.strip()
@@ -136,7 +518,8 @@ class EDIFACTParser:
             segment = self._parse_segment(
                 segment_str,
                 element_separator,
-                component_separator
+                component_separator,
+                release_character
             )
             
             if segment:
@@ -156,6 +539,196 @@ class EDIFACTParser:
         
         return message
     
+    def iter_messages(self, source: EDIFACTSource, chunk_size: int = 1 << 20,
+                      encoding: Optional[str] = None) -> Iterator[EDIFACTMessage]:
+        """
+        流式解析EDIFACT交换，逐条产出UNH..UNT消息
+
+        单遍扫描数据源，内存占用只与当前消息大小相关；段以原始字节保存，
+        访问elements时才切分。支持UNA服务字符、释放字符和UNB/UNZ信封。
+
+        Args:
+            source: 文件路径、二进制文件对象、bytes/bytearray或memoryview/mmap
+            chunk_size: 每次读取的字节数
+            encoding: 字符编码，缺省时按UNB语法标识符确定
+
+        Returns:
+            EDIFACT消息迭代器
+        """
+        syntax, chunks, offset = _read_service_string(_iter_chunks(source, chunk_size))
+        if encoding:
+            syntax = syntax._replace(encoding=encoding)
+
+        interchange_reference = None
+        interchange_messages = 0
+        segments: Optional[List[EDIFACTLazySegment]] = None
+
+        for raw in _iter_raw_segments(chunks, syntax, offset):
+            tag = raw[:3].decode('latin-1')
+            segment = EDIFACTLazySegment(
+                tag, self.segment_definitions.get(tag, {}).get('name', ''), raw, syntax
+            )
+
+            if tag == 'UNH':
+                if segments is not None:
+                    raise ParseError(f"消息 {segments[0].element(0)} 缺少UNT段")
+                segments = [segment]
+            elif segments is not None:
+                segments.append(segment)
+                if tag == 'UNT':
+                    interchange_messages += 1
+                    yield self._build_streamed_message(segments, interchange_reference)
+                    segments = None
+            elif tag == 'UNB':
+                if interchange_reference is not None:
+                    raise ParseError(f"交换 {interchange_reference} 缺少UNZ段")
+                syntax_identifier = segment.element(0)
+                if not encoding:
+                    syntax = syntax._replace(encoding=_SYNTAX_ENCODINGS.get(syntax_identifier, 'latin-1'))
+                interchange_reference = segment.element(4)
+                interchange_messages = 0
+            elif tag == 'UNZ':
+                declared = segment.element(0)
+                if declared.isdigit() and int(declared) != interchange_messages:
+                    logger.warning(
+                        f"交换 {interchange_reference} 消息计数不匹配：声明 {declared}，实际 {interchange_messages}"
+                    )
+                interchange_reference = None
+            elif tag not in _ENVELOPE_TAGS:
+                raise ParseError(f"段 {tag} 不在UNH..UNT消息内")
+
+        if segments is not None:
+            raise ParseError(f"消息 {segments[0].element(0)} 不完整：数据在UNT段之前结束")
+        if interchange_reference is not None:
+            raise ParseError(f"交换 {interchange_reference} 缺少UNZ段")
+
+    def _build_streamed_message(self, segments: List[EDIFACTLazySegment],
+                                interchange_reference: Optional[str]) -> EDIFACTMessage:
+        """由流式解析的段构建消息"""
+        message_reference = segments[0].element(0)
+        if interchange_reference:
+            message_id = f"{interchange_reference}_{message_reference}"
+        else:
+            message_id = message_reference or f"msg_{datetime.utcnow().timestamp()}"
+        return EDIFACTMessage(
+            message_id=message_id,
+            message_type=self._determine_message_type(segments),
+            segments=segments,
+            created_at=datetime.utcnow(),
+            interchange_reference=interchange_reference
+        )
+    
+    def compile_definitions(self) -> CompiledEDIFACTSchema:
+        """
+        预编译当前的段定义和消息类型
+
+        Returns:
+            编译后的定义
+        """
+        return CompiledEDIFACTSchema(self.segment_definitions, self.message_types)
+
+    def convert_interchange_to_xml(self, source: EDIFACTSource, output: Union[str, 'os.PathLike', BinaryIO],
+                                   workers: Optional[int] = None, chunk_messages: int = 500,
+                                   ordered: bool = True, validate: bool = True,
+                                   chunk_size: int = 1 << 20) -> Dict[str, Any]:
+        """
+        批量将EDIFACT交换转换为XML
+
+        主进程流式切分消息，按块分发到进程池完成元素切分、验证和XML生成，
+        结果逐条写入输出，不在内存中拼接完整文档。同时在途的块数为工作进程数的2倍。
+
+        Args:
+            source: EDIFACT数据源，同iter_messages
+            output: 输出文件路径或二进制文件对象
+            workers: 工作进程数，缺省为CPU数，小于等于1时在当前进程内转换
+            chunk_messages: 每个IPC块包含的消息数
+            ordered: 是否按输入顺序写出；为False时按完成顺序写出以提高吞吐
+            validate: 是否验证消息结构
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            转换统计，invalid为未通过验证的消息及其错误
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        schema = self.compile_definitions()
+        stats: Dict[str, Any] = {'messages': 0, 'segments': 0, 'warnings': 0, 'invalid': []}
+        started = time.perf_counter()
+
+        def chunks() -> Iterator[_MessageChunk]:
+            chunk: _MessageChunk = []
+            for message in self.iter_messages(source, chunk_size=chunk_size):
+                chunk.append((message.message_id, message.segments[0]._syntax,
+                              [segment._raw for segment in message.segments]))
+                stats['segments'] += len(message.segments)
+                if len(chunk) >= chunk_messages:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        def write_results(stream: BinaryIO, results):
+            for xml, message_id, errors, warnings in results:
+                stream.write(xml)
+                stream.write(b'\n')
+                stats['messages'] += 1
+                stats['warnings'] += len(warnings)
+                if errors:
+                    stats['invalid'].append({'message_id': message_id, 'errors': errors})
+
+        def convert(stream: BinaryIO):
+            stream.write(b'<?xml version="1.0" encoding="utf-8"?>\n<EDIFACTInterchange>\n')
+            if workers <= 1:
+                for chunk in chunks():
+                    write_results(stream, _convert_chunk(chunk, schema, validate))
+            else:
+                self._convert_in_pool(chunks(), schema, validate, workers, ordered,
+                                      lambda results: write_results(stream, results))
+            stream.write(b'</EDIFACTInterchange>\n')
+
+        if hasattr(output, 'write'):
+            convert(output)
+        else:
+            try:
+                stream = open(output, 'wb')
+            except OSError as e:
+                raise ConversionError(f"无法写入XML文件: {str(e)}") from e
+            with stream:
+                convert(stream)
+
+        stats['seconds'] = time.perf_counter() - started
+        logger.info(f"EDIFACT转换完成: {stats['messages']} 条消息, {stats['segments']} 个段, "
+                    f"{stats['seconds']:.2f} 秒")
+        return stats
+
+    @staticmethod
+    def _convert_in_pool(chunks: Iterator[_MessageChunk], schema: CompiledEDIFACTSchema, validate: bool,
+                         workers: int, ordered: bool, write):
+        """在进程池中转换消息块，限制在途块数"""
+        max_pending = workers * 2
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_convert_worker,
+                                 initargs=(schema,)) as executor:
+            pending = deque()
+            try:
+                for chunk in chunks:
+                    pending.append(executor.submit(_convert_chunk, chunk, None, validate))
+                    while len(pending) >= max_pending:
+                        if ordered:
+                            write(pending.popleft().result())
+                        else:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                pending.remove(future)
+                                write(future.result())
+                for future in (pending if ordered else as_completed(pending)):
+                    write(future.result())
+            except ParseError:
+                executor.shutdown(cancel_futures=True)
+                raise
+            except Exception as e:
+                executor.shutdown(cancel_futures=True)
+                raise ConversionError(f"EDIFACT转换失败: {str(e)}") from e
+
     def _detect_separators(self, message: str) -> Dict[str, str]:
         """检测分隔符"""
         # 默认分隔符
@@ -180,7 +753,7 @@ class EDIFACTParser:
         return separators
     
     def _parse_segment(self, segment_str: str, element_separator: str,
-                      component_separator: str) -> Optional[EDIFACTSegment]:
+                      component_separator: str, release_character: Optional[str] = '?') -> Optional[EDIFACTSegment]:
         """解析段"""
         if not segment_str:
             return None
@@ -188,18 +761,11 @@ class EDIFACTParser:
         # 获取段标识符（前3个字符）
         segment_tag = segment_str[:3]
         
-        # 解析元素
-        elements = []
-        element_strings = segment_str[3:].split(element_separator)
-        
-        for element_str in element_strings:
-            if component_separator in element_str:
-                # 复合元素
-                components = element_str.split(component_separator)
-                elements.append(components)
-            else:
-                # 简单元素
-                elements.append([element_str] if element_str else [])
+        # 解析元素（跳过紧跟段标识符的元素分隔符）
+        syntax = EDIFACTSyntax(component_separator=component_separator,
+                               element_separator=element_separator,
+                               release_character=release_character)
+        elements = _split_elements(segment_str[3:], syntax)
         
         segment_def = self.segment_definitions.get(segment_tag, {})
         
@@ -4,14 +4,33 @@ EPCIS事件处理器
 专注于EPCIS事件处理、解析、查询
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Union, BinaryIO, TextIO, TYPE_CHECKING
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+import io
+import itertools
+import os
+import time
 import xml.etree.ElementTree as ET
 
 from .logger import logger
 from .exceptions import ProcessingError, ValidationError, ParseError
+from .spatial_index import to_epoch_seconds
+
+if TYPE_CHECKING:
+    from .epcis_trace import TraceabilityGraph
+
+_EPCIS_NS = '{urn:epcglobal:epcis:xsd:1}'
+
+_EVENT_TYPE_MAPPING = {
+    'ObjectEvent': 'OBJECT_EVENT',
+    'AggregationEvent': 'AGGREGATION_EVENT',
+    'TransactionEvent': 'TRANSACTION_EVENT',
+    'TransformationEvent': 'TRANSFORMATION_EVENT',
+    'QuantityEvent': 'QUANTITY_EVENT',
+}
 
 
 class EPCISEventType(Enum):
@@ -23,6 +42,39 @@ class EPCISEventType(Enum):
     QUANTITY_EVENT = "QuantityEvent"
 
 
+class _TimeSortedIndex:
+    """
+    按事件时间排序的事件ID列表
+
+    时间键与事件ID分列存储，插入用二分查找定位（按时间顺序到达的事件为追加），
+    范围查询为O(log n + k)。
+    """
+
+    __slots__ = ('times', 'event_ids')
+
+    def __init__(self):
+        self.times: List[float] = []
+        self.event_ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def add(self, timestamp: float, event_id: str):
+        if not self.times or timestamp >= self.times[-1]:
+            self.times.append(timestamp)
+            self.event_ids.append(event_id)
+            return
+        position = bisect_right(self.times, timestamp)
+        self.times.insert(position, timestamp)
+        self.event_ids.insert(position, event_id)
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[str]:
+        """返回时间在[start, end]内的事件ID，按时间排序"""
+        low = 0 if start is None else bisect_left(self.times, start)
+        high = len(self.times) if end is None else bisect_right(self.times, end)
+        return self.event_ids[low:high]
+
+
 @dataclass
 class EPCISEvent:
     """EPCIS事件"""
@@ -55,9 +107,21 @@ class EPCISProcessor:
     专注于EPCIS事件处理、解析、查询
     """
     
-    def __init__(self):
+    def __init__(self, trace_graph: Optional['TraceabilityGraph'] = None):
+        """
+        初始化EPCIS处理器
+        
+        Args:
+            trace_graph: 追溯图，提供时保存的聚合/转换事件会同时加入追溯图
+        """
         self.events: Dict[str, EPCISEvent] = {}
         self.epc_index: Dict[str, List[str]] = {}  # EPC到事件ID的索引
+        self.biz_step_index: Dict[str, _TimeSortedIndex] = {}
+        self.read_point_index: Dict[str, _TimeSortedIndex] = {}
+        self.biz_location_index: Dict[str, _TimeSortedIndex] = {}
+        self.time_index = _TimeSortedIndex()
+        self._event_sequence = itertools.count(1)
+        self.trace_graph = trace_graph
         logger.info("EPCISProcessor initialized")
     
     def parse_epcis_xml(self, epcis_xml: str) -> List[EPCISEvent]:
@@ -81,32 +145,110 @@ class EPCISProcessor:
                 event = self._parse_event_element(event_elem)
                 if event:
                     events.append(event)
-                    self.events[event.event_id] = event
-                    
-                    # 更新EPC索引
-                    self._update_epc_index(event)
+                    self._add_event(event)
         
         return events
     
+    def ingest_epcis(self, source: Union[str, bytes, 'os.PathLike', BinaryIO, TextIO],
+                     consumer: Optional[Callable[[EPCISEvent], None]] = None,
+                     retain: bool = True) -> Dict[str, Any]:
+        """
+        流式摄取EPCIS XML文档
+        
+        用iterparse逐个解析事件，处理完的事件元素立即从树中清除，
+        解析过程的内存占用与文档大小无关。retain为False时事件只交给consumer，
+        不保存也不建索引，整体内存保持有界。
+        
+        Args:
+            source: 文件路径、文件对象或XML字节串
+            consumer: 每个事件的回调
+            retain: 是否保存事件并更新索引
+            
+        Returns:
+            摄取统计
+        """
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        
+        stats = {'events': 0, 'skipped': 0, 'duplicates': 0}
+        started = time.perf_counter()
+        # 当前打开的元素栈，用于找到事件元素的父元素并释放已处理的兄弟元素
+        stack: List[ET.Element] = []
+        in_event_list = 0
+        try:
+            for action, elem in ET.iterparse(source, events=('start', 'end')):
+                local_name = elem.tag.rpartition('}')[2]
+                if action == 'start':
+                    stack.append(elem)
+                    if local_name == 'EventList':
+                        in_event_list += 1
+                    continue
+                
+                stack.pop()
+                if local_name == 'EventList':
+                    in_event_list -= 1
+                if not in_event_list or local_name not in _EVENT_TYPE_MAPPING:
+                    continue
+                
+                event = self._parse_event_element(elem)
+                if event is None:
+                    stats['skipped'] += 1
+                elif retain and not self._add_event(event):
+                    stats['duplicates'] += 1
+                else:
+                    stats['events'] += 1
+                    if consumer:
+                        consumer(event)
+                
+                # 事件已处理完毕，释放其子树及父元素下已完成的兄弟元素
+                elem.clear()
+                if stack:
+                    del stack[-1][:]
+        except ET.ParseError as e:
+            raise ParseError(f"EPCIS XML解析失败: {str(e)}") from e
+        except OSError as e:
+            raise ProcessingError(f"无法读取EPCIS数据源: {str(e)}") from e
+        
+        stats['seconds'] = time.perf_counter() - started
+        logger.info(f"EPCIS摄取完成: {stats['events']} 个事件, {stats['seconds']:.2f} 秒")
+        return stats
+    
+    def _add_event(self, event: EPCISEvent) -> bool:
+        """保存事件并更新全部索引，事件ID已存在时返回False"""
+        if event.event_id in self.events:
+            logger.debug(f"忽略重复的EPCIS事件: {event.event_id}")
+            return False
+        self.events[event.event_id] = event
+        
+        # 更新EPC索引
+        self._update_epc_index(event)
+        
+        timestamp = to_epoch_seconds(event.event_time)
+        self.time_index.add(timestamp, event.event_id)
+        for index, key in ((self.biz_step_index, event.biz_step),
+                           (self.read_point_index, (event.read_point or {}).get('id')),
+                           (self.biz_location_index, (event.biz_location or {}).get('id'))):
+            if key:
+                if key not in index:
+                    index[key] = _TimeSortedIndex()
+                index[key].add(timestamp, event.event_id)
+        
+        if self.trace_graph is not None:
+            self.trace_graph.add_event(event)
+        return True
+    
     def _parse_event_element(self, event_elem: ET.Element) -> Optional[EPCISEvent]:
         """解析事件元素"""
         # 确定事件类型
         tag = event_elem.tag.split('}')[-1] if '}' in event_elem.tag else event_elem.tag
         
-        event_type_mapping = {
-            'ObjectEvent': EPCISEventType.OBJECT_EVENT,
-            'AggregationEvent': EPCISEventType.AGGREGATION_EVENT,
-            'TransactionEvent': EPCISEventType.TRANSACTION_EVENT,
-            'TransformationEvent': EPCISEventType.TRANSFORMATION_EVENT,
-            'QuantityEvent': EPCISEventType.QUANTITY_EVENT
-        }
-        
-        event_type = event_type_mapping.get(tag)
-        if not event_type:
+        event_type_name = _EVENT_TYPE_MAPPING.get(tag)
+        if not event_type_name:
             return None
+        event_type = EPCISEventType[event_type_name]
         
-        # 解析事件ID
-        event_id = event_elem.get('id') or f"event_{datetime.utcnow().timestamp()}"
+        # 解析事件ID（无id属性时按序号生成，避免同一时刻的事件ID冲突）
+        event_id = event_elem.get('id') or f"event_{next(self._event_sequence)}"
         
         # 解析事件时间
         event_time_elem = event_elem.find('.//{urn:epcglobal:epcis:xsd:1}eventTime')
@@ -135,6 +277,9 @@ class EPCISProcessor:
         disposition_elem = event_elem.find('.//{urn:epcglobal:epcis:xsd:1}disposition')
         disposition = disposition_elem.text if disposition_elem is not None else None
         
+        read_point = self._parse_location(event_elem, 'readPoint')
+        biz_location = self._parse_location(event_elem, 'bizLocation')
+        
         # 解析聚合事件特定字段
         parent_id = None
         child_epcs = []
@@ -176,11 +321,23 @@ class EPCISProcessor:
             output_epc_list=output_epc_list,
             action=action,
             biz_step=biz_step,
-            disposition=disposition
+            disposition=disposition,
+            read_point=read_point,
+            biz_location=biz_location
         )
         
         return event
     
+    def _parse_location(self, event_elem: ET.Element, name: str) -> Optional[Dict[str, Any]]:
+        """解析readPoint/bizLocation元素"""
+        location_elem = event_elem.find(f'{_EPCIS_NS}{name}')
+        if location_elem is None:
+            return None
+        id_elem = location_elem.find(f'{_EPCIS_NS}id')
+        if id_elem is None or not id_elem.text:
+            return None
+        return {'id': id_elem.text.strip()}
+    
     def _update_epc_index(self, event: EPCISEvent):
         """更新EPC索引"""
         # 索引EPC列表
@@ -229,20 +386,50 @@ class EPCISProcessor:
         
         return events
     
-    def query_events_by_biz_step(self, biz_step: str) -> List[EPCISEvent]:
+    def query_events_by_biz_step(self, biz_step: str, start_time: Optional[datetime] = None,
+                                 end_time: Optional[datetime] = None) -> List[EPCISEvent]:
         """
         根据业务步骤查询事件
         
         Args:
             biz_step: 业务步骤
+            start_time: 开始时间（可选）
+            end_time: 结束时间（可选）
             
         Returns:
-            事件列表
+            按时间排序的事件列表
         """
-        events = [e for e in self.events.values() if e.biz_step == biz_step]
-        events.sort(key=lambda e: e.event_time)
+        return self._query_index(self.biz_step_index, biz_step, start_time, end_time)
+    
+    def query_events_by_read_point(self, read_point: str, start_time: Optional[datetime] = None,
+                                   end_time: Optional[datetime] = None) -> List[EPCISEvent]:
+        """
+        根据读取点查询事件
         
-        return events
+        Args:
+            read_point: 读取点ID
+            start_time: 开始时间（可选）
+            end_time: 结束时间（可选）
+            
+        Returns:
+            按时间排序的事件列表
+        """
+        return self._query_index(self.read_point_index, read_point, start_time, end_time)
+    
+    def query_events_by_biz_location(self, biz_location: str, start_time: Optional[datetime] = None,
+                                     end_time: Optional[datetime] = None) -> List[EPCISEvent]:
+        """
+        根据业务位置查询事件
+        
+        Args:
+            biz_location: 业务位置ID
+            start_time: 开始时间（可选）
+            end_time: 结束时间（可选）
+            
+        Returns:
+            按时间排序的事件列表
+        """
+        return self._query_index(self.biz_location_index, biz_location, start_time, end_time)
     
     def query_events_by_time_range(self, start_time: datetime,
                                    end_time: datetime) -> List[EPCISEvent]:
@@ -254,15 +441,22 @@ class EPCISProcessor:
             end_time: 结束时间
             
         Returns:
-            事件列表
+            按时间排序的事件列表
         """
-        events = [
-            e for e in self.events.values()
-            if start_time <= e.event_time <= end_time
-        ]
-        events.sort(key=lambda e: e.event_time)
-        
-        return events
+        event_ids = self.time_index.range(to_epoch_seconds(start_time), to_epoch_seconds(end_time))
+        return [self.events[eid] for eid in event_ids]
+    
+    def _query_index(self, index: Dict[str, _TimeSortedIndex], key: str,
+                     start_time: Optional[datetime], end_time: Optional[datetime]) -> List[EPCISEvent]:
+        """在二级索引中按键和可选时间范围查询"""
+        entries = index.get(key)
+        if entries is None:
+            return []
+        event_ids = entries.range(
+            to_epoch_seconds(start_time) if start_time is not None else None,
+            to_epoch_seconds(end_time) if end_time is not None else None
+        )
+        return [self.events[eid] for eid in event_ids]
 
 
 def main():
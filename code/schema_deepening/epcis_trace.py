@@ -0,0 +1,260 @@
+"""
+EPC追溯图引擎
+
+由聚合事件（父/子）和转换事件（输入/输出）构建紧凑的邻接结构，
+支持带时间窗口的正向（召回）和反向（溯源）追溯查询
+"""
+
+from typing import Dict, List, Optional, Iterable, Tuple
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from .logger import logger
+from .exceptions import ValidationError
+from .epcis_processor import EPCISEvent, EPCISEventType
+from .food_industry_converter import TraceDirection
+from .spatial_index import to_epoch_seconds
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class _CSR:
+    """压缩稀疏行格式的邻接表：节点u的出边为targets/times[offsets[u]:offsets[u+1]]"""
+
+    __slots__ = ('offsets', 'targets', 'times')
+
+    def __init__(self, offsets, targets, times):
+        self.offsets = offsets
+        self.targets = targets
+        self.times = times
+
+
+class TraceabilityGraph:
+    """
+    EPC追溯图
+
+    EPC字符串只在驻留表中保存一次，边以整数ID存放在array中，查询前按源节点
+    排序为CSR（有NumPy时向量化构建）。转换事件为每个事件引入一个虚拟节点
+    （输入 -> 事件 -> 输出），边数为输入数加输出数而不是两者之积。
+
+    正向边：子EPC -> 父EPC（打包）、输入EPC -> 输出EPC（加工）；
+    拆包（DELETE聚合事件）为父EPC -> 子EPC。反向追溯沿反向边进行。
+    """
+
+    def __init__(self, memo_size: int = 4096):
+        """
+        初始化追溯图
+
+        Args:
+            memo_size: 缓存的追溯子结果数量上限
+        """
+        self._ids: Dict[str, int] = {}
+        self._epcs: List[Optional[str]] = []  # 虚拟节点为None
+        self._sources = array('q')
+        self._targets = array('q')
+        self._times = array('d')
+        self._forward: Optional[_CSR] = None
+        self._backward: Optional[_CSR] = None
+        self._memo: 'OrderedDict[Tuple, Tuple[int, ...]]' = OrderedDict()
+        self.memo_size = memo_size
+        logger.info("TraceabilityGraph initialized")
+
+    def __len__(self) -> int:
+        """EPC数量（不含虚拟节点）"""
+        return len(self._ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._sources)
+
+    def _intern(self, epc: str) -> int:
+        node = self._ids.get(epc)
+        if node is None:
+            node = self._ids[epc] = len(self._epcs)
+            self._epcs.append(epc)
+        return node
+
+    def _add_edge(self, source: int, target: int, timestamp: float):
+        self._sources.append(source)
+        self._targets.append(target)
+        self._times.append(timestamp)
+
+    def add_event(self, event: EPCISEvent) -> int:
+        """
+        将聚合或转换事件加入追溯图，其他类型事件被忽略
+
+        Args:
+            event: EPCIS事件
+
+        Returns:
+            新增的边数
+        """
+        before = len(self._sources)
+        timestamp = to_epoch_seconds(event.event_time)
+
+        if event.event_type == EPCISEventType.AGGREGATION_EVENT and event.parent_id and event.child_epcs:
+            parent = self._intern(event.parent_id)
+            unpack = (event.action or '').upper() == 'DELETE'
+            for child_epc in event.child_epcs:
+                child = self._intern(child_epc)
+                if unpack:
+                    self._add_edge(parent, child, timestamp)
+                else:
+                    self._add_edge(child, parent, timestamp)
+
+        elif event.event_type == EPCISEventType.TRANSFORMATION_EVENT and \
+                event.input_epc_list and event.output_epc_list:
+            transformation = len(self._epcs)
+            self._epcs.append(None)
+            for input_epc in event.input_epc_list:
+                self._add_edge(self._intern(input_epc), transformation, timestamp)
+            for output_epc in event.output_epc_list:
+                self._add_edge(transformation, self._intern(output_epc), timestamp)
+
+        added = len(self._sources) - before
+        if added:
+            self._forward = self._backward = None
+            self._memo.clear()
+        return added
+
+    def add_events(self, events: Iterable[EPCISEvent]) -> int:
+        """批量加入事件，返回新增的边数"""
+        return sum(self.add_event(event) for event in events)
+
+    def _build_csr(self, sources: array, targets: array) -> _CSR:
+        """按源节点对边做计数排序，构建CSR"""
+        node_count = len(self._epcs)
+        if NUMPY_AVAILABLE:
+            source_arr = np.frombuffer(sources, dtype=np.int64)
+            order = np.argsort(source_arr, kind='stable')
+            offsets = np.zeros(node_count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(source_arr, minlength=node_count), out=offsets[1:])
+            # memoryview按下标取值直接得到Python标量，比NumPy标量索引快
+            return _CSR(
+                memoryview(offsets),
+                memoryview(np.frombuffer(targets, dtype=np.int64)[order].copy()),
+                memoryview(np.frombuffer(self._times, dtype=np.float64)[order].copy()),
+            )
+
+        counts = array('q', bytes(8 * (node_count + 1)))
+        for source in sources:
+            counts[source + 1] += 1
+        for node in range(node_count):
+            counts[node + 1] += counts[node]
+        offsets = array('q', counts)
+        ordered_targets = array('q', bytes(8 * len(sources)))
+        ordered_times = array('d', bytes(8 * len(sources)))
+        for source, target, timestamp in zip(sources, targets, self._times):
+            position = counts[source]
+            ordered_targets[position] = target
+            ordered_times[position] = timestamp
+            counts[source] = position + 1
+        return _CSR(offsets, ordered_targets, ordered_times)
+
+    def _adjacency(self, direction: TraceDirection) -> _CSR:
+        if direction == TraceDirection.FORWARD:
+            if self._forward is None:
+                self._forward = self._build_csr(self._sources, self._targets)
+            return self._forward
+        if self._backward is None:
+            self._backward = self._build_csr(self._targets, self._sources)
+        return self._backward
+
+    def trace(self, epc: str, direction: TraceDirection = TraceDirection.FORWARD,
+              start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+              max_depth: Optional[int] = None) -> List[str]:
+        """
+        追溯EPC
+
+        广度优先遍历，只沿时间窗口内发生的边前进。不限深度时，每次追溯的结果
+        按（方向, 时间窗口, 起点）缓存，后续遍历遇到已缓存的节点直接合并其结果而不再展开。
+
+        Args:
+            epc: 起点EPC
+            direction: 追溯方向，FORWARD为召回（去向），BACKWARD为溯源（来源）
+            start_time: 时间窗口开始（可选）
+            end_time: 时间窗口结束（可选）
+            max_depth: 最大EPC跳数（可选）
+
+        Returns:
+            可达EPC列表（不含起点），按广度优先的发现顺序排列
+
+        Raises:
+            ValidationError: 当epc为空或max_depth无效时
+        """
+        if not epc:
+            raise ValidationError("EPC代码不能为空")
+        if max_depth is not None and max_depth <= 0:
+            raise ValidationError("最大深度必须大于0")
+
+        root = self._ids.get(epc)
+        if root is None:
+            return []
+
+        start = to_epoch_seconds(start_time) if start_time is not None else float('-inf')
+        end = to_epoch_seconds(end_time) if end_time is not None else float('inf')
+        memo_key = (direction, start, end)
+        use_memo = max_depth is None and self.memo_size > 0
+        if use_memo:
+            cached = self._memo.get(memo_key + (root,))
+            if cached is not None:
+                self._memo.move_to_end(memo_key + (root,))
+                return [self._epcs[node] for node in cached]
+
+        reached = self._bfs(root, self._adjacency(direction), start, end, max_depth,
+                            memo_key if use_memo else None)
+
+        if use_memo:
+            self._memo[memo_key + (root,)] = tuple(reached)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return [self._epcs[node] for node in reached]
+
+    def _bfs(self, root: int, csr: _CSR, start: float, end: float,
+             max_depth: Optional[int], memo_key: Optional[Tuple]) -> List[int]:
+        """0-1广度优先遍历：进入虚拟节点不计深度，返回可达EPC节点"""
+        offsets, targets, times, epcs = csr.offsets, csr.targets, csr.times, self._epcs
+        visited = {root}
+        reached: List[int] = []
+        queue = deque([(root, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth and epcs[node] is not None:
+                continue
+            for position in range(offsets[node], offsets[node + 1]):
+                timestamp = times[position]
+                if timestamp < start or timestamp > end:
+                    continue
+                neighbour = targets[position]
+                if neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                if epcs[neighbour] is None:
+                    queue.appendleft((neighbour, depth))
+                    continue
+                reached.append(neighbour)
+                cached = self._memo.get(memo_key + (neighbour,)) if memo_key else None
+                if cached is None:
+                    queue.append((neighbour, depth + 1))
+                    continue
+                # 已缓存节点的可达集合是完整的，合并后无需再展开
+                for node_id in cached:
+                    if node_id not in visited:
+                        visited.add(node_id)
+                        reached.append(node_id)
+        return reached
+
+    def trace_forward(self, epc: str, start_time: Optional[datetime] = None,
+                      end_time: Optional[datetime] = None, max_depth: Optional[int] = None) -> List[str]:
+        """正向追溯（召回）：EPC被打包或加工成了哪些EPC"""
+        return self.trace(epc, TraceDirection.FORWARD, start_time, end_time, max_depth)
+
+    def trace_backward(self, epc: str, start_time: Optional[datetime] = None,
+                       end_time: Optional[datetime] = None, max_depth: Optional[int] = None) -> List[str]:
+        """反向追溯（溯源）：EPC由哪些EPC打包或加工而来"""
+        return self.trace(epc, TraceDirection.BACKWARD, start_time, end_time, max_depth)
@@ -5,12 +5,69 @@
 """
 
 import psycopg2
+from psycopg2.extras import execute_values
+import csv
+import io
 import json
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Union
+from datetime import datetime, timedelta
 
 from .logger import logger
 from .exceptions import StorageError, ValidationError
+from .ais_processor import AISBatch
+
+
+# 批量写入的表定义：列顺序、冲突处理（有冲突处理的表无法使用COPY，改用execute_values）
+# 与外键引用的表（写入前先写入被引用表的缓冲行）
+_BULK_TABLES = {
+    'vessels': {
+        'columns': ('vessel_id', 'mmsi', 'name', 'vessel_type', 'imo_number', 'call_sign', 'metadata'),
+        'on_conflict': """
+            ON CONFLICT (vessel_id)
+            DO UPDATE SET
+                mmsi = EXCLUDED.mmsi,
+                name = EXCLUDED.name,
+                vessel_type = EXCLUDED.vessel_type,
+                imo_number = EXCLUDED.imo_number,
+                call_sign = EXCLUDED.call_sign,
+                metadata = EXCLUDED.metadata,
+                updated_at = CURRENT_TIMESTAMP
+        """,
+    },
+    'ais_data': {
+        'columns': ('message_id', 'mmsi', 'message_type', 'latitude', 'longitude',
+                    'speed', 'course', 'heading', 'timestamp', 'raw_data'),
+        'on_conflict': None,
+    },
+    'route_optimizations': {
+        'columns': ('optimization_id', 'vessel_id', 'origin_port', 'destination_port',
+                    'optimization_type', 'route_data', 'cost', 'duration_hours'),
+        'on_conflict': None,
+        'references': ('vessels',),
+    },
+}
+
+
+@dataclass
+class BulkWriteResult:
+    """批量写入结果"""
+    written: int = 0
+    batches: int = 0
+    pending: int = 0
+    skipped: int = 0
+    rejected: List[Dict[str, Any]] = field(default_factory=list)  # {'table', 'row', 'error'}
+
+    def merge(self, other: 'BulkWriteResult') -> None:
+        """合并另一次写入的结果（pending取最新值）"""
+        self.written += other.written
+        self.batches += other.batches
+        self.skipped += other.skipped
+        self.rejected.extend(other.rejected)
+        self.pending = other.pending
 
 
 class MaritimeStorage:
@@ -20,7 +77,22 @@ class MaritimeStorage:
     专注于AIS数据、航线优化、港口效率的PostgreSQL存储
     """
     
-    def __init__(self, connection_string: str):
+    def __init__(self, connection_string: str, batch_size: int = 5000,
+                 flush_interval: float = 1.0, use_copy: bool = True):
+        """
+        初始化存储
+        
+        Args:
+            connection_string: PostgreSQL连接串
+            batch_size: 批量写入时每个事务的行数
+            flush_interval: 批量写入缓冲的最长停留时间（秒）
+            use_copy: 批量插入是否使用COPY（否则使用execute_values）
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.use_copy = use_copy
+        self._pending: Dict[str, List[Tuple]] = {table: [] for table in _BULK_TABLES}
+        self._last_flush = time.monotonic()
         try:
             self.conn = psycopg2.connect(connection_string)
             self.cur = self.conn.cursor()
@@ -121,6 +193,8 @@ class MaritimeStorage:
         self.cur.execute("CREATE INDEX IF NOT EXISTS idx_ais_data_message_type ON ais_data(message_type, timestamp DESC)")
         self.cur.execute("CREATE INDEX IF NOT EXISTS idx_ais_data_location ON ais_data USING gist(ST_MakePoint(longitude, latitude))")
         self.cur.execute("CREATE INDEX IF NOT EXISTS idx_ais_data_timestamp ON ais_data(timestamp DESC)")
+        # 追加写入的AIS数据按时间近似有序，BRIN索引以极小体积支持时间范围裁剪
+        self.cur.execute("CREATE INDEX IF NOT EXISTS idx_ais_data_timestamp_brin ON ais_data USING brin(timestamp)")
         self.cur.execute("CREATE INDEX IF NOT EXISTS idx_vessels_mmsi ON vessels(mmsi)")
         self.cur.execute("CREATE INDEX IF NOT EXISTS idx_route_optimizations_vessel_id ON route_optimizations(vessel_id, created_at DESC)")
         self.cur.execute("CREATE INDEX IF NOT EXISTS idx_route_optimizations_status ON route_optimizations(status, created_at DESC)")
@@ -247,6 +321,241 @@ class MaritimeStorage:
             self.conn.rollback()
             return False
     
+    def store_ais_batch(self, rows: Union[AISBatch, Iterable[Dict[str, Any]]]) -> BulkWriteResult:
+        """
+        批量存储AIS数据
+        
+        行先进入缓冲区，满batch_size或距上次写入超过flush_interval时写入，
+        每批一个事务。无效行在写入前被拒绝；批内个别行写入失败时用保存点二分定位，
+        只拒绝出错的行，其余行照常提交。可直接作为AISProcessor.ingest_nmea的消费者。
+        
+        Args:
+            rows: AIS数据字典序列，或AISProcessor解码得到的AISBatch（无位置的消息被跳过）
+            
+        Returns:
+            本次调用触发的写入结果，pending为仍在缓冲区中的行数
+        """
+        result = BulkWriteResult()
+        prepared = []
+        
+        if isinstance(rows, AISBatch):
+            timestamp = datetime.utcnow()
+            for message_type, mmsi, latitude, longitude, speed, course, heading in zip(
+                    rows.message_type, rows.mmsi, rows.latitude, rows.longitude,
+                    rows.speed, rows.course, rows.heading):
+                if math.isnan(latitude) or math.isnan(longitude):
+                    result.skipped += 1
+                    continue
+                prepared.append((
+                    f"ais_{uuid.uuid4().hex}", str(mmsi).zfill(9), message_type, latitude, longitude,
+                    None if math.isnan(speed) else speed,
+                    None if math.isnan(course) else course,
+                    None if math.isnan(heading) else heading,
+                    timestamp, '{}'
+                ))
+        else:
+            for ais_data in rows:
+                try:
+                    prepared.append(self._prepare_ais_row(ais_data))
+                except ValidationError as e:
+                    result.rejected.append({'table': 'ais_data', 'row': ais_data, 'error': str(e)})
+        
+        result.merge(self._buffer_rows('ais_data', prepared))
+        return result
+    
+    def store_vessels_batch(self, vessels: Iterable[Dict[str, Any]]) -> BulkWriteResult:
+        """
+        批量存储船舶信息（按vessel_id upsert）
+        
+        Args:
+            vessels: 船舶信息序列
+            
+        Returns:
+            本次调用触发的写入结果
+        """
+        result = BulkWriteResult()
+        prepared = []
+        for vessel in vessels:
+            try:
+                prepared.append((
+                    vessel['vessel_id'], vessel['mmsi'], vessel['name'],
+                    vessel.get('vessel_type'), vessel.get('imo_number'), vessel.get('call_sign'),
+                    json.dumps(vessel.get('metadata', {}))
+                ))
+            except KeyError as e:
+                result.rejected.append({'table': 'vessels', 'row': vessel, 'error': f"缺少字段: {e}"})
+        
+        result.merge(self._buffer_rows('vessels', prepared))
+        return result
+    
+    def store_route_optimizations_batch(self, optimizations: Iterable[Dict[str, Any]]) -> BulkWriteResult:
+        """
+        批量存储航线优化结果
+        
+        Args:
+            optimizations: 航线优化结果序列
+            
+        Returns:
+            本次调用触发的写入结果
+        """
+        result = BulkWriteResult()
+        prepared = []
+        for optimization in optimizations:
+            try:
+                prepared.append((
+                    optimization.get('optimization_id', f"opt_{uuid.uuid4().hex}"),
+                    optimization['vessel_id'], optimization['origin_port'],
+                    optimization['destination_port'], optimization['optimization_type'],
+                    json.dumps(optimization.get('route_data', {})),
+                    optimization.get('cost'), optimization.get('duration_hours')
+                ))
+            except KeyError as e:
+                result.rejected.append({'table': 'route_optimizations', 'row': optimization,
+                                        'error': f"缺少字段: {e}"})
+        
+        result.merge(self._buffer_rows('route_optimizations', prepared))
+        return result
+    
+    def flush(self) -> BulkWriteResult:
+        """
+        写入所有缓冲的行（先船舶，再AIS数据和航线优化，满足外键顺序）
+        
+        写入失败时未写入的行保留在缓冲区中，下次刷新时重试。
+        
+        Returns:
+            写入结果
+        
+        Raises:
+            StorageError: 提交失败时抛出
+        """
+        result = BulkWriteResult()
+        for table in _BULK_TABLES:
+            result.merge(self._write_pending(table, full_batches_only=False))
+        self._last_flush = time.monotonic()
+        result.pending = 0
+        return result
+    
+    def _prepare_ais_row(self, ais_data: Dict[str, Any]) -> Tuple:
+        """校验AIS数据并转换为ais_data表的行"""
+        if not ais_data:
+            raise ValidationError("AIS数据不能为空")
+        if not ais_data.get('mmsi'):
+            raise ValidationError("MMSI不能为空")
+        if ais_data.get('latitude') is None or ais_data.get('longitude') is None:
+            raise ValidationError("经纬度不能为空")
+        if not (-90 <= ais_data['latitude'] <= 90 and -180 <= ais_data['longitude'] <= 180):
+            raise ValidationError("经纬度超出范围")
+        
+        return (
+            ais_data.get('message_id') or f"ais_{uuid.uuid4().hex}",
+            ais_data['mmsi'],
+            ais_data.get('message_type', 1),
+            ais_data['latitude'],
+            ais_data['longitude'],
+            ais_data.get('speed'),
+            ais_data.get('course'),
+            ais_data.get('heading'),
+            ais_data.get('timestamp', datetime.utcnow()),
+            json.dumps(ais_data.get('raw_data', {}))
+        )
+    
+    def _buffer_rows(self, table: str, rows: List[Tuple]) -> BulkWriteResult:
+        """缓冲待写入的行，满批或超过刷新间隔时写入"""
+        result = BulkWriteResult()
+        pending = self._pending[table]
+        pending.extend(rows)
+        
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            result.merge(self.flush())
+            return result
+        
+        if len(pending) >= self.batch_size:
+            # 被引用表的缓冲行先写入，否则外键会拒绝本表的行
+            for referenced in _BULK_TABLES[table].get('references', ()):
+                result.merge(self._write_pending(referenced, full_batches_only=False))
+            result.merge(self._write_pending(table, full_batches_only=True))
+        
+        result.pending = sum(len(rows) for rows in self._pending.values())
+        return result
+    
+    def _write_pending(self, table: str, full_batches_only: bool) -> BulkWriteResult:
+        """按batch_size写入表的缓冲行，每批提交后才移出缓冲区，失败时保留未写入的行"""
+        result = BulkWriteResult()
+        pending = self._pending[table]
+        while pending and (len(pending) >= self.batch_size or not full_batches_only):
+            batch = pending[:self.batch_size]
+            result.merge(self._write_batch(table, batch))
+            del pending[:len(batch)]
+        return result
+    
+    def _write_batch(self, table: str, rows: List[Tuple]) -> BulkWriteResult:
+        """
+        在一个事务中写入一批行
+        
+        Raises:
+            StorageError: 提交失败时抛出
+        """
+        result = BulkWriteResult(batches=1)
+        if not rows:
+            return result
+        
+        try:
+            self._write_isolating_failures(table, rows, result)
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            logger.error(f"{table}批量写入失败: {str(e)}", exc_info=True)
+            raise StorageError(f"{table}批量写入失败: {str(e)}") from e
+        
+        if result.rejected:
+            logger.warning(f"{table}批量写入: {result.written}行成功, {len(result.rejected)}行被拒绝")
+        else:
+            logger.debug(f"{table}批量写入: {result.written}行")
+        return result
+    
+    def _write_isolating_failures(self, table: str, rows: List[Tuple], result: BulkWriteResult) -> None:
+        """在保存点内写入，失败时回滚到保存点并二分重试，直到定位出错的单行"""
+        self.cur.execute("SAVEPOINT bulk_write")
+        try:
+            self._insert_rows(table, rows)
+        except psycopg2.Error as e:
+            self.cur.execute("ROLLBACK TO SAVEPOINT bulk_write")
+            self.cur.execute("RELEASE SAVEPOINT bulk_write")
+            if len(rows) == 1:
+                result.rejected.append({'table': table, 'row': rows[0], 'error': str(e).strip()})
+                return
+            middle = len(rows) // 2
+            self._write_isolating_failures(table, rows[:middle], result)
+            self._write_isolating_failures(table, rows[middle:], result)
+            return
+        self.cur.execute("RELEASE SAVEPOINT bulk_write")
+        result.written += len(rows)
+    
+    def _insert_rows(self, table: str, rows: List[Tuple]) -> None:
+        """用COPY（或execute_values）插入行"""
+        spec = _BULK_TABLES[table]
+        columns = ', '.join(spec['columns'])
+        
+        if self.use_copy and spec['on_conflict'] is None:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(['' if value is None else
+                                 value.isoformat() if isinstance(value, datetime) else value
+                                 for value in row])
+            buffer.seek(0)
+            self.cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            if spec['on_conflict']:
+                # 同一语句内ON CONFLICT不能两次更新同一行，按冲突键保留最后一次
+                rows = list({row[0]: row for row in rows}.values())
+            execute_values(
+                self.cur,
+                f"INSERT INTO {table} ({columns}) VALUES %s {spec['on_conflict'] or ''}",
+                rows,
+                page_size=len(rows)
+            )
+    
     def query_vessel_trajectory(self, mmsi: str, start_time: Optional[datetime] = None,
                                end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """查询船舶轨迹"""
@@ -280,6 +589,130 @@ class MaritimeStorage:
             })
         
         return results
+    
+    def query_vessels_in_area(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                              start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """
+        查询时间范围内位于矩形区域的AIS位置
+        
+        空间条件写成与idx_ais_data_location相同的表达式，由GiST索引和BRIN时间索引裁剪。
+        
+        Args:
+            min_lat: 最小纬度
+            min_lon: 最小经度
+            max_lat: 最大纬度
+            max_lon: 最大经度
+            start_time: 开始时间
+            end_time: 结束时间
+            
+        Returns:
+            按时间排序的位置列表
+        """
+        self.cur.execute("""
+            SELECT mmsi, latitude, longitude, speed, course, timestamp
+            FROM ais_data
+            WHERE ST_MakePoint(longitude, latitude) && ST_MakeEnvelope(%s, %s, %s, %s)
+              AND timestamp BETWEEN %s AND %s
+            ORDER BY timestamp ASC
+        """, (min_lon, min_lat, max_lon, max_lat, start_time, end_time))
+        
+        return [self._position_row(row) for row in self.cur.fetchall()]
+    
+    def query_vessels_near(self, latitude: float, longitude: float, radius_nm: float,
+                           start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """
+        查询时间范围内距某点radius_nm海里以内的AIS位置（如到港判定）
+        
+        先用按度数放宽的ST_DWithin命中GiST索引，再用球面距离精确过滤。
+        
+        Args:
+            latitude: 中心纬度
+            longitude: 中心经度
+            radius_nm: 半径（海里）
+            start_time: 开始时间
+            end_time: 结束时间
+            
+        Returns:
+            按时间排序的位置列表，附带distance_nm
+        """
+        self.cur.execute("""
+            SELECT mmsi, latitude, longitude, speed, course, timestamp,
+                   ST_DistanceSphere(ST_MakePoint(longitude, latitude), ST_MakePoint(%s, %s)) / 1852.0
+            FROM ais_data
+            WHERE ST_DWithin(ST_MakePoint(longitude, latitude), ST_MakePoint(%s, %s), %s)
+              AND ST_DistanceSphere(ST_MakePoint(longitude, latitude), ST_MakePoint(%s, %s)) <= %s
+              AND timestamp BETWEEN %s AND %s
+            ORDER BY timestamp ASC
+        """, (longitude, latitude, longitude, latitude, self._radius_degrees(latitude, radius_nm),
+              longitude, latitude, radius_nm * 1852.0, start_time, end_time))
+        
+        return [self._position_row(row, with_distance=True) for row in self.cur.fetchall()]
+    
+    def query_vessels_near_vessel(self, mmsi: str, at_time: datetime, radius_nm: float,
+                                  time_window: float = 300.0) -> List[Dict[str, Any]]:
+        """
+        查询某时刻某船附近的其他船舶（如碰撞风险筛查）
+        
+        参考船与其他船各取时间窗口内最接近at_time的一个位置。
+        
+        Args:
+            mmsi: 参考船舶的MMSI
+            at_time: 参考时间
+            radius_nm: 半径（海里）
+            time_window: 允许的时间偏差（秒）
+            
+        Returns:
+            按距离排序的位置列表，附带distance_nm
+        """
+        window = timedelta(seconds=time_window)
+        self.cur.execute("""
+            SELECT latitude, longitude
+            FROM ais_data
+            WHERE mmsi = %s AND timestamp BETWEEN %s AND %s
+            ORDER BY ABS(EXTRACT(EPOCH FROM (timestamp - %s))) ASC
+            LIMIT 1
+        """, (mmsi, at_time - window, at_time + window, at_time))
+        reference = self.cur.fetchone()
+        if reference is None:
+            return []
+        latitude, longitude = float(reference[0]), float(reference[1])
+        
+        self.cur.execute("""
+            SELECT DISTINCT ON (mmsi) mmsi, latitude, longitude, speed, course, timestamp,
+                   ST_DistanceSphere(ST_MakePoint(longitude, latitude), ST_MakePoint(%s, %s)) / 1852.0
+            FROM ais_data
+            WHERE mmsi <> %s
+              AND ST_DWithin(ST_MakePoint(longitude, latitude), ST_MakePoint(%s, %s), %s)
+              AND ST_DistanceSphere(ST_MakePoint(longitude, latitude), ST_MakePoint(%s, %s)) <= %s
+              AND timestamp BETWEEN %s AND %s
+            ORDER BY mmsi, ABS(EXTRACT(EPOCH FROM (timestamp - %s))) ASC
+        """, (longitude, latitude, mmsi, longitude, latitude, self._radius_degrees(latitude, radius_nm),
+              longitude, latitude, radius_nm * 1852.0, at_time - window, at_time + window, at_time))
+        
+        results = [self._position_row(row, with_distance=True) for row in self.cur.fetchall()]
+        results.sort(key=lambda row: row['distance_nm'])
+        return results
+    
+    @staticmethod
+    def _radius_degrees(latitude: float, radius_nm: float) -> float:
+        """把海里半径放宽为度数半径（按经度收缩最严重的纬度计算），用于索引预筛选"""
+        cos_lat = math.cos(math.radians(min(abs(latitude) + radius_nm / 60.0, 89.9)))
+        return radius_nm / 60.0 / cos_lat
+    
+    @staticmethod
+    def _position_row(row: Tuple, with_distance: bool = False) -> Dict[str, Any]:
+        """将位置查询结果行转换为字典"""
+        result = {
+            'mmsi': row[0],
+            'latitude': float(row[1]),
+            'longitude': float(row[2]),
+            'speed': float(row[3]) if row[3] is not None else None,
+            'course': float(row[4]) if row[4] is not None else None,
+            'timestamp': row[5].isoformat() if isinstance(row[5], datetime) else row[5]
+        }
+        if with_distance:
+            result['distance_nm'] = float(row[6])
+        return result
 
 
 def main():
@@ -0,0 +1,331 @@
+"""
+船舶位置时空索引
+
+按时间桶和经纬度网格组织位置，支持矩形范围、半径和"某时刻某船附近船舶"查询
+"""
+
+from typing import Dict, List, Optional, Tuple, Iterator, Any
+from array import array
+from datetime import datetime, timedelta
+import math
+
+from .logger import logger
+from .exceptions import ValidationError
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_NM = 3440.065  # 地球半径（海里）
+_EPOCH = datetime(1970, 1, 1)
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Haversine大圆距离（海里）
+
+    参数可以是标量，也可以是可广播的NumPy数组（此时返回数组）。
+
+    Args:
+        lat1: 纬度1（度）
+        lon1: 经度1（度）
+        lat2: 纬度2（度）
+        lon2: 经度2（度）
+
+    Returns:
+        距离（海里）
+    """
+    if NUMPY_AVAILABLE and any(isinstance(value, np.ndarray) for value in (lat1, lon1, lat2, lon2)):
+        lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64))
+                                  for value in (lat1, lon1, lat2, lon2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    a = math.sin(math.radians(lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def to_epoch_seconds(timestamp: datetime) -> float:
+    """将（UTC）datetime转换为Unix时间戳"""
+    if timestamp.tzinfo is not None:
+        return timestamp.timestamp()
+    return (timestamp - _EPOCH).total_seconds()
+
+
+class _Cell:
+    """单个网格单元内按列存储的位置"""
+
+    __slots__ = ('mmsi', 'latitude', 'longitude', 'time', 'speed', 'course', 'heading', 'status')
+
+    def __init__(self):
+        self.mmsi = array('l')
+        self.latitude = array('d')
+        self.longitude = array('d')
+        self.time = array('d')
+        self.speed = array('d')
+        self.course = array('d')
+        self.heading = array('d')
+        self.status = array('b')
+
+    def __len__(self) -> int:
+        return len(self.mmsi)
+
+
+class SpatioTemporalIndex:
+    """
+    船舶位置时空索引
+
+    位置按(时间桶, 纬度格, 经度格)分组，每个单元按列存储。查询只访问
+    时间范围和空间范围覆盖的单元，候选点再做精确过滤（有NumPy时向量化）。
+    超过retention的时间桶整体淘汰，内存随时间窗口而不是总消息量增长。
+    """
+
+    def __init__(self, cell_degrees: float = 0.1, bucket_seconds: float = 600.0,
+                 retention: Optional[float] = None):
+        """
+        初始化时空索引
+
+        Args:
+            cell_degrees: 网格边长（度）
+            bucket_seconds: 时间桶长度（秒）
+            retention: 保留的时间跨度（秒，相对已索引的最新时间），None表示不淘汰
+        """
+        if cell_degrees <= 0 or bucket_seconds <= 0:
+            raise ValidationError("网格边长和时间桶长度必须为正数")
+
+        self.cell_degrees = cell_degrees
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self._buckets: Dict[int, Dict[Tuple[int, int], _Cell]] = {}
+        self._latest_time = float('-inf')
+        self._size = 0
+        logger.info(f"SpatioTemporalIndex initialized: cell={cell_degrees}°, bucket={bucket_seconds}s")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, mmsi: int, latitude: float, longitude: float, timestamp: datetime,
+               speed: Optional[float] = None, course: Optional[float] = None,
+               heading: Optional[float] = None, navigation_status: Optional[int] = None) -> None:
+        """
+        插入一个位置
+
+        Args:
+            mmsi: 海上移动服务标识
+            latitude: 纬度
+            longitude: 经度
+            timestamp: 位置时间
+            speed: 航速
+            course: 航向
+            heading: 船首向
+            navigation_status: 导航状态
+        """
+        seconds = to_epoch_seconds(timestamp)
+        bucket = int(seconds // self.bucket_seconds)
+        key = (int(latitude // self.cell_degrees), int(longitude // self.cell_degrees))
+
+        cells = self._buckets.get(bucket)
+        if cells is None:
+            cells = self._buckets[bucket] = {}
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = _Cell()
+
+        cell.mmsi.append(int(mmsi))
+        cell.latitude.append(latitude)
+        cell.longitude.append(longitude)
+        cell.time.append(seconds)
+        cell.speed.append(math.nan if speed is None else speed)
+        cell.course.append(math.nan if course is None else course)
+        cell.heading.append(math.nan if heading is None else heading)
+        cell.status.append(-1 if navigation_status is None else navigation_status)
+        self._size += 1
+
+        if seconds > self._latest_time:
+            self._latest_time = seconds
+            self._evict_expired()
+
+    def _evict_expired(self) -> None:
+        """淘汰超过保留跨度的时间桶"""
+        if self.retention is None:
+            return
+        oldest = int((self._latest_time - self.retention) // self.bucket_seconds)
+        for bucket in [b for b in self._buckets if b < oldest]:
+            self._size -= sum(len(cell) for cell in self._buckets.pop(bucket).values())
+
+    def _candidate_cells(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                         start: float, end: float) -> Iterator[_Cell]:
+        """枚举与时空范围相交的单元（经度范围min_lon > max_lon表示跨越180°经线）"""
+        size = self.cell_degrees
+        lat_range = (int(min_lat // size), int(max_lat // size))
+        lon_ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+        lon_ranges = [(int(low // size), int(high // size)) for low, high in lon_ranges]
+        span = (lat_range[1] - lat_range[0] + 1) * sum(high - low + 1 for low, high in lon_ranges)
+
+        for bucket in range(int(start // self.bucket_seconds), int(end // self.bucket_seconds) + 1):
+            cells = self._buckets.get(bucket)
+            if not cells:
+                continue
+            if span > len(cells):
+                # 查询范围覆盖的格子多于已占用的格子时，改为遍历已占用格子
+                for (lat_cell, lon_cell), cell in cells.items():
+                    if lat_range[0] <= lat_cell <= lat_range[1] and \
+                            any(low <= lon_cell <= high for low, high in lon_ranges):
+                        yield cell
+            else:
+                for lat_cell in range(lat_range[0], lat_range[1] + 1):
+                    for low, high in lon_ranges:
+                        for lon_cell in range(low, high + 1):
+                            cell = cells.get((lat_cell, lon_cell))
+                            if cell is not None:
+                                yield cell
+
+    def _collect(self, cells: Iterator[_Cell]) -> Dict[str, Any]:
+        """拼接候选单元的列（有NumPy时返回数组，否则返回列表）"""
+        cells = list(cells)
+        columns = {}
+        for name in _Cell.__slots__:
+            if NUMPY_AVAILABLE:
+                parts = [np.frombuffer(getattr(cell, name), dtype=getattr(cell, name).typecode)
+                         for cell in cells if len(cell)]
+                columns[name] = np.concatenate(parts) if parts else np.empty(0)
+            else:
+                columns[name] = [value for cell in cells for value in getattr(cell, name)]
+        return columns
+
+    def query_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                   start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """
+        矩形范围查询
+
+        Args:
+            min_lat: 最小纬度
+            min_lon: 最小经度（大于max_lon时表示跨越180°经线）
+            max_lat: 最大纬度
+            max_lon: 最大经度
+            start_time: 开始时间
+            end_time: 结束时间
+
+        Returns:
+            按时间排序的位置记录
+        """
+        start, end = to_epoch_seconds(start_time), to_epoch_seconds(end_time)
+        columns = self._collect(self._candidate_cells(min_lat, min_lon, max_lat, max_lon, start, end))
+        lat, lon, seconds = columns['latitude'], columns['longitude'], columns['time']
+
+        if NUMPY_AVAILABLE:
+            in_lon = (lon >= min_lon) & (lon <= max_lon) if min_lon <= max_lon else \
+                (lon >= min_lon) | (lon <= max_lon)
+            mask = (lat >= min_lat) & (lat <= max_lat) & in_lon & (seconds >= start) & (seconds <= end)
+            selected = np.flatnonzero(mask)
+        else:
+            selected = [i for i in range(len(lat))
+                        if min_lat <= lat[i] <= max_lat and start <= seconds[i] <= end and
+                        ((min_lon <= lon[i] <= max_lon) if min_lon <= max_lon else
+                         (lon[i] >= min_lon or lon[i] <= max_lon))]
+        return self._records(columns, selected)
+
+    def query_radius(self, latitude: float, longitude: float, radius_nm: float,
+                     start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """
+        半径范围查询
+
+        Args:
+            latitude: 中心纬度
+            longitude: 中心经度
+            radius_nm: 半径（海里）
+            start_time: 开始时间
+            end_time: 结束时间
+
+        Returns:
+            按时间排序的位置记录，附带distance_nm
+        """
+        start, end = to_epoch_seconds(start_time), to_epoch_seconds(end_time)
+        min_lat, min_lon, max_lat, max_lon = self._radius_bbox(latitude, longitude, radius_nm)
+        columns = self._collect(self._candidate_cells(min_lat, min_lon, max_lat, max_lon, start, end))
+        lat, lon, seconds = columns['latitude'], columns['longitude'], columns['time']
+
+        if NUMPY_AVAILABLE:
+            distance = haversine_distance(latitude, longitude, lat, lon)
+            selected = np.flatnonzero((distance <= radius_nm) & (seconds >= start) & (seconds <= end))
+        else:
+            distance = [haversine_distance(latitude, longitude, lat[i], lon[i]) for i in range(len(lat))]
+            selected = [i for i in range(len(lat))
+                        if distance[i] <= radius_nm and start <= seconds[i] <= end]
+        return self._records(columns, selected, distance)
+
+    def nearest_in_time(self, latitude: float, longitude: float, at_time: datetime, radius_nm: float,
+                        time_window: float, exclude_mmsi: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询某时刻附近的船舶，每艘船取时间上最接近at_time的一个位置
+
+        Args:
+            latitude: 中心纬度
+            longitude: 中心经度
+            at_time: 参考时间
+            radius_nm: 半径（海里）
+            time_window: 参考时间前后允许的偏差（秒）
+            exclude_mmsi: 排除的船舶（通常是参考船本身）
+
+        Returns:
+            按距离排序的位置记录，附带distance_nm
+        """
+        window = timedelta(seconds=time_window)
+        target = to_epoch_seconds(at_time)
+        best: Dict[int, Dict[str, Any]] = {}
+        for record in self.query_radius(latitude, longitude, radius_nm, at_time - window, at_time + window):
+            if record['mmsi'] == exclude_mmsi:
+                continue
+            current = best.get(record['mmsi'])
+            if current is None or abs(record['time'] - target) < abs(current['time'] - target):
+                best[record['mmsi']] = record
+        return sorted(best.values(), key=lambda record: record['distance_nm'])
+
+    def _radius_bbox(self, latitude: float, longitude: float,
+                     radius_nm: float) -> Tuple[float, float, float, float]:
+        """半径查询的外接矩形（1纬度约60海里，经度随纬度收缩）"""
+        lat_delta = radius_nm / 60.0
+        min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+        cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+        if cos_lat <= 1e-6 or radius_nm / 60.0 / cos_lat >= 180.0:
+            return min_lat, -180.0, max_lat, 180.0
+        lon_delta = radius_nm / 60.0 / cos_lat
+        min_lon = (longitude - lon_delta + 180.0) % 360.0 - 180.0
+        max_lon = (longitude + lon_delta + 180.0) % 360.0 - 180.0
+        return min_lat, min_lon, max_lat, max_lon
+
+    def _records(self, columns: Dict[str, Any], selected, distance=None) -> List[Dict[str, Any]]:
+        """将选中的行转换为位置记录"""
+        if NUMPY_AVAILABLE:
+            selected = selected[np.argsort(columns['time'][selected], kind='stable')]
+            values = {name: columns[name][selected].tolist() for name in _Cell.__slots__}
+            if distance is not None:
+                values['distance_nm'] = distance[selected].tolist()
+        else:
+            selected = sorted(selected, key=lambda i: columns['time'][i])
+            values = {name: [columns[name][i] for i in selected] for name in _Cell.__slots__}
+            if distance is not None:
+                values['distance_nm'] = [distance[i] for i in selected]
+
+        records = []
+        for i in range(len(values['mmsi'])):
+            record = {
+                'mmsi': values['mmsi'][i],
+                'latitude': values['latitude'][i],
+                'longitude': values['longitude'][i],
+                'time': values['time'][i],
+                'timestamp': _EPOCH + timedelta(seconds=values['time'][i]),
+                'speed': None if math.isnan(values['speed'][i]) else values['speed'][i],
+                'course': None if math.isnan(values['course'][i]) else values['course'][i],
+                'heading': None if math.isnan(values['heading'][i]) else values['heading'][i],
+                'navigation_status': None if values['status'][i] < 0 else values['status'][i],
+            }
+            if distance is not None:
+                record['distance_nm'] = values['distance_nm'][i]
+            records.append(record)
+        return records
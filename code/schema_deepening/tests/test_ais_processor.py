@@ -0,0 +1,186 @@
+"""
+AIS处理器测试
+
+测试AISProcessor的批量解码与流式摄取功能
+"""
+
+import io
+import math
+import os
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from schema_deepening import ais_processor
+from schema_deepening.ais_processor import AISProcessor, AISBatch, iter_nmea_lines
+from schema_deepening.benchmarks import encode_position_report
+from schema_deepening.exceptions import ProcessingError
+
+
+CLASS_A_SENTENCE = "!AIVDM,1,1,,B,177KQJ5000G?tO`K>RA1wUbN0TKH,0*5C"
+CLASS_B_SENTENCE = "!AIVDM,1,1,,B,B52K>;h00Fc>jpUlNV@ikwpUoP06,0*4F"
+STATIC_FRAGMENTS = [
+    "!AIVDM,2,1,3,B,55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E53,0*3E",
+    "!AIVDM,2,2,3,B,1@0000000000000,2*55",
+]
+
+
+class TestAISProcessorBatch(unittest.TestCase):
+    """AIS批量解码测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = AISProcessor()
+        self._numpy_available = ais_processor.NUMPY_AVAILABLE
+
+    def tearDown(self):
+        """测试后清理"""
+        ais_processor.NUMPY_AVAILABLE = self._numpy_available
+
+    def test_decode_class_a_position(self):
+        """测试解码A类位置报告"""
+        batch = self.processor.parse_nmea_batch([CLASS_A_SENTENCE])
+
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(batch.message_type[0], 1)
+        self.assertEqual(batch.mmsi[0], 477553000)
+        self.assertAlmostEqual(batch.latitude[0], 47.582833, places=5)
+        self.assertAlmostEqual(batch.longitude[0], -122.345833, places=5)
+        self.assertEqual(batch.speed[0], 0.0)
+        self.assertEqual(batch.course[0], 51.0)
+        self.assertEqual(batch.heading[0], 181.0)
+        self.assertEqual(batch.navigation_status[0], 5)
+
+    def test_decode_class_b_position(self):
+        """测试解码B类位置报告"""
+        batch = self.processor.parse_nmea_batch([CLASS_B_SENTENCE])
+
+        self.assertEqual(batch.message_type[0], 18)
+        self.assertEqual(batch.mmsi[0], 338087471)
+        self.assertAlmostEqual(batch.latitude[0], 40.68454, places=5)
+        self.assertAlmostEqual(batch.longitude[0], -74.072132, places=5)
+        self.assertAlmostEqual(batch.speed[0], 0.1)
+        self.assertAlmostEqual(batch.course[0], 79.6)
+        self.assertTrue(math.isnan(batch.heading[0]))
+        self.assertEqual(batch.navigation_status[0], -1)
+
+    def test_checksum_rejection(self):
+        """测试校验和错误的句子被丢弃"""
+        corrupted = CLASS_A_SENTENCE[:-2] + "00"
+
+        batch = self.processor.parse_nmea_batch([corrupted, CLASS_A_SENTENCE])
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(batch.checksum_errors, 1)
+
+        batch = self.processor.parse_nmea_batch([corrupted], verify_checksum=False)
+        self.assertEqual(len(batch), 1)
+
+    def test_fragment_reassembly_across_batches(self):
+        """测试多分片消息跨批次重组"""
+        first = self.processor.parse_nmea_batch(STATIC_FRAGMENTS[:1])
+        self.assertEqual(len(first), 0)
+        self.assertEqual(first.pending_fragments, 1)
+
+        second = self.processor.parse_nmea_batch(STATIC_FRAGMENTS[1:])
+        self.assertEqual(len(second), 1)
+        self.assertEqual(second.message_type[0], 5)
+        self.assertEqual(second.pending_fragments, 0)
+        self.assertTrue(math.isnan(second.latitude[0]))
+
+    def test_malformed_sentences(self):
+        """测试格式错误的句子被计数"""
+        batch = self.processor.parse_nmea_batch(
+            ["garbage", "!AIVDM,1,1,,A,13X3,0*00", "!AIVDM,1,1,,B,177KQJ5000G?tO`K>RA1wUbN0TKX,0*00"],
+            verify_checksum=False
+        )
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.malformed, 3)
+
+    def test_numpy_and_python_paths_agree(self):
+        """测试向量化路径与逐句路径结果一致且保持输入顺序"""
+        sentences = [CLASS_B_SENTENCE, STATIC_FRAGMENTS[0], "  " + CLASS_A_SENTENCE + "\r\n",
+                     STATIC_FRAGMENTS[1], CLASS_A_SENTENCE[:-2] + "00", CLASS_B_SENTENCE]
+
+        results = []
+        for numpy_available in (self._numpy_available, False):
+            ais_processor.NUMPY_AVAILABLE = numpy_available
+            results.append(AISProcessor().parse_nmea_batch(sentences, chunk_size=4))
+
+        vector, scalar = results
+        self.assertEqual(list(vector.message_type), [18, 1, 5, 18])
+        for name in AISBatch.COLUMNS:
+            self.assertEqual(
+                [None if isinstance(v, float) and math.isnan(v) else v for v in getattr(vector, name)],
+                [None if isinstance(v, float) and math.isnan(v) else v for v in getattr(scalar, name)],
+            )
+        self.assertEqual(vector.checksum_errors, scalar.checksum_errors)
+
+
+class TestAISProcessorStreaming(unittest.TestCase):
+    """AIS流式摄取测试类"""
+
+    def _reports(self, mmsi: int, count: int):
+        return [encode_position_report(mmsi, 10.0 + i * 0.01, 20.0) for i in range(count)]
+
+    def test_iter_nmea_lines_from_file_and_pipe(self):
+        """测试从文件路径和二进制管道读取句子"""
+        fd, path = tempfile.mkstemp(suffix='.nmea')
+        with os.fdopen(fd, 'w') as stream:
+            stream.write(CLASS_A_SENTENCE + "\r\n\n" + CLASS_B_SENTENCE + "\n")
+        try:
+            self.assertEqual(list(iter_nmea_lines(path)), [CLASS_A_SENTENCE, CLASS_B_SENTENCE])
+        finally:
+            os.remove(path)
+
+        pipe = io.BytesIO((CLASS_B_SENTENCE + "\n").encode('ascii'))
+        self.assertEqual(list(iter_nmea_lines(pipe)), [CLASS_B_SENTENCE])
+
+    def test_stream_batches_and_ring_buffer(self):
+        """测试按批大小分批且每船轨迹有界"""
+        processor = AISProcessor(max_positions_per_vessel=3)
+        source = io.StringIO("\n".join(self._reports(111111111, 10)))
+
+        batches = list(processor.stream_nmea(source, batch_size=4))
+
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual(processor.messages, {})
+        trajectory = processor.get_vessel_trajectory('111111111')
+        self.assertEqual(len(trajectory), 3)
+        self.assertAlmostEqual(trajectory[-1].latitude, 10.09, places=5)
+
+    def test_stale_vessels_evicted(self):
+        """测试超过时间窗口未更新的船舶被淘汰"""
+        processor = AISProcessor(vessel_ttl=0.0)
+        lines = self._reports(111111111, 2) + self._reports(222222222, 2)
+
+        list(processor.stream_nmea(io.StringIO("\n".join(lines)), batch_size=2))
+
+        self.assertEqual(list(processor.positions), ['222222222'])
+
+    def test_ingest_with_consumer(self):
+        """测试摄取批次交给消费者并返回统计"""
+        processor = AISProcessor(max_positions_per_vessel=5)
+        consumed = []
+
+        stats = processor.ingest_nmea(io.StringIO("\n".join(self._reports(333333333, 25))),
+                                      consumed.append, max_pending_batches=1, batch_size=10)
+
+        self.assertEqual([len(batch) for batch in consumed], [10, 10, 5])
+        self.assertEqual(stats['sentences'], 25)
+        self.assertEqual(stats['decoded'], 25)
+        self.assertEqual(stats['tracked_vessels'], 1)
+
+    def test_ingest_source_error(self):
+        """测试数据源错误转换为处理错误"""
+        with self.assertRaises(ProcessingError):
+            AISProcessor().ingest_nmea('/nonexistent/feed.nmea', lambda batch: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+EDIFACT解析器测试
+
+测试EDIFACTParser的消息解析与流式交换解析功能
+"""
+
+import io
+import os
+import re
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from schema_deepening.edifact_parser import EDIFACTParser, EDIFACTMessageType, EDIFACTLazySegment
+from schema_deepening.exceptions import ParseError
+
+
+INTERCHANGE = (
+    b"UNA:+.? 'UNB+UNOC:3+SENDER+RECEIVER+250121:1200+REF42'\r\n"
+    b"UNH+1+ORDERS:D:96A:UN'BGM+220+12345+9'FTX+AAA+++Price ?+ tax?'s ok??'UNT+4+1'\r\n"
+    b"UNH+2+INVOIC:D:96A:UN'BGM+380+67890+9'UNT+3+2'\r\n"
+    b"UNZ+2+REF42'"
+)
+
+
+class TestEDIFACTParser(unittest.TestCase):
+    """EDIFACT解析器测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.parser = EDIFACTParser()
+
+    def test_parse_message_elements(self):
+        """测试段标识符后的首个元素不产生空元素"""
+        message = self.parser.parse_message("UNH+1+ORDERS:D:96A:UN'BGM+220+12345+9'UNT+3+1'")
+
+        self.assertEqual(message.message_type, EDIFACTMessageType.ORDERS)
+        self.assertEqual(message.segments[0].elements, [['1'], ['ORDERS', 'D', '96A', 'UN']])
+        self.assertEqual(self.parser.validate_message(message)['warnings'], [])
+
+    def test_parse_message_release_character(self):
+        """测试释放字符转义的分隔符和终止符"""
+        message = self.parser.parse_message("UNH+1+INVOIC:D:96A:UN'FTX+AAA+a?:b?+c?'d??'UNT+3+1'")
+
+        self.assertEqual(message.message_type, EDIFACTMessageType.INVOIC)
+        self.assertEqual(message.segments[1].elements, [['AAA'], ["a:b+c'd?"]])
+
+    def test_iter_messages_across_chunk_boundaries(self):
+        """测试任意块大小下流式解析结果一致"""
+        expected = None
+        for chunk_size in (1, 2, 7, 64, 1 << 20):
+            messages = list(self.parser.iter_messages(memoryview(INTERCHANGE), chunk_size=chunk_size))
+            summary = [(m.message_id, m.message_type, [s.tag for s in m.segments], m.segments[-1].elements)
+                       for m in messages]
+            if expected is None:
+                expected = summary
+            self.assertEqual(summary, expected)
+
+        self.assertEqual([item[0] for item in expected], ['REF42_1', 'REF42_2'])
+        self.assertEqual(expected[1][1], EDIFACTMessageType.INVOIC)
+
+    def test_iter_messages_lazy_segments(self):
+        """测试段按需解析且释放字符被还原"""
+        message = next(self.parser.iter_messages(INTERCHANGE))
+        segment = message.segments[2]
+
+        self.assertIsInstance(segment, EDIFACTLazySegment)
+        self.assertIsNone(segment._elements)
+        self.assertEqual(segment.element(3), "Price + tax's ok?")
+        self.assertEqual(message.interchange_reference, 'REF42')
+        self.assertTrue(self.parser.validate_message(message)['valid'])
+        self.assertIn('Price + tax', self.parser.convert_to_xml(message))
+
+    def test_iter_messages_from_file(self):
+        """测试从文件路径和二进制文件对象读取"""
+        fd, path = tempfile.mkstemp(suffix='.edi')
+        with os.fdopen(fd, 'wb') as stream:
+            stream.write(INTERCHANGE)
+        try:
+            self.assertEqual(len(list(self.parser.iter_messages(path, chunk_size=16))), 2)
+            with open(path, 'rb') as stream:
+                self.assertEqual(len(list(self.parser.iter_messages(stream, chunk_size=16))), 2)
+        finally:
+            os.remove(path)
+
+    def test_custom_service_characters_and_encoding(self):
+        """测试UNA自定义服务字符与UNOY编码"""
+        data = "UNA*|.\\ ~UNB|UNOY*3|S|R|250121*1200|R1~UNH|1|DESADV*D*96A*UN~FTX|AAA|||Grüße\\|~UNT|3|1~UNZ|1|R1~"
+        message = next(self.parser.iter_messages(data.encode('utf-8'), chunk_size=5))
+
+        self.assertEqual(message.message_type, EDIFACTMessageType.DESADV)
+        self.assertEqual(message.segments[1].element(3), "Grüße|")
+
+    def test_incomplete_message_raises(self):
+        """测试数据在UNT之前结束时报错"""
+        with self.assertRaises(ParseError):
+            list(self.parser.iter_messages(b"UNH+1+ORDERS:D:96A:UN'BGM+220+1+9'"))
+
+        with self.assertRaises(ParseError):
+            list(self.parser.iter_messages(b"UNB+UNOC:3+S+R+250121:1200+R1'UNH+1+ORDERS:D:96A:UN'UNT+2+1'"))
+
+    def test_text_stream_rejected(self):
+        """测试文本模式文件对象被拒绝"""
+        with self.assertRaises(ParseError):
+            list(self.parser.iter_messages(io.StringIO("UNH+1+ORDERS'")))
+
+
+class TestEDIFACTBatchConversion(unittest.TestCase):
+    """EDIFACT批量转换测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.parser = EDIFACTParser()
+        body = b"".join(
+            b"UNH+%d+ORDERS:D:96A:UN'BGM+220+<%d> & co+9'ZZZ'NAD+BY+::9++A:'UNT+5+%d'\n" % (i, i, i)
+            for i in range(1, 41)
+        )
+        self.interchange = b"UNB+UNOC:3+S+R+250121:1200+B1'" + body + b"UNZ+40+B1'"
+
+    def _message_ids(self, xml: bytes):
+        return re.findall(r'messageId="([^"]+)"', xml.decode('utf-8'))
+
+    def test_compiled_render_matches_convert_to_xml(self):
+        """测试预编译生成的XML与convert_to_xml一致"""
+        schema = self.parser.compile_definitions()
+        for message in self.parser.iter_messages(INTERCHANGE + b"UNH+9+XXXXXX'ZZZ'UNT+3+9'"):
+            segments = [(segment.tag, segment.elements) for segment in message.segments]
+            self.assertEqual(schema.render(message.message_id, segments), self.parser.convert_to_xml(message))
+
+    def test_in_process_conversion(self):
+        """测试单进程批量转换并统计验证结果"""
+        output = io.BytesIO()
+
+        stats = self.parser.convert_interchange_to_xml(self.interchange, output, workers=1, chunk_messages=7)
+
+        self.assertEqual(stats['messages'], 40)
+        self.assertEqual(stats['segments'], 200)
+        self.assertEqual(stats['invalid'], [])
+        self.assertEqual(self._message_ids(output.getvalue()), [f"B1_{i}" for i in range(1, 41)])
+        self.assertIn(b'&lt;1&gt; &amp; co', output.getvalue())
+        self.assertTrue(output.getvalue().rstrip().endswith(b'</EDIFACTInterchange>'))
+
+    def test_process_pool_ordered_and_unordered(self):
+        """测试进程池有序模式保持顺序，无序模式不丢消息"""
+        fd, path = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+        try:
+            self.parser.convert_interchange_to_xml(self.interchange, path, workers=2, chunk_messages=3)
+            with open(path, 'rb') as stream:
+                ordered_xml = stream.read()
+
+            unordered = io.BytesIO()
+            self.parser.convert_interchange_to_xml(self.interchange, unordered, workers=2,
+                                                   chunk_messages=3, ordered=False)
+        finally:
+            os.remove(path)
+
+        expected = [f"B1_{i}" for i in range(1, 41)]
+        self.assertEqual(self._message_ids(ordered_xml), expected)
+        self.assertEqual(sorted(self._message_ids(unordered.getvalue())), sorted(expected))
+
+    def test_parse_error_propagates(self):
+        """测试交换格式错误时抛出解析错误"""
+        with self.assertRaises(ParseError):
+            self.parser.convert_interchange_to_xml(b"UNH+1+ORDERS:D:96A:UN'", io.BytesIO(), workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
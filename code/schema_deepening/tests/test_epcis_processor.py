@@ -0,0 +1,120 @@
+"""
+EPCIS处理器测试
+
+测试EPCISProcessor的流式摄取与索引查询功能
+"""
+
+import io
+import os
+import tempfile
+import unittest
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from schema_deepening.epcis_processor import EPCISProcessor, EPCISEventType
+from schema_deepening.exceptions import ParseError
+
+NS = 'urn:epcglobal:epcis:xsd:1'
+BASE_TIME = datetime(2024, 1, 21, tzinfo=timezone.utc)
+
+
+def _object_event(index: int, minutes: int, biz_step: str, read_point: str) -> str:
+    event_time = (BASE_TIME + timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return (
+        f'<epcis:ObjectEvent id="e{index}">'
+        f'<epcis:eventTime>{event_time}</epcis:eventTime>'
+        f'<epcis:epcList><epcis:epc>urn:epc:id:sgtin:0614141.107346.{index % 3}</epcis:epc></epcis:epcList>'
+        f'<epcis:action>OBSERVE</epcis:action>'
+        f'<epcis:bizStep>{biz_step}</epcis:bizStep>'
+        f'<epcis:readPoint><epcis:id>{read_point}</epcis:id></epcis:readPoint>'
+        f'<epcis:bizLocation><epcis:id>urn:epc:id:sgln:0614141.00888.0</epcis:id></epcis:bizLocation>'
+        f'</epcis:ObjectEvent>'
+    )
+
+
+def _document(events) -> str:
+    return (
+        f'<epcis:EPCISDocument xmlns:epcis="{NS}"><epcis:EPCISBody><epcis:EventList>'
+        + ''.join(events)
+        + '</epcis:EventList></epcis:EPCISBody></epcis:EPCISDocument>'
+    )
+
+
+class TestEPCISProcessorStreaming(unittest.TestCase):
+    """EPCIS流式摄取测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = EPCISProcessor()
+        # 乱序到达的事件
+        minutes = [30, 10, 50, 20, 40, 0]
+        self.document = _document(
+            _object_event(i, minute, 'shipping' if i % 2 else 'receiving', f'urn:epc:id:sgln:rp.{i % 2}')
+            for i, minute in enumerate(minutes)
+        )
+
+    def test_streaming_matches_fromstring(self):
+        """测试流式摄取与整体解析得到相同事件"""
+        parsed = EPCISProcessor().parse_epcis_xml(self.document)
+
+        stats = self.processor.ingest_epcis(self.document.encode('utf-8'))
+
+        self.assertEqual(stats['events'], 6)
+        self.assertEqual(sorted(self.processor.events), sorted(e.event_id for e in parsed))
+        event = self.processor.events['e1']
+        self.assertEqual(event.event_type, EPCISEventType.OBJECT_EVENT)
+        self.assertEqual(event.read_point, {'id': 'urn:epc:id:sgln:rp.1'})
+        self.assertEqual(len(self.processor.query_events_by_epc('urn:epc:id:sgtin:0614141.107346.0')), 2)
+
+    def test_time_range_and_secondary_indexes(self):
+        """测试时间范围与二级索引查询结果按时间排序"""
+        self.processor.ingest_epcis(io.BytesIO(self.document.encode('utf-8')))
+
+        in_range = self.processor.query_events_by_time_range(
+            BASE_TIME + timedelta(minutes=10), BASE_TIME + timedelta(minutes=40))
+        self.assertEqual([e.event_id for e in in_range], ['e1', 'e3', 'e0', 'e4'])
+
+        shipping = self.processor.query_events_by_biz_step('shipping')
+        self.assertEqual([e.event_id for e in shipping], ['e5', 'e1', 'e3'])
+
+        windowed = self.processor.query_events_by_read_point(
+            'urn:epc:id:sgln:rp.0', end_time=BASE_TIME + timedelta(minutes=30))
+        self.assertEqual([e.event_id for e in windowed], ['e0'])
+        self.assertEqual(len(self.processor.query_events_by_biz_location('urn:epc:id:sgln:0614141.00888.0')), 6)
+        self.assertEqual(self.processor.query_events_by_biz_step('unknown'), [])
+
+    def test_duplicates_and_consumer_without_retain(self):
+        """测试重复事件被忽略，retain为False时只交给消费者"""
+        self.processor.ingest_epcis(self.document.encode('utf-8'))
+        stats = self.processor.ingest_epcis(self.document.encode('utf-8'))
+        self.assertEqual(stats['duplicates'], 6)
+        self.assertEqual(len(self.processor.time_index), 6)
+
+        consumed = []
+        processor = EPCISProcessor()
+        fd, path = tempfile.mkstemp(suffix='.xml')
+        with os.fdopen(fd, 'w', encoding='utf-8') as stream:
+            stream.write(self.document)
+        try:
+            stats = processor.ingest_epcis(path, consumer=consumed.append, retain=False)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(stats['events'], 6)
+        self.assertEqual(len(consumed), 6)
+        self.assertEqual(processor.events, {})
+
+    def test_malformed_document(self):
+        """测试格式错误的文档抛出解析错误"""
+        with self.assertRaises(ParseError):
+            self.processor.ingest_epcis(b'<epcis:EPCISDocument xmlns:epcis="urn:x"><EventList>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+EPC追溯图测试
+
+测试TraceabilityGraph的正向/反向追溯功能
+"""
+
+import unittest
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from schema_deepening import epcis_trace
+from schema_deepening.epcis_trace import TraceabilityGraph
+from schema_deepening.epcis_processor import EPCISProcessor, EPCISEvent, EPCISEventType
+from schema_deepening.exceptions import ValidationError
+
+BASE_TIME = datetime(2024, 1, 21)
+
+
+def _aggregation(event_id: str, parent: str, children, hours: int, action: str = 'ADD') -> EPCISEvent:
+    return EPCISEvent(event_id=event_id, event_type=EPCISEventType.AGGREGATION_EVENT,
+                      event_time=BASE_TIME + timedelta(hours=hours), parent_id=parent,
+                      child_epcs=list(children), action=action)
+
+
+def _transformation(event_id: str, inputs, outputs, hours: int) -> EPCISEvent:
+    return EPCISEvent(event_id=event_id, event_type=EPCISEventType.TRANSFORMATION_EVENT,
+                      event_time=BASE_TIME + timedelta(hours=hours),
+                      input_epc_list=list(inputs), output_epc_list=list(outputs))
+
+
+class TestTraceabilityGraph(unittest.TestCase):
+    """EPC追溯图测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self._numpy_available = epcis_trace.NUMPY_AVAILABLE
+        # 原料批次 -> 加工成产品 -> 装箱 -> 装托盘
+        self.events = [
+            _transformation('t1', ['lot:flour', 'lot:sugar'], ['item:1', 'item:2'], 1),
+            _transformation('t2', ['lot:flour'], ['item:3'], 5),
+            _aggregation('a1', 'case:1', ['item:1', 'item:2'], 2),
+            _aggregation('a2', 'case:2', ['item:3'], 6),
+            _aggregation('a3', 'pallet:1', ['case:1', 'case:2'], 7),
+        ]
+
+    def tearDown(self):
+        """测试后清理"""
+        epcis_trace.NUMPY_AVAILABLE = self._numpy_available
+
+    def _graph(self) -> TraceabilityGraph:
+        graph = TraceabilityGraph()
+        graph.add_events(self.events)
+        return graph
+
+    def test_forward_and_backward(self):
+        """测试正向召回与反向溯源，两种CSR构建路径结果一致"""
+        for numpy_available in (self._numpy_available, False):
+            epcis_trace.NUMPY_AVAILABLE = numpy_available
+            graph = self._graph()
+
+            self.assertEqual(
+                sorted(graph.trace_forward('lot:flour')),
+                ['case:1', 'case:2', 'item:1', 'item:2', 'item:3', 'pallet:1'])
+            self.assertEqual(sorted(graph.trace_forward('lot:sugar')), ['case:1', 'item:1', 'item:2', 'pallet:1'])
+            self.assertEqual(
+                sorted(graph.trace_backward('pallet:1')),
+                ['case:1', 'case:2', 'item:1', 'item:2', 'item:3', 'lot:flour', 'lot:sugar'])
+
+        self.assertEqual(len(graph), 8)
+        self.assertEqual(graph.edge_count, 11)
+
+    def test_time_window_and_depth(self):
+        """测试时间窗口与最大深度限制"""
+        graph = self._graph()
+
+        early = graph.trace_forward('lot:flour', end_time=BASE_TIME + timedelta(hours=4))
+        self.assertEqual(sorted(early), ['case:1', 'item:1', 'item:2'])
+        self.assertEqual(graph.trace_backward('pallet:1', start_time=BASE_TIME + timedelta(hours=3)),
+                         ['case:1', 'case:2', 'item:3', 'lot:flour'])
+        self.assertEqual(sorted(graph.trace_forward('lot:flour', max_depth=1)), ['item:1', 'item:2', 'item:3'])
+
+    def test_memoized_results_reused(self):
+        """测试缓存的子结果被复用且新增事件后失效"""
+        graph = self._graph()
+        case_result = graph.trace_forward('item:3')
+        self.assertEqual(case_result, ['case:2', 'pallet:1'])
+
+        self.assertEqual(sorted(graph.trace_forward('lot:flour')),
+                         ['case:1', 'case:2', 'item:1', 'item:2', 'item:3', 'pallet:1'])
+
+        graph.add_event(_aggregation('a4', 'container:1', ['pallet:1'], 8))
+        self.assertEqual(graph.trace_forward('item:3'), ['case:2', 'pallet:1', 'container:1'])
+
+    def test_unpack_and_cycles(self):
+        """测试拆包事件方向与循环引用"""
+        graph = TraceabilityGraph()
+        graph.add_event(_aggregation('a1', 'case:1', ['item:1'], 1))
+        graph.add_event(_aggregation('a2', 'case:1', ['item:1'], 2, action='DELETE'))
+
+        self.assertEqual(graph.trace_forward('item:1'), ['case:1'])
+        self.assertEqual(graph.trace_forward('case:1'), ['item:1'])
+        self.assertEqual(graph.trace_forward('unknown'), [])
+        with self.assertRaises(ValidationError):
+            graph.trace_forward('')
+        with self.assertRaises(ValidationError):
+            graph.trace_forward('item:1', max_depth=0)
+
+    def test_processor_feeds_graph(self):
+        """测试处理器保存事件时同步加入追溯图"""
+        graph = TraceabilityGraph()
+        processor = EPCISProcessor(trace_graph=graph)
+        for event in self.events:
+            processor._add_event(event)
+
+        self.assertEqual(graph.edge_count, 11)
+        self.assertIn('pallet:1', graph.trace_forward('lot:sugar'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+"""
+海运存储测试
+
+测试MaritimeStorage的批量写入与时空查询功能
+"""
+
+import unittest
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import psycopg2
+from unittest.mock import MagicMock, patch
+from schema_deepening.maritime_storage import MaritimeStorage
+from schema_deepening.ais_processor import AISProcessor
+from schema_deepening.exceptions import StorageError
+
+CLASS_A_SENTENCE = "!AIVDM,1,1,,B,177KQJ5000G?tO`K>RA1wUbN0TKH,0*5C"
+STATIC_FRAGMENTS = [
+    "!AIVDM,2,1,3,B,55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E53,0*3E",
+    "!AIVDM,2,2,3,B,1@0000000000000,2*55",
+]
+
+
+def _ais_row(mmsi: str) -> dict:
+    return {'mmsi': mmsi, 'latitude': 31.23, 'longitude': 121.47, 'speed': 12.5}
+
+
+class TestMaritimeStorageBulk(unittest.TestCase):
+    """海运存储批量写入测试类"""
+
+    @patch('schema_deepening.maritime_storage.psycopg2.connect')
+    def setUp(self, mock_connect):
+        """测试前准备"""
+        self.mock_conn = MagicMock()
+        self.mock_cur = MagicMock()
+        self.mock_conn.cursor.return_value = self.mock_cur
+        mock_connect.return_value = self.mock_conn
+
+        self.storage = MaritimeStorage("postgresql://localhost/test_db", batch_size=3, flush_interval=3600)
+        self.mock_conn.commit.reset_mock()
+        self.copied = []
+        self.mock_cur.copy_expert.side_effect = self._copy
+
+    def _copy(self, sql, buffer):
+        lines = buffer.read().splitlines()
+        if any('BAD' in line for line in lines):
+            raise psycopg2.DataError("invalid input syntax")
+        self.copied.append(lines)
+
+    def test_buffers_until_batch_size(self):
+        """测试未满批时只缓冲，满批时一个事务COPY写入"""
+        result = self.storage.store_ais_batch([_ais_row('1'), _ais_row('2')])
+        self.assertEqual(result.written, 0)
+        self.assertEqual(result.pending, 2)
+        self.mock_cur.copy_expert.assert_not_called()
+
+        result = self.storage.store_ais_batch([_ais_row('3'), _ais_row('4')])
+        self.assertEqual(result.written, 3)
+        self.assertEqual(result.batches, 1)
+        self.assertEqual(result.pending, 1)
+        self.assertEqual(len(self.copied), 1)
+        self.assertEqual(self.mock_conn.commit.call_count, 1)
+
+        result = self.storage.flush()
+        self.assertEqual(result.written, 1)
+        self.assertEqual(self.mock_conn.commit.call_count, 2)
+
+    def test_invalid_rows_rejected_before_write(self):
+        """测试无效行在写入前被拒绝"""
+        result = self.storage.store_ais_batch([{'mmsi': '1'}, _ais_row('2'), {'latitude': 1.0}])
+
+        self.assertEqual(len(result.rejected), 2)
+        self.assertEqual(result.pending, 1)
+
+    def test_failed_rows_isolated_without_losing_batch(self):
+        """测试批内失败行被单独拒绝，其余行照常提交"""
+        result = self.storage.store_ais_batch([_ais_row('1'), _ais_row('BAD'), _ais_row('3')])
+
+        self.assertEqual(result.written, 2)
+        self.assertEqual(len(result.rejected), 1)
+        self.assertEqual(result.rejected[0]['row'][1], 'BAD')
+        self.assertEqual(self.mock_conn.commit.call_count, 1)
+        self.mock_conn.rollback.assert_not_called()
+
+    def test_store_decoded_batch(self):
+        """测试直接写入AIS批量解码结果，无位置的消息被跳过"""
+        batch = AISProcessor().parse_nmea_batch([CLASS_A_SENTENCE] + STATIC_FRAGMENTS)
+
+        result = self.storage.store_ais_batch(batch)
+        result.merge(self.storage.flush())
+
+        self.assertEqual(result.written, 1)
+        self.assertEqual(result.skipped, 1)
+        self.assertIn('477553000', self.copied[0][0])
+
+    def test_vessels_upsert_with_execute_values(self):
+        """测试船舶批量upsert使用execute_values并按vessel_id去重"""
+        vessels = [
+            {'vessel_id': 'v1', 'mmsi': '1', 'name': 'A'},
+            {'vessel_id': 'v1', 'mmsi': '1', 'name': 'B'},
+            {'vessel_id': 'v2', 'mmsi': '2'},
+        ]
+        with patch('schema_deepening.maritime_storage.execute_values') as mock_execute_values:
+            result = self.storage.store_vessels_batch(vessels)
+            result.merge(self.storage.flush())
+
+        self.assertEqual(len(result.rejected), 1)
+        rows = mock_execute_values.call_args[0][2]
+        self.assertEqual([row[2] for row in rows], ['B'])
+        self.assertIn('ON CONFLICT', mock_execute_values.call_args[0][1])
+
+    def test_commit_failure_raises_storage_error(self):
+        """测试提交失败时抛出存储错误"""
+        self.mock_conn.commit.side_effect = psycopg2.OperationalError("connection lost")
+
+        with self.assertRaises(StorageError):
+            self.storage.store_route_optimizations_batch([
+                {'vessel_id': 'v1', 'origin_port': 'CNSHA', 'destination_port': 'NLRTM',
+                 'optimization_type': 'fuel'}
+            ] * 3)
+        self.mock_conn.rollback.assert_called()
+
+        self.mock_conn.commit.side_effect = None
+        result = self.storage.flush()
+        self.assertEqual(result.written, 3)
+        self.assertEqual(result.batches, 1)
+
+    def test_failed_flush_keeps_unwritten_rows(self):
+        """测试刷新失败时未写入的行保留在缓冲区，下次刷新时写入"""
+        self.storage.store_ais_batch([_ais_row(str(i)) for i in range(2)])
+        self.mock_conn.commit.side_effect = psycopg2.OperationalError("connection lost")
+        with self.assertRaises(StorageError):
+            self.storage.flush()
+
+        self.mock_conn.commit.side_effect = None
+        result = self.storage.flush()
+        self.assertEqual(result.written, 2)
+        self.assertEqual(result.pending, 0)
+        self.assertEqual(len(self.copied), 2)
+
+    def test_full_dependent_batch_writes_referenced_vessels_first(self):
+        """测试航线优化满批写入前先写入缓冲中的船舶，满足外键"""
+        order = []
+        self.mock_cur.copy_expert.side_effect = lambda sql, buffer: order.append(sql.split()[1])
+        with patch('schema_deepening.maritime_storage.execute_values',
+                   side_effect=lambda cur, sql, rows, **kwargs: order.append(sql.split()[2])):
+            result = self.storage.store_vessels_batch([{'vessel_id': 'v1', 'mmsi': '1', 'name': 'A'}])
+            self.assertEqual(result.pending, 1)
+            result = self.storage.store_route_optimizations_batch([
+                {'vessel_id': 'v1', 'origin_port': 'CNSHA', 'destination_port': 'NLRTM',
+                 'optimization_type': 'fuel'}
+            ] * 3)
+
+        self.assertEqual(order, ['vessels', 'route_optimizations'])
+        self.assertEqual(result.written, 4)
+        self.assertEqual(result.pending, 0)
+
+    def test_query_vessels_near_vessel(self):
+        """测试查询某船附近船舶按距离排序"""
+        at_time = datetime(2024, 1, 1, 12, 0)
+        self.mock_cur.fetchone.return_value = (31.0, 121.0)
+        self.mock_cur.fetchall.return_value = [
+            ('333333333', 31.2, 121.0, 10.0, 90.0, at_time, 12.0),
+            ('222222222', 31.05, 121.0, None, None, at_time, 3.0),
+        ]
+
+        results = self.storage.query_vessels_near_vessel('111111111', at_time, radius_nm=20)
+
+        self.assertEqual([r['mmsi'] for r in results], ['222222222', '333333333'])
+        sql, params = self.mock_cur.execute.call_args[0]
+        self.assertIn('ST_DWithin', sql)
+        self.assertEqual(sql.count('%s'), len(params))
+
+    def test_query_vessels_near_vessel_without_reference(self):
+        """测试参考船无位置时返回空列表"""
+        self.mock_cur.fetchone.return_value = None
+
+        self.assertEqual(self.storage.query_vessels_near_vessel('111111111', datetime(2024, 1, 1), 5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+时空索引测试
+
+测试SpatioTemporalIndex与AISProcessor的时空查询
+"""
+
+import random
+import unittest
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from schema_deepening import spatial_index
+from schema_deepening.spatial_index import SpatioTemporalIndex, haversine_distance
+from schema_deepening.ais_processor import AISProcessor, AISPosition
+from schema_deepening.exceptions import ProcessingError
+
+BASE_TIME = datetime(2024, 1, 1)
+
+
+class TestSpatioTemporalIndex(unittest.TestCase):
+    """时空索引测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self._numpy_available = spatial_index.NUMPY_AVAILABLE
+        rng = random.Random(7)
+        self.points = [
+            (200000000 + i % 50, rng.uniform(29.0, 33.0), rng.uniform(119.0, 123.0),
+             BASE_TIME + timedelta(seconds=rng.uniform(0, 7200)))
+            for i in range(2000)
+        ]
+        self.index = SpatioTemporalIndex(cell_degrees=0.25, bucket_seconds=900)
+        for mmsi, lat, lon, timestamp in self.points:
+            self.index.insert(mmsi, lat, lon, timestamp, speed=10.0)
+
+    def tearDown(self):
+        """测试后清理"""
+        spatial_index.NUMPY_AVAILABLE = self._numpy_available
+
+    def test_haversine_scalar_and_vector(self):
+        """测试标量与向量化Haversine一致"""
+        scalar = haversine_distance(31.0, 121.0, 32.0, 122.0)
+        self.assertAlmostEqual(haversine_distance(0.0, 0.0, 1.0, 0.0), 60.04, places=1)
+
+        if self._numpy_available:
+            import numpy as np
+            vector = haversine_distance(31.0, 121.0, np.array([32.0, 31.0]), np.array([122.0, 121.0]))
+            self.assertAlmostEqual(vector[0], scalar)
+            self.assertEqual(vector[1], 0.0)
+
+    def test_bbox_matches_brute_force(self):
+        """测试矩形查询与全量扫描结果一致"""
+        start, end = BASE_TIME + timedelta(minutes=20), BASE_TIME + timedelta(minutes=80)
+        expected = sorted(
+            (mmsi, lat) for mmsi, lat, lon, ts in self.points
+            if 30.0 <= lat <= 31.5 and 120.0 <= lon <= 121.0 and start <= ts <= end
+        )
+
+        for numpy_available in (self._numpy_available, False):
+            spatial_index.NUMPY_AVAILABLE = numpy_available
+            records = self.index.query_bbox(30.0, 120.0, 31.5, 121.0, start, end)
+            self.assertEqual(sorted((r['mmsi'], r['latitude']) for r in records), expected)
+            self.assertEqual([r['time'] for r in records], sorted(r['time'] for r in records))
+
+    def test_radius_matches_brute_force(self):
+        """测试半径查询与全量扫描结果一致"""
+        start, end = BASE_TIME, BASE_TIME + timedelta(hours=2)
+        expected = sorted(
+            lat for mmsi, lat, lon, ts in self.points
+            if haversine_distance(31.0, 121.0, lat, lon) <= 30.0
+        )
+
+        for numpy_available in (self._numpy_available, False):
+            spatial_index.NUMPY_AVAILABLE = numpy_available
+            records = self.index.query_radius(31.0, 121.0, 30.0, start, end)
+            self.assertEqual(sorted(r['latitude'] for r in records), expected)
+            self.assertTrue(all(r['distance_nm'] <= 30.0 for r in records))
+
+    def test_antimeridian_bbox(self):
+        """测试跨越180°经线的矩形查询"""
+        index = SpatioTemporalIndex()
+        index.insert(1, 10.0, 179.9, BASE_TIME)
+        index.insert(2, 10.0, -179.9, BASE_TIME)
+        index.insert(3, 10.0, 0.0, BASE_TIME)
+
+        records = index.query_bbox(9.0, 179.0, 11.0, -179.0, BASE_TIME, BASE_TIME)
+        self.assertEqual(sorted(r['mmsi'] for r in records), [1, 2])
+
+    def test_retention_evicts_old_buckets(self):
+        """测试超过保留跨度的时间桶被淘汰"""
+        index = SpatioTemporalIndex(bucket_seconds=60, retention=120)
+        index.insert(1, 10.0, 10.0, BASE_TIME)
+        index.insert(1, 10.0, 10.0, BASE_TIME + timedelta(minutes=10))
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.query_bbox(0, 0, 20, 20, BASE_TIME, BASE_TIME + timedelta(hours=1))[0]['time'],
+                         600.0 + (BASE_TIME - datetime(1970, 1, 1)).total_seconds())
+
+
+class TestAISProcessorSpatialQueries(unittest.TestCase):
+    """AIS处理器时空查询测试类"""
+
+    def test_vessels_near(self):
+        """测试查询某时刻某船附近的船舶"""
+        processor = AISProcessor(spatial_index=SpatioTemporalIndex())
+        positions = [
+            ('111111111', 31.00, 121.00, 0),
+            ('222222222', 31.05, 121.00, 30),
+            ('222222222', 31.20, 121.00, 600),
+            ('333333333', 32.00, 121.00, 0),
+            ('444444444', 31.01, 121.00, 3600),
+        ]
+        for mmsi, lat, lon, offset in positions:
+            processor._record_position(
+                AISPosition(mmsi=mmsi, latitude=lat, longitude=lon,
+                            timestamp=BASE_TIME + timedelta(seconds=offset)), 0.0)
+
+        nearby = processor.vessels_near('111111111', BASE_TIME, radius_nm=20, time_window=300)
+
+        self.assertEqual([r['mmsi'] for r in nearby], [222222222])
+        self.assertAlmostEqual(nearby[0]['distance_nm'], 3.0, places=1)
+        self.assertEqual(processor.vessels_near('999999999', BASE_TIME, 20), [])
+
+    def test_queries_require_index(self):
+        """测试未启用索引时查询报错"""
+        with self.assertRaises(ProcessingError):
+            AISProcessor().query_radius(31.0, 121.0, 5.0, BASE_TIME, BASE_TIME)
+
+
+if __name__ == '__main__':
+    unittest.main()
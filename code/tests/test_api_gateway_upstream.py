@@ -0,0 +1,249 @@
+"""
+API网关上游连接池测试
+
+测试内容：
+1. UpstreamPool - 每个服务复用一个客户端、JSON请求、并行健康检查与缓存
+2. ResponseCache - max-age直接命中、ETag重新验证、no-store不缓存
+3. 缓存隔离 - 携带Authorization/Cookie的请求、Vary头部、按精确路径失效
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+pytest.importorskip("fastapi")
+import httpx
+
+from api_gateway.upstream import CachedResponse, ResponseCache, UpstreamConfig, UpstreamPool
+
+SERVICES = {
+    "usl": {"url": "http://usl.test", "health": "/health"},
+    "kg": {"url": "http://kg.test", "health": "/health"},
+}
+
+
+def respond(status_code, body=b"", headers=None):
+    """构造与网络传输层一致的流式响应（响应体尚未读取）"""
+    headers = dict(headers or {})
+    headers["content-length"] = str(len(body))
+    return httpx.Response(status_code, headers=headers, stream=httpx.ByteStream(body))
+
+
+class Upstream:
+    """记录请求的模拟上游，按路径返回预设响应"""
+
+    def __init__(self):
+        self.requests = []
+        self.routes = {}
+
+    def route(self, path, handler):
+        self.routes[path] = handler
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        handler = self.routes.get(request.url.path)
+        if handler is None:
+            return httpx.Response(404, json={"detail": "not found"})
+        return handler(request)
+
+    def calls(self, path):
+        return sum(1 for request in self.requests if request.url.path == path)
+
+
+def make_pool(upstream, **config):
+    return UpstreamPool(SERVICES, UpstreamConfig(**config), transport=httpx.MockTransport(upstream.handle))
+
+
+async def read(result):
+    """读取proxy的结果（缓存条目或流式响应）"""
+    if isinstance(result, CachedResponse):
+        return result.status_code, result.body
+    body = await result.aread()
+    await result.aclose()
+    return result.status_code, body
+
+
+# ============================================================================
+# 连接池
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_pool_reuses_client_and_streams_responses():
+    """测试每个服务只创建一个客户端，未启用缓存时返回流式响应"""
+    upstream = Upstream()
+    upstream.route("/api/v1/schemas", lambda request: respond(200, b"[]"))
+    pool = make_pool(upstream)
+
+    assert pool.client("usl") is pool.client("usl")
+    assert pool.client("usl") is not pool.client("kg")
+    result = await pool.proxy("usl", "GET", "/api/v1/schemas", params="page=2")
+    assert isinstance(result, httpx.Response)
+    assert await read(result) == (200, b"[]")
+    assert str(upstream.requests[0].url) == "http://usl.test/api/v1/schemas?page=2"
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_request_json_raises_on_error_status():
+    """测试request_json解析JSON并在错误状态时抛出异常"""
+    upstream = Upstream()
+    upstream.route("/items", lambda request: httpx.Response(201, json={"body": request.content.decode()}))
+    pool = make_pool(upstream)
+
+    assert await pool.request_json("usl", "/items", "POST", {"a": 1}) == {"body": '{"a":1}'}
+    with pytest.raises(httpx.HTTPStatusError):
+        await pool.request_json("usl", "/missing")
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_health_probes_in_parallel_and_caches():
+    """测试健康检查并发调用共享一次探测，结果在TTL内缓存"""
+    upstream = Upstream()
+    upstream.route("/health", lambda request: httpx.Response(
+        200 if request.url.host == "usl.test" else 503))
+    pool = make_pool(upstream, health_cache_ttl=60)
+
+    first, second = await asyncio.gather(pool.health(), pool.health())
+    assert first == second
+    assert first["usl"]["status"] == "healthy"
+    assert first["kg"]["status"] == "unhealthy"
+    await pool.health()
+    assert upstream.calls("/health") == 2
+    await pool.aclose()
+
+
+# ============================================================================
+# 响应缓存
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_cache_serves_fresh_and_revalidates_with_etag():
+    """测试max-age内直接命中，过期后以If-None-Match重新验证"""
+    upstream = Upstream()
+
+    def schemas(request):
+        if request.headers.get("if-none-match") == '"v1"':
+            return respond(304, headers={"etag": '"v1"'})
+        return respond(200, b"v1", {"etag": '"v1"', "cache-control": "max-age=60"})
+
+    upstream.route("/schemas", schemas)
+    pool = make_pool(upstream, response_cache=True)
+
+    assert await read(await pool.proxy("usl", "GET", "/schemas")) == (200, b"v1")
+    assert await read(await pool.proxy("usl", "GET", "/schemas")) == (200, b"v1")
+    assert upstream.calls("/schemas") == 1
+
+    next(iter(pool.cache._entries.values())).expires_at = 0
+    assert await read(await pool.proxy("usl", "GET", "/schemas", headers=[("If-None-Match", '"old"')])) == \
+        (200, b"v1")
+    assert upstream.requests[-1].headers["if-none-match"] == '"v1"'
+    assert pool.cache.stats() == {"entries": 1, "hits": 1, "revalidations": 1, "misses": 1}
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cache_skips_no_store_and_private():
+    """测试no-store/private响应不缓存"""
+    upstream = Upstream()
+    upstream.route("/a", lambda request: respond(200, b"a", {
+        "etag": '"a"', "cache-control": "no-store"}))
+    upstream.route("/b", lambda request: respond(200, b"b", {
+        "etag": '"b"', "cache-control": "private, max-age=60"}))
+    pool = make_pool(upstream, response_cache=True)
+
+    for path in ("/a", "/b", "/a", "/b"):
+        assert isinstance(await pool.proxy("usl", "GET", path), httpx.Response)
+    assert len(pool.cache) == 0
+    assert upstream.calls("/a") == upstream.calls("/b") == 2
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cache_isolates_credentialed_requests():
+    """测试携带凭据的请求不缓存非public响应，也不使用匿名请求缓存的响应"""
+    upstream = Upstream()
+    upstream.route("/me", lambda request: respond(
+        200, request.headers.get("authorization", "anonymous").encode(),
+        {"etag": '"me"', "cache-control": "max-age=60"}))
+    upstream.route("/catalog", lambda request: respond(
+        200, b"catalog", {"cache-control": "public, max-age=60"}))
+    pool = make_pool(upstream, response_cache=True)
+
+    alice = [("Authorization", "Bearer alice")]
+    bob = [("Authorization", "Bearer bob")]
+    assert await read(await pool.proxy("usl", "GET", "/me", headers=alice)) == (200, b"Bearer alice")
+    assert await read(await pool.proxy("usl", "GET", "/me", headers=bob)) == (200, b"Bearer bob")
+    assert await read(await pool.proxy("usl", "GET", "/me")) == (200, b"anonymous")
+    assert await read(await pool.proxy("usl", "GET", "/me", headers=[("Cookie", "session=1")])) == \
+        (200, b"anonymous")
+    assert await read(await pool.proxy("usl", "GET", "/me", headers=alice)) == (200, b"Bearer alice")
+    assert upstream.calls("/me") == 5
+
+    assert await read(await pool.proxy("usl", "GET", "/catalog", headers=alice)) == (200, b"catalog")
+    assert await read(await pool.proxy("usl", "GET", "/catalog", headers=bob)) == (200, b"catalog")
+    assert upstream.calls("/catalog") == 1
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cache_key_includes_vary_headers():
+    """测试Vary列出的请求头部不同的请求分别缓存，Vary: *不缓存"""
+    upstream = Upstream()
+    upstream.route("/greeting", lambda request: respond(
+        200, request.headers.get("accept-language", "en").encode(),
+        {"cache-control": "max-age=60", "vary": "Accept-Language"}))
+    upstream.route("/random", lambda request: respond(
+        200, b"x", {"cache-control": "max-age=60", "vary": "*"}))
+    pool = make_pool(upstream, response_cache=True)
+
+    for language in ("zh", "en", "zh", "en"):
+        result = await pool.proxy("usl", "GET", "/greeting", headers=[("Accept-Language", language)])
+        assert await read(result) == (200, language.encode())
+    assert upstream.calls("/greeting") == 2
+
+    await pool.proxy("usl", "GET", "/random")
+    await pool.proxy("usl", "GET", "/random")
+    assert upstream.calls("/random") == 2
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_write_invalidates_exact_path_only():
+    """测试写操作只使同一路径（任意查询）的缓存失效"""
+    upstream = Upstream()
+    for path in ("/schemas", "/schemas2"):
+        upstream.route(path, lambda request: respond(
+            200, request.url.path.encode(), {"cache-control": "max-age=60"}))
+    pool = make_pool(upstream, response_cache=True)
+
+    for path, params in (("/schemas", None), ("/schemas", "page=2"), ("/schemas2", None)):
+        await pool.proxy("usl", "GET", path, params=params)
+    assert len(pool.cache) == 3
+
+    await read(await pool.proxy("usl", "POST", "/schemas", content=b"{}"))
+    assert len(pool.cache) == 1
+    assert pool.cache.get(("usl", "/schemas2", "")) is not None
+    await pool.aclose()
+
+
+def test_response_cache_lru_eviction():
+    """测试超过容量时淘汰最久未使用的条目"""
+    cache = ResponseCache(max_entries=2)
+    response = httpx.Response(200, content=b"x", headers={"cache-control": "max-age=60"})
+    for path in ("/a", "/b"):
+        cache.store(("usl", path, ""), [], response, b"x")
+    assert cache.get(("usl", "/a", "")) is not None
+    cache.store(("usl", "/c", ""), [], response, b"x")
+    assert cache.get(("usl", "/b", "")) is None
+    assert cache.get(("usl", "/a", "")) is not None
+    assert len(cache) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,804 @@
+"""
+MCP缓存管理器扩展测试
+
+测试内容：
+1. 分片内存后端 (ShardedMemoryCacheBackend) - 淘汰策略、统计汇总、线程安全
+2. W-TinyLFU淘汰策略 (CountMinSketch) - 频率估计、抗扫描、容量约束
+3. 布隆过滤器 (BloomFilter/CountingBloomFilter/ScalableBloomFilter) - 批量接口、删除、扩展、快照
+4. 加载合并 (get_with_loader) - single-flight、旧值后台刷新、提前刷新、登记表上限
+5. 内存预算 (max_bytes/SizeEstimator) - 加权淘汰、字节统计、命名空间明细
+6. 快照 (SnapshotStore) - 增量段、mmap索引、延迟恢复、TTL保留、压缩
+7. 共享L2 (SQLiteCacheBackend/MultiLevelCache) - 批量读写、异步写回合并、跨实例失效
+"""
+
+import asyncio
+import pickle
+import pytest
+import sys
+import os
+import threading
+import time
+
+# 添加路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from mcp.cache_manager import (
+    CacheManager, CacheConfig, CacheStrategy, CacheEntry, ShardedMemoryCacheBackend, CountMinSketch,
+    BloomFilter, CountingBloomFilter, ScalableBloomFilter, MemoryCacheBackend, SizeEstimator
+)
+from mcp import cache_manager
+from mcp.cache_manager import MultiLevelCache
+from mcp.cache_l2 import SQLiteCacheBackend
+from mcp.cache_snapshot import SnapshotStore
+from mcp.benchmarks import replay_trace, scan_trace, zipf_keys
+
+
+def _entry(key, ttl: float = 60.0, size: int = 0) -> CacheEntry:
+    return CacheEntry(key=key, value=f"value_{key}", expires_at=time.time() + ttl, size=size)
+
+
+# ============================================================================
+# Sharded Backend Tests
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_sharded_lfu_evicts_least_frequent():
+    """测试LFU按频率淘汰，同频率时淘汰最早的键"""
+    backend = ShardedMemoryCacheBackend(CacheConfig(max_size=3, strategy=CacheStrategy.LFU, shard_count=1))
+    for key in ("a", "b", "c"):
+        await backend.set(key, _entry(key))
+    await backend.get("a")
+    await backend.get("a")
+    await backend.get("c")
+
+    await backend.set("d", _entry("d"))
+    assert await backend.get("b") is None
+
+    await backend.delete("d")
+    await backend.set("e", _entry("e"))
+    await backend.set("f", _entry("f"))
+    assert sorted(await backend.keys()) == ["a", "c", "f"]
+
+
+@pytest.mark.asyncio
+async def test_sharded_lru_and_fifo_per_segment():
+    """测试单分片下LRU与FIFO的淘汰顺序"""
+    lru = ShardedMemoryCacheBackend(CacheConfig(max_size=2, strategy=CacheStrategy.LRU, shard_count=1))
+    fifo = ShardedMemoryCacheBackend(CacheConfig(max_size=2, strategy=CacheStrategy.FIFO, shard_count=1))
+    for backend in (lru, fifo):
+        await backend.set("a", _entry("a"))
+        await backend.set("b", _entry("b"))
+        await backend.get("a")
+        await backend.set("c", _entry("c"))
+
+    assert sorted(await lru.keys()) == ["a", "c"]
+    assert sorted(await fifo.keys()) == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_sharded_manager_stats_roll_up():
+    """测试缓存管理器使用分片后端并汇总分片统计"""
+    cache = CacheManager(CacheConfig(max_size=8, shard_count=4, enable_bloom_filter=False))
+    assert isinstance(cache._backend, ShardedMemoryCacheBackend)
+
+    for i in range(40):
+        await cache.set(f"key{i}", i)
+    await cache.set("short", 1, ttl=0.01)
+    await asyncio.sleep(0.02)
+    assert await cache.get("short") is None
+
+    stats = await cache.get_stats_async()
+    assert len(stats['shards']) == 4
+    assert stats['size'] == sum(shard['size'] for shard in stats['shards'])
+    assert stats['size'] <= 8
+    assert stats['evictions'] == 41 - stats['size'] - stats['expirations']
+    assert stats['expirations'] == 1
+
+
+def test_sharded_backend_thread_safety():
+    """测试多线程并发读写分片后端"""
+    backend = ShardedMemoryCacheBackend(CacheConfig(max_size=64, strategy=CacheStrategy.LFU, shard_count=4))
+    errors = []
+
+    def worker(offset: int):
+        async def run():
+            for i in range(2000):
+                key = (i * 7 + offset) % 200
+                if await backend.get(key) is None:
+                    await backend.set(key, _entry(key))
+        try:
+            asyncio.run(run())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert asyncio.run(backend.size()) <= 64
+    for shard in backend._shards:
+        assert set(shard.frequency) == set(shard.data)
+        assert sum(len(bucket) for bucket in shard.buckets.values()) == len(shard.data)
+
+
+# ============================================================================
+# W-TinyLFU Tests
+# ============================================================================
+
+def test_count_min_sketch_estimate_and_aging():
+    """测试频率草图的估计值、计数上限与老化"""
+    sketch = CountMinSketch(capacity=64)
+    for _ in range(20):
+        sketch.increment("hot")
+    sketch.increment("cold")
+
+    assert sketch.estimate("hot") == 15
+    assert sketch.estimate("cold") >= 1
+    assert sketch.estimate("missing") <= 1
+
+    sketch.reset()
+    assert sketch.estimate("hot") == 7
+
+    # 达到采样数后自动老化
+    aging = CountMinSketch(capacity=4)
+    for _ in range(aging.sample_size - 1):
+        aging.increment("hot")
+    assert aging.estimate("hot") == 15
+    aging.increment("hot")
+    assert aging.estimate("hot") == 7
+
+
+@pytest.mark.asyncio
+async def test_wtinylfu_capacity_and_delete():
+    """测试W-TinyLFU各区域与数据保持一致且不超过容量"""
+    backend = ShardedMemoryCacheBackend(CacheConfig(max_size=50, strategy=CacheStrategy.W_TINYLFU, shard_count=1))
+    for i in range(500):
+        key = i % 120 if i % 3 else i % 7
+        if await backend.get(key) is None:
+            await backend.set(key, _entry(key))
+        if i % 50 == 0:
+            await backend.delete(key)
+
+    shard = backend._shards[0]
+    regions = set(shard.window) | set(shard.probation) | set(shard.protected)
+    assert regions == set(shard.data)
+    assert len(shard.data) <= 50
+    assert len(shard.protected) <= shard.protected_capacity
+
+    tiny = ShardedMemoryCacheBackend(CacheConfig(max_size=1, strategy=CacheStrategy.W_TINYLFU, shard_count=1))
+    for key in ("a", "b", "c"):
+        await tiny.set(key, _entry(key))
+    assert await tiny.size() == 1
+
+
+def test_wtinylfu_resists_scans():
+    """测试顺序扫描不会冲掉热点：W-TinyLFU命中率高于LRU"""
+    capacity = 200
+    mixed = scan_trace(40000, universe=capacity * 20, scan_length=capacity * 2)
+    loop = [f"loop:{i % (capacity + capacity // 5)}" for i in range(20000)]
+
+    assert replay_trace(mixed, CacheStrategy.W_TINYLFU, capacity).hit_rate > \
+        replay_trace(mixed, CacheStrategy.LRU, capacity).hit_rate
+    assert replay_trace(loop, CacheStrategy.LRU, capacity).hit_rate == 0
+    assert replay_trace(loop, CacheStrategy.W_TINYLFU, capacity).hit_rate > 0.5
+
+    zipf = zipf_keys(20000, universe=capacity * 20)
+    stats = replay_trace(zipf, CacheStrategy.W_TINYLFU, capacity)
+    assert stats.hits + stats.misses == 20000
+    assert stats.evictions == stats.misses - capacity
+
+
+@pytest.mark.asyncio
+async def test_wtinylfu_manager_integration():
+    """测试缓存管理器使用W-TinyLFU策略"""
+    cache = CacheManager(CacheConfig(max_size=20, strategy=CacheStrategy.W_TINYLFU, enable_bloom_filter=False))
+    assert isinstance(cache._backend, ShardedMemoryCacheBackend)
+
+    for _ in range(3):
+        for i in range(10):
+            await cache.set(f"hot{i}", i)
+            assert await cache.get(f"hot{i}") == i
+    for i in range(200):
+        await cache.set(f"scan{i}", i)
+
+    hot_hits = [await cache.get(f"hot{i}") for i in range(10)]
+    assert hot_hits == list(range(10))
+    stats = await cache.get_stats_async()
+    assert stats['size'] <= 20
+
+
+# ============================================================================
+# Bloom Filter Tests
+# ============================================================================
+
+@pytest.mark.parametrize("numpy_available", [cache_manager.NUMPY_AVAILABLE, False])
+def test_bloom_batch_matches_single(monkeypatch, numpy_available):
+    """测试批量接口与逐个接口结果一致，误判率接近目标"""
+    monkeypatch.setattr(cache_manager, "NUMPY_AVAILABLE", numpy_available)
+    bloom = BloomFilter(expected_items=2000, fp_rate=0.01)
+    assert (bloom.size, bloom.hash_count) == BloomFilter.optimal_parameters(2000, 0.01)
+
+    present = [f"key{i}" for i in range(2000)]
+    absent = [f"other{i}" for i in range(5000)]
+    assert bloom.add_many(present) == 2000
+    assert all(bloom.contains_many(present))
+
+    batch = bloom.contains_many(absent)
+    assert batch == [key in bloom for key in absent]
+    assert sum(batch) / len(absent) < 0.03
+
+
+@pytest.mark.parametrize("numpy_available", [cache_manager.NUMPY_AVAILABLE, False])
+def test_bloom_add_many_counts_new_items_only(monkeypatch, numpy_available):
+    """测试批量添加只计入此前不存在的元素，重复元素不抬高填充估计"""
+    monkeypatch.setattr(cache_manager, "NUMPY_AVAILABLE", numpy_available)
+    bloom = BloomFilter(expected_items=1000, fp_rate=0.01)
+    bloom.add_many(["a", "b", "a", "b", "a"])
+    assert len(bloom) == 2
+    bloom.add_item("c")
+    bloom.add_many(["a", "c"])
+    assert len(bloom) == 3
+
+    scalable = ScalableBloomFilter(initial_capacity=10, fp_rate=0.01)
+    scalable.filters[0].add_many(["x"] * 50)
+    assert len(scalable.filters[0]) == 1
+    scalable.add_item("y")
+    assert len(scalable.filters) == 1
+
+
+def test_bloom_zero_step_uses_distinct_positions(monkeypatch):
+    """测试双重哈希步长为0时各哈希位置不重合"""
+    bloom = BloomFilter(size=1024, hash_count=5)
+    monkeypatch.setattr(BloomFilter, "_digest", staticmethod(lambda item: (7).to_bytes(16, "little")))
+    assert len(set(bloom._positions("item"))) == 5
+    bloom.add_item("item")
+    assert "item" in bloom
+    if cache_manager.NUMPY_AVAILABLE:
+        assert bloom._batch_positions(["item"]).tolist() == [bloom._positions("item")]
+
+
+@pytest.mark.parametrize("numpy_available", [cache_manager.NUMPY_AVAILABLE, False])
+def test_counting_bloom_remove(monkeypatch, numpy_available):
+    """测试计数布隆过滤器删除元素"""
+    monkeypatch.setattr(cache_manager, "NUMPY_AVAILABLE", numpy_available)
+    bloom = CountingBloomFilter(expected_items=100)
+    bloom.add_many(["a", "b"])
+    bloom.add_item("a")
+
+    assert bloom.remove("a") is True
+    assert "a" in bloom
+    assert bloom.remove("a") is True
+    assert "a" not in bloom
+    assert "b" in bloom
+    assert bloom.remove("never-added") is False
+
+
+def test_scalable_bloom_grows_and_snapshots(tmp_path):
+    """测试可扩展过滤器自动增长并可从快照恢复"""
+    bloom = ScalableBloomFilter(initial_capacity=100, fp_rate=0.01, counting=True)
+    keys = [str(i) for i in range(1000)]
+    assert bloom.add_many(keys) == 1000
+    assert bloom.add_many(keys[:10]) == 0
+    assert len(bloom.filters) > 1
+    assert len(bloom) == 1000
+
+    path = str(tmp_path / "keys.bloom")
+    bloom.save(path)
+    restored = ScalableBloomFilter.load(path)
+    assert [f.size for f in restored.filters] == [f.size for f in bloom.filters]
+    assert all(restored.contains_many(keys))
+    assert restored.remove("7") is True
+    assert "7" not in restored
+
+    with pytest.raises(TypeError):
+        ScalableBloomFilter().remove("7")
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(restored.to_bytes())
+
+
+@pytest.mark.asyncio
+async def test_manager_persists_bloom_snapshot(tmp_path):
+    """测试缓存持久化时同时写出布隆过滤器快照"""
+    path = str(tmp_path / "cache.pkl")
+    config = CacheConfig(enable_persistence=True, persistence_path=path, bloom_expected_items=10)
+    cache = CacheManager(config)
+    for i in range(50):
+        await cache.set(f"key{i}", i)
+    await cache.stop()
+    assert os.path.exists(path + ".bloom")
+
+    restored = CacheManager(config)
+    assert await restored.restore() == 50
+    assert len(restored._bloom_filter.filters) > 1
+    assert await restored.get("key7") == 7
+    assert await restored.get("unknown") is None
+
+    with pytest.raises(ValueError):
+        CacheConfig(bloom_fp_rate=1.5)
+
+
+# ============================================================================
+# Single-Flight / Stale-While-Revalidate Tests
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    """测试并发未命中只触发一次加载，完成后登记表清空"""
+    cache = CacheManager(CacheConfig(enable_bloom_filter=False))
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "value"
+
+    results = await asyncio.gather(*(cache.get_with_loader("key", loader) for _ in range(20)))
+    assert results == ["value"] * 20
+    assert calls == 1
+    assert cache._inflight == {}
+    assert cache.get_stats()["coalesced"] == 19
+
+
+@pytest.mark.asyncio
+async def test_failed_load_propagates_to_all_waiters():
+    """测试加载失败时所有等待者收到异常，之后可重新加载"""
+    cache = CacheManager(CacheConfig(enable_bloom_filter=False))
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("backend down")
+
+    results = await asyncio.gather(*(cache.get_with_loader("key", failing) for _ in range(3)),
+                                   return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache._inflight == {}
+
+    async def loader():
+        return "recovered"
+
+    assert await cache.get_with_loader("key", loader) == "recovered"
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing():
+    """测试宽限期内返回旧值并在后台刷新，宽限期后同步加载"""
+    cache = CacheManager(CacheConfig(enable_bloom_filter=False, stale_ttl=0.2, early_expiration_beta=0))
+    version = 0
+
+    async def loader():
+        nonlocal version
+        version += 1
+        await asyncio.sleep(0.02)
+        return version
+
+    assert await cache.get_with_loader("key", loader, ttl=0.05) == 1
+    await asyncio.sleep(0.07)
+    assert await cache.get("key") is None
+    assert await cache.exists("key") is False
+
+    assert await cache.get_with_loader("key", loader, ttl=0.05) == 1
+    assert await cache.get_with_loader("key", loader, ttl=0.05) == 1
+    await asyncio.sleep(0.03)
+    assert await cache.get_with_loader("key", loader, ttl=0.05) == 2
+    assert version == 2
+    stats = cache.get_stats()
+    assert stats["stale_hits"] == 2
+    assert stats["refreshes"] == 1
+
+    await asyncio.sleep(0.3)
+    assert await cache.get_with_loader("key", loader, ttl=0.05) == 3
+
+
+@pytest.mark.asyncio
+async def test_early_expiration_refreshes_in_background():
+    """测试加载耗时相对剩余时间较大时提前后台刷新"""
+    cache = CacheManager(CacheConfig(enable_bloom_filter=False, early_expiration_beta=1e9))
+    version = 0
+
+    async def loader():
+        nonlocal version
+        version += 1
+        await asyncio.sleep(0.01)
+        return version
+
+    assert await cache.get_with_loader("key", loader, ttl=60) == 1
+    assert await cache.get_with_loader("key", loader, ttl=60) == 1
+    await asyncio.sleep(0.1)
+    assert version == 2
+    assert await cache.get("key") == 2
+
+    disabled = CacheManager(CacheConfig(enable_bloom_filter=False, early_expiration_beta=0))
+    await disabled.get_with_loader("key", loader, ttl=60)
+    await disabled.get_with_loader("key", loader, ttl=60)
+    await asyncio.sleep(0.1)
+    assert version == 3
+
+
+@pytest.mark.asyncio
+async def test_inflight_registry_is_bounded():
+    """测试登记表达到上限后直接加载而不登记"""
+    cache = CacheManager(CacheConfig(enable_bloom_filter=False, max_inflight_loads=1))
+    started = []
+
+    async def loader_for(key):
+        started.append(key)
+        await asyncio.sleep(0.02)
+        assert len(cache._inflight) <= 1
+        return key
+
+    results = await asyncio.gather(*(cache.get_with_loader(k, lambda k=k: loader_for(k))
+                                     for k in ("a", "a", "b", "c")))
+    assert results == ["a", "a", "b", "c"]
+    assert sorted(started) == ["a", "b", "c"]
+    assert cache._inflight == {}
+
+    with pytest.raises(ValueError):
+        CacheConfig(max_inflight_loads=0)
+
+
+# ============================================================================
+# Memory Budget Tests
+# ============================================================================
+
+def test_size_estimator():
+    """测试大小估算：共享对象只计一次、循环引用、抽样误差"""
+    sizer = SizeEstimator()
+    shared = "x" * 1000
+    assert sizer([shared, shared]) < 2 * sys.getsizeof(shared)
+    assert sizer("abc") == sys.getsizeof("abc")
+
+    cyclic = []
+    cyclic.append(cyclic)
+    assert sizer(cyclic) == sys.getsizeof(cyclic)
+
+    class Slotted:
+        __slots__ = ("payload",)
+
+        def __init__(self):
+            self.payload = "y" * 500
+
+    assert sizer(Slotted()) > 500
+
+    document = {"fields": [{"name": f"f{i}", "doc": "d" * (i % 50)} for i in range(2000)]}
+    exact = SizeEstimator(sample_size=0)(document)
+    assert abs(sizer(document) - exact) / exact < 0.1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend_cls,strategy", [
+    (MemoryCacheBackend, CacheStrategy.LRU),
+    (ShardedMemoryCacheBackend, CacheStrategy.LRU),
+    (ShardedMemoryCacheBackend, CacheStrategy.LFU),
+    (ShardedMemoryCacheBackend, CacheStrategy.W_TINYLFU),
+])
+async def test_weighted_eviction(backend_cls, strategy):
+    """测试按字节预算加权淘汰与字节统计"""
+    backend = backend_cls(CacheConfig(max_size=100, max_bytes=1000, strategy=strategy))
+    for i in range(10):
+        assert await backend.set(f"small{i}", _entry(f"small{i}", size=50)) is True
+    assert backend.bytes_used == 500
+
+    assert await backend.set("big", _entry("big", size=800)) is True
+    assert backend.bytes_used <= 1000
+    assert backend.bytes_used == sum(size for _, size in await backend.entry_sizes())
+
+    assert await backend.set("huge", _entry("huge", size=5000)) is False
+    assert await backend.get("huge") is None
+
+    await backend.delete("big")
+    assert backend.bytes_used == sum(size for _, size in await backend.entry_sizes())
+    await backend.clear()
+    assert backend.bytes_used == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_update_is_most_recent_for_byte_trim():
+    """测试更新已有LRU键后字节淘汰先驱逐其他条目，而不是刚写入的条目"""
+    backend = MemoryCacheBackend(CacheConfig(max_size=100, max_bytes=1000, strategy=CacheStrategy.LRU))
+    for key in ("a", "b", "c"):
+        assert await backend.set(key, _entry(key, size=300)) is True
+
+    assert await backend.set("a", _entry("a", size=600)) is True
+    assert await backend.get("a") is not None
+    assert sorted(key for key, _ in await backend.entry_sizes()) == ["a", "c"]
+    assert backend.bytes_used == 900
+
+
+@pytest.mark.asyncio
+async def test_manager_memory_budget_and_breakdown():
+    """测试缓存管理器的内存预算与命名空间明细"""
+    cache = CacheManager(CacheConfig(max_bytes=200_000, shard_count=2, enable_bloom_filter=False))
+    for i in range(20):
+        await cache.set(f"schema:{i}", {"doc": "s" * 2000})
+    await cache.set("user:1", "u", size=100)
+    await cache.set("plain", "p", size=10)
+    assert await cache.set("schema:huge", "h", size=10_000_000) is False
+
+    await cache.set("schema:0", {"doc": "s" * 50})
+    breakdown = await cache.memory_breakdown(top_n=3)
+    assert list(breakdown["namespaces"])[0] == "schema"
+    assert breakdown["namespaces"]["schema"]["keys"] == 20
+    assert breakdown["namespaces"]["user"] == {"keys": 1, "bytes": 100}
+    assert breakdown["namespaces"][""] == {"keys": 1, "bytes": 10}
+    assert len(breakdown["largest_keys"]) == 3
+    assert "schema:0" not in [key for key, _ in breakdown["largest_keys"]]
+
+    stats = cache.get_stats()
+    assert stats["total_size"] == breakdown["total_bytes"] <= 200_000
+
+    await cache.delete("user:1")
+    assert cache.get_stats()["total_size"] == breakdown["total_bytes"] - 100
+
+    with pytest.raises(ValueError):
+        CacheConfig(max_bytes=0)
+
+
+# ============================================================================
+# Snapshot Tests
+# ============================================================================
+
+def test_snapshot_store_incremental_segments(tmp_path):
+    """测试增量写入、删除、过期跳过与重新打开"""
+    directory = str(tmp_path / "snapshot")
+    store = SnapshotStore(directory)
+    now = time.time()
+    store.write([(f"key{i}", {"n": i}, now + 60, None) for i in range(100)])
+    store.write([("key1", "updated", now + 60, now + 30), (("tuple", 2), [2], now + 60, None),
+                 ("expired", 1, now - 1, None)], deleted=["key2"])
+
+    assert store.stats()["segments"] == 2
+    assert len(store) == 100
+    assert store.get("key0").value == {"n": 0}
+    record = store.get("key1")
+    assert (record.value, record.stale_at) == ("updated", pytest.approx(now + 30))
+    assert store.get("key2") is None
+    assert store.get("expired") is None
+    assert store.get(("tuple", 2)).value == [2]
+    assert store.get("key3", now=now + 120) is None
+    store.close()
+
+    reopened = SnapshotStore(directory)
+    assert reopened.get("key1").value == "updated"
+    assert sorted(r.key for r in reopened.iter_records() if isinstance(r.key, str))[:2] == ["key0", "key1"]
+    reopened.close()
+
+
+def test_snapshot_store_compaction(tmp_path):
+    """测试失效数据过半时压缩为单个段"""
+    store = SnapshotStore(str(tmp_path / "snapshot"), compact_min_bytes=0)
+    expires_at = time.time() + 60
+    for round_number in range(3):
+        store.write([(f"key{i}", "x" * 100 + str(round_number), expires_at, None) for i in range(50)])
+
+    stats = store.stats()
+    assert stats["segments"] == 1
+    assert stats["total_bytes"] == stats["live_bytes"]
+    assert store.get("key7").value.endswith("2")
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_manager_lazy_restore_preserves_ttl(tmp_path):
+    """测试停止时写快照，恢复时延迟加载并保留过期时间"""
+    config = CacheConfig(enable_persistence=True, persistence_path=str(tmp_path / "cache"))
+    cache = CacheManager(config)
+    for i in range(30):
+        await cache.set(f"key{i}", {"value": i}, ttl=100)
+    await cache.set("short", "gone", ttl=0.05)
+    await cache.stop()
+    await asyncio.sleep(0.1)
+
+    restored = CacheManager(config)
+    assert await restored.restore() == 31
+    assert await restored._backend.size() == 0
+
+    assert await restored.get("key5") == {"value": 5}
+    assert await restored._backend.size() == 1
+    assert 95 < await restored.ttl("key5") <= 100
+    assert await restored.get("short") is None
+    assert await restored.exists("key6") is True
+
+    # 删除与修改在下一次快照后生效，未访问的条目保留
+    await restored.delete("key7")
+    await restored.set("key8", "changed")
+    assert await restored.get("key7") is None
+    await restored.stop()
+
+    again = CacheManager(config)
+    await again.restore()
+    assert await again.get("key7") is None
+    assert await again.get("key8") == "changed"
+    assert await again.get("key29") == {"value": 29}
+
+
+@pytest.mark.asyncio
+async def test_manager_background_snapshot_and_eager_restore(tmp_path):
+    """测试后台增量快照与一次性恢复"""
+    path = str(tmp_path / "cache")
+    cache = CacheManager(CacheConfig(enable_persistence=True, persistence_path=path, snapshot_interval=0.02))
+    await cache.start()
+    await cache.set("a", 1)
+    await asyncio.sleep(0.1)
+    assert cache._dirty == {}
+    await cache.set("b", 2)
+    await cache.stop()
+
+    eager = CacheManager(CacheConfig(persistence_path=path, lazy_restore=False, enable_bloom_filter=False))
+    assert await eager.restore() == 2
+    assert sorted(await eager.keys()) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_manager_restores_legacy_pickle(tmp_path):
+    """测试旧版pickle文件仍可恢复，下次持久化时改为快照目录"""
+    path = str(tmp_path / "cache.pkl")
+    with open(path, "wb") as f:
+        pickle.dump({"old": "value"}, f)
+
+    cache = CacheManager(CacheConfig(enable_persistence=True, persistence_path=path))
+    assert await cache.restore() == 1
+    assert await cache.get("old") == "value"
+    await cache.stop()
+    assert os.path.isdir(path)
+
+    restored = CacheManager(CacheConfig(persistence_path=path))
+    assert await restored.restore() == 1
+    assert await restored.get("old") == "value"
+
+
+# ============================================================================
+# Shared L2 Tests
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_batches_concurrent_gets(tmp_path):
+    """测试并发get合并为一次批量查询，批量写入在一个事务中完成"""
+    backend = SQLiteCacheBackend(str(tmp_path / "l2.db"))
+    assert await backend.set_many({f"key{i}": _entry(f"key{i}") for i in range(20)}) == 20
+    await backend.set(("tuple", 1), _entry("tuple"))
+    await backend.set("expired", _entry("expired", ttl=-1))
+
+    entries = await asyncio.gather(*(backend.get(f"key{i}") for i in range(25)))
+    assert [entry.value for entry in entries[:20]] == [f"value_key{i}" for i in range(20)]
+    assert entries[20:] == [None] * 5
+    assert (await backend.get(("tuple", 1))).value == "value_tuple"
+    assert await backend.get("expired") is None
+
+    stats = backend.stats()
+    assert stats['get_batches'] == 3
+    assert stats['write_batches'] == 3
+    assert await backend.size() == 21
+    assert await backend.delete("key0") is True
+    assert await backend.delete("key0") is False
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_multilevel_write_behind_coalesces(tmp_path):
+    """测试L2异步写回：同一key的多次写入合并，停止时写回剩余数据"""
+    l2 = SQLiteCacheBackend(str(tmp_path / "l2.db"))
+    cache = MultiLevelCache(CacheConfig(l2_flush_interval=10.0), l2_backend=l2)
+    for version in range(5):
+        await cache.set("schema:1", {"version": version})
+    await cache.set("schema:2", "other")
+    await cache.delete("schema:2")
+    assert await l2.size() == 0
+    assert await cache.get("schema:1") == {"version": 4}
+
+    assert await cache.flush_l2() == 2
+    assert l2.stats()['write_batches'] == 2
+    assert (await l2.get("schema:1")).value == {"version": 4}
+    assert await l2.get("schema:2") is None
+
+    await cache.set("schema:3", "late")
+    await cache.stop()
+    reopened = SQLiteCacheBackend(str(tmp_path / "l2.db"))
+    assert (await reopened.get("schema:3")).value == "late"
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_multilevel_shared_l2_invalidates_l1(tmp_path):
+    """测试两个实例共享L2：L1未命中从L2回填，其他实例的写入使本地L1失效"""
+    path = str(tmp_path / "l2.db")
+    config = CacheConfig(l2_write_behind=False, l2_invalidation_interval=0.02)
+    first = MultiLevelCache(config, l2_backend=SQLiteCacheBackend(path))
+    second = MultiLevelCache(config, l2_backend=SQLiteCacheBackend(path))
+    await first.start()
+    await second.start()
+
+    await first.set("schema:1", "v1", ttl=100)
+    assert await second.get("schema:1") == "v1"
+    assert 95 < await second.ttl("schema:1") <= 100
+    assert await second.get_many(["schema:1", "missing"]) == {"schema:1": "v1"}
+
+    await first.set("schema:1", "v2")
+    await asyncio.sleep(0.1)
+    assert await second._l1.get("schema:1") is None
+    assert await second.get("schema:1") == "v2"
+
+    await first.delete("schema:1")
+    await asyncio.sleep(0.1)
+    assert await second.get("schema:1") is None
+    # 本实例自己的写入不会被当作失效通知
+    assert await first.apply_invalidations() == 0
+    await first.stop()
+    await second.stop()
+
+
+@pytest.mark.asyncio
+async def test_multilevel_l2_hit_counted_once(tmp_path):
+    """测试布隆过滤器判定不存在但L2命中时只计一次命中"""
+    path = str(tmp_path / "l2.db")
+    config = CacheConfig(l2_write_behind=False)
+    first = MultiLevelCache(config, l2_backend=SQLiteCacheBackend(path))
+    second = MultiLevelCache(config, l2_backend=SQLiteCacheBackend(path))
+    await first.set("schema:1", "v1")
+
+    assert "schema:1" not in second._bloom_filter
+    assert await second.get("schema:1") == "v1"
+    assert (second._stats.hits, second._stats.misses) == (1, 0)
+    assert await second.get("schema:1") == "v1"
+    assert await second.get("missing") is None
+    assert (second._stats.hits, second._stats.misses) == (2, 1)
+    await first.stop()
+    await second.stop()
+
+
+class GatedSQLiteBackend(SQLiteCacheBackend):
+    """批量写入等待gate打开，用于观察写回进行中的读取"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.gate = asyncio.Event()
+        self.writing = asyncio.Event()
+
+    async def set_many(self, entries):
+        self.writing.set()
+        await self.gate.wait()
+        return await super().set_many(entries)
+
+    async def delete_many(self, keys):
+        self.writing.set()
+        await self.gate.wait()
+        return await super().delete_many(keys)
+
+
+@pytest.mark.asyncio
+async def test_multilevel_reads_see_inflight_write_behind(tmp_path):
+    """测试写回提交前的读取看到正在写回的删除与更新，不从L2回填旧值"""
+    l2 = GatedSQLiteBackend(str(tmp_path / "l2.db"))
+    l2.gate.set()
+    cache = MultiLevelCache(CacheConfig(l2_flush_interval=10.0), l2_backend=l2)
+    await cache.set("gone", "old")
+    await cache.set("kept", "old")
+    await cache.flush_l2()
+    await cache._l1.clear()
+
+    l2.gate.clear()
+    l2.writing.clear()
+    await cache.delete("gone")
+    await cache.set("kept", "new")
+    await cache._l1.clear()
+    flush = asyncio.ensure_future(cache.flush_l2())
+    await l2.writing.wait()
+
+    assert await cache.get("gone") is None
+    assert await cache.get("kept") == "new"
+    assert await cache.get_many(["gone", "kept"]) == {"kept": "new"}
+    assert await cache._l1.get("gone") is None
+
+    l2.gate.set()
+    assert await flush == 2
+    assert await l2.get("gone") is None
+    assert await cache.get("gone") is None
+    assert await cache.get("kept") == "new"
+    await cache.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -2,8 +2,8 @@
 MCP协议性能优化模块测试
 
 测试内容：
-1. 连接池 (ConnectionPool) - 基本功能、并发、超时、指标
-2. 批处理器 (BatchProcessor) - 提交、优先级、自适应、指标
+1. 连接池 (ConnectionPool) - 基本功能、并发、超时、指标、选择策略、等待交付、多路复用
+2. 批处理器 (BatchProcessor) - 提交、优先级、自适应、指标、执行器模式、去重合并、EDF调度、流式背压
 3. 缓存管理器 (CacheManager) - 存取、过期、装饰器、防护机制
 """
 
@@ -11,6 +11,8 @@ import asyncio
 import pytest
 import sys
 import os
+import threading
+import time
 from typing import List, Any
 
 # 添加路径
@@ -21,7 +23,8 @@ from mcp.connection_pool import (
     ConnectionState, MockMCPConnection
 )
 from mcp.batch_processor import (
-    BatchProcessor, BatchConfig, BatchItem, Priority, BatchStrategy
+    BatchProcessor, BatchConfig, BatchItem, Priority, BatchStrategy, ExecutorMode, LatencyHistogram,
+    StreamingBatchProcessor, _dedup_key
 )
 from mcp.cache_manager import (
     CacheManager, CacheConfig, CacheStrategy, BloomFilter
@@ -137,6 +140,101 @@ def test_pool_config_validation():
         ConnectionPoolConfig(min_connections=10, max_connections=5)
 
 
+@pytest.mark.asyncio
+async def test_pool_selection_strategies():
+    """测试各负载均衡策略的选择结果与按连接删除"""
+    for strategy in ("round_robin", "least_busy", "random", "fifo"):
+        config = ConnectionPoolConfig(min_connections=4, max_connections=4, enable_warmup=False,
+                                      load_balance_strategy=strategy)
+        pool = ConnectionPool(config)
+        await pool.initialize()
+        
+        held = [await pool.get_connection() for _ in range(4)]
+        assert len({conn.id for conn in held}) == 4
+        for conn in held:
+            await pool.release(conn)
+        
+        # 删除任意一个可用连接后仍能取出其余连接
+        pool._pool.discard(held[1])
+        remaining = [await pool.get_connection() for _ in range(3)]
+        assert held[1] not in remaining
+        await pool.close()
+    
+    pool = ConnectionPool(ConnectionPoolConfig(min_connections=3, max_connections=3, enable_warmup=False,
+                                               load_balance_strategy="least_busy"))
+    await pool.initialize()
+    for _ in range(2):
+        conn = await pool.get_connection()
+        await pool.release(conn)
+    conn = await pool.get_connection()
+    assert conn.use_count == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_hands_off_to_waiters_in_order():
+    """测试释放的连接按等待顺序直接交给等待者，关闭时唤醒等待者"""
+    config = ConnectionPoolConfig(min_connections=1, max_connections=1, enable_warmup=False)
+    pool = ConnectionPool(config)
+    conn = await pool.get_connection()
+    
+    order = []
+    
+    async def waiter(name: str):
+        acquired = await pool.get_connection()
+        order.append(name)
+        await pool.release(acquired)
+    
+    tasks = [asyncio.create_task(waiter(name)) for name in ("a", "b", "c")]
+    await asyncio.sleep(0.01)
+    assert pool.get_metrics()['waiting_requests'] == 3
+    await pool.release(conn)
+    await asyncio.gather(*tasks)
+    assert order == ["a", "b", "c"]
+    
+    held = await pool.get_connection()
+    blocked = asyncio.create_task(pool.get_connection())
+    await asyncio.sleep(0.01)
+    await pool.close()
+    with pytest.raises(RuntimeError):
+        await blocked
+    assert held.state == ConnectionState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_pool_multiplexed_connections():
+    """测试多路复用：单个连接承载多个请求，least_busy按进行中请求数分摊"""
+    config = ConnectionPoolConfig(min_connections=1, max_connections=1, enable_warmup=False,
+                                  max_inflight_per_connection=3, acquire_timeout=0.1)
+    pool = ConnectionPool(config)
+    held = [await pool.get_connection() for _ in range(3)]
+    assert len({conn.id for conn in held}) == 1
+    assert held[0].inflight == 3
+    with pytest.raises(TimeoutError):
+        await pool.get_connection()
+    
+    await pool.release(held[0])
+    assert held[0].state == ConnectionState.BUSY
+    again = await pool.get_connection()
+    assert again is held[0]
+    for conn in held[1:] + [again]:
+        await pool.release(conn)
+    assert held[0].state == ConnectionState.IDLE
+    await pool.close()
+    
+    pool = ConnectionPool(ConnectionPoolConfig(min_connections=2, max_connections=2, enable_warmup=False,
+                                               max_inflight_per_connection=4, load_balance_strategy="least_busy"))
+    held = [await pool.get_connection() for _ in range(6)]
+    assert sorted(conn.inflight for conn in {conn.id: conn for conn in held}.values()) == [3, 3]
+    
+    async def query(connection):
+        return await connection.execute("q")
+    
+    results = await asyncio.gather(*(pool.execute(query) for _ in range(2)))
+    assert all(result["result"] == "success" for result in results)
+    await pool.close()
+
+
 # ============================================================================
 # Batch Processor Tests
 # ============================================================================
@@ -233,6 +331,336 @@ async def test_processor_metrics():
     await processor.stop()
 
 
+def _square_batch(items: List[int]) -> List[int]:
+    """CPU密集的同步批处理函数（模块级，可pickle）"""
+    deadline = time.thread_time() + 0.02
+    while time.thread_time() < deadline:
+        pass
+    return [item * item for item in items]
+
+
+@pytest.mark.asyncio
+async def test_thread_executor_keeps_loop_responsive():
+    """测试线程池模式下阻塞的同步处理函数不阻塞事件循环"""
+    def blocking_process(items: List[Any]) -> List[Any]:
+        time.sleep(0.2)
+        return [f"done_{item}" for item in items]
+    
+    ticks = 0
+    
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+    
+    config = BatchConfig(batch_size=2, worker_count=1, executor_mode=ExecutorMode.THREAD)
+    processor = BatchProcessor(config, blocking_process)
+    await processor.start()
+    ticker_task = asyncio.create_task(ticker())
+    
+    results = await processor.submit_many(["a", "b"])
+    ticker_task.cancel()
+    
+    assert results == ["done_a", "done_b"]
+    assert ticks >= 10
+    metrics = processor.get_metrics()
+    assert metrics['executor_mode'] == "thread"
+    assert metrics['avg_item_latency'] >= 0.09
+    
+    await processor.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_executor_without_blocking_loop():
+    """测试停止时等待在途批次结束，期间事件循环仍可调度"""
+    def blocking_process(items: List[Any]) -> List[Any]:
+        time.sleep(0.3)
+        return items
+    
+    ticks = 0
+    
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+    
+    config = BatchConfig(batch_size=1, worker_count=1, executor_mode=ExecutorMode.THREAD)
+    processor = BatchProcessor(config, blocking_process)
+    await processor.start()
+    submitted = asyncio.ensure_future(processor.submit("a"))
+    await asyncio.sleep(0.05)
+    
+    ticker_task = asyncio.create_task(ticker())
+    start = time.time()
+    await processor.stop(timeout=0.01)
+    ticker_task.cancel()
+    
+    assert time.time() - start >= 0.2
+    assert ticks >= 10
+    submitted.cancel()
+    await asyncio.gather(submitted, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_process_executor_and_auto_selection():
+    """测试进程池模式，以及AUTO模式按CPU占比和可pickle性选择执行器"""
+    config = BatchConfig(batch_size=4, worker_count=2, executor_mode=ExecutorMode.PROCESS, executor_workers=2)
+    processor = BatchProcessor(config, _square_batch)
+    await processor.start()
+    assert await processor.submit_many(list(range(8))) == [i * i for i in range(8)]
+    assert processor.get_metrics()['executor_mode'] == "process"
+    await processor.stop()
+    
+    with pytest.raises(ValueError):
+        BatchProcessor(BatchConfig(executor_mode=ExecutorMode.PROCESS), lambda items: items)
+    
+    auto = BatchProcessor(BatchConfig(batch_size=2, worker_count=1, executor_mode=ExecutorMode.AUTO,
+                                      executor_workers=2, auto_probe_batches=2), _square_batch)
+    await auto.start()
+    await auto.submit_many(list(range(4)))
+    assert auto.get_metrics()['executor_mode'] == "process"
+    assert await auto.submit_many([3, 4]) == [9, 16]
+    await auto.stop()
+    
+    unpicklable = BatchProcessor(BatchConfig(executor_mode=ExecutorMode.AUTO), lambda items: items)
+    assert unpicklable.get_metrics()['executor_mode'] == "thread"
+
+
+@pytest.mark.asyncio
+async def test_executor_inflight_cap_and_adaptive_latency():
+    """测试每个执行器的在途批次上限，以及自适应批大小使用实测单项耗时"""
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+    
+    def slow_process(items: List[Any]) -> List[Any]:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01 * len(items))
+        with lock:
+            running -= 1
+        return items
+    
+    config = BatchConfig(batch_size=5, min_batch_size=2, flush_interval=0.01, worker_count=4,
+                         executor_mode=ExecutorMode.THREAD, executor_workers=4, max_inflight_batches=1)
+    processor = BatchProcessor(config, slow_process)
+    await processor.start()
+    
+    assert await processor.submit_many(list(range(40))) == list(range(40))
+    assert peak == 1
+    metrics = processor.get_metrics()
+    assert 0.009 <= metrics['avg_item_latency'] < 0.05
+    # 每批预计0.05秒，远超刷新间隔，批大小应减小
+    assert metrics['current_batch_size'] < 5
+    
+    await processor.stop()
+
+
+@pytest.mark.asyncio
+async def test_duplicates_join_inflight_request():
+    """测试去重窗口内的重复请求共享结果，失败的请求不被复用"""
+    calls = []
+    
+    async def process_func(items: List[Any]) -> List[Any]:
+        calls.extend(items)
+        if any(item == {"fail": True} for item in items):
+            raise RuntimeError("boom")
+        return [f"result_{len(calls)}" for _ in items]
+    
+    config = BatchConfig(batch_size=1, worker_count=1, enable_deduplication=True, dedup_window=0.2,
+                         max_retries=1)
+    processor = BatchProcessor(config, process_func)
+    await processor.start()
+    
+    first, second = await asyncio.gather(processor.submit({"schema": 1}), processor.submit({"schema": 1}))
+    assert first == second == "result_1"
+    assert await processor.submit({"schema": 1}) == "result_1"
+    assert processor.get_metrics()['total_deduplicated'] == 2
+    
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await processor.submit({"fail": True})
+    assert calls.count({"fail": True}) == 2
+    
+    await asyncio.sleep(0.3)
+    assert await processor.submit({"schema": 1}) != "result_1"
+    
+    await processor.stop()
+
+
+def test_dedup_key_types_and_dict_order():
+    """测试去重键区分1、1.0与True，dict与集合与插入顺序无关"""
+    keys = [_dedup_key(value) for value in (1, 1.0, True, (1,), (True,), [1], {'a': 1}, {'a': True})]
+    assert len(set(keys)) == len(keys)
+    assert _dedup_key({'a': 1, 'b': [2, {3}]}) == _dedup_key({'b': [2, {3}], 'a': 1})
+    assert _dedup_key({'a': 1, 'b': 2}) != _dedup_key({'a': 1, 'b': 3})
+    assert _dedup_key({frozenset({1, 2}): 'x'}) == _dedup_key({frozenset({2, 1}): 'x'})
+
+
+@pytest.mark.asyncio
+async def test_duplicates_of_equal_values_with_different_types():
+    """测试1与True等相等但类型不同的请求不共享结果"""
+    async def process_func(items: List[Any]) -> List[Any]:
+        return [repr(item) for item in items]
+    
+    config = BatchConfig(batch_size=1, worker_count=1, enable_deduplication=True, dedup_window=1.0)
+    processor = BatchProcessor(config, process_func)
+    await processor.start()
+    
+    results = await asyncio.gather(*(processor.submit(value) for value in (1, True, 1.0, 1)))
+    assert results == ['1', 'True', '1.0', '1']
+    first, second = await asyncio.gather(processor.submit({'b': 2, 'a': 1}), processor.submit({'a': 1, 'b': 2}))
+    assert first == second
+    assert processor.get_metrics()['total_deduplicated'] == 2
+    
+    await processor.stop()
+
+
+@pytest.mark.asyncio
+async def test_deadline_strategy_orders_and_closes_batches():
+    """测试EDF策略按截止时间排序，并在最紧的截止时间前关闭批次"""
+    processed = []
+    
+    async def process_func(items: List[Any]) -> List[Any]:
+        processed.append(list(items))
+        return items
+    
+    config = BatchConfig(batch_size=100, worker_count=1, max_wait_time=5.0, strategy=BatchStrategy.DEADLINE)
+    processor = BatchProcessor(config, process_func)
+    
+    loose = [processor._new_item(f"loose{i}", Priority.NORMAL, None, 10.0) for i in range(3)]
+    tight = processor._new_item("tight", Priority.NORMAL, None, 0.2)
+    for item in loose + [tight]:
+        await processor._enqueue(item)
+    
+    start = time.time()
+    await processor.start()
+    await asyncio.wait_for(tight.future, timeout=2.0)
+    
+    assert time.time() - start < 1.0
+    assert processed[0][0] == "tight"
+    metrics = processor.get_metrics()
+    assert metrics['deadline_misses'] == 0
+    assert 0 < metrics['queue_wait_p50'] <= metrics['queue_wait_p99'] < 1.0
+    
+    await processor.stop()
+
+
+def test_latency_histogram_percentiles():
+    """测试对数分桶直方图的分位数误差"""
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0.0
+    for i in range(1, 1001):
+        histogram.record(i / 1000)
+    
+    for percent, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+        assert expected <= histogram.percentile(percent) <= expected * 1.1
+
+
+async def _numbers(count: int, delay: float = 0.0, produced: List[int] = None, fail: bool = False):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        if produced is not None:
+            produced.append(i)
+        yield i
+    if fail:
+        raise ValueError("upstream failed")
+
+
+@pytest.mark.asyncio
+async def test_stream_ordered_and_unordered_delivery():
+    """测试流式结果按输入顺序或批次完成顺序返回"""
+    async def process_func(items: List[int]) -> List[int]:
+        # 前面的批次更慢，完成顺序与输入顺序相反
+        await asyncio.sleep(0.05 if items[0] < 4 else 0.0)
+        return [item * 10 for item in items]
+    
+    config = BatchConfig(batch_size=4, worker_count=1, strategy=BatchStrategy.FIXED_SIZE)
+    processor = StreamingBatchProcessor(config, process_func)
+    
+    ordered = [result async for result in processor.submit_stream(_numbers(10))]
+    assert ordered == [i * 10 for i in range(10)]
+    
+    unordered = [result async for result in processor.submit_stream(_numbers(10), ordered=False,
+                                                                       max_inflight_batches=3)]
+    assert sorted(unordered) == ordered
+    assert unordered[0] == 40
+    assert processor.get_metrics()['total_submitted'] == 20
+
+
+@pytest.mark.asyncio
+async def test_stream_backpressure_throttles_upstream():
+    """测试消费者慢时上游迭代器被限流"""
+    async def process_func(items: List[int]) -> List[int]:
+        return items
+    
+    produced: List[int] = []
+    config = BatchConfig(batch_size=5, worker_count=1, strategy=BatchStrategy.FIXED_SIZE)
+    processor = StreamingBatchProcessor(config, process_func)
+    stream = processor.submit_stream(_numbers(1000, produced=produced), max_inflight_batches=2)
+    
+    assert await stream.__anext__() == 0
+    await asyncio.sleep(0.1)
+    # 两个批次占满上限，组批中的第三批尚未提交
+    assert len(produced) <= 5 * 3 + 1
+    
+    rest = [result async for result in stream]
+    assert rest == list(range(1, 1000))
+
+
+@pytest.mark.asyncio
+async def test_stream_partial_results_survive_failures():
+    """测试失败批次不丢弃其他结果，输入停顿时提交部分批次"""
+    async def process_func(items: List[int]) -> List[int]:
+        if 5 in items:
+            raise RuntimeError("bad batch")
+        # 少返回一项的批次，缺失项标记为失败
+        return [item for item in items if item != 8]
+    
+    config = BatchConfig(batch_size=3, worker_count=1, max_retries=1, strategy=BatchStrategy.FIXED_SIZE)
+    processor = StreamingBatchProcessor(config, process_func)
+    
+    results = [result async for result in processor.submit_stream(_numbers(9), return_exceptions=True)]
+    assert results[:3] == [0, 1, 2]
+    assert all(isinstance(result, RuntimeError) for result in results[3:6])
+    assert results[6:8] == [6, 7] and isinstance(results[8], RuntimeError)
+    
+    received = []
+    with pytest.raises(RuntimeError, match="bad batch"):
+        async for result in processor.submit_stream(_numbers(9)):
+            received.append(result)
+    assert received == [0, 1, 2]
+    
+    slow = StreamingBatchProcessor(BatchConfig(batch_size=100, flush_interval=0.02, worker_count=1), process_func)
+    stream = slow.submit_stream(_numbers(3, delay=0.2))
+    start = time.time()
+    assert await stream.__anext__() == 0
+    assert time.time() - start < 0.4
+    assert [result async for result in stream] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_stream_upstream_error_after_partial_batch():
+    """测试上游出错时部分批次中已读取的数据仍返回结果，之后再抛出异常"""
+    async def process_func(items: List[int]) -> List[int]:
+        return [item * 10 for item in items]
+    
+    config = BatchConfig(batch_size=10, worker_count=1, strategy=BatchStrategy.FIXED_SIZE)
+    processor = StreamingBatchProcessor(config, process_func)
+    
+    for ordered in (True, False):
+        received = []
+        with pytest.raises(ValueError, match="upstream failed"):
+            async for result in processor.submit_stream(_numbers(25, fail=True), ordered=ordered):
+                received.append(result)
+        assert sorted(received) == [i * 10 for i in range(25)]
+
+
 # ============================================================================
 # Cache Manager Tests
 # ============================================================================